@@ -40,7 +40,7 @@ router = APIRouter()
 
 # --- VERIFICACIÓN DE PERMISOS ---
 @router.get("/verificar-admin", summary="Verificar si el usuario es administrador")
-async def verificar_admin(
+def verificar_admin(
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -70,7 +70,7 @@ async def verificar_admin(
 
 # --- ESTADÍSTICAS DEL SISTEMA ---
 @router.get("/estadisticas", summary="Estadísticas del sistema", response_model=EstadisticasAdminOut)
-async def obtener_estadisticas(
+def obtener_estadisticas(
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -90,7 +90,7 @@ async def obtener_estadisticas(
 
 # --- GESTIÓN DE EMPLEADOS ---
 @router.get("/empleados", summary="Listar todos los empleados", response_model=List[EmpleadoOut])
-async def listar_todos_empleados(
+def listar_todos_empleados(
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -109,7 +109,7 @@ async def listar_todos_empleados(
         raise HTTPException(status_code=500, detail=f"Error listando empleados: {str(e)}")
 
 @router.get("/empleados/{email_empleado}", summary="Obtener empleado específico", response_model=EmpleadoOut)
-async def obtener_empleado_especifico(
+def obtener_empleado_especifico(
     email_empleado: str,
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -133,7 +133,7 @@ async def obtener_empleado_especifico(
         raise HTTPException(status_code=500, detail=f"Error obteniendo empleado: {str(e)}")
 
 @router.post("/empleados", summary="Crear nuevo empleado", response_model=OperacionExitosaOut)
-async def crear_nuevo_empleado(
+def crear_nuevo_empleado(
     empleado_data: EmpleadoCreateIn,
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -161,7 +161,7 @@ async def crear_nuevo_empleado(
         raise HTTPException(status_code=500, detail=f"Error creando empleado: {str(e)}")
 
 @router.put("/empleados/{email_empleado}", summary="Actualizar empleado", response_model=OperacionExitosaOut)
-async def actualizar_empleado_existente(
+def actualizar_empleado_existente(
     email_empleado: str,
     empleado_data: EmpleadoUpdateIn,
     current_user: dict = Depends(get_current_user),
@@ -191,7 +191,7 @@ async def actualizar_empleado_existente(
         raise HTTPException(status_code=500, detail=f"Error actualizando empleado: {str(e)}")
 
 @router.patch("/empleados/{email_empleado}/estado", summary="Cambiar estado de empleado", response_model=OperacionExitosaOut)
-async def cambiar_estado_empleado_endpoint(
+def cambiar_estado_empleado_endpoint(
     email_empleado: str,
     activo: bool,
     current_user: dict = Depends(get_current_user),
@@ -215,7 +215,7 @@ async def cambiar_estado_empleado_endpoint(
 
 # --- GESTIÓN DE ROLES ---
 @router.get("/roles", summary="Listar todos los roles", response_model=List[RolOut])
-async def listar_todos_roles(
+def listar_todos_roles(
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -234,7 +234,7 @@ async def listar_todos_roles(
         raise HTTPException(status_code=500, detail=f"Error listando roles: {str(e)}")
 
 @router.post("/roles", summary="Crear nuevo rol", response_model=OperacionExitosaOut)
-async def crear_nuevo_rol(
+def crear_nuevo_rol(
     rol_data: RolCreateIn,
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -256,7 +256,7 @@ async def crear_nuevo_rol(
         raise HTTPException(status_code=500, detail=f"Error creando rol: {str(e)}")
 
 @router.put("/roles/{idrol}", summary="Actualizar rol", response_model=OperacionExitosaOut)
-async def actualizar_rol_existente(
+def actualizar_rol_existente(
     idrol: UUID,
     rol_data: RolUpdateIn,
     current_user: dict = Depends(get_current_user),
@@ -279,7 +279,7 @@ async def actualizar_rol_existente(
         raise HTTPException(status_code=500, detail=f"Error actualizando rol: {str(e)}")
 
 @router.post("/empleados/asignar-rol", summary="Asignar rol a empleado", response_model=OperacionExitosaOut)
-async def asignar_rol_a_empleado(
+def asignar_rol_a_empleado(
     asignacion: AsignarRolIn,
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -302,7 +302,7 @@ async def asignar_rol_a_empleado(
 
 # --- GESTIÓN DE DEPENDENCIAS ---
 @router.get("/dependencias", summary="Listar todas las dependencias", response_model=List[DependenciaOut])
-async def listar_todas_dependencias(
+def listar_todas_dependencias(
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -321,7 +321,7 @@ async def listar_todas_dependencias(
         raise HTTPException(status_code=500, detail=f"Error listando dependencias: {str(e)}")
 
 @router.post("/dependencias", summary="Crear nueva dependencia", response_model=OperacionExitosaOut)
-async def crear_nueva_dependencia(
+def crear_nueva_dependencia(
     dependencia_data: DependenciaCreateIn,
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -343,7 +343,7 @@ async def crear_nueva_dependencia(
 
 # --- GESTIÓN DE MÓDULOS Y PERMISOS ---
 @router.get("/modulos", summary="Listar todos los módulos del sistema")
-async def listar_modulos_sistema(
+def listar_modulos_sistema(
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -359,7 +359,7 @@ async def listar_modulos_sistema(
     return {"modulos": modulos}
 
 @router.get("/permisos-rol/{rol}", summary="Obtener permisos de un rol específico")
-async def obtener_permisos_rol(
+def obtener_permisos_rol(
     rol: str,
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -382,7 +382,7 @@ async def obtener_permisos_rol(
     }
 
 @router.get("/matriz-permisos", summary="Obtener matriz completa de permisos")
-async def obtener_matriz_permisos(
+def obtener_matriz_permisos(
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -405,7 +405,7 @@ async def obtener_matriz_permisos(
     }
 
 @router.get("/empleados-completo", summary="Listar empleados con información completa")
-async def listar_empleados_completo(
+def listar_empleados_completo(
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -432,7 +432,7 @@ async def listar_empleados_completo(
         raise HTTPException(status_code=500, detail=f"Error listando empleados: {str(e)}")
 
 @router.get("/empleados-permisos", summary="Empleados con información completa de permisos")
-async def listar_empleados_permisos_completos(
+def listar_empleados_permisos_completos(
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -468,7 +468,7 @@ async def listar_empleados_permisos_completos(
         raise HTTPException(status_code=500, detail=f"Error listando empleados con permisos: {str(e)}")
 
 @router.post("/empleados/{email}/asignar-modulos", summary="Asignar módulos personalizados a empleado")
-async def asignar_modulos_empleado(
+def asignar_modulos_empleado(
     email: str,
     modulos: List[str],
     current_user: dict = Depends(get_current_user),
@@ -491,7 +491,7 @@ async def asignar_modulos_empleado(
         raise HTTPException(status_code=500, detail=f"Error asignando módulos: {str(e)}")
 
 @router.delete("/empleados/{email}/permisos-personalizados", summary="Eliminar permisos personalizados")
-async def eliminar_permisos_personalizados_empleado(
+def eliminar_permisos_personalizados_empleado(
     email: str,
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -511,7 +511,7 @@ async def eliminar_permisos_personalizados_empleado(
         raise HTTPException(status_code=500, detail=f"Error eliminando permisos personalizados: {str(e)}")
 
 @router.get("/empleados/{email}/modulos-disponibles", summary="Ver módulos disponibles para empleado")
-async def obtener_modulos_disponibles_empleado(
+def obtener_modulos_disponibles_empleado(
     email: str,
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
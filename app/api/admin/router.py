@@ -64,7 +64,7 @@ async def pagina_admin_completo():
     response_model=List[DependenciaOut],
     summary="Listar todas las dependencias"
 )
-async def listar_dependencias(
+def listar_dependencias(
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
@@ -88,7 +88,7 @@ async def listar_dependencias(
     response_model=List[RolOut],
     summary="Listar todos los roles"
 )
-async def listar_roles(
+def listar_roles(
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
@@ -112,7 +112,7 @@ async def listar_roles(
     response_model=List[EmpleadoListOut],
     summary="Listar todos los empleados"
 )
-async def listar_empleados(
+def listar_empleados(
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
@@ -135,7 +135,7 @@ async def listar_empleados(
     status_code=status.HTTP_201_CREATED,
     summary="Crear nuevo empleado"
 )
-async def crear_nuevo_empleado(
+def crear_nuevo_empleado(
     payload: CrearEmpleadoIn,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -211,7 +211,7 @@ async def crear_nuevo_empleado(
     "/empleados/{email}",
     summary="Actualizar datos de un empleado"
 )
-async def actualizar_datos_empleado(
+def actualizar_datos_empleado(
     email: str,
     payload: ActualizarEmpleadoIn,
     db: Session = Depends(get_db),
@@ -248,7 +248,7 @@ async def actualizar_datos_empleado(
     "/empleados/{email}/estado",
     summary="Dar de baja o activar empleado"
 )
-async def cambiar_estado_de_empleado(
+def cambiar_estado_de_empleado(
     email: str,
     payload: CambiarEstadoIn,
     db: Session = Depends(get_db),
@@ -277,7 +277,7 @@ async def cambiar_estado_de_empleado(
     "/empleados/{email}/contrasena",
     summary="Cambiar contraseña de un empleado"
 )
-async def cambiar_password_empleado(
+def cambiar_password_empleado(
     email: str,
     payload: CambiarContrasenaIn,
     db: Session = Depends(get_db),
@@ -310,7 +310,7 @@ async def cambiar_password_empleado(
     response_model=AsignarRolOut,
     summary="Asignar o cambiar rol a empleado existente"
 )
-async def asignar_rol_a_empleado(
+def asignar_rol_a_empleado(
     payload: AsignarRolIn,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -346,7 +346,7 @@ async def asignar_rol_a_empleado(
     "/empleados/{email}/roles/{id_rol}",
     summary="Eliminar rol de un empleado"
 )
-async def quitar_rol_empleado(
+def quitar_rol_empleado(
     email: str,
     id_rol: str,
     db: Session = Depends(get_db),
@@ -377,7 +377,7 @@ async def quitar_rol_empleado(
     status_code=status.HTTP_201_CREATED,
     summary="Crear nueva dependencia"
 )
-async def crear_nueva_dependencia(
+def crear_nueva_dependencia(
     payload: CrearDependenciaIn,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -409,7 +409,7 @@ async def crear_nueva_dependencia(
     "/dependencias/{id_dependencia}",
     summary="Actualizar dependencia"
 )
-async def actualizar_datos_dependencia(
+def actualizar_datos_dependencia(
     id_dependencia: str,
     payload: ActualizarDependenciaIn,
     db: Session = Depends(get_db),
@@ -443,7 +443,7 @@ async def actualizar_datos_dependencia(
     "/dependencias/{id_dependencia}",
     summary="Eliminar dependencia"
 )
-async def eliminar_una_dependencia(
+def eliminar_una_dependencia(
     id_dependencia: str,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -474,7 +474,7 @@ async def eliminar_una_dependencia(
     status_code=status.HTTP_201_CREATED,
     summary="Crear nuevo rol"
 )
-async def crear_nuevo_rol(
+def crear_nuevo_rol(
     payload: CrearRolIn,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
@@ -501,7 +501,7 @@ async def crear_nuevo_rol(
     "/roles/{id_rol}",
     summary="Actualizar rol"
 )
-async def actualizar_datos_rol(
+def actualizar_datos_rol(
     id_rol: int,
     payload: ActualizarRolIn,
     db: Session = Depends(get_db),
@@ -533,7 +533,7 @@ async def actualizar_datos_rol(
     "/roles/{id_rol}",
     summary="Eliminar rol"
 )
-async def eliminar_un_rol(
+def eliminar_un_rol(
     id_rol: int,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
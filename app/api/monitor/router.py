@@ -0,0 +1,197 @@
+"""
+Endpoints de monitoreo interno (solo Administrador)
+"""
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import bus_cache
+from app.core.config import settings
+
+from app.core.database import get_async_db, estadisticas_pool
+from app.core.security import get_current_user
+from app.core.mail import estado_smtp
+from app.core.monitor import obtener_resumen, reiniciar_estadisticas
+from app.core.permissions import verificar_admin_async
+from app.core.pg_listen import canal_notificaciones
+from app.core.scheduler import estado_scheduler
+from app.core.sql_monitor import detecciones_recientes
+from app.repositories.bandeja import bandeja_activa, verificar_bandeja, reconstruir_bandeja
+
+router = APIRouter()
+
+
+@router.get("/event-loop", summary="Lag del event loop y rutas que más lo bloquean")
+async def api_monitor_event_loop(
+    limite: int = Query(80, ge=1, le=500),
+    adb: AsyncSession = Depends(get_async_db),
+    current_user: dict = Depends(get_current_user),
+):
+    await verificar_admin_async(adb, current_user)
+    return obtener_resumen(limite)
+
+
+@router.post("/event-loop/reiniciar", summary="Reinicia las estadísticas del monitor")
+async def api_monitor_reiniciar(
+    adb: AsyncSession = Depends(get_async_db),
+    current_user: dict = Depends(get_current_user),
+):
+    await verificar_admin_async(adb, current_user)
+    reiniciar_estadisticas()
+    return {"status": "ok"}
+
+
+@router.get("/pool", summary="Estado y métricas del pool de conexiones")
+async def api_monitor_pool(
+    adb: AsyncSession = Depends(get_async_db),
+    current_user: dict = Depends(get_current_user),
+):
+    await verificar_admin_async(adb, current_user)
+    return estadisticas_pool()
+
+
+@router.get("/smtp", summary="Circuit breaker y pool de sesiones SMTP de este proceso")
+async def api_monitor_smtp(
+    adb: AsyncSession = Depends(get_async_db),
+    current_user: dict = Depends(get_current_user),
+):
+    await verificar_admin_async(adb, current_user)
+    return estado_smtp()
+
+
+@router.get("/notificaciones/stream", summary="Conexión LISTEN y clientes SSE de este proceso")
+async def api_monitor_stream(
+    adb: AsyncSession = Depends(get_async_db),
+    current_user: dict = Depends(get_current_user),
+):
+    await verificar_admin_async(adb, current_user)
+    return canal_notificaciones.estado()
+
+
+@router.get("/cache", summary="Cachés en memoria y bus de invalidación de este proceso")
+async def api_monitor_cache(
+    adb: AsyncSession = Depends(get_async_db),
+    current_user: dict = Depends(get_current_user),
+):
+    await verificar_admin_async(adb, current_user)
+    return bus_cache.estado()
+
+
+@router.get("/sql/n-mas-1", summary="Peticiones recientes con posibles consultas N+1")
+async def api_monitor_n_mas_1(
+    limite: int = Query(50, ge=1, le=200),
+    adb: AsyncSession = Depends(get_async_db),
+    current_user: dict = Depends(get_current_user),
+):
+    await verificar_admin_async(adb, current_user)
+    return detecciones_recientes(limite)
+
+
+@router.get("/bandeja/verificar", summary="Compara la bandeja de aprobación con la pertenencia calculada")
+async def api_monitor_bandeja_verificar(
+    adb: AsyncSession = Depends(get_async_db),
+    current_user: dict = Depends(get_current_user),
+):
+    await verificar_admin_async(adb, current_user)
+    if not await bandeja_activa(adb):
+        raise HTTPException(status_code=409, detail="La bandeja de aprobación no está activada")
+    diferencias = await verificar_bandeja(adb)
+    return {"consistente": not diferencias, "total": len(diferencias), "diferencias": diferencias[:500]}
+
+
+@router.post("/bandeja/reconstruir", summary="Reconstruye la bandeja de aprobación completa")
+async def api_monitor_bandeja_reconstruir(
+    adb: AsyncSession = Depends(get_async_db),
+    current_user: dict = Depends(get_current_user),
+):
+    await verificar_admin_async(adb, current_user)
+    if not await bandeja_activa(adb):
+        raise HTTPException(status_code=409, detail="La bandeja de aprobación no está activada")
+    filas = await reconstruir_bandeja(adb)
+    return {"mensaje": "Bandeja reconstruida", "filas": filas}
+
+
+@router.get("/workers", summary="Latidos de los procesos worker y estado de la cola de trabajos")
+async def api_monitor_workers(
+    adb: AsyncSession = Depends(get_async_db),
+    current_user: dict = Depends(get_current_user),
+):
+    await verificar_admin_async(adb, current_user)
+    workers = (await adb.execute(text("""
+        SELECT worker_id, host, pid, estado, iniciado_en, ultimo_latido,
+               trabajos_ejecutados, ultimo_error, metricas,
+               ultimo_latido > NOW() - make_interval(secs => :margen) AS vivo
+        FROM requisiciones.worker_latidos
+        ORDER BY ultimo_latido DESC
+    """), {"margen": settings.WORKER_HEARTBEAT_SEC * 3})).mappings().all()
+    cola = (await adb.execute(text("""
+        SELECT estado, COUNT(*) AS total
+        FROM requisiciones.cola_trabajos
+        GROUP BY estado
+    """))).mappings().all()
+    return {
+        "tareasEnApi": settings.TAREAS_EN_API,
+        "workers": [
+            {
+                "workerId": w["worker_id"],
+                "host": w["host"],
+                "pid": w["pid"],
+                "estado": w["estado"],
+                "vivo": bool(w["vivo"]) and w["estado"] == "activo",
+                "iniciadoEn": w["iniciado_en"].isoformat() if w["iniciado_en"] else None,
+                "ultimoLatido": w["ultimo_latido"].isoformat() if w["ultimo_latido"] else None,
+                "trabajosEjecutados": w["trabajos_ejecutados"],
+                "ultimoError": w["ultimo_error"],
+                "scheduler": w["metricas"],
+            }
+            for w in workers
+        ],
+        "cola": {c["estado"]: int(c["total"]) for c in cola},
+        # Scheduler del proceso de la API que atiende esta petición (modo TAREAS_EN_API)
+        "schedulerApi": estado_scheduler() if settings.TAREAS_EN_API else None,
+    }
+
+
+@router.get("/notificaciones/envio", summary="Estado del envío de notificaciones por correo")
+async def api_monitor_notificaciones_envio(
+    adb: AsyncSession = Depends(get_async_db),
+    current_user: dict = Depends(get_current_user),
+):
+    await verificar_admin_async(adb, current_user)
+    fila = (await adb.execute(text("""
+        SELECT
+            COUNT(*) FILTER (WHERE proximo_intento <= NOW()) AS vencidas,
+            COUNT(*) FILTER (WHERE proximo_intento > NOW() AND reservado_por IS NOT NULL) AS reservadas,
+            COUNT(*) FILTER (WHERE proximo_intento > NOW() AND reservado_por IS NULL) AS en_espera,
+            COUNT(*) FILTER (WHERE estado_envio = 'fallido') AS fallidas,
+            MIN(proximo_intento) FILTER (WHERE proximo_intento > NOW() AND reservado_por IS NULL) AS proximo_reintento
+        FROM requisiciones.notificaciones
+        WHERE proximo_intento IS NOT NULL OR estado_envio = 'fallido'
+    """))).mappings().one()
+    return {
+        "vencidas": int(fila["vencidas"]),
+        "reservadas": int(fila["reservadas"]),
+        "enEsperaDeReintento": int(fila["en_espera"]),
+        "fallidas": int(fila["fallidas"]),
+        "proximoReintento": fila["proximo_reintento"].isoformat() if fila["proximo_reintento"] else None,
+        "maxIntentos": settings.NOTIF_MAX_INTENTOS,
+    }
+
+
+@router.post("/notificaciones/reintentar-fallidas", summary="Reencola las notificaciones en estado fallido")
+async def api_monitor_notificaciones_reintentar(
+    adb: AsyncSession = Depends(get_async_db),
+    current_user: dict = Depends(get_current_user),
+):
+    await verificar_admin_async(adb, current_user)
+    try:
+        filas = (await adb.execute(text("""
+            UPDATE requisiciones.notificaciones
+            SET estado_envio = 'pendiente', intentos = 0, proximo_intento = NOW()
+            WHERE estado_envio = 'fallido'
+        """))).rowcount
+        await adb.commit()
+    except Exception:
+        await adb.rollback()
+        raise
+    return {"mensaje": "Notificaciones reencoladas", "total": filas}
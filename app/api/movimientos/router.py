@@ -4,12 +4,12 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
 
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
 from typing import Optional
 from datetime import date
 
-from app.core.database import get_db
+from app.core.database import get_async_db
 from app.core.security import get_current_user
 
 router = APIRouter()
@@ -20,7 +20,7 @@ async def listar_movimientos(
     fecha_fin: Optional[date] = Query(None, description="Fecha final del rango"),
     tipo_movimiento: Optional[str] = Query(None, description="Tipo de movimiento"),
     id_producto: Optional[str] = Query(None, description="ID del producto"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(get_current_user)
 ):
     """
@@ -73,7 +73,7 @@ async def listar_movimientos(
         
         query += " ORDER BY m.fecmovimiento DESC, m.creadoen DESC"
         
-        result = db.execute(text(query), params)
+        result = await db.execute(text(query), params)
         
         movimientos = []
         for row in result.mappings():
@@ -100,7 +100,7 @@ async def listar_movimientos(
 async def resumen_movimientos(
     mes: Optional[int] = Query(None, description="Mes (1-12)"),
     anio: Optional[int] = Query(None, description="Año"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(get_current_user)
 ):
     """
@@ -129,7 +129,7 @@ async def resumen_movimientos(
             query += " AND EXTRACT(YEAR FROM m.fecmovimiento) = :anio"
             params['anio'] = anio
         
-        result = db.execute(text(query), params).mappings().first()
+        result = (await db.execute(text(query), params)).mappings().first()
         
         return {
             'totalMovimientos': result['total_movimientos'] or 0,
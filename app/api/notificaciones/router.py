@@ -1,11 +1,18 @@
-from typing import List, Optional
+import asyncio
+import json
+from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy import text
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.database import get_db
-from app.core.security import get_current_user
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, get_async_db
+from app.core.pg_listen import canal_notificaciones
+from app.core.security import create_stream_ticket, decode_stream_ticket, get_current_user
+from app.repositories.notificaciones import contar_no_leidas, listar_notificaciones
+from app.schemas.notificaciones.schemas import PreferenciasNotificacionIn, PreferenciasNotificacionOut
 
 router = APIRouter()
 
@@ -19,7 +26,9 @@ async def _get_notificaciones(
     solo_no_leidas: bool,
     codigo: Optional[str],
     todas: bool,
-    db: Session,
+    limite: int,
+    before: Optional[str],
+    db: AsyncSession,
     current_user: dict,
 ):
     """Lógica compartida para listar notificaciones"""
@@ -27,39 +36,19 @@ async def _get_notificaciones(
     if not email and not (todas and _is_admin(current_user)):
         raise HTTPException(status_code=401, detail="No autenticado")
 
-    filtros: List[str] = []
-    params = {}
-
-    if not (todas and _is_admin(current_user)):
-        filtros.append("LOWER(n.emailusuario) = LOWER(:email)")
-        params["email"] = email
-
-    if solo_no_leidas:
-        filtros.append("COALESCE(n.leida, FALSE) = FALSE")
-
-    if codigo:
-        filtros.append("LOWER(r.codrequisicion) LIKE LOWER(:codigo)")
-        params["codigo"] = f"%{codigo}%"
-
-    query = (
-        "SELECT n.idnotificacion, n.tipo, n.mensaje, n.leida, n.fechacreacion, "
-        "n.emailusuario, n.estado_envio, n.medio, n.enviado_en, n.error_envio, "
-        "n.idrequisicion, COALESCE(r.codrequisicion, '') AS codrequisicion "
-        "FROM requisiciones.notificaciones n "
-        "LEFT JOIN requisiciones.requisiciones r ON r.idrequisicion = n.idrequisicion "
-    )
-
-    if filtros:
-        query += " WHERE " + " AND ".join(filtros)
-
-    query += " ORDER BY n.fechacreacion DESC LIMIT 200"
-
-    rows = db.execute(text(query), params).mappings().all()
-    data = [dict(row) for row in rows]
-    total = len(data)
-    no_leidas = sum(1 for r in data if not r.get("leida"))
-
-    return {"notificaciones": data, "total": total, "noLeidas": no_leidas}
+    try:
+        pagina = await listar_notificaciones(
+            db,
+            None if (todas and _is_admin(current_user)) else email,
+            solo_no_leidas=solo_no_leidas,
+            codigo=codigo,
+            limite=limite,
+            before=before,
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor 'before' inválido: se espera <fechacreacion>,<idnotificacion>")
+    pagina["noLeidas"] = await contar_no_leidas(db, email) if email else 0
+    return pagina
 
 
 @router.get("/test")
@@ -72,10 +61,12 @@ async def listar_notificaciones_sin_slash(
     solo_no_leidas: bool = False,
     codigo: Optional[str] = None,
     todas: bool = False,
-    db: Session = Depends(get_db),
+    limite: int = Query(200, ge=1, le=200),
+    before: Optional[str] = Query(None, description="Cursor <fechacreacion>,<idnotificacion> de la última fila recibida"),
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(get_current_user),
 ):
-    return await _get_notificaciones(solo_no_leidas, codigo, todas, db, current_user)
+    return await _get_notificaciones(solo_no_leidas, codigo, todas, limite, before, db, current_user)
 
 
 @router.get("/")
@@ -83,16 +74,145 @@ async def listar_notificaciones(
     solo_no_leidas: bool = False,
     codigo: Optional[str] = None,
     todas: bool = False,
-    db: Session = Depends(get_db),
+    limite: int = Query(200, ge=1, le=200),
+    before: Optional[str] = Query(None, description="Cursor <fechacreacion>,<idnotificacion> de la última fila recibida"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: dict = Depends(get_current_user),
+):
+    return await _get_notificaciones(solo_no_leidas, codigo, todas, limite, before, db, current_user)
+
+
+@router.get("/no-leidas", summary="Cantidad de notificaciones no leídas del usuario")
+async def no_leidas(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: dict = Depends(get_current_user),
+):
+    email = (current_user or {}).get("sub") or (current_user or {}).get("email")
+    if not email:
+        raise HTTPException(status_code=401, detail="No autenticado")
+    return {"noLeidas": await contar_no_leidas(db, email)}
+
+
+def _evento_sse(nombre: str, datos: dict) -> str:
+    return f"event: {nombre}\ndata: {json.dumps(datos, default=str)}\n\n"
+
+
+@router.post("/stream/ticket", summary="Ticket de corta duración para abrir /notificaciones/stream")
+async def ticket_stream_notificaciones(current_user: dict = Depends(get_current_user)):
+    """
+    EventSource no permite enviar cabeceras, así que /stream se autentica con un
+    ticket en la URL en lugar del JWT de acceso. El ticket solo sirve para /stream
+    y vence a los NOTIF_STREAM_TICKET_SEC segundos; al reconectar se pide otro.
+    """
+    email = (current_user or {}).get("sub") or (current_user or {}).get("email")
+    if not email:
+        raise HTTPException(status_code=401, detail="No autenticado")
+    return {"ticket": create_stream_ticket(email), "expiraEnSec": settings.NOTIF_STREAM_TICKET_SEC}
+
+
+@router.get("/stream", summary="Notificaciones nuevas y conteo de no leídas en tiempo real (SSE)")
+async def stream_notificaciones(
+    request: Request,
+    ticket: str = Query(..., description="Ticket de POST /notificaciones/stream/ticket"),
+):
+    """
+    Server-Sent Events con los eventos:
+    - `conteo`: {noLeidas} al conectar.
+    - `nueva`: {notificacion, noLeidas} cuando llega una notificación para el usuario.
+    - `leidas`: {noLeidas} cuando cambia el estado de lectura (p. ej. desde otra pestaña).
+    - `resincronizar`: pudieron perderse eventos; el cliente debe recargar la lista.
+    """
+    email = decode_stream_ticket(ticket).get("sub")
+    if not email:
+        raise HTTPException(status_code=401, detail="No autenticado")
+
+    async with AsyncSessionLocal() as db:
+        no_leidas = await contar_no_leidas(db, email)
+
+    async def eventos():
+        cola = canal_notificaciones.suscribir(email)
+        try:
+            yield f"retry: 5000\n{_evento_sse('conteo', {'noLeidas': no_leidas})}"
+            while not await request.is_disconnected():
+                try:
+                    evento = await asyncio.wait_for(cola.get(), timeout=settings.NOTIF_STREAM_KEEPALIVE_SEC)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                # El mismo dict llega a todas las pestañas del usuario: no modificarlo
+                datos = {k: v for k, v in evento.items() if k != "evento"}
+                yield _evento_sse(evento.get("evento") or "resincronizar", datos)
+        finally:
+            canal_notificaciones.desuscribir(email, cola)
+
+    return StreamingResponse(
+        eventos(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/preferencias", summary="Preferencias de envío por correo del usuario", response_model=PreferenciasNotificacionOut)
+async def obtener_preferencias(
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(get_current_user),
 ):
-    return await _get_notificaciones(solo_no_leidas, codigo, todas, db, current_user)
+    email = (current_user or {}).get("sub") or (current_user or {}).get("email")
+    if not email:
+        raise HTTPException(status_code=401, detail="No autenticado")
+
+    fila = (await db.execute(
+        text(
+            """
+            SELECT resumen, ventana_min
+            FROM requisiciones.preferencias_notificacion
+            WHERE emailusuario = LOWER(:email)
+            """
+        ),
+        {"email": email},
+    )).mappings().first()
+    return {
+        "email": email.lower(),
+        "resumen": bool(fila["resumen"]) if fila else False,
+        "ventanaMin": int(fila["ventana_min"]) if fila else 30,
+    }
+
+
+@router.put("/preferencias", summary="Activa o desactiva el resumen de notificaciones por correo", response_model=PreferenciasNotificacionOut)
+async def guardar_preferencias(
+    body: PreferenciasNotificacionIn,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: dict = Depends(get_current_user),
+):
+    """
+    Con resumen activado, las notificaciones que lleguen dentro de `ventanaMin`
+    minutos desde la primera se envían juntas en un solo correo.
+    """
+    email = (current_user or {}).get("sub") or (current_user or {}).get("email")
+    if not email:
+        raise HTTPException(status_code=401, detail="No autenticado")
+
+    await db.execute(
+        text(
+            """
+            INSERT INTO requisiciones.preferencias_notificacion (emailusuario, resumen, ventana_min)
+            VALUES (LOWER(:email), :resumen, :ventana)
+            ON CONFLICT (emailusuario) DO UPDATE
+            SET resumen = EXCLUDED.resumen,
+                ventana_min = EXCLUDED.ventana_min,
+                actualizado_en = NOW()
+            """
+        ),
+        {"email": email, "resumen": body.resumen, "ventana": body.ventanaMin},
+    )
+    await db.commit()
+    return {"email": email.lower(), "resumen": body.resumen, "ventanaMin": body.ventanaMin}
 
 
 @router.put("/{id_notificacion}/marcar-leida", summary="Marca una notificación como leída")
 async def marcar_leida(
     id_notificacion: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(get_current_user),
 ):
     email = (current_user or {}).get("sub") or (current_user or {}).get("email")
@@ -100,7 +220,7 @@ async def marcar_leida(
     if not email and not es_admin:
         raise HTTPException(status_code=401, detail="No autenticado")
 
-    res = db.execute(
+    res = (await db.execute(
         text(
             """
             UPDATE requisiciones.notificaciones
@@ -111,9 +231,9 @@ async def marcar_leida(
             """
         ),
         {"id": id_notificacion, "email": email or "", "es_admin": es_admin},
-    ).fetchone()
+    )).fetchone()
 
-    db.commit()
+    await db.commit()
 
     if not res:
         raise HTTPException(status_code=404, detail="Notificación no encontrada")
@@ -123,14 +243,14 @@ async def marcar_leida(
 
 @router.put("/marcar-todas-leidas", summary="Marca todas las notificaciones del usuario como leídas")
 async def marcar_todas_leidas(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(get_current_user),
 ):
     email = (current_user or {}).get("sub") or (current_user or {}).get("email")
     if not email:
         raise HTTPException(status_code=401, detail="No autenticado")
 
-    db.execute(
+    await db.execute(
         text(
             """
             UPDATE requisiciones.notificaciones
@@ -140,7 +260,7 @@ async def marcar_todas_leidas(
         ),
         {"email": email},
     )
-    db.commit()
+    await db.commit()
     return {"status": "ok"}
 
 
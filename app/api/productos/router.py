@@ -4,31 +4,68 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
 
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from uuid import UUID
 
+from app.core.imagenes import tipo_imagen
 from app.core.security import get_current_user
-from app.core.database import get_db
-from app.repositories.productos import listar_categorias, ver_productos_por_categoria, listar_productos, buscar_productos, listar_categorias_y_unidades, crear_producto, crear_categoria, editar_categoria, buscar_categoria
+from app.core.database import get_async_db
+from app.repositories.productos import listar_categorias, ver_productos_por_categoria, listar_productos, snapshot_productos, obtener_imagen_categoria, buscar_productos, listar_categorias_y_unidades, crear_producto, crear_categoria, editar_categoria, buscar_categoria
 from app.schemas.productos.schemas import CategoriaOut, ProductoPorCategoriaOut, ProductoOut, CatalogosProductoOut, ProductoCreateIn, ProductoCreateOut, CategoriaCreateIn, CategoriaCreateOut, CategoriaUpdateIn, CategoriaUpdateOut
 
 router = APIRouter()
 
 ##USUARIOS EMPLEADOS
+def _etag_coincide(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    etiquetas = [e.strip().removeprefix("W/") for e in if_none_match.split(",")]
+    return "*" in etiquetas or etag in etiquetas
+
 @router.get("/", summary="Listado de productos", response_model=List[ProductoOut])
 async def api_listar_productos(
-    db: Session = Depends(get_db),
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
     _: dict = Depends(get_current_user),
 ):
-    return listar_productos(db)
+    # JSON precalculado; el navegador revalida con If-None-Match y recibe 304 si no cambió
+    etag, cuerpo = await snapshot_productos(db)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if _etag_coincide(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=cuerpo, media_type="application/json", headers=headers)
 
 @router.get("/categorias", summary="Listado de categorías", response_model=List[CategoriaOut])
 async def api_listar_categorias(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     _: dict = Depends(get_current_user),
 ):
-    return listar_categorias(db)
+    return await listar_categorias(db)
+
+@router.get("/categorias/{idcategoria}/imagen", summary="Imagen (o miniatura) de una categoría")
+async def api_imagen_categoria(
+    idcategoria: UUID,
+    request: Request,
+    miniatura: bool = Query(False, description="Miniatura si existe; si no, la imagen original"),
+    v: Optional[str] = Query(default=None, description="Versión (imagen_hash) que pone imagen_url"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    # Sin autenticación: <img src> no envía el token y las imágenes de categorías no son sensibles
+    imagen = await obtener_imagen_categoria(db, idcategoria, miniatura)
+    if imagen is None:
+        raise HTTPException(status_code=404, detail="La categoría no tiene imagen")
+    etag = f'"{imagen["hash"]}-mini"' if imagen["es_miniatura"] else f'"{imagen["hash"]}"'
+    if v and v == imagen["hash"]:
+        # URL versionada con el hash vigente: cambia con la imagen, se puede guardar un año.
+        # Una versión vieja o parcial no debe fijar en caché los bytes actuales
+        cache_control = "public, max-age=31536000, immutable"
+    else:
+        cache_control = "public, max-age=300"
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if _etag_coincide(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=imagen["contenido"], media_type=tipo_imagen(imagen["contenido"]), headers=headers)
 
 @router.get(
     "/categorias/{codobjeto}/productos",
@@ -37,10 +74,10 @@ async def api_listar_categorias(
 )
 async def api_productos_por_categoria(
     codobjeto: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     _: dict = Depends(get_current_user),
 ):
-    return ver_productos_por_categoria(db, codobjeto)
+    return await ver_productos_por_categoria(db, codobjeto)
 
 @router.get(
     "/buscar",
@@ -50,12 +87,12 @@ async def api_productos_por_categoria(
 async def api_buscar_productos(
     nomproducto: Optional[str] = Query(default=None, description="Nombre parcial o completo del producto"),
     codobjeto: Optional[int] = Query(default=None, description="Código de categoría"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     _: dict = Depends(get_current_user),
 ):
     if nomproducto is None and codobjeto is None:
         raise HTTPException(status_code=400, detail="Debe proporcionar nomproducto y/o codobjeto")
-    return buscar_productos(db, nomproducto, codobjeto)
+    return await buscar_productos(db, nomproducto, codobjeto)
 
 @router.get(
     "/verCategoriasyUnidadesMedida",
@@ -63,10 +100,10 @@ async def api_buscar_productos(
     response_model=CatalogosProductoOut,
 )
 async def api_listar_categorias_y_unidades(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     _: dict = Depends(get_current_user),
 ):
-    return listar_categorias_y_unidades(db)
+    return await listar_categorias_y_unidades(db)
 
 
 
@@ -79,7 +116,7 @@ async def api_listar_categorias_y_unidades(
 )
 async def api_crear_producto(
     payload: ProductoCreateIn,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(get_current_user),
 ):
     creadopor = (
@@ -90,11 +127,11 @@ async def api_crear_producto(
         or "api"
     )
     try:
-        new_id = crear_producto(db, payload, creadopor)
-        db.commit()  # Commit explícito en el endpoint
+        new_id = await crear_producto(db, payload, creadopor)
+        await db.commit()  # Commit explícito en el endpoint
         return ProductoCreateOut(idproducto=new_id, message="Producto creado correctamente")
     except Exception as ex:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=400, detail=f"No se pudo crear el producto: {ex}")
 
 @router.post(
@@ -105,7 +142,7 @@ async def api_crear_producto(
 )
 async def api_crear_categoria(
     payload: CategoriaCreateIn,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(get_current_user),
 ):
     creadopor = (
@@ -116,11 +153,11 @@ async def api_crear_categoria(
         or "api"
     )
     try:
-        new_id = crear_categoria(db, payload, creadopor)
-        db.commit()  # Commit explícito en el endpoint
+        new_id = await crear_categoria(db, payload, creadopor)
+        await db.commit()  # Commit explícito en el endpoint
         return CategoriaCreateOut(idcategoria=new_id, message="Categoría creada correctamente")
     except Exception as ex:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=400, detail=f"No se pudo crear la categoría: {ex}")
 
 @router.put(
@@ -131,7 +168,7 @@ async def api_crear_categoria(
 async def api_editar_categoria(
     idcategoria: UUID,
     payload: CategoriaUpdateIn,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(get_current_user),
 ):
     actualizadopor = (
@@ -142,13 +179,16 @@ async def api_editar_categoria(
         or "api"
     )
     try:
-        ok = editar_categoria(db, idcategoria, payload, actualizadopor)
+        ok = await editar_categoria(db, idcategoria, payload, actualizadopor)
         if not ok:
             raise HTTPException(status_code=400, detail="No se actualizó la categoría")
+        await db.commit()  # Commit explícito en el endpoint
         return CategoriaUpdateOut(idcategoria=idcategoria, message="Categoría actualizada correctamente")
     except HTTPException:
+        await db.rollback()
         raise
     except Exception as ex:
+        await db.rollback()
         raise HTTPException(status_code=400, detail=f"No se pudo editar la categoría: {ex}")
 
 @router.get(
@@ -158,16 +198,16 @@ async def api_editar_categoria(
 )
 async def api_buscar_categoria(
     codobjeto: int = Query(..., description="Código de categoría"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     _: dict = Depends(get_current_user),
 ):
-    return buscar_categoria(db, codobjeto)
+    return await buscar_categoria(db, codobjeto)
 
 # ENDPOINT DE DEBUG - TEMPORAL
 @router.get("/debug/productos-sin-auth", summary="Debug: Productos sin autenticación")
-async def debug_productos(db: Session = Depends(get_db)):
+async def debug_productos(db: AsyncSession = Depends(get_async_db)):
     """Endpoint de debug para verificar códigos de productos (SIN AUTENTICACIÓN)"""
-    prods = listar_productos(db)
+    prods = await listar_productos(db)
     # Retornar solo nombre y codobjetunico para debug
     return [
         {"nomproducto": p.nomproducto, "codobjetunico": p.codobjetunico, "idproducto": str(p.idproducto)}
@@ -1,17 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import ProgrammingError, SQLAlchemyError
 from sqlalchemy import text
 from io import BytesIO
 from io import StringIO
 from datetime import datetime, date
+from typing import Optional
+from uuid import UUID
+import base64
 import csv
+import json
 import logging
 
 logger = logging.getLogger(__name__)
-from app.core.database import get_db
+from app.core.database import get_db, get_async_db
 from app.core.security import get_current_user
+from app.core.monitor import medir_bloqueo
+from app.core.outbox import encolar_correo, despertar_outbox
+from app.core.email_templates import correo_aprobacion_jefe, correo_confirmacion_solicitante
+from app.core.email_templates import correo_requisicion_completada
+from app.core.trabajos import encolar_trabajo, obtener_trabajo
+from app.core.permissions import verificar_admin
+from app.schemas.requisiciones.schemas import ReenvioCorreosIn
 
 router = APIRouter()
 
@@ -28,7 +40,7 @@ def _iso_with_time(value):
 
 @router.get("/email-log", summary="Historial de env??os de correo")
 async def api_email_log(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     destinatario: str = None,
     idrequisicion: str = None,
     estado: str = None,
@@ -75,12 +87,12 @@ async def api_email_log(
     query += " ORDER BY el.fecha_envio DESC LIMIT :limit OFFSET :offset"
     params["limit"] = limit
     params["offset"] = offset
-    rows = db.execute(text(query), params).fetchall()
+    rows = (await db.execute(text(query), params)).fetchall()
     return [dict(row._mapping) for row in rows]
 
 @router.get("/email-log/count", summary="Total de logs de correo")
 async def api_email_log_count(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     destinatario: str = None,
     idrequisicion: str = None,
     estado: str = None,
@@ -114,13 +126,13 @@ async def api_email_log_count(
         params["q"] = f"%{q}%"
     if filtros:
         query += " WHERE " + " AND ".join(filtros)
-    row = db.execute(text(query), params).fetchone()
+    row = (await db.execute(text(query), params)).fetchone()
     total = int(row.total) if row else 0
     return {"total": total}
 
 @router.get("/email-log/export", summary="Exportar logs de correo en CSV")
 async def api_email_log_export(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     destinatario: str = None,
     idrequisicion: str = None,
     estado: str = None,
@@ -160,7 +172,7 @@ async def api_email_log_export(
         query += " WHERE " + " AND ".join(filtros)
     query += " ORDER BY fecha_envio DESC"
 
-    rows = db.execute(text(query), params).fetchall()
+    rows = (await db.execute(text(query), params)).fetchall()
 
     # Construir CSV en memoria
     buffer = StringIO()
@@ -194,7 +206,7 @@ async def api_email_log_export(
     )
 
 @router.post("/email-log/{idlog}/reenviar", summary="Reenviar correo con error")
-async def api_reenviar_email(
+def api_reenviar_email(
     idlog: int,
     db: Session = Depends(get_db),
 ):
@@ -218,87 +230,17 @@ async def api_reenviar_email(
             raise HTTPException(status_code=404, detail="Log no encontrado o no tiene error")
         
         from app.core.mail import send_email
-        import os
-        
-        destinatario = row.destinatario
-        asunto = row.asunto
-        cuerpo_text = row.cuerpo or ""
-        idrequisicion = row.idrequisicion
-        codrequisicion = row.codrequisicion
-        prointermedio = None
-        profinal = None
-        
-        # Reconstruir HTML y attachments si es necesario
-        inline_images = {}
-        try:
-            logo_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "frontend", "Imagen", "LogoSedhEscudo.png"))
-            with open(logo_path, "rb") as f:
-                inline_images["logo_sedh"] = f.read()
-        except Exception:
-            pass
-        
-        # Determinar tipo de correo por el asunto
-        cuerpo_html = None
-        attachments = []
-        
-        if "Confirmaci??n de creaci??n" in asunto:
-            link_hist = f"http://192.168.180.164:8081/historial?cod={codrequisicion or ''}&tab=aprobaciones"
-            cuerpo_html = f"""
-            <div style='font-family:Segoe UI, Tahoma, sans-serif; color:#103b37;'>
-              <div style='display:flex;align-items:center;gap:12px;margin-bottom:16px;'>
-                <img src="cid:logo_sedh" alt="SEDH" style="height:60px;">
-                <div>
-                  <div style='font-weight:600;font-size:18px;'>Secretar??a de Derechos Humanos - Sistema de Almac??n</div>
-                  <div style='font-size:12px;opacity:0.8;'>Confirmaci??n de creaci??n de requisici??n</div>
-                </div>
-              </div>
-              <div style='background:#f8f9fa;border:1px solid #e0e0e0;border-radius:8px;padding:16px;'>
-                <div style='margin-bottom:12px;'>Tu requisici??n {codrequisicion or ''} fue creada correctamente y enviada para aprobaci??n.</div>
-                                <div style='margin-top:8px;'>
-                                    <div><strong>Programa Intermedio:</strong> {str(prointermedio) if prointermedio is not None else 'N/A'}</div>
-                                    <div><strong>Programa Final:</strong> {str(profinal) if profinal is not None else 'N/A'}</div>
-                                </div>
-                <a href='{link_hist}' style='display:inline-block;background:#0f766e;color:white;text-decoration:none;padding:10px 16px;border-radius:6px;'>Ver historial y aprobaciones</a>
-              </div>
-              <div style='font-size:12px;color:#6c757d;margin-top:12px;'>Este correo se genera autom??ticamente. No responder.</div>
-            </div>
-            """
-        elif "pendiente de aprobaci??n" in asunto:
-            link_aprobacion = f"http://192.168.180.164:8081/requisiciones/aprobar/{codrequisicion or ''}"
-            cuerpo_html = f"""
-            <div style='font-family:Segoe UI, Tahoma, sans-serif; color:#103b37;'>
-              <div style='display:flex;align-items:center;gap:12px;margin-bottom:16px;'>
-                <img src="cid:logo_sedh" alt="SEDH" style="height:60px;">
-                <div>
-                  <div style='font-weight:600;font-size:18px;'>Secretar??a de Derechos Humanos - Sistema de Almac??n</div>
-                  <div style='font-size:12px;opacity:0.8;'>Notificaci??n autom??tica del sistema</div>
-                </div>
-              </div>
-              <div style='background:#f8f9fa;border:1px solid #e0e0e0;border-radius:8px;padding:16px;'>
-                <div style='margin-bottom:12px;'>Tiene una nueva requisici??n pendiente de aprobaci??n.</div>
-                <div><strong>C??digo:</strong> {codrequisicion or 'N/A'}</div>
-                                <div style='margin-top:8px;'>
-                                    <div><strong>Programa Intermedio:</strong> {str(prointermedio) if prointermedio is not None else 'N/A'}</div>
-                                    <div><strong>Programa Final:</strong> {str(profinal) if profinal is not None else 'N/A'}</div>
-                                </div>
-                <a href='{link_aprobacion}' style='display:inline-block;background:#0f766e;color:white;text-decoration:none;padding:10px 16px;border-radius:6px;margin-top:10px;'>Revisar y aprobar</a>
-              </div>
-              <div style='font-size:12px;color:#6c757d;margin-top:12px;'>Este correo se genera autom??ticamente. No responder.</div>
-            </div>
-            """
-        
+        from app.core.reenvio_correos import reconstruir_correo
+
         # Reenviar
         estado, error = send_email(
-            destinatario,
-            asunto,
-            cuerpo_text,
-            body_html=cuerpo_html,
-            attachments=attachments,
-            inline_images=inline_images,
+            row.destinatario,
+            row.asunto,
+            **reconstruir_correo(row.asunto, row.cuerpo, row.codrequisicion),
         )
         
         # Registrar nuevo intento
-        registrar_email_log(destinatario, asunto, cuerpo_text, estado, error, idrequisicion, db)
+        registrar_email_log(row.destinatario, row.asunto, row.cuerpo or "", estado, error, row.idrequisicion, db)
         
         return {"estado": estado, "error": error, "idlog": idlog}
         
@@ -310,8 +252,36 @@ async def api_reenviar_email(
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/email-log/reenviar-lote", status_code=202, summary="Reenviar en lote los correos con error")
+def api_reenviar_email_lote(
+    body: ReenvioCorreosIn,
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user),
+):
+    """
+    Encola un trabajo "reenvio_correos" que reenvía los correos con error que
+    cumplen el filtro (ver app/core/reenvio_correos.py). El avance se consulta en
+    GET /email-log/reenviar-lote/{idTrabajo}.
+    """
+    email = verificar_admin(db, current_user)
+    idtrabajo = encolar_trabajo(db, "reenvio_correos", body.model_dump(), creado_por=email)
+    db.commit()
+    return {"idTrabajo": idtrabajo, "estado": "pendiente"}
+
+@router.get("/email-log/reenviar-lote/{idtrabajo}", summary="Progreso de un reenvío en lote")
+def api_reenviar_email_lote_estado(
+    idtrabajo: int,
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user),
+):
+    verificar_admin(db, current_user)
+    trabajo = obtener_trabajo(db, idtrabajo)
+    if trabajo is None or trabajo["tipo"] != "reenvio_correos":
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return trabajo
+
 @router.get("/programas-cascading", summary="Obtener relaci??n entre programas intermedios y finales")
-async def api_programas_cascading(db: Session = Depends(get_db)):
+async def api_programas_cascading(db: AsyncSession = Depends(get_async_db)):
     """
     Devuelve la relaci??n entre programas intermedios y programas finales
     para implementar cascada en los dropdowns del formulario de requisiciones.
@@ -330,7 +300,7 @@ async def api_programas_cascading(db: Session = Depends(get_db)):
                    ON pi.idprograma = pg.idprograma
             ORDER BY pg.idprograma, pi.idprointermedio
         """)
-        rows = db.execute(query).fetchall()
+        rows = (await db.execute(query)).fetchall()
         
         # Agrupar por programa final para facilitar la b??squeda
         programas_finales = {}
@@ -371,7 +341,7 @@ async def api_programas_cascading(db: Session = Depends(get_db)):
 @router.get("/buscar-por-codigo", summary="Buscar requisici??n por c??digo")
 async def api_buscar_por_codigo(
     codigo: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     Busca una requisici??n por su c??digo (ej: UIT-050-2025) y retorna su ID.
@@ -382,7 +352,7 @@ async def api_buscar_por_codigo(
         WHERE codrequisicion = :codigo
         LIMIT 1
     """)
-    row = db.execute(query, {"codigo": codigo}).fetchone()
+    row = (await db.execute(query, {"codigo": codigo})).fetchone()
     
     if not row:
         raise HTTPException(status_code=404, detail=f"No se encontr?? requisici??n con c??digo {codigo}")
@@ -401,11 +371,15 @@ from app.repositories.requisiciones import requisiciones_pendientes_jefe_materia
 from app.repositories.requisiciones import responder_requisicion_jefe_materiales
 from app.repositories.requisiciones import requisiciones_pendientes_almacen
 from app.repositories.requisiciones import responder_requisicion_almacen
-from app.repositories.requisiciones import registrar_auditoria_requisicion, actualizar_timestamp_aprobacion_jefe, actualizar_timestamp_aprobacion_almacen, actualizar_timestamp_rechazo, actualizar_timestamp_envio
+from app.repositories.requisiciones import responder_requisiciones_lote
+from app.repositories.bandeja import contar_pendientes
+from app.repositories.notificaciones import contar_no_leidas, listar_notificaciones
+from app.repositories.requisiciones import registrar_auditoria_requisicion, actualizar_timestamp_envio
 from app.schemas.requisiciones.schemas import CrearRequisicionIn, CrearRequisicionOut, ResponderRequisicionIn, ResponderRequisicionOut
 from app.schemas.requisiciones.schemas import RequisicionPendienteOut
 from app.schemas.requisiciones.schemas import RequisicionPendienteGerenteOut
 from app.schemas.requisiciones.schemas import ResponderRequisicionGerenteIn
+from app.schemas.requisiciones.schemas import ResponderLoteIn, ResponderLoteOut
 
 #EMPLEADOS 
 
@@ -430,9 +404,58 @@ async def api_carrito_info(
         "mensaje": f"Carrito individual habilitado para {email}"
     }
 
+# Pivot de la proyecci??n requisiciones.aprobaciones_ultimas (migrations/aprobaciones_ultimas.sql):
+# un solo join que trae el ??ltimo estado, aprobador y fecha de cada rol de la requisici??n "r".
+_SQL_JOIN_APROBACIONES_ULTIMAS = """
+        LEFT JOIN LATERAL (
+            SELECT
+                MAX(au.estadoaprobacion) FILTER (WHERE au.rol = 'JefInmediato') AS estado_jefe,
+                MAX(e.nombre)            FILTER (WHERE au.rol = 'JefInmediato') AS nombre_jefe,
+                MAX(au.fecaprobacion)    FILTER (WHERE au.rol = 'JefInmediato') AS fecha_jefe,
+                MAX(au.estadoaprobacion) FILTER (WHERE au.rol = 'GerAdmon')     AS estado_gerente,
+                MAX(e.nombre)            FILTER (WHERE au.rol = 'GerAdmon')     AS nombre_gerente,
+                MAX(au.fecaprobacion)    FILTER (WHERE au.rol = 'GerAdmon')     AS fecha_gerente,
+                MAX(au.estadoaprobacion) FILTER (WHERE au.rol = 'JefSerMat')    AS estado_jefemat,
+                MAX(e.nombre)            FILTER (WHERE au.rol = 'JefSerMat')    AS nombre_jefemat,
+                MAX(au.fecaprobacion)    FILTER (WHERE au.rol = 'JefSerMat')    AS fecha_jefemat,
+                MAX(au.estadoaprobacion) FILTER (WHERE au.rol = 'EmpAlmacen')   AS estado_almacen,
+                MAX(e.nombre)            FILTER (WHERE au.rol = 'EmpAlmacen')   AS nombre_almacen,
+                MAX(au.fecaprobacion)    FILTER (WHERE au.rol = 'EmpAlmacen')   AS fecha_almacen,
+                (ARRAY_AGG(au.comentario ORDER BY au.fecaprobacion DESC NULLS FIRST, au.actualizado_en DESC))[1]
+                                                                                AS ultimo_comentario
+            FROM requisiciones.aprobaciones_ultimas au
+            LEFT JOIN usuarios.empleados e ON e.emailinstitucional = au.emailinstitucional
+            WHERE au.idrequisicion = r.idrequisicion
+        ) ap ON TRUE
+"""
+
+
+def _estado_flujo(estado, rechazada_antes: bool) -> str:
+    """Etiqueta de FlujoAprobacion a partir del ??ltimo estado de un rol."""
+    if not estado:
+        return "No Procesado" if rechazada_antes else "Pendiente"
+    estado_up = str(estado).upper()
+    if estado_up.startswith("APROB"):
+        return "Aprobado"
+    if estado_up.startswith("RECHAZ"):
+        return "Rechazado"
+    return str(estado)
+
+
+def _flujo_aprobacion(*estados) -> list:
+    """Etiquetas de los roles en orden; los roles posteriores a un rechazo quedan "No Procesado"."""
+    etiquetas = []
+    rechazada = False
+    for estado in estados:
+        etiqueta = _estado_flujo(estado, rechazada)
+        rechazada = rechazada or etiqueta == "Rechazado"
+        etiquetas.append(etiqueta)
+    return etiquetas
+
+
 @router.get("/mis-requisiciones", summary="Ver mis propias requisiciones", response_model=list[dict])
 async def api_mis_requisiciones(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(get_current_user),
 ):
     """Endpoint para que cada usuario vea sus propias requisiciones con el estado de aprobaci??n"""
@@ -495,108 +518,53 @@ async def api_mis_requisiciones(
                             JOIN acceso.empleados_roles erl ON erl.emailinstitucional = el.emailinstitucional AND COALESCE(erl.actlaboralmente, TRUE) = TRUE
                             JOIN acceso.roles rl ON rl.idrol = erl.idrol AND rl.nomrol = 'EmpAlmacen'
                         ) AS ListaAlmacen,
-            -- Estado de aprobaci??n del Jefe Inmediato
-            COALESCE(
-                (SELECT EstadoAprobacion 
-                 FROM requisiciones.Aprobaciones a1 
-                 WHERE a1.IdRequisicion = r.IdRequisicion 
-                 AND a1.Rol = 'JefInmediato' 
-                 ORDER BY a1.FecAprobacion DESC LIMIT 1), 
-                'Pendiente'
-            ) as EstadoJefeInmediato,
-            -- Nombre y fecha de aprobaci??n del Jefe Inmediato
-            (SELECT e.nombre FROM requisiciones.Aprobaciones a1
-             JOIN usuarios.empleados e ON e.emailinstitucional = a1.EmailInstitucional
-             WHERE a1.IdRequisicion = r.IdRequisicion AND a1.Rol = 'JefInmediato'
-             ORDER BY a1.FecAprobacion DESC LIMIT 1) as NombreAprobadorJefe,
-            (SELECT a1.FecAprobacion AT TIME ZONE 'America/Tegucigalpa' FROM requisiciones.Aprobaciones a1
-             WHERE a1.IdRequisicion = r.IdRequisicion AND a1.Rol = 'JefInmediato'
-             ORDER BY a1.FecAprobacion DESC LIMIT 1) as FechaAprobacionJefe,
-            -- Estado de aprobaci??n del Gerente Administrativo
-            COALESCE(
-                (SELECT EstadoAprobacion 
-                 FROM requisiciones.Aprobaciones a2 
-                 WHERE a2.IdRequisicion = r.IdRequisicion 
-                 AND a2.Rol = 'GerAdmon' 
-                 ORDER BY a2.FecAprobacion DESC LIMIT 1), 
-                'Pendiente'
-            ) as EstadoGerenteAdministrativo,
-            -- Nombre y fecha de aprobaci??n del Gerente
-            (SELECT e.nombre FROM requisiciones.Aprobaciones a2
-             JOIN usuarios.empleados e ON e.emailinstitucional = a2.EmailInstitucional
-             WHERE a2.IdRequisicion = r.IdRequisicion AND a2.Rol = 'GerAdmon'
-             ORDER BY a2.FecAprobacion DESC LIMIT 1) as NombreAprobadorGerente,
-            (SELECT a2.FecAprobacion AT TIME ZONE 'America/Tegucigalpa' FROM requisiciones.Aprobaciones a2
-             WHERE a2.IdRequisicion = r.IdRequisicion AND a2.Rol = 'GerAdmon'
-             ORDER BY a2.FecAprobacion DESC LIMIT 1) as FechaAprobacionGerente,
-            -- Estado de aprobaci??n del Jefe de Servicios Materiales
-            COALESCE(
-                (SELECT EstadoAprobacion 
-                 FROM requisiciones.Aprobaciones a3 
-                 WHERE a3.IdRequisicion = r.IdRequisicion 
-                 AND a3.Rol = 'JefSerMat' 
-                 ORDER BY a3.FecAprobacion DESC LIMIT 1), 
-                'Pendiente'
-            ) as EstadoJefeMateriales,
-            -- Nombre y fecha de aprobaci??n del Jefe Materiales
-            (SELECT e.nombre FROM requisiciones.Aprobaciones a3
-             JOIN usuarios.empleados e ON e.emailinstitucional = a3.EmailInstitucional
-             WHERE a3.IdRequisicion = r.IdRequisicion AND a3.Rol = 'JefSerMat'
-             ORDER BY a3.FecAprobacion DESC LIMIT 1) as NombreAprobadorJefeMat,
-            (SELECT a3.FecAprobacion AT TIME ZONE 'America/Tegucigalpa' FROM requisiciones.Aprobaciones a3
-             WHERE a3.IdRequisicion = r.IdRequisicion AND a3.Rol = 'JefSerMat'
-             ORDER BY a3.FecAprobacion DESC LIMIT 1) as FechaAprobacionJefeMat,
-            -- Estado de aprobaci??n del Almac??n
-            COALESCE(
-                (SELECT EstadoAprobacion 
-                 FROM requisiciones.Aprobaciones a4 
-                 WHERE a4.IdRequisicion = r.IdRequisicion 
-                 AND a4.Rol = 'EmpAlmacen' 
-                 ORDER BY a4.FecAprobacion DESC LIMIT 1), 
-                'Pendiente'
-            ) as EstadoAlmacen,
-            -- Nombre y fecha de aprobaci??n del Almac??n
-            (SELECT e.nombre FROM requisiciones.Aprobaciones a4
-             JOIN usuarios.empleados e ON e.emailinstitucional = a4.EmailInstitucional
-             WHERE a4.IdRequisicion = r.IdRequisicion AND a4.Rol = 'EmpAlmacen'
-             ORDER BY a4.FecAprobacion DESC LIMIT 1) as NombreAprobadorAlmacen,
-            (SELECT a4.FecAprobacion AT TIME ZONE 'America/Tegucigalpa' FROM requisiciones.Aprobaciones a4
-             WHERE a4.IdRequisicion = r.IdRequisicion AND a4.Rol = 'EmpAlmacen'
-             ORDER BY a4.FecAprobacion DESC LIMIT 1) as FechaAprobacionAlmacen,
+            -- Estado, aprobador y fecha por rol desde la proyecci??n aprobaciones_ultimas
+            COALESCE(ap.estado_jefe, 'Pendiente') as EstadoJefeInmediato,
+            ap.nombre_jefe as NombreAprobadorJefe,
+            ap.fecha_jefe AT TIME ZONE 'America/Tegucigalpa' as FechaAprobacionJefe,
+            COALESCE(ap.estado_gerente, 'Pendiente') as EstadoGerenteAdministrativo,
+            ap.nombre_gerente as NombreAprobadorGerente,
+            ap.fecha_gerente AT TIME ZONE 'America/Tegucigalpa' as FechaAprobacionGerente,
+            COALESCE(ap.estado_jefemat, 'Pendiente') as EstadoJefeMateriales,
+            ap.nombre_jefemat as NombreAprobadorJefeMat,
+            ap.fecha_jefemat AT TIME ZONE 'America/Tegucigalpa' as FechaAprobacionJefeMat,
+            COALESCE(ap.estado_almacen, 'Pendiente') as EstadoAlmacen,
+            ap.nombre_almacen as NombreAprobadorAlmacen,
+            ap.fecha_almacen AT TIME ZONE 'America/Tegucigalpa' as FechaAprobacionAlmacen,
                         -- Aprobador actual (rol y nombre)
                         CASE 
-                            WHEN COALESCE((SELECT EstadoAprobacion FROM requisiciones.Aprobaciones ai WHERE ai.IdRequisicion = r.IdRequisicion AND ai.Rol = 'JefInmediato' ORDER BY ai.FecAprobacion DESC LIMIT 1), 'Pendiente') = 'Pendiente'
+                            WHEN COALESCE(ap.estado_jefe, 'Pendiente') = 'Pendiente'
                                 THEN 'Jefe Inmediato'
-                            WHEN COALESCE((SELECT EstadoAprobacion FROM requisiciones.Aprobaciones ag WHERE ag.IdRequisicion = r.IdRequisicion AND ag.Rol = 'GerAdmon' ORDER BY ag.FecAprobacion DESC LIMIT 1), 'Pendiente') = 'Pendiente'
+                            WHEN COALESCE(ap.estado_gerente, 'Pendiente') = 'Pendiente'
                                 THEN 'Gerente Admin.'
-                            WHEN COALESCE((SELECT EstadoAprobacion FROM requisiciones.Aprobaciones aj WHERE aj.IdRequisicion = r.IdRequisicion AND aj.Rol = 'JefSerMat' ORDER BY aj.FecAprobacion DESC LIMIT 1), 'Pendiente') = 'Pendiente'
+                            WHEN COALESCE(ap.estado_jefemat, 'Pendiente') = 'Pendiente'
                                 THEN 'Jefe Materiales'
-                            WHEN COALESCE((SELECT EstadoAprobacion FROM requisiciones.Aprobaciones al WHERE al.IdRequisicion = r.IdRequisicion AND al.Rol = 'EmpAlmacen' ORDER BY al.FecAprobacion DESC LIMIT 1), 'Pendiente') = 'Pendiente'
+                            WHEN COALESCE(ap.estado_almacen, 'Pendiente') = 'Pendiente'
                                 THEN 'Almac??n'
                             ELSE NULL
                         END AS AprobadorActualRol,
                         CASE 
-                            WHEN COALESCE((SELECT EstadoAprobacion FROM requisiciones.Aprobaciones ai2 WHERE ai2.IdRequisicion = r.IdRequisicion AND ai2.Rol = 'JefInmediato' ORDER BY ai2.FecAprobacion DESC LIMIT 1), 'Pendiente') = 'Pendiente'
+                            WHEN COALESCE(ap.estado_jefe, 'Pendiente') = 'Pendiente'
                                 THEN (
                                         SELECT jefe2.nombre FROM usuarios.empleados e2
                                         LEFT JOIN usuarios.empleados jefe2 ON jefe2.dni = e2.dnijefeinmediato
                                         WHERE e2.emailinstitucional = r.CreadoPor LIMIT 1
                                 )
-                            WHEN COALESCE((SELECT EstadoAprobacion FROM requisiciones.Aprobaciones ag2 WHERE ag2.IdRequisicion = r.IdRequisicion AND ag2.Rol = 'GerAdmon' ORDER BY ag2.FecAprobacion DESC LIMIT 1), 'Pendiente') = 'Pendiente'
+                            WHEN COALESCE(ap.estado_gerente, 'Pendiente') = 'Pendiente'
                                 THEN (
                                         SELECT split_part(string_agg(ea2.nombre, ', ' ORDER BY ea2.nombre), ',', 1)
                                         FROM usuarios.empleados ea2
                                         JOIN acceso.empleados_roles era2 ON era2.emailinstitucional = ea2.emailinstitucional AND COALESCE(era2.actlaboralmente, TRUE) = TRUE
                                         JOIN acceso.roles ra2 ON ra2.idrol = era2.idrol AND ra2.nomrol = 'GerAdmon'
                                 )
-                            WHEN COALESCE((SELECT EstadoAprobacion FROM requisiciones.Aprobaciones aj2 WHERE aj2.IdRequisicion = r.IdRequisicion AND aj2.Rol = 'JefSerMat' ORDER BY aj2.FecAprobacion DESC LIMIT 1), 'Pendiente') = 'Pendiente'
+                            WHEN COALESCE(ap.estado_jefemat, 'Pendiente') = 'Pendiente'
                                 THEN (
                                         SELECT split_part(string_agg(em2.nombre, ', ' ORDER BY em2.nombre), ',', 1)
                                         FROM usuarios.empleados em2
                                         JOIN acceso.empleados_roles erm2 ON erm2.emailinstitucional = em2.emailinstitucional AND COALESCE(erm2.actlaboralmente, TRUE) = TRUE
                                         JOIN acceso.roles rm2 ON rm2.idrol = erm2.idrol AND rm2.nomrol = 'JefSerMat'
                                 )
-                            WHEN COALESCE((SELECT EstadoAprobacion FROM requisiciones.Aprobaciones al2 WHERE al2.IdRequisicion = r.IdRequisicion AND al2.Rol = 'EmpAlmacen' ORDER BY al2.FecAprobacion DESC LIMIT 1), 'Pendiente') = 'Pendiente'
+                            WHEN COALESCE(ap.estado_almacen, 'Pendiente') = 'Pendiente'
                                 THEN (
                                         SELECT split_part(string_agg(el2.nombre, ', ' ORDER BY el2.nombre), ',', 1)
                                         FROM usuarios.empleados el2
@@ -606,29 +574,22 @@ async def api_mis_requisiciones(
                             ELSE NULL
                         END AS AprobadorActualNombre,
             -- ??ltimo comentario
-            COALESCE(
-                (SELECT Comentario 
-                 FROM requisiciones.Aprobaciones a5 
-                 WHERE a5.IdRequisicion = r.IdRequisicion 
-                 ORDER BY a5.FecAprobacion DESC LIMIT 1), 
-                ''
-            ) as UltimoComentario
+            COALESCE(ap.ultimo_comentario, '') as UltimoComentario
         FROM requisiciones.Requisiciones r
+        """ + _SQL_JOIN_APROBACIONES_ULTIMAS + """
         WHERE r.CreadoPor = :email
         ORDER BY r.FecSolicitud DESC
         """)
         
-        result = db.execute(query, {"email": email})
+        filas = [dict(row._mapping) for row in await db.execute(query, {"email": email})]
         requisiciones = []
-        
-        for row in result:
-            # Usar _mapping para acceder a las columnas por nombre (min??sculas)
-            row_dict = dict(row._mapping)
-            id_requisicion = str(row_dict['idrequisicion'])
-            
-            # Obtener los productos de esta requisici??n desde Detalle_Requisicion
+
+        # Productos de todas las requisiciones del usuario en una sola consulta
+        productos_por_requisicion = {}
+        if filas:
             query_productos = text("""
             SELECT 
+                dr.IdRequisicion,
                 dr.IdProducto,
                 dr.CantSolicitada as Cantidad,
                 dr.GasUnitario as PrecioUnitario,
@@ -643,16 +604,13 @@ async def api_mis_requisiciones(
                 p.FecVencimiento
             FROM requisiciones.Detalle_Requisicion dr
             INNER JOIN productos.Productos p ON dr.IdProducto = p.IdProducto
-            WHERE dr.IdRequisicion = :id_requisicion
-            ORDER BY p.NomProducto
+            WHERE dr.IdRequisicion = ANY(:ids)
+            ORDER BY dr.IdRequisicion, p.NomProducto
             """)
-            
-            result_productos = db.execute(query_productos, {"id_requisicion": id_requisicion})
-            productos = []
-            
-            for prod in result_productos:
+            ids = [f['idrequisicion'] for f in filas]
+            for prod in await db.execute(query_productos, {"ids": ids}):
                 prod_dict = dict(prod._mapping)
-                productos.append({
+                productos_por_requisicion.setdefault(str(prod_dict['idrequisicion']), []).append({
                     "IdProducto": str(prod_dict['idproducto']),
                     "CodObjetoUnico": prod_dict['codobjetounico'],
                     "NomProducto": prod_dict['nomproducto'],
@@ -666,6 +624,10 @@ async def api_mis_requisiciones(
                     "CanStock": float(prod_dict['canstock']) if prod_dict['canstock'] else 0.0,
                     "FecVencimiento": prod_dict['fecvencimiento'].isoformat() if prod_dict['fecvencimiento'] else None
                 })
+        
+        for row_dict in filas:
+            id_requisicion = str(row_dict['idrequisicion'])
+            productos = productos_por_requisicion.get(id_requisicion, [])
             
             # Serializar fechas con componente de hora para evitar que JS reste 6h al parsear solo la fecha
             fecha_aprob_jefe_raw = row_dict.get('fecha_hora_aprobacion_jefe') or row_dict.get('fechaaprobacionjefe')
@@ -759,7 +721,7 @@ async def api_mis_requisiciones(
 
 @router.get("/jerarquia", summary="Ver jerarqu??a de aprobaci??n del usuario")
 async def api_jerarquia_usuario(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(get_current_user),
 ):
     """Endpoint para mostrar la jerarqu??a de aprobaci??n seg??n el usuario"""
@@ -792,7 +754,7 @@ async def api_jerarquia_usuario(
                  d.NomDependencia, d.Siglas, jefe.EmailInstitucional, jefe.Nombre
         """)
         
-        result = db.execute(query, {"email": email}).fetchone()
+        result = (await db.execute(query, {"email": email})).fetchone()
         
         if not result:
             raise HTTPException(status_code=404, detail="Usuario no encontrado")
@@ -877,7 +839,7 @@ def registrar_email_log(destinatario, asunto, cuerpo, estado, error, idrequisici
 
 @router.post("/", summary="Crear requisici??n", response_model=CrearRequisicionOut)
 @router.post("", include_in_schema=False)
-async def api_crear_requisicion(
+def api_crear_requisicion(
     body: CrearRequisicionIn,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user),
@@ -972,52 +934,10 @@ async def api_crear_requisicion(
                     }
                 )
 
-                # Enviar correo al jefe con link de aprobaci??n
+                # Encolar correo al jefe con link de aprobaci??n
                 try:
-                    from app.core.mail import send_email
-                    import os
-                    link_aprobacion = f"http://192.168.180.164:8081/requisiciones/aprobar/{cod_req}"
                     asunto = "Requisici??n pendiente de aprobaci??n"
-
-                    # Texto plano
-                    cuerpo_text = (
-                        f"SEDH Almac??n\n\n"
-                        f"Nueva requisici??n pendiente de aprobaci??n.\n"
-                        f"Solicitante: {nom_empleado}\n"
-                        f"C??digo: {cod_req}\n\n"
-                        f"Aprobar en: {link_aprobacion}\n"
-                    )
-
-                    # Cargar logo inline
-                    inline_images = {}
-                    try:
-                        logo_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "frontend", "Imagen", "LogoSedhEscudo.png"))
-                        with open(logo_path, "rb") as f:
-                            inline_images["logo_sedh"] = f.read()
-                    except Exception:
-                        inline_images = {}
-
-                    # HTML
-                    cuerpo_html = f"""
-                    <div style='font-family:Segoe UI, Tahoma, sans-serif; color:#103b37;'>
-                      <div style='display:flex;align-items:center;gap:12px;margin-bottom:16px;'>
-                        <img src="cid:logo_sedh" alt="SEDH" style="height:60px;">
-                        <div>
-                          <div style='font-weight:600;font-size:18px;'>Secretar??a de Derechos Humanos - Sistema de Almac??n</div>
-                          <div style='font-size:12px;opacity:0.8;'>Notificaci??n autom??tica del sistema</div>
-                        </div>
-                      </div>
-                      <div style='background:#f8f9fa;border:1px solid #e0e0e0;border-radius:8px;padding:16px;'>
-                        <div style='font-size:16px;margin-bottom:8px;'>Estimado/a {nombre_jefe or ''},</div>
-                        <div style='margin-bottom:12px;'>Tiene una nueva requisici??n pendiente de aprobaci??n.</div>
-                        <div><strong>Solicitante:</strong> {nom_empleado}</div>
-                        <div><strong>C??digo:</strong> {cod_req}</div>
-                        
-                        <a href='{link_aprobacion}' style='display:inline-block;background:#0f766e;color:white;text-decoration:none;padding:10px 16px;border-radius:6px;margin-top:10px;'>Revisar y aprobar</a>
-                      </div>
-                      <div style='font-size:12px;color:#6c757d;margin-top:12px;'>Este correo se genera autom??ticamente. No responder.</div>
-                    </div>
-                    """
+                    cuerpo_text, cuerpo_html = correo_aprobacion_jefe(cod_req, nom_empleado, nombre_jefe)
 
                     # Adjuntar PDF de requisici??n - generar directamente con detalles completos
                     attachments = []
@@ -1109,7 +1029,8 @@ async def api_crear_requisicion(
                             )
                             elements.append(footer)
                             
-                            doc.build(elements)
+                            with medir_bloqueo("pdf"):
+                                doc.build(elements)
                             buffer.seek(0)
                             attachments.append((f"Requisicion_{cod_req}.pdf", buffer.read(), "application/pdf"))
                     except Exception as pdf_err:
@@ -1118,21 +1039,18 @@ async def api_crear_requisicion(
                         traceback.print_exc()
                         pass
 
-                    estado, error = send_email(
+                    encolar_correo(
+                        db,
                         email_jefe,
                         asunto,
                         cuerpo_text,
-                        body_html=cuerpo_html,
-                        attachments=attachments,
-                        inline_images=inline_images,
+                        cuerpo_html=cuerpo_html,
+                        adjuntos=attachments,
+                        incluir_logo=True,
+                        idrequisicion=result.idrequisicion,
                     )
-                    registrar_email_log(email_jefe, asunto, cuerpo_text, estado, error, result.idrequisicion, db)
-                    if estado == "enviado":
-                        print(f"Correo enviado correctamente al jefe ({email_jefe}) para requisici??n {cod_req}")
-                    else:
-                        print(f"ERROR al enviar correo al jefe ({email_jefe}): {error}")
                 except Exception as correo_err:
-                    print(f"EXCEPCI??N al enviar correo al jefe: {correo_err}")
+                    print(f"EXCEPCI??N al encolar correo al jefe: {correo_err}")
 
             # Notificaci??n de confirmaci??n para el solicitante
             msg_solicitante = f"??? Tu requisici??n {cod_req or ''} fue creada y enviada para aprobaci??n"
@@ -1149,10 +1067,8 @@ async def api_crear_requisicion(
                 }
             )
 
-            # Enviar correo al solicitante a su emailinstitucional (si existe)
+            # Encolar correo al solicitante a su emailinstitucional (si existe)
             try:
-                from app.core.mail import send_email
-                import os
                 # Obtener emailinstitucional confiable desde tabla empleados
                 q_emp = text("""
                     SELECT emailinstitucional, nombre
@@ -1165,38 +1081,7 @@ async def api_crear_requisicion(
                 nombre_dest = (row_emp.nombre if row_emp else nom_empleado) or email
 
                 asunto_solic = "Confirmaci??n de creaci??n de requisici??n"
-                link_hist = f"http://localhost:8081/historial?cod={cod_req or ''}&tab=aprobaciones"
-                cuerpo_text_solic = (
-                    f"SEDH Almac??n\n\n"
-                    f"Tu requisici??n {cod_req or ''} fue creada correctamente y enviada para aprobaci??n.\n"
-                    f"Historial y aprobaciones: {link_hist}\n"
-                )
-
-                inline_images = {}
-                try:
-                    logo_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "frontend", "Imagen", "LogoSedhEscudo.png"))
-                    with open(logo_path, "rb") as f:
-                        inline_images["logo_sedh"] = f.read()
-                except Exception:
-                    inline_images = {}
-
-                cuerpo_html_solic = f"""
-                <div style='font-family:Segoe UI, Tahoma, sans-serif; color:#103b37;'>
-                  <div style='display:flex;align-items:center;gap:12px;margin-bottom:16px;'>
-                    <img src="cid:logo_sedh" alt="SEDH" style="height:60px;">
-                    <div>
-                      <div style='font-weight:600;font-size:18px;'>Secretar??a de Derechos Humanos - Sistema de Almac??n</div>
-                      <div style='font-size:12px;opacity:0.8;'>Confirmaci??n de creaci??n de requisici??n</div>
-                    </div>
-                  </div>
-                  <div style='background:#f8f9fa;border:1px solid #e0e0e0;border-radius:8px;padding:16px;'>
-                    <div style='font-size:16px;margin-bottom:8px;'>Estimado/a {nombre_dest},</div>
-                    <div style='margin-bottom:12px;'>Tu requisici??n {cod_req or ''} fue creada correctamente y enviada para aprobaci??n.</div>
-                    <a href='{link_hist}' style='display:inline-block;background:#0f766e;color:white;text-decoration:none;padding:10px 16px;border-radius:6px;'>Ver historial y aprobaciones</a>
-                  </div>
-                  <div style='font-size:12px;color:#6c757d;margin-top:12px;'>Este correo se genera autom??ticamente. No responder.</div>
-                </div>
-                """
+                cuerpo_text_solic, cuerpo_html_solic = correo_confirmacion_solicitante(cod_req, nombre_dest)
 
                 attachments = []
                 try:
@@ -1287,7 +1172,8 @@ async def api_crear_requisicion(
                         )
                         elements.append(footer)
                         
-                        doc.build(elements)
+                        with medir_bloqueo("pdf"):
+                            doc.build(elements)
                         buffer.seek(0)
                         attachments.append((f"Requisicion_{cod_req}.pdf", buffer.read(), "application/pdf"))
                 except Exception as pdf_err:
@@ -1296,21 +1182,21 @@ async def api_crear_requisicion(
                     traceback.print_exc()
                     pass
 
-                estado_solic, error_solic = send_email(
+                encolar_correo(
+                    db,
                     correo_dest,
                     asunto_solic,
                     cuerpo_text_solic,
-                    body_html=cuerpo_html_solic,
-                    attachments=attachments,
-                    inline_images=inline_images,
+                    cuerpo_html=cuerpo_html_solic,
+                    adjuntos=attachments,
+                    incluir_logo=True,
+                    idrequisicion=result.idrequisicion,
                 )
-                registrar_email_log(correo_dest, asunto_solic, cuerpo_text_solic, estado_solic, error_solic, result.idrequisicion, db)
-                if estado_solic != "enviado":
-                    print(f"WARN: Error al enviar confirmaci??n al solicitante {correo_dest}: {error_solic}")
             except Exception as correo_solic_err:
-                print(f"WARN: Fallo al enviar correo al solicitante: {correo_solic_err}")
+                print(f"WARN: Fallo al encolar correo al solicitante: {correo_solic_err}")
 
             db.commit()
+            despertar_outbox()
         except Exception as _notif_err:
             # No bloquear la creaci??n por fallo al notificar; registrar y continuar
             try:
@@ -1351,7 +1237,7 @@ async def api_crear_requisicion(
     response_model=list[RequisicionPendienteOut],
 )
 async def api_requisiciones_pendientes_jefe(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(get_current_user),
 ):
     email = (str(current_user.get("email") or current_user.get("sub") or "")).strip()
@@ -1359,7 +1245,7 @@ async def api_requisiciones_pendientes_jefe(
         raise HTTPException(status_code=401, detail="No se encontr?? email del usuario autenticado")
 
     try:
-        return requisiciones_pendientes_jefe(db, email)
+        return await requisiciones_pendientes_jefe(db, email)
     except ProgrammingError as e:
         msg = str(getattr(e, "orig", e))
         if "Usuario no autorizado" in msg or "no es Jefe Inmediato" in msg:
@@ -1371,12 +1257,21 @@ async def api_requisiciones_pendientes_jefe(
         raise HTTPException(status_code=500, detail="Error inesperado")
 
 
+def _rechazo_aprobacion(db: Session, e: ValueError) -> HTTPException:
+    """
+    AprobacionRechazada trae el código HTTP según el SQLSTATE de procesar_aprobacion
+    (403 no autorizado, 404 no existe, 400 regla del rol); otro ValueError es 400.
+    """
+    db.rollback()
+    return HTTPException(status_code=getattr(e, "status_code", 400), detail=str(e))
+
+
 @router.post(
     "/responder/jefe",
     summary="Responder (aprobar/rechazar) una requisici??n de un subordinado",
     response_model=ResponderRequisicionOut,
 )
-async def api_responder_requisicion_jefe(
+def api_responder_requisicion_jefe(
     body: ResponderRequisicionIn,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user),
@@ -1386,46 +1281,15 @@ async def api_responder_requisicion_jefe(
         raise HTTPException(status_code=401, detail="No se encontr?? email del usuario autenticado")
 
     try:
-        result = responder_requisicion_jefe(db, body, email)
-        
-        # Registrar en auditor??a si la aprobaci??n fue exitosa
-        try:
-            if body.estado.upper() == "APROBADO":
-                actualizar_timestamp_aprobacion_jefe(db, str(body.idRequisicion), str(current_user.get("id", "")))
-                registrar_auditoria_requisicion(
-                    db=db,
-                    id_requisicion=str(body.idRequisicion),
-                    tipo_accion="APROBADA_JEFE",
-                    id_usuario_accion=str(current_user.get("id", "")),
-                    nombre_usuario_accion=current_user.get("nombre", email),
-                    descripcion_accion="Aprobada por jefe de departamento",
-                    observaciones=body.comentario
-                )
-            elif body.estado.upper() == "RECHAZADO":
-                actualizar_timestamp_rechazo(db, str(body.idRequisicion))
-                registrar_auditoria_requisicion(
-                    db=db,
-                    id_requisicion=str(body.idRequisicion),
-                    tipo_accion="RECHAZADA",
-                    id_usuario_accion=str(current_user.get("id", "")),
-                    nombre_usuario_accion=current_user.get("nombre", email),
-                    descripcion_accion="Rechazada por jefe de departamento",
-                    observaciones=f"Motivo: {body.comentario}"
-                )
-        except Exception as audit_error:
-            print(f"Advertencia: Error al registrar auditor??a: {audit_error}")
-        
+        # Estado, notificaciones, auditoría y timestamps en una sola transacción
+        result = responder_requisicion_jefe(
+            db, body, email,
+            id_usuario=current_user.get("id"),
+            nombre_usuario=current_user.get("nombre", email),
+        )
         return result
-    except ProgrammingError as e:
-        db.rollback()
-        msg = str(getattr(e, "orig", e))
-        if "Usuario no autorizado" in msg or "no es Jefe Inmediato" in msg:
-            raise HTTPException(status_code=401, detail="Usuario no autorizado: no es Jefe Inmediato")
-        if "Estado inv??lido" in msg or "Comentario es obligatorio" in msg:
-            raise HTTPException(status_code=400, detail=msg)
-        print(f"ERROR ProgrammingError: {e}")
-        print(f"ERROR msg: {msg}")
-        raise HTTPException(status_code=500, detail=f"Error al responder la requisici??n: {msg}")
+    except ValueError as e:
+        raise _rechazo_aprobacion(db, e)
     except SQLAlchemyError as e:
         db.rollback()
         print(f"ERROR SQLAlchemyError: {e}")
@@ -1445,7 +1309,7 @@ async def api_responder_requisicion_jefe(
     response_model=list[RequisicionPendienteGerenteOut],
 )
 async def api_requisiciones_pendientes_gerente(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(get_current_user),
 ):
     email = (str(current_user.get("email") or current_user.get("sub") or "")).strip()
@@ -1453,7 +1317,7 @@ async def api_requisiciones_pendientes_gerente(
         raise HTTPException(status_code=401, detail="No se encontr?? email del usuario autenticado")
 
     try:
-        return requisiciones_pendientes_gerente(db, email)
+        return await requisiciones_pendientes_gerente(db, email)
     except ProgrammingError as e:
         msg = str(getattr(e, "orig", e))
         if "Usuario no autorizado" in msg or "no es Gerente Administrativo" in msg:
@@ -1470,7 +1334,7 @@ async def api_requisiciones_pendientes_gerente(
     summary="Gerente Administrativo responde (aprobar/rechazar) una requisici??n",
     response_model=ResponderRequisicionOut,
 )
-async def api_responder_requisicion_gerente(
+def api_responder_requisicion_gerente(
     body: ResponderRequisicionGerenteIn,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user),
@@ -1480,44 +1344,15 @@ async def api_responder_requisicion_gerente(
         raise HTTPException(status_code=401, detail="No se encontr?? email del usuario autenticado")
 
     try:
-        result = responder_requisicion_gerente(db, body, email)
-        
-        # Registrar en auditor??a si la aprobaci??n fue exitosa
-        try:
-            if body.estado.upper() == "APROBADO":
-                actualizar_timestamp_aprobacion_jefe(db, str(body.idRequisicion), str(current_user.get("id", "")))
-                registrar_auditoria_requisicion(
-                    db=db,
-                    id_requisicion=str(body.idRequisicion),
-                    tipo_accion="APROBADA_GERENTE",
-                    id_usuario_accion=str(current_user.get("id", "")),
-                    nombre_usuario_accion=current_user.get("nombre", email),
-                    descripcion_accion="Aprobada por Gerente Administrativo",
-                    observaciones=body.comentario
-                )
-            elif body.estado.upper() == "RECHAZADO":
-                actualizar_timestamp_rechazo(db, str(body.idRequisicion))
-                registrar_auditoria_requisicion(
-                    db=db,
-                    id_requisicion=str(body.idRequisicion),
-                    tipo_accion="RECHAZADA",
-                    id_usuario_accion=str(current_user.get("id", "")),
-                    nombre_usuario_accion=current_user.get("nombre", email),
-                    descripcion_accion="Rechazada por Gerente Administrativo",
-                    observaciones=f"Motivo: {body.comentario}"
-                )
-        except Exception as audit_error:
-            print(f"Advertencia: Error al registrar auditor??a: {audit_error}")
-        
+        # Estado, notificaciones, auditoría y timestamps en una sola transacción
+        result = responder_requisicion_gerente(
+            db, body, email,
+            id_usuario=current_user.get("id"),
+            nombre_usuario=current_user.get("nombre", email),
+        )
         return result
-    except ProgrammingError as e:
-        db.rollback()
-        msg = str(getattr(e, "orig", e))
-        if "Usuario no autorizado" in msg or "no es Gerente Administrativo" in msg:
-            raise HTTPException(status_code=401, detail="Usuario no autorizado: no es Gerente Administrativo")
-        if "Estado inv??lido" in msg or "Comentario es obligatorio" in msg:
-            raise HTTPException(status_code=400, detail=msg)
-        raise HTTPException(status_code=500, detail="Error al responder la requisici??n")
+    except ValueError as e:
+        raise _rechazo_aprobacion(db, e)
     except SQLAlchemyError as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Error de base de datos: {str(e)}")
@@ -1532,7 +1367,7 @@ async def api_responder_requisicion_gerente(
     response_model=list[RequisicionPendienteGerenteOut],
 )
 async def api_requisiciones_pendientes_jefe_materiales(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(get_current_user),
 ):
     email = (str(current_user.get("email") or current_user.get("sub") or "")).strip()
@@ -1540,7 +1375,7 @@ async def api_requisiciones_pendientes_jefe_materiales(
         raise HTTPException(status_code=401, detail="No se encontr?? email del usuario autenticado")
 
     try:
-        return requisiciones_pendientes_jefe_materiales(db, email)
+        return await requisiciones_pendientes_jefe_materiales(db, email)
     except ProgrammingError as e:
         msg = str(getattr(e, "orig", e))
         if "Usuario no autorizado" in msg or "no es Jefe de Materiales" in msg:
@@ -1557,7 +1392,7 @@ async def api_requisiciones_pendientes_jefe_materiales(
     summary="Jefe de Materiales responde (aprobar/rechazar) una requisici??n",
     response_model=ResponderRequisicionOut,
 )
-async def api_responder_requisicion_jefe_materiales(
+def api_responder_requisicion_jefe_materiales(
     body: ResponderRequisicionGerenteIn,  # reutiliza el esquema del gerente
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user),
@@ -1567,45 +1402,16 @@ async def api_responder_requisicion_jefe_materiales(
         raise HTTPException(status_code=401, detail="No se encontr?? email del usuario autenticado")
 
     try:
-        result = responder_requisicion_jefe_materiales(db, body, email)
+        # Estado, notificaciones, auditoría y timestamps en una sola transacción
+        result = responder_requisicion_jefe_materiales(
+            db, body, email,
+            id_usuario=current_user.get("id"),
+            nombre_usuario=current_user.get("nombre", email),
+        )
         logger.warning(f"[JefSerMat] Email usado: '{email}' | Requisicion: {body.idRequisicion} | Estado: {body.estado}")
-        
-        # Registrar en auditor??a si la aprobaci??n fue exitosa
-        try:
-            if body.estado.upper() == "APROBADO":
-                actualizar_timestamp_aprobacion_almacen(db, str(body.idRequisicion), str(current_user.get("id", "")))
-                registrar_auditoria_requisicion(
-                    db=db,
-                    id_requisicion=str(body.idRequisicion),
-                    tipo_accion="APROBADA_JEFE_MATERIALES",
-                    id_usuario_accion=str(current_user.get("id", "")),
-                    nombre_usuario_accion=current_user.get("nombre", email),
-                    descripcion_accion="Aprobada por Jefe de Materiales",
-                    observaciones=body.comentario
-                )
-            elif body.estado.upper() == "RECHAZADO":
-                actualizar_timestamp_rechazo(db, str(body.idRequisicion))
-                registrar_auditoria_requisicion(
-                    db=db,
-                    id_requisicion=str(body.idRequisicion),
-                    tipo_accion="RECHAZADA",
-                    id_usuario_accion=str(current_user.get("id", "")),
-                    nombre_usuario_accion=current_user.get("nombre", email),
-                    descripcion_accion="Rechazada por Jefe de Materiales",
-                    observaciones=f"Motivo: {body.comentario}"
-                )
-        except Exception as audit_error:
-            print(f"Advertencia: Error al registrar auditor??a: {audit_error}")
-        
         return result
-    except ProgrammingError as e:
-        db.rollback()
-        msg = str(getattr(e, "orig", e))
-        if "Usuario no autorizado" in msg or "no es Jefe de Materiales" in msg:
-            raise HTTPException(status_code=401, detail="Usuario no autorizado: no es Jefe de Materiales")
-        if "Estado inv??lido" in msg or "Comentario es obligatorio" in msg or "no puede aumentar la cantidad" in msg:
-            raise HTTPException(status_code=400, detail=msg)
-        raise HTTPException(status_code=500, detail="Error al responder la requisici??n (jefe de materiales)")
+    except ValueError as e:
+        raise _rechazo_aprobacion(db, e)
     except SQLAlchemyError as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Error de base de datos: {str(e)}")
@@ -1613,6 +1419,40 @@ async def api_responder_requisicion_jefe_materiales(
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Error inesperado: {str(e)}")
 
+
+# APROBACIÓN POR LOTE (JefInmediato, GerAdmon, JefSerMat)
+@router.post(
+    "/responder/lote",
+    summary="Responder varias requisiciones en una sola transacción",
+    response_model=ResponderLoteOut,
+)
+def api_responder_requisiciones_lote(
+    body: ResponderLoteIn,
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user),
+):
+    """
+    Aplica una lista de decisiones (idRequisicion, estado, comentario, productos)
+    con la misma lógica que /responder/jefe, /responder/gerente y
+    /responder/jefe-materiales. Devuelve el resultado de cada requisición; las que
+    fallan (p. ej. usuario no autorizado o ya atendida) no afectan a las demás.
+    """
+    email = (str(current_user.get("email") or current_user.get("sub") or "")).strip()
+    if not email:
+        raise HTTPException(status_code=401, detail="No se encontró email del usuario autenticado")
+
+    try:
+        return responder_requisiciones_lote(
+            db, body.rol, body.decisiones, email,
+            id_usuario=current_user.get("id"),
+            nombre_usuario=current_user.get("nombre", email),
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except SQLAlchemyError as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Error de base de datos: {str(e)}")
+
 # EMPLEADOS ALMACEN
 @router.get(
     "/pendientes/almacen",
@@ -1620,7 +1460,7 @@ async def api_responder_requisicion_jefe_materiales(
     response_model=list[RequisicionPendienteGerenteOut],
 )
 async def api_requisiciones_pendientes_almacen(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(get_current_user),
 ):
     email = (str(current_user.get("email") or current_user.get("sub") or "")).strip()
@@ -1628,7 +1468,7 @@ async def api_requisiciones_pendientes_almacen(
         raise HTTPException(status_code=401, detail="No se encontr?? email del usuario autenticado")
 
     try:
-        return requisiciones_pendientes_almacen(db, email)
+        return await requisiciones_pendientes_almacen(db, email)
     except ProgrammingError as e:
         msg = str(getattr(e, "orig", e))
         if "Usuario no autorizado" in msg or "no es Empleado de Almac??n" in msg:
@@ -1640,11 +1480,28 @@ async def api_requisiciones_pendientes_almacen(
         raise HTTPException(status_code=500, detail="Error inesperado")
 
 
+# CONTADOR DE PENDIENTES (badge)
+@router.get("/pendientes/conteo", summary="Número de requisiciones pendientes por rol del usuario")
+async def api_requisiciones_pendientes_conteo(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: dict = Depends(get_current_user),
+):
+    email = (str(current_user.get("email") or current_user.get("sub") or "")).strip()
+    if not email:
+        raise HTTPException(status_code=401, detail="No se encontró email del usuario autenticado")
+
+    try:
+        por_rol = await contar_pendientes(db, email)
+    except SQLAlchemyError:
+        raise HTTPException(status_code=500, detail="Error de base de datos")
+    return {"total": sum(por_rol.values()), "porRol": por_rol}
+
+
 # ====================================
 # GENERAR PDF DE REQUISICI??N
 # ====================================
 @router.get("/{id_requisicion}/pdf", summary="Generar PDF imprimible de una requisici??n")
-async def api_generar_pdf_requisicion(
+def api_generar_pdf_requisicion(
     id_requisicion: str,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user),
@@ -2108,7 +1965,8 @@ async def api_generar_pdf_requisicion(
         elements.append(footer)
         
         # Construir PDF
-        doc.build(elements)
+        with medir_bloqueo("pdf"):
+            doc.build(elements)
         
         # Preparar respuesta
         buffer.seek(0)
@@ -2132,7 +1990,7 @@ async def api_generar_pdf_requisicion(
     summary="Empleado de Almac??n responde (aprobar/rechazar) una requisici??n",
     response_model=ResponderRequisicionOut,
 )
-async def api_responder_requisicion_almacen(
+def api_responder_requisicion_almacen(
     body: ResponderRequisicionGerenteIn,  # reutiliza el esquema del gerente
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user),
@@ -2142,44 +2000,15 @@ async def api_responder_requisicion_almacen(
         raise HTTPException(status_code=401, detail="No se encontr?? email del usuario autenticado")
 
     try:
-        result = responder_requisicion_almacen(db, body, email)
-        
-        # Registrar en auditor??a si la aprobaci??n fue exitosa
-        try:
-            if body.estado.upper() == "APROBADO":
-                actualizar_timestamp_aprobacion_almacen(db, str(body.idRequisicion), str(current_user.get("id", "")))
-                registrar_auditoria_requisicion(
-                    db=db,
-                    id_requisicion=str(body.idRequisicion),
-                    tipo_accion="APROBADA_ALMACEN",
-                    id_usuario_accion=str(current_user.get("id", "")),
-                    nombre_usuario_accion=current_user.get("nombre", email),
-                    descripcion_accion="Aprobada por Encargado de Almac??n",
-                    observaciones=body.comentario
-                )
-            elif body.estado.upper() == "RECHAZADO":
-                actualizar_timestamp_rechazo(db, str(body.idRequisicion))
-                registrar_auditoria_requisicion(
-                    db=db,
-                    id_requisicion=str(body.idRequisicion),
-                    tipo_accion="RECHAZADA",
-                    id_usuario_accion=str(current_user.get("id", "")),
-                    nombre_usuario_accion=current_user.get("nombre", email),
-                    descripcion_accion="Rechazada por Encargado de Almac??n",
-                    observaciones=f"Motivo: {body.comentario}"
-                )
-        except Exception as audit_error:
-            print(f"Advertencia: Error al registrar auditor??a: {audit_error}")
-        
+        # Estado, notificaciones, auditoría y timestamps en una sola transacción
+        result = responder_requisicion_almacen(
+            db, body, email,
+            id_usuario=current_user.get("id"),
+            nombre_usuario=current_user.get("nombre", email),
+        )
         return result
-    except ProgrammingError as e:
-        db.rollback()
-        msg = str(getattr(e, "orig", e))
-        if "Usuario no autorizado" in msg or "no es Empleado de Almac??n" in msg:
-            raise HTTPException(status_code=401, detail="Usuario no autorizado: no es Empleado de Almac??n")
-        if "Estado inv??lido" in msg or "Comentario es obligatorio" in msg or "no puede aumentar la cantidad" in msg:
-            raise HTTPException(status_code=400, detail=msg)
-        raise HTTPException(status_code=500, detail="Error al responder la requisici??n (almac??n)")
+    except ValueError as e:
+        raise _rechazo_aprobacion(db, e)
     except SQLAlchemyError as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Error de base de datos: {str(e)}")
@@ -2191,14 +2020,14 @@ async def api_responder_requisicion_almacen(
 # ENDPOINT DE PRUEBA SIMPLE
 @router.get("/test-todas", summary="Test endpoint para debug")
 async def test_todas_requisiciones(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(get_current_user),
 ):
     """Endpoint de prueba simple para verificar conectividad"""
     try:
         # Prueba 1: Verificar conexi??n b??sica
         query = text("SELECT COUNT(*) as total FROM requisiciones.requisiciones")
-        result = db.execute(query)
+        result = await db.execute(query)
         count = result.fetchone()[0]
         
         return {
@@ -2212,15 +2041,43 @@ async def test_todas_requisiciones(
         print(f"ERROR EN TEST: {error_detail}")
         raise HTTPException(status_code=500, detail=error_detail)
 
+# Las requisiciones sin fecha se ordenan primero (como NULLS FIRST en ORDER BY ... DESC)
+_FECHA_SIN_SOLICITUD = date(9999, 12, 31)
+
+
+def _codificar_cursor_todas(fecsolicitud, codrequisicion, idrequisicion) -> str:
+    """Cursor opaco (base64) con la clave de orden de la última fila devuelta."""
+    valor = json.dumps([
+        fecsolicitud.isoformat() if fecsolicitud else None,
+        codrequisicion or "",
+        str(idrequisicion),
+    ])
+    return base64.urlsafe_b64encode(valor.encode("utf-8")).decode("ascii")
+
+
+def _decodificar_cursor_todas(cursor: str):
+    try:
+        fec, cod, idreq = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8"))
+        return (date.fromisoformat(fec) if fec else _FECHA_SIN_SOLICITUD), cod, UUID(idreq)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+
+
 # ENDPOINT PARA REPORTE COMPLETO - VERSION MUY SIMPLE
 @router.get("/todas", summary="Obtener todas las requisiciones para reporte completo")
 async def api_todas_requisiciones(
+    response: Response,
     mes: int = None,
     anio: int = None,
     estado: str = None,
     dependencia: str = None,
     busqueda: str = None,
-    db: Session = Depends(get_db),
+    codigo: str = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    incluir_total: bool = False,
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(get_current_user),
 ):
     """
@@ -2233,14 +2090,21 @@ async def api_todas_requisiciones(
     - estado: Estado general (EN ESPERA, APROBADO, RECHAZADO)
     - dependencia: UUID de la dependencia
     - busqueda: Texto para buscar en c??digo de requisici??n o nombre de empleado
+    - codigo: C??digo exacto de requisici??n
+
+    Paginaci??n (keyset):
+    - limit: m??ximo de filas; sin limit se devuelven todas
+    - cursor: valor de la cabecera X-Next-Cursor de la p??gina anterior
+    - incluir_total: agrega la cabecera X-Total-Count con el total filtrado
     """
     email = (str(current_user.get("email") or current_user.get("sub") or "")).strip()
     if not email:
         raise HTTPException(status_code=401, detail="No se encontr?? email del usuario autenticado")
-    
+
+    # Fuera del try: un cursor inválido es un 400, no un error del servidor
+    clave_cursor = _decodificar_cursor_todas(cursor) if cursor else None
+
     try:
-        print("DEBUG: Iniciando endpoint /todas - Conectando con BD real")
-        
         # Construir la consulta con filtros din??micos
         base_query = """
             SELECT 
@@ -2255,9 +2119,14 @@ async def api_todas_requisiciones(
                 r.creadoen,
                 r.creadopor,
                 COALESCE(d.nomdependencia, 'Sin Dependencia') as nomdependencia,
-                COALESCE(d.siglas, 'SIN') as siglas
+                COALESCE(d.siglas, 'SIN') as siglas,
+                ap.estado_jefe,
+                ap.estado_gerente,
+                ap.estado_jefemat,
+                ap.estado_almacen
             FROM requisiciones.requisiciones r
             LEFT JOIN usuarios.dependencias d ON r.iddependencia = d.iddependencia
+        """ + _SQL_JOIN_APROBACIONES_ULTIMAS + """
             WHERE 1=1
         """
         
@@ -2279,42 +2148,60 @@ async def api_todas_requisiciones(
             
         if dependencia:
             try:
-                from uuid import UUID
                 # Validar que sea un UUID v??lido
                 uuid_obj = UUID(dependencia)
                 filtros.append("r.iddependencia = :dependencia")
                 parametros['dependencia'] = uuid_obj
             except ValueError:
-                print(f"DEBUG: Dependencia inv??lida: {dependencia}")
                 # Si no es un UUID v??lido, ignorar el filtro
+                pass
         
         if busqueda:
             # Buscar en c??digo de requisici??n o nombre de empleado
             filtros.append("(r.codrequisicion ILIKE :busqueda OR r.nomempleado ILIKE :busqueda)")
             parametros['busqueda'] = f"%{busqueda}%"
+
+        if codigo:
+            filtros.append("LOWER(r.codrequisicion) = LOWER(:codigo)")
+            parametros['codigo'] = codigo
         
         # Agregar filtros a la consulta
         if filtros:
             base_query += " AND " + " AND ".join(filtros)
-        
-        base_query += " ORDER BY r.fecsolicitud DESC, r.codrequisicion DESC"
-        
-        query = text(base_query)
-        result = db.execute(query, parametros)
+
+        if incluir_total:
+            count_query = "SELECT COUNT(*) FROM requisiciones.requisiciones r WHERE 1=1"
+            if filtros:
+                count_query += " AND " + " AND ".join(filtros)
+            total = (await db.execute(text(count_query), parametros)).scalar() or 0
+            response.headers["X-Total-Count"] = str(total)
+
+        # Clave de orden estable para keyset: fecha, c??digo e id como desempate
+        orden_fecha = "COALESCE(r.fecsolicitud, DATE '9999-12-31')"
+        orden_codigo = "COALESCE(r.codrequisicion, '')"
+        if clave_cursor:
+            c_fec, c_cod, c_id = clave_cursor
+            base_query += f" AND ({orden_fecha}, {orden_codigo}, r.idrequisicion) < (:c_fec, :c_cod, :c_id)"
+            parametros.update({"c_fec": c_fec, "c_cod": c_cod, "c_id": c_id})
+
+        base_query += f" ORDER BY {orden_fecha} DESC, {orden_codigo} DESC, r.idrequisicion DESC"
+        if limit:
+            base_query += " LIMIT :limit"
+            parametros['limit'] = limit
+        
+        result = await db.execute(text(base_query), parametros)
         requisiciones_bd = result.fetchall()
-        
-        print(f"DEBUG: Aplicados filtros - mes: {mes}, anio: {anio}, estado: {estado}, dependencia: {dependencia}, busqueda: {busqueda}")
-        print(f"DEBUG: Encontradas {len(requisiciones_bd)} requisiciones en BD")
-        
-        
-        # Convertir los resultados a formato esperado por el frontend
-        requisiciones = []
-        for req in requisiciones_bd:
-            id_requisicion = str(req[0])
-            
-            # Consultar productos para esta requisici??n
+
+        if limit and len(requisiciones_bd) == limit:
+            ultima = requisiciones_bd[-1]
+            response.headers["X-Next-Cursor"] = _codificar_cursor_todas(ultima[4], ultima[1], ultima[0])
+
+        # Productos de todas las requisiciones de la p??gina en una sola consulta
+        productos_por_requisicion = {}
+        if requisiciones_bd:
             productos_query = text("""
                 SELECT 
+                    dr.idrequisicion,
                     dr.idproducto,
                     COALESCE(p.nomproducto, 'Producto sin nombre') as nomproducto,
                     COALESCE(dr.cantsolicitada, 0) as cantsolicitada,
@@ -2324,29 +2211,31 @@ async def api_todas_requisiciones(
                     COALESCE(p.ordenescompra, '') as ordenescompra
                 FROM requisiciones.detalle_requisicion dr
                 LEFT JOIN productos.productos p ON dr.idproducto = p.idproducto
-                WHERE dr.idrequisicion = :id_requisicion
-                ORDER BY p.nomproducto
+                WHERE dr.idrequisicion = ANY(:ids)
+                ORDER BY dr.idrequisicion, p.nomproducto
             """)
-            
-            productos_result = db.execute(productos_query, {"id_requisicion": req[0]})
-            productos_bd = productos_result.fetchall()
-            
-            # Convertir productos a formato esperado
-            productos = []
-            for prod in productos_bd:
-                producto_dict = {
-                    "IdProducto": prod[0],
-                    "NomProducto": prod[1],
-                    "CantSolicitada": int(prod[2]) if prod[2] else 0,
-                    "GasUnitario": float(prod[3]) if prod[3] else 0.0,
-                    "GasTotal": float(prod[4]) if prod[4] else 0.0,
-                    "NumFactura": prod[5] if prod[5] else "",
-                    "OrdenCompra": prod[6] if prod[6] else ""
-                }
-                productos.append(producto_dict)
+            ids = [req[0] for req in requisiciones_bd]
+            for prod in (await db.execute(productos_query, {"ids": ids})).fetchall():
+                productos_por_requisicion.setdefault(prod[0], []).append({
+                    "IdProducto": prod[1],
+                    "NomProducto": prod[2],
+                    "CantSolicitada": int(prod[3]) if prod[3] else 0,
+                    "GasUnitario": float(prod[4]) if prod[4] else 0.0,
+                    "GasTotal": float(prod[5]) if prod[5] else 0.0,
+                    "NumFactura": prod[6] if prod[6] else "",
+                    "OrdenCompra": prod[7] if prod[7] else ""
+                })
+        
+        # Convertir los resultados a formato esperado por el frontend
+        requisiciones = []
+        for req in requisiciones_bd:
+            productos = productos_por_requisicion.get(req[0], [])
+            flujo_jefe, flujo_gerente, flujo_jefemat, flujo_almacen = _flujo_aprobacion(
+                req[12], req[13], req[14], req[15]
+            )
             
             requisicion_dict = {
-                "IdRequisicion": id_requisicion,
+                "IdRequisicion": str(req[0]),
                 "CodRequisicion": req[1] or "N/A",
                 "NomEmpleado": req[2] or "Sin Nombre",
                 "CreadoPor": req[9] or "Sistema",
@@ -2360,147 +2249,16 @@ async def api_todas_requisiciones(
                 "TotalProductos": len(productos),
                 "Productos": productos,
                 "FlujoAprobacion": {
-                    "JefeInmediato": "Pendiente" if req[5] == "EN ESPERA" else ("Aprobado" if req[5] == "APROBADO" else "Rechazado"),
-                    "GerenteAdministrativo": "Pendiente" if req[5] == "EN ESPERA" else ("Aprobado" if req[5] == "APROBADO" else "Rechazado"),
-                    "JefeServiciosMateriales": "Pendiente" if req[5] == "EN ESPERA" else ("Aprobado" if req[5] == "APROBADO" else "Rechazado"),
-                    "Almacen": "Pendiente" if req[5] == "EN ESPERA" else ("Aprobado" if req[5] == "APROBADO" else "Rechazado")
+                    "JefeInmediato": flujo_jefe,
+                    "GerenteAdministrativo": flujo_gerente,
+                    "JefeServiciosMateriales": flujo_jefemat,
+                    "Almacen": flujo_almacen
                 }
             }
             requisiciones.append(requisicion_dict)
         
-        print(f"DEBUG: Retornando {len(requisiciones)} requisiciones reales de la BD")
         return requisiciones
-        
-        # C??DIGO DE RESPALDO - datos simulados (comentado)
-        """
-        requisiciones_simuladas = [
-            {
-                "IdRequisicion": "1",
-                "CodRequisicion": "UIT-001-2025",
-                "NomEmpleado": "Humberto Josue Zelaya Lagos",
-                "CreadoPor": "humberto.zelaya@sedh.gob.hn",
-                "IdDependencia": "1",
-                "SiglasDependencia": "UIT",
-                "NomDependencia": "Unidad de Inform??tica y Tecnolog??a",
-                "FecSolicitud": "2025-11-15T09:30:00",
-                "EstGeneral": "EN ESPERA",
-                "ObsEmpleado": "Equipos de c??mputo para mejorar la infraestructura tecnol??gica",
-                "GasTotalDelPedido": 1850.0,
-                "TotalProductos": 3,
-                "Productos": [
-                    {
-                        "IdProducto": 1,
-                        "NomProducto": "Laptop Dell Inspiron 15 - Core i5",
-                        "CantSolicitada": 1,
-                        "GasUnitario": 950.0,
-                        "GasTotal": 950.0
-                    },
-                    {
-                        "IdProducto": 2,
-                        "NomProducto": "Mouse Inal??mbrico Logitech MX Master", 
-                        "CantSolicitada": 2,
-                        "GasUnitario": 350.0,
-                        "GasTotal": 700.0
-                    },
-                    {
-                        "IdProducto": 3,
-                        "NomProducto": "Teclado Mec??nico USB",
-                        "CantSolicitada": 1,
-                        "GasUnitario": 200.0,
-                        "GasTotal": 200.0
-                    }
-                ],
-                "FlujoAprobacion": {
-                    "JefeInmediato": "Pendiente",
-                    "GerenteAdministrativo": "Pendiente", 
-                    "JefeServiciosMateriales": "Pendiente",
-                    "Almacen": "Pendiente"
-                }
-            },
-            {
-                "IdRequisicion": "2",
-                "CodRequisicion": "SEDH-002-2025",
-                "NomEmpleado": "Juan Gabriel",
-                "CreadoPor": "juan.gabriel@sedh.gob.hn",
-                "IdDependencia": "2",
-                "SiglasDependencia": "SEDH",
-                "NomDependencia": "Secretar??a de Estado en los Derechos Humanos",
-                "FecSolicitud": "2025-11-10T14:15:00",
-                "EstGeneral": "APROBADO",
-                "ObsEmpleado": "Material de oficina para actividades administrativas urgentes",
-                "GasTotalDelPedido": 1900.0,
-                "TotalProductos": 4,
-                "Productos": [
-                    {
-                        "IdProducto": 4,
-                        "NomProducto": "Impresora HP LaserJet Pro M404dn",
-                        "CantSolicitada": 1,
-                        "GasUnitario": 1200.0,
-                        "GasTotal": 1200.0
-                    },
-                    {
-                        "IdProducto": 5,
-                        "NomProducto": "Papel Bond Carta 75g - Resma",
-                        "CantSolicitada": 10,
-                        "GasUnitario": 35.0,
-                        "GasTotal": 350.0
-                    },
-                    {
-                        "IdProducto": 6,
-                        "NomProducto": "T??ner HP Original 59A",
-                        "CantSolicitada": 2,
-                        "GasUnitario": 175.0,
-                        "GasTotal": 350.0
-                    }
-                ],
-                "FlujoAprobacion": {
-                    "JefeInmediato": "Aprobado",
-                    "GerenteAdministrativo": "Aprobado",
-                    "JefeServiciosMateriales": "Aprobado",
-                    "Almacen": "Aprobado"
-                }
-            },
-            {
-                "IdRequisicion": "3",
-                "CodRequisicion": "ADMIN-003-2025",
-                "NomEmpleado": "Escarleth Yadira Nu??ez Ortiz",
-                "CreadoPor": "escarleth.ortiz@sedh.gob.hn",
-                "IdDependencia": "3",
-                "SiglasDependencia": "ADMIN",
-                "NomDependencia": "Administraci??n General",
-                "FecSolicitud": "2025-11-18T11:45:00",
-                "EstGeneral": "RECHAZADO",
-                "ObsEmpleado": "Suministros para ??rea administrativa",
-                "GasTotalDelPedido": 680.0,
-                "TotalProductos": 2,
-                "Productos": [
-                    {
-                        "IdProducto": 7,
-                        "NomProducto": "Archivadores de Palanca Tama??o Oficio",
-                        "CantSolicitada": 12,
-                        "GasUnitario": 25.0,
-                        "GasTotal": 300.0
-                    },
-                    {
-                        "IdProducto": 8,
-                        "NomProducto": "Calculadora Cient??fica Casio FX-570",
-                        "CantSolicitada": 2,
-                        "GasUnitario": 190.0,
-                        "GasTotal": 380.0
-                    }
-                ],
-                "FlujoAprobacion": {
-                    "JefeInmediato": "Rechazado",
-                    "GerenteAdministrativo": "No Procesado",
-                    "JefeServiciosMateriales": "No Procesado",
-                    "Almacen": "No Procesado"
-                }
-            }
-        ]
-        """
-        # FIN DEL C??DIGO DE RESPALDO
 
-        
     except Exception as e:
         import traceback
         error_detail = f"Error al obtener requisiciones: {str(e)}\n{traceback.format_exc()}"
@@ -2513,7 +2271,7 @@ async def api_todas_requisiciones(
 @router.get("/{cod}/detalle", summary="Detalle de requisici??n por c??digo")
 async def api_detalle_por_codigo(
     cod: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(get_current_user)
 ):
     cod = (cod or "").strip()
@@ -2542,7 +2300,7 @@ async def api_detalle_por_codigo(
             LIMIT 1
             """
         )
-        req = db.execute(q, {"cod": cod}).fetchone()
+        req = (await db.execute(q, {"cod": cod})).fetchone()
         if not req:
             raise HTTPException(status_code=404, detail="Requisici??n no encontrada")
 
@@ -2561,7 +2319,7 @@ async def api_detalle_por_codigo(
             ORDER BY p.nomproducto
             """
         )
-        prod_rows = db.execute(productos_q, {"id": req[0]}).fetchall()
+        prod_rows = (await db.execute(productos_q, {"id": req[0]})).fetchall()
         productos = [
             {
                 "nombre": r[1],
@@ -2594,12 +2352,12 @@ async def api_detalle_por_codigo(
 @router.get("/{cod}/aprobaciones", summary="Aprobaciones de requisici??n por c??digo")
 async def api_aprobaciones_por_codigo(
     cod: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(get_current_user)
 ):
     try:
         q_id = text("SELECT idrequisicion FROM requisiciones.requisiciones WHERE codrequisicion = :cod LIMIT 1")
-        id_row = db.execute(q_id, {"cod": cod}).first()
+        id_row = (await db.execute(q_id, {"cod": cod})).first()
         if not id_row:
             raise HTTPException(status_code=404, detail="Requisici??n no encontrada")
         idreq = id_row[0]
@@ -2617,7 +2375,7 @@ async def api_aprobaciones_por_codigo(
             ORDER BY a.fecaprobacion
             """
         )
-        rows = db.execute(q, {"id": idreq}).mappings().all()
+        rows = (await db.execute(q, {"id": idreq})).mappings().all()
         return rows
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error consultando aprobaciones: {str(e)}")
@@ -2628,12 +2386,12 @@ async def api_historial_por_codigo(
     cod: str,
     from_: str = None,
     to: str = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(get_current_user)
 ):
     try:
         q_id = text("SELECT idrequisicion FROM requisiciones.requisiciones WHERE codrequisicion = :cod LIMIT 1")
-        id_row = db.execute(q_id, {"cod": cod}).first()
+        id_row = (await db.execute(q_id, {"cod": cod})).first()
         if not id_row:
             raise HTTPException(status_code=404, detail="Requisici??n no encontrada")
         idreq = id_row[0]
@@ -2657,14 +2415,14 @@ async def api_historial_por_codigo(
         if filtros:
             base += " AND " + " AND ".join(filtros)
         base += " ORDER BY n.fechacreacion"
-        rows = db.execute(text(base), params).mappings().all()
+        rows = (await db.execute(text(base), params)).mappings().all()
         return rows
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error consultando historial: {str(e)}")
 
 
 @router.get("/{cod}/pdf", summary="Generar PDF por c??digo")
-async def api_pdf_por_codigo(
+def api_pdf_por_codigo(
     cod: str,
     from_: str = None,
     to: str = None,
@@ -2678,7 +2436,7 @@ async def api_pdf_por_codigo(
             raise HTTPException(status_code=404, detail="Requisici??n no encontrada")
         idreq = id_row[0]
         # Generar PDF aplicando opcionalmente el rango de fechas en el timeline
-        return await api_generar_pdf_requisicion(str(idreq), db, current_user, from_=from_, to=to)
+        return api_generar_pdf_requisicion(str(idreq), db, current_user, from_=from_, to=to)
     except HTTPException:
         raise
     except Exception as e:
@@ -2690,7 +2448,7 @@ async def api_pdf_por_codigo(
 @router.get("/auditoria/timeline/{id_requisicion}", summary="Timeline de auditor??a de una requisici??n")
 async def obtener_timeline(
     id_requisicion: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(get_current_user)
 ):
     """
@@ -2701,7 +2459,7 @@ async def obtener_timeline(
     try:
         from app.repositories.requisiciones import obtener_timeline_requisicion
         
-        timeline = obtener_timeline_requisicion(db, id_requisicion)
+        timeline = await obtener_timeline_requisicion(db, id_requisicion)
         
         if not timeline:
             raise HTTPException(status_code=404, detail="No hay eventos registrados para esta requisici??n")
@@ -2720,7 +2478,7 @@ async def obtener_timeline(
 @router.get("/auditoria/tiempos/{id_requisicion}", summary="C??lculo de tiempos entre etapas")
 async def obtener_tiempos(
     id_requisicion: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(get_current_user)
 ):
     """
@@ -2736,7 +2494,7 @@ async def obtener_tiempos(
     try:
         from app.repositories.requisiciones import obtener_tiempos_requisicion
         
-        tiempos = obtener_tiempos_requisicion(db, id_requisicion)
+        tiempos = await obtener_tiempos_requisicion(db, id_requisicion)
         
         if not tiempos:
             raise HTTPException(status_code=404, detail="Requisici??n no encontrada")
@@ -2755,7 +2513,7 @@ async def obtener_tiempos(
 
 
 @router.post("/auditoria/registrar/{id_requisicion}", summary="Registrar evento de auditor??a")
-async def registrar_evento_auditoria(
+def registrar_evento_auditoria(
     id_requisicion: str,
     tipo_accion: str,
     descripcion: str = None,
@@ -2812,12 +2570,15 @@ async def api_listar_notificaciones(
     solo_no_leidas: bool = False,
     codigo: str = None,
     todas: bool = False,
-    db: Session = Depends(get_db),
+    limite: int = Query(200, ge=1, le=200),
+    before: Optional[str] = Query(None, description="Cursor <fechacreacion>,<idnotificacion> de la última fila recibida"),
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(get_current_user),
 ):
     """
     Endpoint proxy que devuelve notificaciones.
-    Filtrada por usuario actual a menos que sea admin y pida 'todas=true'
+    Filtrada por usuario actual a menos que sea admin y pida 'todas=true'.
+    Paginada por cursor: `siguiente` se pasa como `before` para la página siguiente.
     """
     email = (current_user or {}).get("sub") or (current_user or {}).get("email")
     if not email:
@@ -2826,46 +2587,23 @@ async def api_listar_notificaciones(
     # Verificar si es admin
     is_admin = "admin" in str((current_user or {}).get("rol") or "").lower()
     
-    filtros = []
-    params = {}
-    
-    # Filtrar por email del usuario actual, a menos que sea admin pidiendo todas
-    if not (todas and is_admin):
-        filtros.append("LOWER(n.emailusuario) = LOWER(:email)")
-        params["email"] = email
-    
-    # Filtrar por no leídas si aplica
-    if solo_no_leidas:
-        filtros.append("COALESCE(n.leida, FALSE) = FALSE")
-    
-    # Filtrar por código de requisición si se proporciona
-    if codigo:
-        filtros.append("LOWER(r.codrequisicion) LIKE LOWER(:codigo)")
-        params["codigo"] = f"%{codigo}%"
-    
-    query = (
-        "SELECT n.idnotificacion, n.tipo, n.mensaje, n.leida, n.fechacreacion, "
-        "n.emailusuario, n.estado_envio, n.medio, n.enviado_en, n.error_envio, "
-        "n.idrequisicion, COALESCE(r.codrequisicion, '') AS codrequisicion "
-        "FROM requisiciones.notificaciones n "
-        "LEFT JOIN requisiciones.requisiciones r ON r.idrequisicion = n.idrequisicion "
-    )
-    
-    if filtros:
-        query += " WHERE " + " AND ".join(filtros)
-    
-    query += " ORDER BY n.fechacreacion DESC LIMIT 200"
-    
-    rows = db.execute(text(query), params).mappings().all()
-    data = [dict(row) for row in rows]
-    total = len(data)
-    no_leidas = sum(1 for r in data if not r.get("leida"))
-    
-    return {"notificaciones": data, "total": total, "noLeidas": no_leidas}
+    try:
+        pagina = await listar_notificaciones(
+            db,
+            None if (todas and is_admin) else email,
+            solo_no_leidas=solo_no_leidas,
+            codigo=codigo,
+            limite=limite,
+            before=before,
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor 'before' inválido: se espera <fechacreacion>,<idnotificacion>")
+    pagina["noLeidas"] = await contar_no_leidas(db, email)
+    return pagina
 
 
 @router.put("/notificaciones/{id_notificacion}/marcar-leida", summary="Marca una notificación como leída")
-async def api_marcar_notif_leida(
+def api_marcar_notif_leida(
     id_notificacion: str,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user),
@@ -2899,7 +2637,7 @@ async def api_marcar_notif_leida(
 
 
 @router.put("/notificaciones/marcar-todas-leidas", summary="Marca todas las notificaciones como leídas")
-async def api_marcar_todas_leidas(
+def api_marcar_todas_leidas(
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user),
 ):
@@ -2923,67 +2661,25 @@ async def api_marcar_todas_leidas(
 
 
 @router.post("/notificaciones/enviar-pendientes", summary="Envía notificaciones pendientes (endpoint proxy)")
-async def api_enviar_notificaciones_pendientes(
+def api_enviar_notificaciones_pendientes(
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user),
 ):
-    """Endpoint proxy para enviar notificaciones pendientes"""
-    try:
-        # Obtener notificaciones pendientes de envío
-        pendientes = db.execute(
-            text(
-                """
-                SELECT idnotificacion, emailusuario, tipo, mensaje
-                FROM requisiciones.notificaciones
-                WHERE estado_envio IN ('PENDIENTE', 'ERROR')
-                LIMIT 50
-                """
-            )
-        ).fetchall()
-        
-        enviadas = 0
-        errores = 0
-        
-        for notif in pendientes:
-            try:
-                from app.core.mail import send_email
-                
-                # Enviar email
-                await send_email(
-                    to=notif.emailusuario,
-                    subject=f"Notificación: {notif.tipo}",
-                    body=notif.mensaje
-                )
-                
-                # Marcar como enviada
-                db.execute(
-                    text(
-                        """
-                        UPDATE requisiciones.notificaciones
-                        SET estado_envio = 'ENVIADO', enviado_en = NOW()
-                        WHERE idnotificacion = :id
-                        """
-                    ),
-                    {"id": str(notif.idnotificacion)}
-                )
-                enviadas += 1
-            except Exception as e:
-                errores += 1
-                db.execute(
-                    text(
-                        """
-                        UPDATE requisiciones.notificaciones
-                        SET estado_envio = 'ERROR', error_envio = :error
-                        WHERE idnotificacion = :id
-                        """
-                    ),
-                    {"id": str(notif.idnotificacion), "error": str(e)[:500]}
-                )
-        
-        db.commit()
-        return {"status": "ok", "enviadas": enviadas, "errores": errores}
-    except Exception as e:
-        return {"status": "error", "detail": str(e)}
+    """
+    Endpoint proxy: el envío lo hace el sender en background
+    (app/core/notificaciones_envio.py) con reintentos y backoff; aquí solo se
+    informa cuántas notificaciones están vencidas para envío.
+    """
+    vencidas = db.execute(
+        text(
+            """
+            SELECT COUNT(*)
+            FROM requisiciones.notificaciones
+            WHERE proximo_intento <= NOW()
+            """
+        )
+    ).scalar_one()
+    return {"status": "ok", "pendientes": int(vencidas), "detalle": "Worker en background manejando el envío"}
 
 
 # ====================================
@@ -2991,7 +2687,7 @@ async def api_enviar_notificaciones_pendientes(
 # ====================================
 
 @router.post("/{id_requisicion}/finalizar", summary="Finalizar requisición (EmpAlmacen)")
-async def api_finalizar_requisicion(
+def api_finalizar_requisicion(
     id_requisicion: str,
     observaciones: str = None,
     db: Session = Depends(get_db),
@@ -3168,7 +2864,7 @@ async def api_finalizar_requisicion(
                 (emailusuario, tipo, mensaje, idrequisicion, leida, fechacreacion, estado_envio, medio)
                 VALUES 
                 (:email, 'requisicion_completada', :mensaje, CAST(:id_req AS UUID), FALSE, 
-                 CURRENT_TIMESTAMP, 'PENDIENTE', 'EMAIL_Y_SISTEMA')
+                 CURRENT_TIMESTAMP, 'pendiente', 'EMAIL_Y_SISTEMA')
             """),
             {
                 "email": email_solicitante,
@@ -3177,156 +2873,47 @@ async def api_finalizar_requisicion(
             }
         )
         
-        # Enviar correo al solicitante con PDF adjunto
-        estado_correo = "enviado"
+        # Encolar correo al solicitante con PDF adjunto (se envía tras el commit)
+        estado_correo = "encolado"
         error_correo = None
         
         try:
-            from app.core.mail import send_email
-            from io import BytesIO
-            
-            # Cargar logo para email
-            inline_images = {}
-            try:
-                logo_path = os.path.abspath(os.path.join(
-                    os.path.dirname(__file__), "..", "frontend", "Imagen", "LogoSedhEscudo.png"
-                ))
-                with open(logo_path, "rb") as f:
-                    inline_images["logo_sedh"] = f.read()
-            except Exception:
-                pass
-            
             asunto = f"Requisición Completada: {cod_req}"
             
-            cuerpo_text = f"""
-SEDH Sistema de Almacén
-
-Estimado/a {nombre_solicitante},
-
-Tu requisición {cod_req} ha sido completada exitosamente.
-
-Detalles:
-- Código: {cod_req}
-- Número de Proceso: {numero_historial}
-- Total: Bs. {float(gasto_total or 0):.2f}
-- Productos: {len(productos_pdf)}
-- Fecha de Finalización: {datetime.now().strftime('%d/%m/%Y %H:%M')}
-- Completado por: {current_user.get("nombre", email)}
-
-Observaciones: {observaciones or "Sin observaciones"}
-
-El documento PDF con todos los detalles se encuentra adjunto a este correo.
-
-Para ver más detalles, accede a: http://192.168.180.164:8081/historial?cod={cod_req}&tab=aprobaciones
+            cuerpo_text, cuerpo_html = correo_requisicion_completada(
+                cod_req,
+                nombre_solicitante,
+                numero_historial,
+                gasto_total,
+                len(productos_pdf),
+                current_user.get("nombre", email),
+                observaciones,
+            )
 
----
-Este correo se generó automáticamente. No responder.
-Sistema de Almacén SEDH
-            """
-            
-            cuerpo_html = f"""
-<div style='font-family:Segoe UI, Tahoma, sans-serif; color:#103b37;'>
-  <div style='display:flex;align-items:center;gap:12px;margin-bottom:16px;'>
-    <img src="cid:logo_sedh" alt="SEDH" style="height:60px;">
-    <div>
-      <div style='font-weight:600;font-size:18px;'>Secretaría de Derechos Humanos - Sistema de Almacén</div>
-      <div style='font-size:12px;opacity:0.8;'>Notificación de Requisición Completada</div>
-    </div>
-  </div>
-  
-  <div style='background:#f8f9fa;border:1px solid #e0e0e0;border-radius:8px;padding:16px;margin-bottom:16px;'>
-    <div style='font-size:16px;margin-bottom:12px;color:#155e75;font-weight:600;'>Requisición Completada</div>
-    
-    <div style='margin-bottom:12px;'>
-      <strong>Estimado/a {nombre_solicitante},</strong>
-    </div>
-    
-    <div style='background:white;border-left:4px solid #0f766e;padding:12px;margin-bottom:12px;'>
-      <p style='margin:0;'>Tu requisición ha sido <strong>completada exitosamente</strong>.</p>
-      <p style='margin:8px 0 0 0;'>Todos los productos fueron procesados y entregados.</p>
-    </div>
-    
-    <div style='background:white;border:1px solid #e5e7eb;border-radius:6px;padding:12px;margin-bottom:12px;'>
-      <table style='width:100%;font-size:14px;'>
-        <tr style='border-bottom:1px solid #f3f4f6;'>
-          <td style='padding:8px 0;'><strong>Código Requisición:</strong></td>
-          <td style='padding:8px 0;color:#0f766e;'>{cod_req}</td>
-        </tr>
-        <tr style='border-bottom:1px solid #f3f4f6;'>
-          <td style='padding:8px 0;'><strong>Número de Proceso:</strong></td>
-          <td style='padding:8px 0;color:#0f766e;'>{numero_historial}</td>
-        </tr>
-        <tr style='border-bottom:1px solid #f3f4f6;'>
-          <td style='padding:8px 0;'><strong>Total del Pedido:</strong></td>
-          <td style='padding:8px 0;'>Bs. {float(gasto_total or 0):.2f}</td>
-        </tr>
-        <tr style='border-bottom:1px solid #f3f4f6;'>
-          <td style='padding:8px 0;'><strong>Cantidad de Productos:</strong></td>
-          <td style='padding:8px 0;'>{len(productos_pdf)} artículos</td>
-        </tr>
-        <tr style='border-bottom:1px solid #f3f4f6;'>
-          <td style='padding:8px 0;'><strong>Fecha de Finalización:</strong></td>
-          <td style='padding:8px 0;'>{datetime.now().strftime('%d/%m/%Y %H:%M')}</td>
-        </tr>
-        <tr>
-          <td style='padding:8px 0;'><strong>Completado por:</strong></td>
-          <td style='padding:8px 0;'>{current_user.get("nombre", email)}</td>
-        </tr>
-      </table>
-    </div>
-    
-    {f'<div style="background:#fffbeb;border:1px solid #fcd34d;border-radius:6px;padding:12px;margin-bottom:12px;"><strong>Observaciones:</strong><br>{observaciones}</div>' if observaciones else ''}
-    
-    <div style='margin-bottom:12px;'>
-      <a href="http://192.168.180.164:8081/historial?cod={cod_req}&tab=aprobaciones" 
-         style='display:inline-block;background:#0f766e;color:white;text-decoration:none;padding:10px 16px;border-radius:6px;'>
-        Ver Detalles Completos
-      </a>
-    </div>
-  </div>
-  
-  <div style='font-size:12px;color:#6c757d;'>
-    <p>El documento PDF con todos los detalles de la requisición se encuentra adjunto.</p>
-    <p>Generado el {datetime.now().strftime('%d/%m/%Y a las %H:%M')} - Sistema de Almacén SEDH</p>
-    <p>Este correo se generó automáticamente. No responder.</p>
-  </div>
-</div>
-            """
-            
             # Adjuntar PDF
             attachments = [(f"Requisicion_{cod_req}_Completada.pdf", pdf_bytes, "application/pdf")]
             
-            estado_correo, error_correo = send_email(
-                email_solicitante or email,
-                asunto,
-                cuerpo_text,
-                body_html=cuerpo_html,
-                attachments=attachments,
-                inline_images=inline_images
-            )
-            
-            # Registrar en log de correos
-            registrar_email_log(
+            encolar_correo(
+                db,
                 email_solicitante or email,
                 asunto,
                 cuerpo_text,
-                estado_correo,
-                error_correo,
-                id_requisicion,
-                db
+                cuerpo_html=cuerpo_html,
+                adjuntos=attachments,
+                incluir_logo=True,
+                idrequisicion=id_requisicion,
             )
-            
-            print(f"Correo de finalización enviado a {email_solicitante or email}: {estado_correo}")
         
         except Exception as e:
             estado_correo = "error"
             error_correo = str(e)
-            print(f"ERROR al enviar correo de finalización: {e}")
+            print(f"ERROR al encolar correo de finalización: {e}")
             import traceback
             traceback.print_exc()
         
         # Confirmar cambios
         db.commit()
+        despertar_outbox()
         
         return {
             "status": "success",
@@ -3336,7 +2923,8 @@ Sistema de Almacén SEDH
             "total": float(gasto_total or 0),
             "productos": len(productos_pdf),
             "notificacion_enviada": True,
-            "correo_enviado": estado_correo == "enviado",
+            "correo_enviado": False,
+            "correo_encolado": estado_correo == "encolado",
             "correo_destino": email_solicitante or email,
             "error_correo": error_correo,
             "fecha_finalizacion": datetime.now().isoformat(),
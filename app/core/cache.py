@@ -0,0 +1,225 @@
+"""
+Cachés en memoria por proceso con invalidación entre workers (LISTEN/NOTIFY).
+
+Cada proceso de uvicorn tiene sus propias cachés (CacheLocal); una escritura que
+atiende un worker dejaría viejas las de los demás. Para evitarlo quien escribe
+llama publicar_invalidacion(db, namespace, clave) dentro de su transacción: hace
+pg_notify('cache_invalidacion') y PostgreSQL entrega el aviso a todos los
+procesos solo si la transacción confirma. Un hilo por proceso mantiene el LISTEN
+(psycopg 3, fuera del pool) y borra la clave (o todo el namespace si clave es
+None) de las cachés registradas con ese namespace.
+
+Las cachés solo responden mientras el LISTEN está activo: sin él podrían perderse
+avisos, así que se consulta la base como si no hubiera caché. Al (re)conectar se
+vacían todas. Con eso los TTL pueden ser largos; el TTL queda como respaldo para
+escrituras hechas fuera de la aplicación.
+"""
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import psycopg
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+
+CANAL = "cache_invalidacion"
+
+SQL_PUBLICAR = "SELECT pg_notify('cache_invalidacion', :aviso)"
+
+_CACHES: Dict[str, List["CacheLocal"]] = {}
+_registro_lock = threading.Lock()
+
+
+class CacheLocal:
+    """Diccionario con TTL de un proceso, invalidado por namespace/clave desde el bus."""
+
+    def __init__(self, nombre: str, namespace: str, ttl_sec: float, max_entradas: int = 1000):
+        self.nombre = nombre
+        self.namespace = namespace
+        self.ttl_sec = ttl_sec
+        self.max_entradas = max_entradas
+        self._datos: Dict[Any, tuple] = {}
+        self._lock = threading.Lock()
+        # Sube con cada invalidación: una carga que empezó antes no se guarda
+        self._version = 0
+        self.aciertos = 0
+        self.fallos = 0
+        self.invalidaciones = 0
+        with _registro_lock:
+            _CACHES.setdefault(namespace, []).append(self)
+
+    def version(self) -> int:
+        return self._version
+
+    def obtener(self, clave: Any) -> Optional[Any]:
+        if not bus_cache.conectado:
+            return None
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is not None and entrada[0] > time.monotonic():
+                self.aciertos += 1
+                return entrada[1]
+            if entrada is not None:
+                del self._datos[clave]
+            self.fallos += 1
+            return None
+
+    def guardar(self, clave: Any, valor: Any, version: int) -> None:
+        """Guarda `valor` si no hubo invalidaciones desde `version` (tomada antes de cargarlo)."""
+        if valor is None or not bus_cache.conectado:
+            return
+        with self._lock:
+            if version != self._version:
+                return
+            if len(self._datos) >= self.max_entradas and clave not in self._datos:
+                # Se descarta la entrada más antigua
+                self._datos.pop(next(iter(self._datos)))
+            self._datos[clave] = (time.monotonic() + self.ttl_sec, valor)
+
+    def obtener_o_cargar(self, clave: Any, cargar: Callable[[], Any]) -> Any:
+        valor = self.obtener(clave)
+        if valor is not None:
+            return valor
+        version = self._version
+        valor = cargar()
+        self.guardar(clave, valor, version)
+        return valor
+
+    def invalidar(self, clave: Any = None) -> None:
+        with self._lock:
+            self._version += 1
+            self.invalidaciones += 1
+            if clave is None:
+                self._datos.clear()
+            else:
+                self._datos.pop(clave, None)
+
+    def estado(self) -> Dict[str, Any]:
+        return {
+            "nombre": self.nombre,
+            "namespace": self.namespace,
+            "ttlSec": self.ttl_sec,
+            "entradas": len(self._datos),
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "invalidaciones": self.invalidaciones,
+        }
+
+
+def invalidar_local(namespace: str, clave: Any = None) -> None:
+    for cache in _CACHES.get(namespace, ()):
+        cache.invalidar(clave)
+
+
+def _vaciar_todo() -> None:
+    for caches in list(_CACHES.values()):
+        for cache in caches:
+            cache.invalidar()
+
+
+def _aviso(namespace: str, clave: Any) -> Dict[str, Any]:
+    return {"aviso": json.dumps({"ns": namespace, "clave": clave}, default=str)}
+
+
+def publicar_invalidacion(db: Session, namespace: str, clave: Any = None) -> None:
+    """
+    Invalida `namespace`/`clave` en todos los procesos cuando `db` confirme (no hace commit).
+    También borra la entrada local de inmediato, para que este proceso no la use
+    mientras llega el aviso.
+    """
+    db.execute(text(SQL_PUBLICAR), _aviso(namespace, clave))
+    invalidar_local(namespace, clave)
+
+
+async def publicar_invalidacion_async(db: AsyncSession, namespace: str, clave: Any = None) -> None:
+    """publicar_invalidacion() para sesiones asíncronas."""
+    await db.execute(text(SQL_PUBLICAR), _aviso(namespace, clave))
+    invalidar_local(namespace, clave)
+
+
+class BusCache:
+    """Hilo con el LISTEN de invalidaciones de este proceso."""
+
+    def __init__(self):
+        self._detener = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+        self.conectado = False
+        self.avisos_recibidos = 0
+        self.reconexiones = 0
+
+    def _aplicar(self, payload: str) -> None:
+        try:
+            aviso = json.loads(payload)
+        except ValueError:
+            return
+        if aviso.get("ns"):
+            invalidar_local(aviso["ns"], aviso.get("clave"))
+
+    def _escuchar(self) -> None:
+        espera = 1.0
+        while not self._detener.is_set():
+            try:
+                conexion = psycopg.connect(
+                    host=settings.DB_HOST,
+                    port=settings.DB_PORT,
+                    user=settings.DB_USER,
+                    password=settings.DB_PASSWORD,
+                    dbname=settings.DB_NAME,
+                    autocommit=True,
+                    application_name="almacen-cache",
+                    keepalives=1,
+                    keepalives_idle=30,
+                )
+            except Exception as e:
+                print(f"WARN: LISTEN {CANAL} no disponible, reintento en {espera:.0f}s: {e}")
+                self._detener.wait(espera)
+                espera = min(espera * 2, 60.0)
+                continue
+
+            try:
+                conexion.execute(f"LISTEN {CANAL}")
+                # Lo guardado antes del LISTEN pudo perder avisos
+                _vaciar_todo()
+                self.conectado = True
+                espera = 1.0
+                while not self._detener.is_set():
+                    # Con timeout para revisar _detener
+                    for aviso in conexion.notifies(timeout=settings.CACHE_BUS_TIMEOUT_SEC):
+                        self.avisos_recibidos += 1
+                        self._aplicar(aviso.payload)
+                    # Detecta la conexión caída aunque no lleguen avisos
+                    conexion.execute("SELECT 1")
+            except Exception as e:
+                print(f"WARN: Conexión LISTEN {CANAL} perdida: {e}")
+                self.reconexiones += 1
+                self._detener.wait(espera)
+            finally:
+                self.conectado = False
+                conexion.close()
+
+    def iniciar(self) -> None:
+        if not settings.CACHE_BUS_ENABLED:
+            return
+        if self._hilo is None or not self._hilo.is_alive():
+            self._detener.clear()
+            self._hilo = threading.Thread(target=self._escuchar, name="cache-invalidacion", daemon=True)
+            self._hilo.start()
+
+    def detener(self) -> None:
+        self._detener.set()
+        self.conectado = False
+
+    def estado(self) -> Dict[str, Any]:
+        return {
+            "conectado": self.conectado,
+            "avisosRecibidos": self.avisos_recibidos,
+            "reconexiones": self.reconexiones,
+            "caches": [c.estado() for caches in list(_CACHES.values()) for c in caches],
+        }
+
+
+bus_cache = BusCache()
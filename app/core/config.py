@@ -13,12 +13,99 @@ class Settings(BaseSettings):
     DB_PASSWORD: str
     DB_NAME: str
     ENV: str = "dev"
+
+    # Pool de conexiones (app/core/database.py)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: int = 30               # segundos esperando una conexión libre
+    DB_POOL_RECYCLE: int = 1800             # segundos; -1 desactiva el reciclaje
+    DB_POOL_PRE_PING: str = "checkout"      # checkout | background | none
+    DB_POOL_LIVENESS_INTERVAL_SEC: int = 30 # usado con DB_POOL_PRE_PING=background
     
     # Configuración SMTP
     SMTP_SERVER: str = "smtp.gmail.com"
     SMTP_PORT: int = 587
     SMTP_USERNAME: str = ""
     SMTP_PASSWORD: str = ""
+    SMTP_STARTTLS: bool = True              # false para un servidor local de pruebas sin TLS
+    SMTP_TIMEOUT_SEC: int = 15              # connect y cada operación del socket
+    SMTP_POOL_SIZE: int = 2                 # sesiones autenticadas simultáneas
+    SMTP_MAX_MENSAJES_POR_SESION: int = 100 # después se abre una sesión nueva
+    SMTP_SESION_MAX_SEC: int = 600          # vida máxima de una sesión
+    SMTP_SESION_OCIOSA_SEC: int = 30        # ociosa más que esto: NOOP antes de reutilizar
+    SMTP_CIRCUITO_UMBRAL: int = 5           # fallos de conexión seguidos que abren el circuito
+    SMTP_CIRCUITO_ESPERA_SEC: int = 60      # tiempo abierto antes del envío de prueba
+    FRONTEND_URL: str = "http://192.168.180.164:8081"  # base de los enlaces en los correos
+
+    # Envío de notificaciones por correo (app/core/notificaciones_envio.py)
+    NOTIF_SENDER_ENABLED: bool = False
+    NOTIF_SENDER_INTERVAL_SEC: int = 120    # espera entre lotes cuando no hay más pendientes
+    NOTIF_SENDER_LOTE: int = 100            # filas reservadas por lote
+    NOTIF_SENDER_LEASE_SEC: int = 300       # vencimiento de la reserva si el worker muere
+    NOTIF_SENDER_CONCURRENCIA: int = 2      # tramos enviados en paralelo (≤ SMTP_POOL_SIZE)
+    NOTIF_MAX_INTENTOS: int = 6             # después queda en estado 'fallido'
+    NOTIF_BACKOFF_BASE_SEC: int = 60        # espera tras el primer fallo; se duplica en cada uno
+    NOTIF_BACKOFF_MAX_SEC: int = 3600
+
+    # Avisos en tiempo real por SSE (app/core/pg_listen.py, migrations/notificaciones_stream.sql)
+    NOTIF_STREAM_KEEPALIVE_SEC: int = 25    # comentario SSE para que proxies no corten la conexión
+    NOTIF_STREAM_TICKET_SEC: int = 60       # vigencia del ticket de /notificaciones/stream
+    NOTIF_STREAM_COLA: int = 100            # eventos pendientes por cliente antes de resincronizar
+
+    # Cachés por proceso con invalidación entre workers (app/core/cache.py)
+    CACHE_BUS_ENABLED: bool = True          # false: sin LISTEN las cachés no responden (siempre van a la base)
+    CACHE_BUS_TIMEOUT_SEC: int = 30         # espera de avisos antes de comprobar la conexión
+    CACHE_PERMISOS_TTL_SEC: int = 600       # rol de administrador y módulos por usuario
+    CACHE_CATALOGO_TTL_SEC: int = 3600      # snapshot de GET /productos/ (se invalida al cambiar el catálogo)
+
+    # Imágenes de categorías (app/core/imagenes.py)
+    CATEGORIA_MINIATURA_PX: int = 256       # lado máximo de la miniatura
+
+    # Reenvío en lote de correos con error (app/core/reenvio_correos.py)
+    REENVIO_CONCURRENCIA: int = 2           # hilos de envío (se limita a SMTP_POOL_SIZE)
+    REENVIO_MAX_CORREOS: int = 2000         # tope por trabajo
+    REENVIO_PROGRESO_CADA: int = 25         # correos entre actualizaciones del progreso
+
+    # Trabajos en segundo plano (app/worker.py, migrations/worker.sql)
+    TAREAS_EN_API: bool = True              # false: los hilos de fondo solo corren en `python -m app.worker`
+    WORKER_DB_POOL_SIZE: int = 3
+    WORKER_TICK_SEC: float = 1.0            # espera entre vueltas del bucle del worker
+    WORKER_HEARTBEAT_SEC: int = 15
+    WORKER_LEASE_SEC: int = 600             # reserva de un trabajo de la cola
+    WORKER_MAX_INTENTOS: int = 3
+
+    # Scheduler de tareas periódicas (app/core/scheduler.py)
+    SCHEDULER_TICK_SEC: float = 1.0         # espera entre vueltas en modo TAREAS_EN_API
+    SCHEDULER_JITTER: float = 0.1           # ±10% sobre el intervalo de cada tarea
+
+    # Retención (tarea "retencion" en app/core/mantenimiento.py)
+    RETENCION_INTERVALO_SEC: int = 3600
+    RETENCION_DIAS_OUTBOX: int = 30         # correos ya enviados en email_outbox
+    RETENCION_DIAS_TRABAJOS: int = 30       # trabajos terminados en cola_trabajos
+    RETENCION_DIAS_LATIDOS: int = 7         # workers sin latido
+
+    # Monitor del event loop (app/core/monitor.py)
+    MONITOR_ENABLED: bool = True
+    MONITOR_HEARTBEAT_MS: int = 50          # intervalo del heartbeat
+    MONITOR_STALL_UMBRAL_MS: int = 100      # retraso del loop considerado stall
+    MONITOR_LOG_BLOQUEO_MS: int = 200       # loguear peticiones con más bloqueo síncrono que esto
+
+    # Contador de consultas SQL por petición (app/core/sql_monitor.py)
+    SQL_MONITOR_ENABLED: bool = True
+    SQL_N1_UMBRAL: int = 5                  # repeticiones de una misma sentencia para marcar N+1
+
+    # Bandeja de aprobación (migrations/bandeja_aprobacion.sql)
+    # Activar antes los triggers: python -m app.repositories.bandeja activar
+    BANDEJA_APROBACION_ENABLED: bool = False  # leer pendientes desde requisiciones.bandeja_aprobacion
+
+    # Bandeja de salida de correos (app/core/outbox.py, migrations/email_outbox.sql)
+    OUTBOX_ENABLED: bool = True             # tarea "outbox" que drena requisiciones.email_outbox
+    OUTBOX_INTERVALO_SEC: int = 10          # espera máxima entre drenados si nadie lo despierta
+    OUTBOX_LOTE: int = 20                   # correos por pasada
+    OUTBOX_MAX_INTENTOS: int = 3            # después queda en estado 'error'
+    OUTBOX_LEASE_SEC: int = 120             # vencimiento de la reserva si el worker muere
+    OUTBOX_BACKOFF_BASE_SEC: int = 30       # espera tras el primer fallo; se duplica en cada uno
+    OUTBOX_BACKOFF_MAX_SEC: int = 1800
 
     @property
     def SQLALCHEMY_DATABASE_URI(self) -> str:
@@ -26,6 +113,12 @@ class Settings(BaseSettings):
         return (f"postgresql+psycopg2://{self.DB_USER}:{self.DB_PASSWORD}"
                 f"@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}")
 
+    @property
+    def SQLALCHEMY_ASYNC_DATABASE_URI(self) -> str:
+        # psycopg 3 soporta asyncio de forma nativa (usado por AsyncEngine)
+        return (f"postgresql+psycopg://{self.DB_USER}:{self.DB_PASSWORD}"
+                f"@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}")
+
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -1,19 +1,228 @@
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import DisconnectionError, TimeoutError as PoolTimeoutError
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from app.core.config import settings
+from threading import Lock, Thread
+import logging
+import time
 import traceback
 
+logger = logging.getLogger(__name__)
+
 class Base(DeclarativeBase):
     pass
 
-engine = create_engine(
-    settings.SQLALCHEMY_DATABASE_URI,  # ajusta a tu variable actual
-    echo=False,                        # asegura que NO haya echo
-    pool_pre_ping=True,
-    future=True,
-)
+# ================================
+# Estadísticas del pool de conexiones
+# ================================
+
+# Límites superiores (ms) del histograma de espera por una conexión
+_BUCKETS_ESPERA_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+_stats_lock = Lock()
+_stats_pool = {}
+
+
+def _stats(nombre: str) -> dict:
+    stats = _stats_pool.get(nombre)
+    if stats is None:
+        stats = {
+            "esperas": 0,
+            "espera_total_ms": 0.0,
+            "espera_max_ms": 0.0,
+            "histograma": [0] * (len(_BUCKETS_ESPERA_MS) + 1),
+            "timeouts": 0,
+            "pre_ping_fallos": 0,
+            "liveness_fallos": 0,
+        }
+        _stats_pool[nombre] = stats
+    return stats
+
+
+def _registrar_espera(nombre: str, ms: float, timeout: bool = False) -> None:
+    with _stats_lock:
+        stats = _stats(nombre)
+        stats["esperas"] += 1
+        stats["espera_total_ms"] += ms
+        stats["espera_max_ms"] = max(stats["espera_max_ms"], ms)
+        idx = next((i for i, limite in enumerate(_BUCKETS_ESPERA_MS) if ms <= limite), len(_BUCKETS_ESPERA_MS))
+        stats["histograma"][idx] += 1
+        if timeout:
+            stats["timeouts"] += 1
+
+
+def _contar_fallo(nombre: str, campo: str) -> None:
+    with _stats_lock:
+        _stats(nombre)[campo] += 1
+
+
+class _EsperaMedidaMixin:
+    """Mide cuánto tarda cada checkout en obtener una conexión (cola + conexión nueva)."""
+    nombre_stats = "sync"
+
+    def _do_get(self):
+        inicio = time.perf_counter()
+        timeout = False
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            timeout = True
+            raise
+        finally:
+            _registrar_espera(self.nombre_stats, (time.perf_counter() - inicio) * 1000, timeout)
+
+
+class PoolMedido(_EsperaMedidaMixin, QueuePool):
+    nombre_stats = "sync"
+
+
+class PoolMedidoAsync(_EsperaMedidaMixin, AsyncAdaptedQueuePool):
+    nombre_stats = "async"
+
+
+def _opciones_pool() -> dict:
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        # El pre-ping lo hace el listener de checkout (cuenta fallos) o el hilo de liveness
+        "pool_pre_ping": False,
+    }
+
+
+def _instalar_pre_ping(engine, nombre: str) -> None:
+    """Pre-ping por checkout: SELECT 1 y, si falla, DisconnectionError para que el pool reconecte."""
+
+    @event.listens_for(engine, "checkout")
+    def _ping(dbapi_connection, connection_record, connection_proxy):
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute("SELECT 1")
+        except Exception as e:
+            _contar_fallo(nombre, "pre_ping_fallos")
+            logger.warning(f"Pre-ping falló en pool {nombre}, reconectando: {e}")
+            raise DisconnectionError() from e
+        finally:
+            try:
+                cursor.close()
+            except Exception:
+                pass
+
+
+def crear_engine(**opciones):
+    """
+    Engine síncrono con el pool medido y el pre-ping de DB_POOL_PRE_PING.
+    `opciones` reemplaza las de _opciones_pool() (p. ej. el tamaño en el worker).
+    """
+    nuevo = create_engine(
+        settings.SQLALCHEMY_DATABASE_URI,  # ajusta a tu variable actual
+        echo=False,                        # asegura que NO haya echo
+        poolclass=PoolMedido,
+        future=True,
+        **{**_opciones_pool(), **opciones},
+    )
+    if settings.DB_POOL_PRE_PING == "checkout":
+        _instalar_pre_ping(nuevo, "sync")
+    return nuevo
+
+
+engine = crear_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Motor asíncrono (psycopg 3) para los handlers `async def`: las consultas
+# ceden el event loop mientras esperan a PostgreSQL en lugar de bloquearlo.
+async_engine = create_async_engine(
+    settings.SQLALCHEMY_ASYNC_DATABASE_URI,
+    echo=False,
+    poolclass=PoolMedidoAsync,
+    **_opciones_pool(),
+)
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
+if settings.DB_POOL_PRE_PING == "checkout":
+    _instalar_pre_ping(async_engine.sync_engine, "async")
+
+
+# ================================
+# Verificación de liveness en background
+# ================================
+
+_liveness_thread = None
+
+
+def _liveness_loop():
+    """
+    Alternativa al pre-ping por checkout: cada N segundos se prueba una conexión.
+    Si la base de datos no responde, se descartan los pools para que las siguientes
+    peticiones abran conexiones nuevas. DB_POOL_RECYCLE acota la edad de las conexiones.
+    """
+    intervalo = settings.DB_POOL_LIVENESS_INTERVAL_SEC
+    while True:
+        time.sleep(intervalo)
+        try:
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+        except Exception as e:
+            _contar_fallo("sync", "liveness_fallos")
+            logger.warning(f"Liveness del pool falló, descartando conexiones: {e}")
+            try:
+                engine.dispose()
+                # close=False: las conexiones async no pueden cerrarse desde este hilo
+                async_engine.sync_engine.dispose(close=False)
+            except Exception:
+                pass
+
+
+def iniciar_verificacion_pool():
+    """Arranca el hilo de liveness si DB_POOL_PRE_PING=background."""
+    global _liveness_thread
+    if settings.DB_POOL_PRE_PING != "background":
+        return
+    if _liveness_thread is None or not _liveness_thread.is_alive():
+        _liveness_thread = Thread(target=_liveness_loop, daemon=True, name="db-pool-liveness")
+        _liveness_thread.start()
+
+
+def estadisticas_pool() -> dict:
+    """Estado actual y métricas acumuladas de los pools sync y async."""
+    resultado = {
+        "configuracion": {
+            "pool_size": settings.DB_POOL_SIZE,
+            "max_overflow": settings.DB_MAX_OVERFLOW,
+            "pool_timeout": settings.DB_POOL_TIMEOUT,
+            "pool_recycle": settings.DB_POOL_RECYCLE,
+            "pre_ping": settings.DB_POOL_PRE_PING,
+        },
+        "pools": {},
+    }
+    for nombre, pool in (("sync", engine.pool), ("async", async_engine.sync_engine.pool)):
+        with _stats_lock:
+            stats = dict(_stats(nombre))
+            stats["histograma"] = list(stats["histograma"])
+        etiquetas = [f"<={b}ms" for b in _BUCKETS_ESPERA_MS] + [f">{_BUCKETS_ESPERA_MS[-1]}ms"]
+        resultado["pools"][nombre] = {
+            "tamano": pool.size(),
+            "en_uso": pool.checkedout(),
+            "disponibles": pool.checkedin(),
+            "overflow": pool.overflow(),
+            "esperas": stats["esperas"],
+            "espera_promedio_ms": round(stats["espera_total_ms"] / stats["esperas"], 2) if stats["esperas"] else 0.0,
+            "espera_max_ms": round(stats["espera_max_ms"], 2),
+            "histograma_espera": dict(zip(etiquetas, stats["histograma"])),
+            "timeouts": stats["timeouts"],
+            "pre_ping_fallos": stats["pre_ping_fallos"],
+            "liveness_fallos": stats["liveness_fallos"],
+        }
+    return resultado
+
 def get_db():
     db = SessionLocal()
     try:
@@ -27,6 +236,15 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    """Dependencia equivalente a get_db pero con AsyncSession."""
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db
+        except Exception:
+            await db.rollback()
+            raise
+
 def test_db_connection():
     try:
         with engine.connect() as conn:
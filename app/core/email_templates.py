@@ -0,0 +1,300 @@
+"""
+Plantillas de los correos del sistema.
+
+Los diseños se compilan una vez al importar (string.Template) y cada correo se
+renderiza con un contexto pequeño; los valores se escapan para HTML. El logo se
+lee del disco una sola vez y mail.py guarda su parte MIME ya codificada, así que
+adjuntarlo no cuesta lectura ni base64 por correo.
+
+Cada función devuelve (texto, html) para send_email()/encolar_correo(); el HTML
+referencia el logo con <img src="cid:logo_sedh">, que se adjunta con imagenes_logo().
+"""
+import os
+from datetime import datetime
+from functools import lru_cache
+from html import escape
+from string import Template
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from app.core.config import settings
+
+LOGO_CID = "logo_sedh"
+LOGO_PATH = os.path.abspath(os.path.join(
+    os.path.dirname(__file__), "..", "frontend", "Imagen", "LogoSedhEscudo.png"
+))
+
+
+@lru_cache(maxsize=1)
+def _logo() -> bytes:
+    try:
+        with open(LOGO_PATH, "rb") as f:
+            return f.read()
+    except OSError as e:
+        print(f"WARN: No se pudo leer el logo de los correos: {e}")
+        return b""
+
+
+def imagenes_logo() -> Dict[str, bytes]:
+    """inline_images de send_email() con el logo (vacío si el archivo no existe)."""
+    logo = _logo()
+    return {LOGO_CID: logo} if logo else {}
+
+
+# ================================
+# Diseño común
+# ================================
+
+_PAGINA = Template("""
+<div style='font-family:Segoe UI, Tahoma, sans-serif; color:#103b37;'>
+  <div style='display:flex;align-items:center;gap:12px;margin-bottom:16px;'>
+    <img src="cid:$cid" alt="SEDH" style="height:60px;">
+    <div>
+      <div style='font-weight:600;font-size:18px;'>Secretaría de Derechos Humanos - Sistema de Almacén</div>
+      <div style='font-size:12px;opacity:0.8;'>$subtitulo</div>
+    </div>
+  </div>
+  <div style='background:#f8f9fa;border:1px solid #e0e0e0;border-radius:8px;padding:16px;margin-bottom:12px;'>
+$contenido
+  </div>
+  <div style='font-size:12px;color:#6c757d;'>
+$pie
+  </div>
+</div>
+""")
+
+_PIE = "    <p>Este correo se genera automáticamente. No responder.</p>"
+
+_BOTON = Template(
+    "    <a href='$href' style='display:inline-block;background:#0f766e;color:white;"
+    "text-decoration:none;padding:10px 16px;border-radius:6px;margin-top:10px;'>$texto</a>"
+)
+
+_SALUDO = Template("    <div style='font-size:16px;margin-bottom:8px;'>Estimado/a $nombre,</div>")
+
+_FILA = Template(
+    "      <tr style='border-bottom:1px solid #f3f4f6;'>"
+    "<td style='padding:8px 0;'><strong>$etiqueta:</strong></td>"
+    "<td style='padding:8px 0;$estilo'>$valor</td></tr>"
+)
+
+
+def _pagina(subtitulo: str, contenido: str, pie: str = _PIE) -> str:
+    return _PAGINA.substitute(cid=LOGO_CID, subtitulo=subtitulo, contenido=contenido, pie=pie)
+
+
+def _saludo(nombre: Optional[str]) -> str:
+    return _SALUDO.substitute(nombre=escape(nombre)) if nombre else ""
+
+
+def _boton(href: str, texto: str) -> str:
+    return _BOTON.substitute(href=escape(href), texto=texto)
+
+
+def _filas(filas: Iterable[Tuple[str, Any, str]]) -> str:
+    return "\n".join(
+        _FILA.substitute(etiqueta=etiqueta, valor=escape(str(valor)), estilo=estilo)
+        for etiqueta, valor, estilo in filas
+    )
+
+
+def link_aprobacion(codrequisicion: Optional[str]) -> str:
+    return f"{settings.FRONTEND_URL}/requisiciones/aprobar/{codrequisicion or ''}"
+
+
+def link_historial(codrequisicion: Optional[str]) -> str:
+    return f"{settings.FRONTEND_URL}/historial?cod={codrequisicion or ''}&tab=aprobaciones"
+
+
+# ================================
+# Correos
+# ================================
+
+_APROBACION_TEXTO = Template(
+    "SEDH Almacén\n\n"
+    "Nueva requisición pendiente de aprobación.\n"
+    "${solicitante}Código: $codigo\n\n"
+    "Aprobar en: $link\n"
+)
+
+_APROBACION_HTML = Template("""$saludo
+    <div style='margin-bottom:12px;'>Tiene una nueva requisición pendiente de aprobación.</div>
+$solicitante    <div><strong>Código:</strong> $codigo</div>
+$boton""")
+
+
+def correo_aprobacion_jefe(
+    codrequisicion: Optional[str], solicitante: Optional[str], nombre_jefe: Optional[str] = None
+) -> Tuple[str, str]:
+    """Aviso al jefe de una requisición nueva pendiente de su aprobación."""
+    link = link_aprobacion(codrequisicion)
+    texto = _APROBACION_TEXTO.substitute(
+        solicitante=f"Solicitante: {solicitante}\n" if solicitante else "",
+        codigo=codrequisicion or "N/A",
+        link=link,
+    )
+    html = _pagina("Notificación automática del sistema", _APROBACION_HTML.substitute(
+        saludo=_saludo(nombre_jefe),
+        solicitante=f"    <div><strong>Solicitante:</strong> {escape(solicitante)}</div>\n" if solicitante else "",
+        codigo=escape(codrequisicion or "N/A"),
+        boton=_boton(link, "Revisar y aprobar"),
+    ))
+    return texto, html
+
+
+_CONFIRMACION_TEXTO = Template(
+    "SEDH Almacén\n\n"
+    "Tu requisición $codigo fue creada correctamente y enviada para aprobación.\n"
+    "Historial y aprobaciones: $link\n"
+)
+
+_CONFIRMACION_HTML = Template("""$saludo
+    <div style='margin-bottom:12px;'>Tu requisición $codigo fue creada correctamente y enviada para aprobación.</div>
+$boton""")
+
+
+def correo_confirmacion_solicitante(
+    codrequisicion: Optional[str], nombre: Optional[str] = None
+) -> Tuple[str, str]:
+    """Confirmación al solicitante de que su requisición se creó."""
+    link = link_historial(codrequisicion)
+    texto = _CONFIRMACION_TEXTO.substitute(codigo=codrequisicion or "", link=link)
+    html = _pagina("Confirmación de creación de requisición", _CONFIRMACION_HTML.substitute(
+        saludo=_saludo(nombre),
+        codigo=escape(codrequisicion or ""),
+        boton=_boton(link, "Ver historial y aprobaciones"),
+    ))
+    return texto, html
+
+
+_COMPLETADA_TEXTO = Template("""
+SEDH Sistema de Almacén
+
+Estimado/a $nombre,
+
+Tu requisición $codigo ha sido completada exitosamente.
+
+Detalles:
+- Código: $codigo
+- Número de Proceso: $proceso
+- Total: Bs. $total
+- Productos: $productos
+- Fecha de Finalización: $fecha
+- Completado por: $completado_por
+
+Observaciones: $observaciones
+
+El documento PDF con todos los detalles se encuentra adjunto a este correo.
+
+Para ver más detalles, accede a: $link
+
+---
+Este correo se generó automáticamente. No responder.
+Sistema de Almacén SEDH
+""")
+
+_COMPLETADA_HTML = Template("""    <div style='font-size:16px;margin-bottom:12px;color:#155e75;font-weight:600;'>Requisición Completada</div>
+    <div style='margin-bottom:12px;'><strong>Estimado/a $nombre,</strong></div>
+    <div style='background:white;border-left:4px solid #0f766e;padding:12px;margin-bottom:12px;'>
+      <p style='margin:0;'>Tu requisición ha sido <strong>completada exitosamente</strong>.</p>
+      <p style='margin:8px 0 0 0;'>Todos los productos fueron procesados y entregados.</p>
+    </div>
+    <div style='background:white;border:1px solid #e5e7eb;border-radius:6px;padding:12px;margin-bottom:12px;'>
+      <table style='width:100%;font-size:14px;'>
+$filas
+      </table>
+    </div>
+$observaciones
+$boton""")
+
+_OBSERVACIONES_HTML = Template(
+    "    <div style='background:#fffbeb;border:1px solid #fcd34d;border-radius:6px;padding:12px;"
+    "margin-bottom:12px;'><strong>Observaciones:</strong><br>$texto</div>"
+)
+
+_COMPLETADA_PIE = Template("""    <p>El documento PDF con todos los detalles de la requisición se encuentra adjunto.</p>
+    <p>Generado el $fecha - Sistema de Almacén SEDH</p>
+    <p>Este correo se generó automáticamente. No responder.</p>""")
+
+
+def correo_requisicion_completada(
+    codrequisicion: str,
+    nombre: Optional[str],
+    numero_proceso: Any,
+    total: float,
+    productos: int,
+    completado_por: Optional[str],
+    observaciones: Optional[str] = None,
+) -> Tuple[str, str]:
+    """Aviso al solicitante de que almacén finalizó su requisición (lleva el PDF adjunto)."""
+    ahora = datetime.now()
+    link = link_historial(codrequisicion)
+    total_fmt = f"{float(total or 0):.2f}"
+    texto = _COMPLETADA_TEXTO.substitute(
+        nombre=nombre or "",
+        codigo=codrequisicion,
+        proceso=numero_proceso,
+        total=total_fmt,
+        productos=productos,
+        fecha=ahora.strftime("%d/%m/%Y %H:%M"),
+        completado_por=completado_por or "",
+        observaciones=observaciones or "Sin observaciones",
+        link=link,
+    )
+    html = _pagina(
+        "Notificación de Requisición Completada",
+        _COMPLETADA_HTML.substitute(
+            nombre=escape(nombre or ""),
+            filas=_filas([
+                ("Código Requisición", codrequisicion, "color:#0f766e;"),
+                ("Número de Proceso", numero_proceso, "color:#0f766e;"),
+                ("Total del Pedido", f"Bs. {total_fmt}", ""),
+                ("Cantidad de Productos", f"{productos} artículos", ""),
+                ("Fecha de Finalización", ahora.strftime("%d/%m/%Y %H:%M"), ""),
+                ("Completado por", completado_por or "", ""),
+            ]),
+            observaciones=_OBSERVACIONES_HTML.substitute(texto=escape(observaciones)) if observaciones else "",
+            boton=_boton(link, "Ver Detalles Completos"),
+        ),
+        pie=_COMPLETADA_PIE.substitute(fecha=ahora.strftime("%d/%m/%Y a las %H:%M")),
+    )
+    return texto, html
+
+
+_RESUMEN_HTML = Template("""    <div style='font-weight:600;font-size:16px;margin-bottom:12px;'>Resumen de notificaciones ($cantidad)</div>
+    <table style='width:100%;font-size:14px;border-collapse:collapse;background:white;'>
+      <tr style='text-align:left;'>
+        <th style='padding:6px 8px;'>Fecha</th><th style='padding:6px 8px;'>Código</th>
+        <th style='padding:6px 8px;'>Acción</th><th style='padding:6px 8px;'>Detalle</th>
+      </tr>
+$filas
+    </table>""")
+
+_RESUMEN_FILA = Template(
+    "      <tr>"
+    "<td style='padding:6px 8px;border-bottom:1px solid #f3f4f6;'>$fecha</td>"
+    "<td style='padding:6px 8px;border-bottom:1px solid #f3f4f6;color:#0f766e;'>$codigo</td>"
+    "<td style='padding:6px 8px;border-bottom:1px solid #f3f4f6;'>$accion</td>"
+    "<td style='padding:6px 8px;border-bottom:1px solid #f3f4f6;'>$detalle</td>"
+    "</tr>"
+)
+
+
+def correo_resumen_notificaciones(filas: Iterable[Tuple[str, str, str, str]]) -> Tuple[str, str]:
+    """Resumen (digest) de notificaciones; cada fila es (fecha, código, acción, detalle)."""
+    filas = list(filas)
+    texto = (
+        "SEDH Almacén\n\n"
+        f"Resumen de {len(filas)} notificaciones:\n\n"
+        "Fecha | Código | Acción | Detalle\n"
+        + "\n".join(f"- {fecha} | {codigo} | {accion} | {detalle}" for fecha, codigo, accion, detalle in filas)
+    )
+    html = _pagina("Resumen de notificaciones", _RESUMEN_HTML.substitute(
+        cantidad=len(filas),
+        filas="\n".join(
+            _RESUMEN_FILA.substitute(
+                fecha=escape(fecha), codigo=escape(codigo), accion=escape(accion), detalle=escape(detalle),
+            )
+            for fecha, codigo, accion, detalle in filas
+        ),
+    ))
+    return texto, html
@@ -0,0 +1,67 @@
+"""
+Imágenes de categorías: tipo de contenido y miniaturas.
+
+Las miniaturas se generan con Pillow al crear o editar una categoría y se guardan
+en productos.categorias.imagen_miniatura (migrations/categorias_imagen.sql). Pillow
+es opcional: sin él no se generan y GET /categorias/{idcategoria}/imagen?miniatura=true
+devuelve la imagen original.
+"""
+import hashlib
+from io import BytesIO
+from typing import Optional
+
+from app.core.config import settings
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+    ImageOps = None
+
+_FIRMAS = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+
+
+def tipo_imagen(contenido: bytes) -> str:
+    for firma, tipo in _FIRMAS:
+        if contenido.startswith(firma):
+            return tipo
+    if contenido[:4] == b"RIFF" and contenido[8:12] == b"WEBP":
+        return "image/webp"
+    return "application/octet-stream"
+
+
+def hash_imagen(contenido: bytes) -> str:
+    """Igual que encode(sha256(imagen), 'hex') del trigger de la migración."""
+    return hashlib.sha256(contenido).hexdigest()
+
+
+def generar_miniatura(contenido: bytes) -> Optional[bytes]:
+    """
+    Miniatura de como máximo CATEGORIA_MINIATURA_PX de lado (PNG si tiene
+    transparencia, JPEG si no). None si falta Pillow, la imagen no se puede leer
+    o ya es pequeña.
+    """
+    if Image is None or not contenido:
+        return None
+    lado = settings.CATEGORIA_MINIATURA_PX
+    try:
+        with Image.open(BytesIO(contenido)) as original:
+            if original.width <= lado and original.height <= lado:
+                return None
+            imagen = ImageOps.exif_transpose(original)
+            imagen.thumbnail((lado, lado))
+            salida = BytesIO()
+            if imagen.mode in ("RGBA", "LA", "P"):
+                imagen.save(salida, format="PNG", optimize=True)
+            else:
+                imagen.convert("RGB").save(salida, format="JPEG", quality=80, optimize=True)
+    except Exception as e:
+        print(f"WARN: No se pudo generar la miniatura de la categoría: {e}")
+        return None
+    miniatura = salida.getvalue()
+    return miniatura if len(miniatura) < len(contenido) else None
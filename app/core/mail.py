@@ -1,32 +1,290 @@
 import smtplib
-from email.message import EmailMessage
-from email.utils import make_msgid
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from email.message import EmailMessage, MIMEPart
 from email.mime.base import MIMEBase
 from email import encoders
-from typing import Optional, Tuple
+from queue import Empty, LifoQueue
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 from app.core.config import settings
+from app.core.monitor import bloqueante
 
 
-def send_email(
+# ================================
+# Pool de sesiones SMTP
+# ================================
+#
+# Abrir una sesión cuesta connect + EHLO + STARTTLS + EHLO + LOGIN, varias idas y
+# vueltas con el servidor por cada correo. El pool conserva hasta SMTP_POOL_SIZE
+# sesiones autenticadas y las reutiliza; una sesión que falla se descarta y la
+# siguiente petición abre otra. Para pruebas locales basta un servidor de
+# depuración sin TLS (p. ej. `python -m aiosmtpd -n -l localhost:1025`) con
+# SMTP_PORT=1025, SMTP_STARTTLS=false y SMTP_PASSWORD vacío.
+
+class _SesionSMTP:
+    def __init__(self, conexion: smtplib.SMTP):
+        self.conexion = conexion
+        self.creada = time.monotonic()
+        self.ultimo_uso = self.creada
+        self.enviados = 0
+
+    def cerrar(self) -> None:
+        try:
+            self.conexion.quit()
+        except Exception:
+            try:
+                self.conexion.close()
+            except Exception:
+                pass
+
+
+# ================================
+# Circuit breaker
+# ================================
+#
+# Si el servidor no responde, cada envío esperaría SMTP_TIMEOUT_SEC ocupando un
+# hilo. Tras SMTP_CIRCUITO_UMBRAL fallos de conexión seguidos el circuito se abre
+# y los envíos fallan al instante con estado 'circuito_abierto' (queda así en
+# email_log). Pasados SMTP_CIRCUITO_ESPERA_SEC pasa a semiabierto: un único envío
+# de prueba decide si se cierra o vuelve a abrirse. Los rechazos del servidor a un
+# mensaje concreto (destinatario, remitente, datos) no cuentan como fallo.
+
+ESTADO_CIRCUITO_ABIERTO = "circuito_abierto"
+
+# El servidor respondió: el problema es del mensaje, no de la conexión
+_ERRORES_DE_MENSAJE = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)
+
+
+class CircuitoSMTP:
+    CERRADO = "cerrado"
+    ABIERTO = "abierto"
+    SEMIABIERTO = "semiabierto"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.estado = self.CERRADO
+        self.fallos_consecutivos = 0
+        self._abierto_desde = 0.0
+        self._sonda_en_curso = False
+        self.aperturas = 0
+        self.rechazados = 0
+        self.ultimo_error: Optional[str] = None
+
+    def permitir(self) -> bool:
+        """True si se puede intentar un envío (en semiabierto, solo la sonda)."""
+        with self._lock:
+            if self.estado == self.CERRADO:
+                return True
+            if self.estado == self.ABIERTO:
+                if time.monotonic() - self._abierto_desde < settings.SMTP_CIRCUITO_ESPERA_SEC:
+                    self.rechazados += 1
+                    return False
+                self.estado = self.SEMIABIERTO
+                self._sonda_en_curso = False
+            if self._sonda_en_curso:
+                self.rechazados += 1
+                return False
+            self._sonda_en_curso = True
+            return True
+
+    def abierto(self) -> bool:
+        """Consulta sin consumir la sonda: True mientras no conviene ni intentarlo."""
+        with self._lock:
+            return (self.estado == self.ABIERTO
+                    and time.monotonic() - self._abierto_desde < settings.SMTP_CIRCUITO_ESPERA_SEC)
+
+    def registrar_exito(self) -> None:
+        with self._lock:
+            if self.estado != self.CERRADO:
+                print("Circuito SMTP cerrado: el servidor vuelve a responder")
+            self.estado = self.CERRADO
+            self.fallos_consecutivos = 0
+            self._sonda_en_curso = False
+
+    def registrar_fallo(self, error: str) -> None:
+        with self._lock:
+            self.fallos_consecutivos += 1
+            self.ultimo_error = error
+            self._sonda_en_curso = False
+            if self.estado == self.SEMIABIERTO or self.fallos_consecutivos >= settings.SMTP_CIRCUITO_UMBRAL:
+                if self.estado != self.ABIERTO:
+                    self.aperturas += 1
+                    print(f"WARN: Circuito SMTP abierto tras {self.fallos_consecutivos} fallos: {error}")
+                self.estado = self.ABIERTO
+                self._abierto_desde = time.monotonic()
+
+    def resultado_rechazo(self) -> Tuple[str, Optional[str]]:
+        restante = max(0, settings.SMTP_CIRCUITO_ESPERA_SEC - (time.monotonic() - self._abierto_desde))
+        return ESTADO_CIRCUITO_ABIERTO, (
+            f"Circuito SMTP abierto (reintento en {restante:.0f}s): {self.ultimo_error}"
+        )
+
+    def resumen(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "estado": self.estado,
+                "fallosConsecutivos": self.fallos_consecutivos,
+                "aperturas": self.aperturas,
+                "rechazados": self.rechazados,
+                "ultimoError": self.ultimo_error,
+                "umbral": settings.SMTP_CIRCUITO_UMBRAL,
+                "esperaSec": settings.SMTP_CIRCUITO_ESPERA_SEC,
+            }
+
+
+circuito_smtp = CircuitoSMTP()
+
+
+class PoolSMTP:
+    """Pool acotado de sesiones SMTP autenticadas, seguro entre hilos."""
+
+    def __init__(self):
+        self._libres: "LifoQueue[_SesionSMTP]" = LifoQueue()
+        self._cupo = threading.BoundedSemaphore(max(1, settings.SMTP_POOL_SIZE))
+        self.conexiones_abiertas = 0
+        self.mensajes_enviados = 0
+
+    def _conectar(self) -> _SesionSMTP:
+        conexion = smtplib.SMTP(
+            settings.SMTP_SERVER, settings.SMTP_PORT, timeout=settings.SMTP_TIMEOUT_SEC
+        )
+        try:
+            conexion.ehlo()
+            if settings.SMTP_STARTTLS:
+                conexion.starttls()  # Gmail requiere TLS
+                conexion.ehlo()
+            if settings.SMTP_USERNAME and settings.SMTP_PASSWORD:
+                conexion.login(settings.SMTP_USERNAME, settings.SMTP_PASSWORD)
+        except Exception:
+            conexion.close()
+            raise
+        self.conexiones_abiertas += 1
+        return _SesionSMTP(conexion)
+
+    def _vigente(self, sesion: _SesionSMTP) -> bool:
+        """Descarta sesiones agotadas o viejas; las ociosas se comprueban con NOOP."""
+        if sesion.enviados >= settings.SMTP_MAX_MENSAJES_POR_SESION:
+            return False
+        if time.monotonic() - sesion.creada > settings.SMTP_SESION_MAX_SEC:
+            return False
+        if time.monotonic() - sesion.ultimo_uso > settings.SMTP_SESION_OCIOSA_SEC:
+            try:
+                return sesion.conexion.noop()[0] == 250
+            except Exception:
+                return False
+        return True
+
+    @contextmanager
+    def sesion(self) -> Iterator[_SesionSMTP]:
+        """
+        Presta una sesión del pool (o abre una nueva). Si el bloque lanza una
+        excepción la sesión se cierra en lugar de devolverse.
+        """
+        if not self._cupo.acquire(timeout=settings.SMTP_TIMEOUT_SEC):
+            raise TimeoutError("Sin sesiones SMTP libres en el pool")
+        sesion = None
+        try:
+            while sesion is None:
+                try:
+                    candidata = self._libres.get_nowait()
+                except Empty:
+                    sesion = self._conectar()
+                    break
+                if self._vigente(candidata):
+                    sesion = candidata
+                else:
+                    candidata.cerrar()
+            try:
+                yield sesion
+            except Exception:
+                sesion.cerrar()
+                sesion = None
+                raise
+            sesion.ultimo_uso = time.monotonic()
+            self._libres.put(sesion)
+        finally:
+            self._cupo.release()
+
+    def enviar(self, msg: EmailMessage) -> Tuple[str, Optional[str]]:
+        """
+        Envía un mensaje por una sesión del pool. Si la sesión reutilizada resultó
+        estar cerrada por el servidor, reintenta una vez con una sesión nueva.
+        """
+        if not circuito_smtp.permitir():
+            return circuito_smtp.resultado_rechazo()
+        for intento in range(2):
+            try:
+                with self.sesion() as sesion:
+                    response = sesion.conexion.send_message(msg)
+                    sesion.enviados += 1
+                self.mensajes_enviados += 1
+                circuito_smtp.registrar_exito()
+                # smtplib devuelve dict de fallos; vacío significa todos enviados
+                if response:
+                    return "error", str(response)
+                return "enviado", None
+            except smtplib.SMTPServerDisconnected as e:
+                if intento == 1:
+                    circuito_smtp.registrar_fallo(str(e))
+                    return "error", str(e)
+            except _ERRORES_DE_MENSAJE as e:
+                circuito_smtp.registrar_exito()
+                return "error", str(e)
+            except Exception as e:
+                circuito_smtp.registrar_fallo(str(e))
+                return "error", str(e)
+        return "error", "Error desconocido"
+
+    def cerrar(self) -> None:
+        """Cierra todas las sesiones libres (llamar en el shutdown)."""
+        while True:
+            try:
+                self._libres.get_nowait().cerrar()
+            except Empty:
+                break
+
+    def estado(self) -> Dict[str, Any]:
+        return {
+            "sesionesLibres": self._libres.qsize(),
+            "conexionesAbiertas": self.conexiones_abiertas,
+            "mensajesEnviados": self.mensajes_enviados,
+        }
+
+
+pool_smtp = PoolSMTP()
+
+
+def cerrar_pool_smtp() -> None:
+    pool_smtp.cerrar()
+
+
+def estado_smtp() -> Dict[str, Any]:
+    """Estado del circuit breaker y del pool de sesiones (para el monitor)."""
+    return {"circuito": circuito_smtp.resumen(), "pool": pool_smtp.estado()}
+
+
+@lru_cache(maxsize=8)
+def _parte_inline(cid_name: str, img_bytes: bytes) -> MIMEPart:
+    """
+    Parte MIME de una imagen embebida, codificada una sola vez por imagen (el logo
+    va en casi todos los correos). Solo se lee al serializar, así que los mensajes
+    la comparten.
+    """
+    parte = MIMEPart()
+    parte.set_content(img_bytes, maintype="image", subtype="png", cid=f"<{cid_name}>", disposition="inline")
+    return parte
+
+
+def _construir_mensaje(
     to_email: str,
     subject: str,
     body_text: str,
     body_html: Optional[str] = None,
     attachments: Optional[list[tuple[str, bytes, str]]] = None,
     inline_images: Optional[dict[str, bytes]] = None,
-) -> Tuple[str, Optional[str]]:
-    """
-    Envía un correo soportando texto plano y HTML, con adjuntos e imágenes embebidas.
-    - body_text: contenido en texto plano (recomendado siempre)
-    - body_html: contenido en HTML (opcional)
-    - attachments: lista de tuplas (filename, file_bytes, mime_type)
-    - inline_images: dict {cid_name: image_bytes} para insertar con <img src="cid:cid_name">.
-    Retorna (estado, error).
-    """
-    # Validar configuración SMTP
-    if not settings.SMTP_SERVER or not settings.SMTP_USERNAME:
-        return "error", "SMTP no configurado (faltan SMTP_SERVER o SMTP_USERNAME)"
-
+) -> EmailMessage:
     msg = EmailMessage()
     msg["From"] = settings.SMTP_USERNAME
     msg["To"] = to_email
@@ -38,18 +296,13 @@ def send_email(
         msg.add_alternative(body_html, subtype="html")
 
     # Imágenes embebidas (inline)
-    if inline_images:
-        # Se adjuntan a la parte HTML; los clientes usan cid: para resolver
-        for cid_name, img_bytes in inline_images.items():
-            if not img_bytes:
-                continue
-            # Adjuntar a mensaje como imagen inline
-            msg.get_payload()[-1].add_related(
-                img_bytes,
-                maintype="image",
-                subtype="png",
-                cid=make_msgid(cid_name),
-            )
+    partes = [_parte_inline(cid_name, img) for cid_name, img in (inline_images or {}).items() if img]
+    if body_html and partes:
+        # Se adjuntan a la parte HTML; los clientes resuelven <img src="cid:cid_name">
+        html = msg.get_payload()[-1]
+        html.make_related()
+        for parte in partes:
+            html.attach(parte)
 
     # Adjuntos
     if attachments:
@@ -58,21 +311,96 @@ def send_email(
                 continue
             maintype, subtype = (mime_type.split("/", 1) + ["octet-stream"])[:2]
             msg.add_attachment(file_bytes, maintype=maintype, subtype=subtype, filename=filename)
+    return msg
+
+
+def _smtp_configurado() -> bool:
+    return bool(settings.SMTP_SERVER and settings.SMTP_USERNAME)
+
+
+@bloqueante("email")
+def send_email(
+    to_email: str,
+    subject: str,
+    body_text: str,
+    body_html: Optional[str] = None,
+    attachments: Optional[list[tuple[str, bytes, str]]] = None,
+    inline_images: Optional[dict[str, bytes]] = None,
+) -> Tuple[str, Optional[str]]:
+    """
+    Envía un correo soportando texto plano y HTML, con adjuntos e imágenes embebidas.
+    - body_text: contenido en texto plano (recomendado siempre)
+    - body_html: contenido en HTML (opcional)
+    - attachments: lista de tuplas (filename, file_bytes, mime_type)
+    - inline_images: dict {cid_name: image_bytes} para insertar con <img src="cid:cid_name">.
+    Retorna (estado, error).
+    """
+    # Validar configuración SMTP
+    if not _smtp_configurado():
+        return "error", "SMTP no configurado (faltan SMTP_SERVER o SMTP_USERNAME)"
 
     try:
-        with smtplib.SMTP(settings.SMTP_SERVER, settings.SMTP_PORT) as server:
-            server.ehlo()
-            server.starttls()  # Gmail requiere TLS
-            server.ehlo()
-            
-            if settings.SMTP_USERNAME and settings.SMTP_PASSWORD:
-                server.login(settings.SMTP_USERNAME, settings.SMTP_PASSWORD)
-            
-            response = server.send_message(msg)
-        
-        # smtplib devuelve dict de fallos; vacío significa todos enviados
-        if response:
-            return "error", str(response)
-        return "enviado", None
+        msg = _construir_mensaje(to_email, subject, body_text, body_html, attachments, inline_images)
     except Exception as e:
         return "error", str(e)
+    return pool_smtp.enviar(msg)
+
+
+@bloqueante("email")
+def send_emails(mensajes: List[Dict[str, Any]]) -> List[Tuple[str, Optional[str]]]:
+    """
+    Envía varios correos reutilizando una misma sesión SMTP.
+    Cada elemento de `mensajes` lleva los argumentos de send_email
+    (to_email, subject, body_text y opcionalmente body_html, attachments, inline_images).
+    Retorna una lista (estado, error) en el mismo orden.
+    """
+    if not _smtp_configurado():
+        return [("error", "SMTP no configurado (faltan SMTP_SERVER o SMTP_USERNAME)")] * len(mensajes)
+
+    resultados: List[Tuple[str, Optional[str]]] = []
+    pendientes = list(mensajes)
+    while pendientes:
+        if not circuito_smtp.permitir():
+            resultados.extend([circuito_smtp.resultado_rechazo()] * len(pendientes))
+            break
+        conectado = False
+        try:
+            with pool_smtp.sesion() as sesion:
+                conectado = True
+                while pendientes:
+                    datos = pendientes[0]
+                    try:
+                        msg = _construir_mensaje(**datos)
+                    except Exception as e:
+                        resultados.append(("error", str(e)))
+                        pendientes.pop(0)
+                        continue
+                    try:
+                        response = sesion.conexion.send_message(msg)
+                    except smtplib.SMTPRecipientsRefused as e:
+                        # El destinatario fue rechazado pero la sesión sigue sirviendo
+                        resultados.append(("error", str(e.recipients)))
+                        pendientes.pop(0)
+                        continue
+                    sesion.enviados += 1
+                    pool_smtp.mensajes_enviados += 1
+                    resultados.append(("error", str(response)) if response else ("enviado", None))
+                    pendientes.pop(0)
+                    if sesion.enviados >= settings.SMTP_MAX_MENSAJES_POR_SESION:
+                        break
+            circuito_smtp.registrar_exito()
+        except Exception as e:
+            if isinstance(e, _ERRORES_DE_MENSAJE):
+                circuito_smtp.registrar_exito()
+            else:
+                circuito_smtp.registrar_fallo(str(e))
+            if not conectado:
+                # Sin servidor no tiene sentido esperar un timeout por mensaje
+                resultados.extend([("error", str(e))] * len(pendientes))
+                break
+            # La sesión se descartó; el mensaje en curso se marca como fallido
+            # y el resto continúa con una sesión nueva
+            if pendientes:
+                resultados.append(("error", str(e)))
+                pendientes.pop(0)
+    return resultados
@@ -0,0 +1,40 @@
+"""
+Tareas programadas de mantenimiento (se registran al importar este módulo).
+
+- retencion: borra lo que ya cumplió su función en las tablas de trabajo
+  (correos enviados de la bandeja de salida, trabajos terminados de la cola y
+  latidos de workers detenidos). El historial de envíos queda en email_log.
+"""
+from sqlalchemy import text
+
+from app.core import database
+from app.core.config import settings
+from app.core.scheduler import programar
+
+
+@programar("retencion", settings.RETENCION_INTERVALO_SEC)
+def limpiar_retencion() -> None:
+    db = database.SessionLocal()
+    try:
+        correos = db.execute(text("""
+            DELETE FROM requisiciones.email_outbox
+            WHERE estado = 'enviado'
+              AND enviado_en < NOW() - make_interval(days => :dias)
+        """), {"dias": settings.RETENCION_DIAS_OUTBOX}).rowcount
+        trabajos = db.execute(text("""
+            DELETE FROM requisiciones.cola_trabajos
+            WHERE estado IN ('completado', 'error')
+              AND terminado_en < NOW() - make_interval(days => :dias)
+        """), {"dias": settings.RETENCION_DIAS_TRABAJOS}).rowcount
+        latidos = db.execute(text("""
+            DELETE FROM requisiciones.worker_latidos
+            WHERE ultimo_latido < NOW() - make_interval(days => :dias)
+        """), {"dias": settings.RETENCION_DIAS_LATIDOS}).rowcount
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    if correos or trabajos or latidos:
+        print(f"Retención: {correos} correos, {trabajos} trabajos, {latidos} latidos eliminados")
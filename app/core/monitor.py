@@ -0,0 +1,352 @@
+"""
+Monitor del event loop y del tiempo bloqueante por petición.
+
+Mientras existan handlers `async def` que hacen trabajo síncrono (Session.execute,
+send_email, doc.build de reportlab) conviene saber cuáles detienen el event loop
+y por cuánto tiempo:
+
+- Un heartbeat (tarea asyncio) mide el retraso del loop; los retrasos que superan
+  el umbral se registran como "stall" y se atribuyen a la ruta en curso.
+- El middleware acumula, por petición, el tiempo síncrono gastado en cada
+  categoría ("db", "email", "pdf") cuando ocurre en el hilo del event loop.
+- Los resultados se exponen en /api/v1/monitor/event-loop y en logs JSON.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import event
+
+from app.core.config import settings
+
+logger = logging.getLogger("app.monitor")
+
+CATEGORIAS = ("db", "email", "pdf")
+
+_peticion_actual: ContextVar[Optional[dict]] = ContextVar("monitor_peticion", default=None)
+_en_curso: Dict[int, dict] = {}
+_finalizadas: deque = deque(maxlen=256)
+_hilo_loop: Optional[int] = None
+_lock = threading.Lock()
+
+_rutas: Dict[str, dict] = {}
+_stalls_recientes: deque = deque(maxlen=100)
+_lag = {"muestras": 0, "ultimo_ms": 0.0, "max_ms": 0.0, "stalls": 0, "stall_total_ms": 0.0}
+_lag_historial: deque = deque(maxlen=1200)
+_heartbeat_task: Optional[asyncio.Task] = None
+
+
+# ================================
+# Medición de bloqueo síncrono
+# ================================
+
+def peticion_actual() -> Optional[dict]:
+    """Devuelve el registro de la petición HTTP en curso (o None fuera de una petición)."""
+    return _peticion_actual.get()
+
+
+def _en_hilo_loop() -> bool:
+    return _hilo_loop is not None and threading.get_ident() == _hilo_loop
+
+
+def _sumar_bloqueo(categoria: str, ms: float) -> None:
+    peticion = _peticion_actual.get()
+    if peticion is None or not _en_hilo_loop():
+        # Fuera de una petición o en un hilo del threadpool: no bloquea el loop
+        return
+    peticion["bloqueo"][categoria] = peticion["bloqueo"].get(categoria, 0.0) + ms
+
+
+@contextmanager
+def medir_bloqueo(categoria: str):
+    """Context manager que suma al request actual el tiempo síncrono del bloque."""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        _sumar_bloqueo(categoria, (time.perf_counter() - inicio) * 1000)
+
+
+def bloqueante(categoria: str):
+    """Decorador equivalente a medir_bloqueo para funciones síncronas."""
+    def decorador(func):
+        @wraps(func)
+        def envoltura(*args, **kwargs):
+            with medir_bloqueo(categoria):
+                return func(*args, **kwargs)
+        return envoltura
+    return decorador
+
+
+def instrumentar_engine(engine) -> None:
+    """Registra en un Engine síncrono el tiempo de cada cursor.execute como categoría 'db'."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _antes(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("monitor_inicio", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _despues(conn, cursor, statement, parameters, context, executemany):
+        pila = conn.info.get("monitor_inicio")
+        if pila:
+            _sumar_bloqueo("db", (time.perf_counter() - pila.pop()) * 1000)
+
+
+# ================================
+# Middleware
+# ================================
+
+def _nombre_ruta(scope: dict) -> str:
+    metodo = scope.get("method", "")
+    ruta = scope.get("route")
+    path = getattr(ruta, "path_format", None) or getattr(ruta, "path", None)
+    if not path:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return f"{metodo} (sin ruta)"
+        path = getattr(endpoint, "__name__", type(endpoint).__name__)
+    return f"{metodo} {path}"
+
+
+def _total_bloqueo(peticion: dict) -> float:
+    return sum(peticion["bloqueo"].values())
+
+
+def _stats_ruta(nombre: str) -> dict:
+    stats = _rutas.get(nombre)
+    if stats is None:
+        stats = {
+            "peticiones": 0,
+            "duraciones": deque(maxlen=500),
+            "bloqueo_ms": dict.fromkeys(CATEGORIAS, 0.0),
+            "bloqueo_max_ms": 0.0,
+            "stalls": 0,
+            "stall_ms": 0.0,
+        }
+        _rutas[nombre] = stats
+    return stats
+
+
+def _registrar_peticion(peticion: dict) -> None:
+    nombre = _nombre_ruta(peticion["scope"])
+    peticion["ruta"] = nombre
+    duracion_ms = (peticion["fin"] - peticion["inicio"]) * 1000
+    bloqueo_ms = _total_bloqueo(peticion)
+
+    with _lock:
+        stats = _stats_ruta(nombre)
+        stats["peticiones"] += 1
+        stats["duraciones"].append(duracion_ms)
+        for categoria, ms in peticion["bloqueo"].items():
+            stats["bloqueo_ms"][categoria] = stats["bloqueo_ms"].get(categoria, 0.0) + ms
+        stats["bloqueo_max_ms"] = max(stats["bloqueo_max_ms"], bloqueo_ms)
+
+    if bloqueo_ms >= settings.MONITOR_LOG_BLOQUEO_MS:
+        logger.warning(json.dumps({
+            "evento": "peticion_bloqueante",
+            "ruta": nombre,
+            "status": peticion.get("status"),
+            "duracion_ms": round(duracion_ms, 1),
+            "bloqueo_ms": {k: round(v, 1) for k, v in peticion["bloqueo"].items()},
+        }))
+
+
+class MonitorMiddleware:
+    """Middleware ASGI que registra cada petición HTTP para el monitor."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        global _hilo_loop
+        if scope["type"] != "http" or not settings.MONITOR_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        if _hilo_loop is None:
+            _hilo_loop = threading.get_ident()
+
+        peticion = {
+            "scope": scope,
+            "inicio": time.perf_counter(),
+            "fin": None,
+            "status": None,
+            "bloqueo": dict.fromkeys(CATEGORIAS, 0.0),
+        }
+        token = _peticion_actual.set(peticion)
+        _en_curso[id(peticion)] = peticion
+
+        async def send_con_status(message):
+            if message["type"] == "http.response.start":
+                peticion["status"] = message["status"]
+                # Un stream SSE queda abierto mientras el cliente esté conectado:
+                # no se le atribuyen los stalls de las demás peticiones
+                peticion["streaming"] = any(
+                    nombre.lower() == b"content-type" and valor.startswith(b"text/event-stream")
+                    for nombre, valor in message.get("headers", ())
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_con_status)
+        finally:
+            peticion["fin"] = time.perf_counter()
+            _en_curso.pop(id(peticion), None)
+            _finalizadas.append(peticion)
+            _peticion_actual.reset(token)
+            _registrar_peticion(peticion)
+
+
+# ================================
+# Heartbeat del event loop
+# ================================
+
+def _atribuir_stall(lag_ms: float, inicio_ventana: float, bloqueo_previo: Dict[int, float]) -> None:
+    """
+    Atribuye un stall a la petición cuyo bloqueo medido más creció durante la ventana.
+    Si ninguna registró bloqueo (p.ej. CPU puro), se atribuye a todas las que estaban en curso.
+    Los streams SSE ya abiertos no cuentan.
+    """
+    candidatas = [p for p in list(_en_curso.values()) if not p.get("streaming")] + [
+        p for p in list(_finalizadas)
+        if p["fin"] is not None and p["fin"] >= inicio_ventana and not p.get("streaming")
+    ]
+    culpable = None
+    mayor_delta = 0.0
+    for p in candidatas:
+        delta = _total_bloqueo(p) - bloqueo_previo.get(id(p), 0.0)
+        if delta > mayor_delta:
+            culpable, mayor_delta = p, delta
+
+    involucradas = [culpable] if culpable is not None else candidatas
+    rutas = sorted({p.get("ruta") or _nombre_ruta(p["scope"]) for p in involucradas})
+
+    with _lock:
+        _lag["stalls"] += 1
+        _lag["stall_total_ms"] += lag_ms
+        for nombre in rutas:
+            stats = _stats_ruta(nombre)
+            stats["stalls"] += 1
+            stats["stall_ms"] += lag_ms
+        registro = {
+            "evento": "event_loop_stall",
+            "lag_ms": round(lag_ms, 1),
+            "rutas": rutas,
+            "atribucion": "bloqueo_medido" if culpable is not None else "en_curso",
+            "bloqueo_ms": (
+                {k: round(v, 1) for k, v in culpable["bloqueo"].items()} if culpable is not None else None
+            ),
+            "timestamp": time.time(),
+        }
+        _stalls_recientes.append(registro)
+
+    logger.warning(json.dumps(registro))
+
+
+async def _heartbeat() -> None:
+    global _hilo_loop
+    _hilo_loop = threading.get_ident()
+    loop = asyncio.get_running_loop()
+    intervalo = settings.MONITOR_HEARTBEAT_MS / 1000
+    while True:
+        inicio_ventana = time.perf_counter()
+        bloqueo_previo = {id(p): _total_bloqueo(p) for p in list(_en_curso.values())}
+        esperado = loop.time() + intervalo
+        await asyncio.sleep(intervalo)
+        lag_ms = max(0.0, (loop.time() - esperado) * 1000)
+
+        with _lock:
+            _lag["muestras"] += 1
+            _lag["ultimo_ms"] = lag_ms
+            _lag["max_ms"] = max(_lag["max_ms"], lag_ms)
+            _lag_historial.append(lag_ms)
+
+        if lag_ms >= settings.MONITOR_STALL_UMBRAL_MS:
+            try:
+                _atribuir_stall(lag_ms, inicio_ventana, bloqueo_previo)
+            except Exception as e:
+                logger.error(f"Error atribuyendo stall del event loop: {e}")
+
+
+def iniciar_heartbeat() -> None:
+    """Arranca el heartbeat en el event loop actual (llamar desde un evento startup)."""
+    global _heartbeat_task
+    if not settings.MONITOR_ENABLED:
+        return
+    if _heartbeat_task is None or _heartbeat_task.done():
+        _heartbeat_task = asyncio.get_running_loop().create_task(_heartbeat())
+
+
+# ================================
+# Consulta de resultados
+# ================================
+
+def _percentil(valores: List[float], p: float) -> float:
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    idx = min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))
+    return ordenados[idx]
+
+
+def obtener_resumen(limite: int = 80) -> Dict[str, Any]:
+    """
+    Resumen del monitor: estado del event loop y rutas ordenadas por el tiempo
+    que mantienen bloqueado el loop (bloqueo medido + stalls atribuidos).
+    """
+    with _lock:
+        historial = list(_lag_historial)
+        lag = dict(_lag)
+        rutas = []
+        for nombre, stats in _rutas.items():
+            duraciones = list(stats["duraciones"])
+            bloqueo_total = sum(stats["bloqueo_ms"].values())
+            peticiones = stats["peticiones"] or 1
+            rutas.append({
+                "ruta": nombre,
+                "peticiones": stats["peticiones"],
+                "p50_ms": round(_percentil(duraciones, 50), 1),
+                "p95_ms": round(_percentil(duraciones, 95), 1),
+                "p99_ms": round(_percentil(duraciones, 99), 1),
+                "bloqueo_total_ms": round(bloqueo_total, 1),
+                "bloqueo_promedio_ms": round(bloqueo_total / peticiones, 1),
+                "bloqueo_max_ms": round(stats["bloqueo_max_ms"], 1),
+                "bloqueo_por_categoria_ms": {k: round(v, 1) for k, v in stats["bloqueo_ms"].items()},
+                "stalls": stats["stalls"],
+                "stall_ms": round(stats["stall_ms"], 1),
+            })
+        stalls = list(_stalls_recientes)
+
+    rutas.sort(key=lambda r: r["bloqueo_total_ms"] + r["stall_ms"], reverse=True)
+    return {
+        "event_loop": {
+            "heartbeat_ms": settings.MONITOR_HEARTBEAT_MS,
+            "umbral_stall_ms": settings.MONITOR_STALL_UMBRAL_MS,
+            "muestras": lag["muestras"],
+            "lag_ultimo_ms": round(lag["ultimo_ms"], 1),
+            "lag_max_ms": round(lag["max_ms"], 1),
+            "lag_p50_ms": round(_percentil(historial, 50), 1),
+            "lag_p99_ms": round(_percentil(historial, 99), 1),
+            "stalls": lag["stalls"],
+            "stall_total_ms": round(lag["stall_total_ms"], 1),
+            "peticiones_en_curso": len(_en_curso),
+        },
+        "rutas": rutas[:limite],
+        "stalls_recientes": stalls[-20:],
+    }
+
+
+def reiniciar_estadisticas() -> None:
+    """Limpia las estadísticas acumuladas (no detiene el heartbeat)."""
+    with _lock:
+        _rutas.clear()
+        _stalls_recientes.clear()
+        _lag_historial.clear()
+        _lag.update({"muestras": 0, "ultimo_ms": 0.0, "max_ms": 0.0, "stalls": 0, "stall_total_ms": 0.0})
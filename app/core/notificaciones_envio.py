@@ -0,0 +1,234 @@
+"""
+Envío por correo de requisiciones.notificaciones (migrations/notificaciones_envio.sql,
+migrations/notificaciones_reintentos.sql).
+
+La tarea programada "notificaciones" (app/core/scheduler.py), que corre en cada
+proceso de la API con TAREAS_EN_API o en app.worker, reserva lotes con FOR UPDATE
+SKIP LOCKED entre las notificaciones vencidas (proximo_intento <= NOW(), índice parcial). Al
+reservar se adelanta proximo_intento NOTIF_SENDER_LEASE_SEC y se marca
+reservado_por; la reserva se confirma antes de hablar con SMTP, de modo que los
+workers se reparten las filas en lugar de enviarlas todos. Si un proceso muere
+con un lote reservado, otro lo retoma cuando vence la reserva.
+
+Un fallo programa el siguiente intento con backoff exponencial
+(NOTIF_BACKOFF_BASE_SEC * 2^intentos, tope NOTIF_BACKOFF_MAX_SEC, ±20%); al llegar
+a NOTIF_MAX_INTENTOS la notificación queda en estado 'fallido' y deja de
+intentarse hasta que se reencole.
+
+Los destinatarios con resumen activado (requisiciones.preferencias_notificacion,
+migrations/notificaciones_resumen.sql) reciben un solo correo por lote con la
+tabla de sus notificaciones; el trigger de la migración hace que las de una misma
+ventana venzan a la vez.
+
+El lote se reparte en NOTIF_SENDER_CONCURRENCIA tramos que se envían en paralelo,
+cada uno por su propia sesión del pool SMTP.
+"""
+import os
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.email_templates import correo_resumen_notificaciones, imagenes_logo
+from app.core.mail import ESTADO_CIRCUITO_ABIERTO, circuito_smtp, send_emails
+from app.core.scheduler import programar
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+SQL_RESERVAR = """
+WITH candidatas AS (
+    SELECT idnotificacion
+    FROM requisiciones.notificaciones
+    WHERE proximo_intento <= NOW()
+    ORDER BY proximo_intento
+    LIMIT :lote
+    FOR UPDATE SKIP LOCKED
+)
+UPDATE requisiciones.notificaciones n
+SET proximo_intento = NOW() + make_interval(secs => :lease),
+    reservado_por = :worker
+FROM candidatas c
+WHERE n.idnotificacion = c.idnotificacion
+RETURNING n.idnotificacion, n.emailusuario, n.tipo, n.mensaje, n.fechacreacion,
+          (SELECT r.codrequisicion FROM requisiciones.requisiciones r
+           WHERE r.idrequisicion = n.idrequisicion) AS codrequisicion,
+          EXISTS (SELECT 1 FROM requisiciones.preferencias_notificacion p
+                  WHERE p.emailusuario = LOWER(n.emailusuario) AND p.resumen) AS resumen
+"""
+
+# Solo se actualiza si la reserva sigue siendo nuestra
+SQL_MARCAR_ENVIADA = """
+UPDATE requisiciones.notificaciones
+SET estado_envio = 'enviado', medio = COALESCE(medio, 'smtp'), enviado_en = NOW(),
+    error_envio = NULL, intentos = intentos + 1,
+    proximo_intento = NULL, reservado_por = NULL
+WHERE idnotificacion = :id AND reservado_por = :worker
+"""
+
+# En SET, `intentos` es el valor anterior a este fallo
+SQL_MARCAR_ERROR = """
+UPDATE requisiciones.notificaciones
+SET estado_envio = CASE WHEN intentos + 1 >= :max_intentos THEN 'fallido' ELSE 'error' END,
+    medio = COALESCE(medio, 'smtp'), enviado_en = NOW(),
+    error_envio = :err, intentos = intentos + 1,
+    proximo_intento = CASE
+        WHEN intentos + 1 >= :max_intentos THEN NULL
+        ELSE NOW() + make_interval(secs => LEAST(:tope, :base * power(2, intentos)) * (0.8 + random() * 0.4))
+    END,
+    reservado_por = NULL
+WHERE idnotificacion = :id AND reservado_por = :worker
+"""
+
+# Circuito SMTP abierto: no hubo intento real; se devuelve sin contar el intento
+SQL_LIBERAR = """
+UPDATE requisiciones.notificaciones
+SET proximo_intento = NOW() + make_interval(secs => :espera), reservado_por = NULL
+WHERE idnotificacion = :id AND reservado_por = :worker
+"""
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _reservar_lote() -> List[Any]:
+    db = SessionLocal()
+    try:
+        filas = db.execute(text(SQL_RESERVAR), {
+            "lote": settings.NOTIF_SENDER_LOTE,
+            "lease": settings.NOTIF_SENDER_LEASE_SEC,
+            "worker": WORKER_ID,
+        }).fetchall()
+        db.commit()
+        return filas
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def _mensaje(fila) -> dict:
+    body = fila.mensaje
+    if fila.codrequisicion:
+        body += f"\n\nCódigo: {fila.codrequisicion}"
+    return {
+        "to_email": fila.emailusuario,
+        "subject": f"[SEDH Almacén] Notificación: {fila.tipo}",
+        "body_text": body,
+    }
+
+
+def _accion(tipo: Optional[str]) -> str:
+    return (tipo or "notificación").replace("_", " ").capitalize()
+
+
+def _fecha(fila) -> str:
+    return fila.fechacreacion.strftime("%d/%m/%Y %H:%M") if fila.fechacreacion else ""
+
+
+def _mensaje_resumen(filas: List[Any]) -> dict:
+    """Un solo correo con la tabla de códigos y acciones de varias notificaciones."""
+    body_text, body_html = correo_resumen_notificaciones(
+        (_fecha(f), f.codrequisicion or "-", _accion(f.tipo), f.mensaje or "") for f in filas
+    )
+    return {
+        "to_email": filas[0].emailusuario,
+        "subject": f"[SEDH Almacén] Resumen: {len(filas)} notificaciones",
+        "body_text": body_text,
+        "body_html": body_html,
+        "inline_images": imagenes_logo(),
+    }
+
+
+def _agrupar(filas: List[Any]) -> List[Tuple[List[Any], dict]]:
+    """
+    Un correo por notificación, salvo los destinatarios con resumen activado,
+    que reciben uno solo con todas sus notificaciones del lote.
+    """
+    envios: List[Tuple[List[Any], dict]] = []
+    grupos: Dict[str, List[Any]] = {}
+    for fila in filas:
+        if fila.resumen:
+            grupos.setdefault(fila.emailusuario.lower(), []).append(fila)
+        else:
+            envios.append(([fila.idnotificacion], _mensaje(fila)))
+    for grupo in grupos.values():
+        mensaje = _mensaje(grupo[0]) if len(grupo) == 1 else _mensaje_resumen(grupo)
+        envios.append(([f.idnotificacion for f in grupo], mensaje))
+    return envios
+
+
+def _enviar_tramo(envios: List[Tuple[List[Any], dict]]) -> List[Tuple[Any, Tuple[str, Optional[str]]]]:
+    resultados = send_emails([mensaje for _, mensaje in envios])
+    # El resultado de un resumen vale para cada notificación que incluye
+    return [(i, resultado) for (ids, _), resultado in zip(envios, resultados) for i in ids]
+
+
+def _registrar_resultados(resultados: List[Tuple[Any, Tuple[str, Optional[str]]]]) -> None:
+    enviadas = [{"id": i, "worker": WORKER_ID} for i, (estado, _) in resultados if estado == "enviado"]
+    liberadas = [
+        {"id": i, "worker": WORKER_ID, "espera": settings.SMTP_CIRCUITO_ESPERA_SEC}
+        for i, (estado, _) in resultados if estado == ESTADO_CIRCUITO_ABIERTO
+    ]
+    fallidas = [
+        {"id": i, "worker": WORKER_ID, "err": error or "Error desconocido",
+         "max_intentos": settings.NOTIF_MAX_INTENTOS,
+         "base": settings.NOTIF_BACKOFF_BASE_SEC, "tope": settings.NOTIF_BACKOFF_MAX_SEC}
+        for i, (estado, error) in resultados if estado not in ("enviado", ESTADO_CIRCUITO_ABIERTO)
+    ]
+    db = SessionLocal()
+    try:
+        if enviadas:
+            db.execute(text(SQL_MARCAR_ENVIADA), enviadas)
+        if liberadas:
+            db.execute(text(SQL_LIBERAR), liberadas)
+        if fallidas:
+            db.execute(text(SQL_MARCAR_ERROR), fallidas)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def procesar_notificaciones() -> int:
+    """Reserva, envía y registra un lote. Devuelve el número de filas reservadas."""
+    if circuito_smtp.abierto():
+        return 0
+    filas = _reservar_lote()
+    if not filas:
+        return 0
+
+    envios = _agrupar(filas)
+    concurrencia = max(1, settings.NOTIF_SENDER_CONCURRENCIA)
+    tramos = [envios[i::concurrencia] for i in range(concurrencia) if envios[i::concurrencia]]
+    resultados: List[Tuple[Any, Tuple[str, Optional[str]]]] = []
+    if len(tramos) == 1 or _executor is None:
+        for tramo in tramos:
+            resultados.extend(_enviar_tramo(tramo))
+    else:
+        for parcial in _executor.map(_enviar_tramo, tramos):
+            resultados.extend(parcial)
+
+    _registrar_resultados(resultados)
+    return len(filas)
+
+
+def programar_envio_notificaciones() -> None:
+    """Registra la tarea "notificaciones" en el scheduler (la API con TAREAS_EN_API o app.worker)."""
+    global _executor
+    if not settings.NOTIF_SENDER_ENABLED:
+        return
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=max(1, settings.NOTIF_SENDER_CONCURRENCIA),
+            thread_name_prefix="notif-smtp",
+        )
+
+    # Lote lleno: probablemente queda más, se repite sin esperar al intervalo
+    @programar("notificaciones", settings.NOTIF_SENDER_INTERVAL_SEC, exclusivo=False)
+    def _notificaciones():
+        return procesar_notificaciones() >= settings.NOTIF_SENDER_LOTE
@@ -0,0 +1,233 @@
+"""
+Bandeja de salida de correos (requisiciones.email_outbox).
+
+Los handlers no hablan con SMTP: encolar_correo() inserta el mensaje en la misma
+transacción que la requisición, de modo que el correo existe si y solo si la
+operación hizo COMMIT. La tarea programada "outbox" (app/core/scheduler.py) drena
+la tabla, envía con send_email() y deja el resultado en requisiciones.email_log,
+igual que el envío en línea.
+
+Los correos vencidos (proximo_intento <= NOW()) se reservan por lotes con FOR
+UPDATE SKIP LOCKED: se adelanta proximo_intento OUTBOX_LEASE_SEC y se marca
+reservado_por, y la reserva se confirma antes de hablar con SMTP, así que no se
+retienen bloqueos ni conexiones durante el envío y varios workers pueden drenar a
+la vez sin enviar dos veces. Si un proceso muere con un lote reservado, otro lo
+retoma cuando vence la reserva. Un fallo programa el siguiente intento con
+backoff exponencial (OUTBOX_BACKOFF_BASE_SEC * 2^intentos, tope
+OUTBOX_BACKOFF_MAX_SEC, ±20%) hasta OUTBOX_MAX_INTENTOS.
+"""
+import base64
+import json
+import os
+import socket
+from typing import Any, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.email_templates import imagenes_logo
+from app.core.mail import ESTADO_CIRCUITO_ABIERTO, circuito_smtp, send_email
+from app.core.scheduler import adelantar, programar
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+SQL_ENCOLAR = """
+INSERT INTO requisiciones.email_outbox
+    (idrequisicion, destinatario, asunto, cuerpo_texto, cuerpo_html, adjuntos, incluir_logo)
+VALUES
+    (:idrequisicion, :destinatario, :asunto, :cuerpo_texto, :cuerpo_html,
+     CAST(:adjuntos AS JSONB), :incluir_logo)
+RETURNING idcorreo
+"""
+
+SQL_RESERVAR = """
+WITH candidatos AS (
+    SELECT idcorreo
+    FROM requisiciones.email_outbox
+    WHERE estado = 'pendiente'
+      AND proximo_intento <= NOW()
+    ORDER BY proximo_intento
+    LIMIT :lote
+    FOR UPDATE SKIP LOCKED
+)
+UPDATE requisiciones.email_outbox o
+SET proximo_intento = NOW() + make_interval(secs => :lease),
+    reservado_por = :worker
+FROM candidatos c
+WHERE o.idcorreo = c.idcorreo
+RETURNING o.idcorreo, o.idrequisicion, o.destinatario, o.asunto, o.cuerpo_texto,
+          o.cuerpo_html, o.adjuntos, o.incluir_logo, o.intentos
+"""
+
+# Solo se actualiza si la reserva sigue siendo nuestra. En SET, `intentos` es el
+# valor anterior a este intento; :cuenta es 0 si el circuito estaba abierto
+SQL_MARCAR_RESULTADO = """
+UPDATE requisiciones.email_outbox
+SET estado = CASE
+        WHEN :estado = 'enviado' THEN 'enviado'
+        WHEN :cuenta = 1 AND intentos + 1 >= :max_intentos THEN 'error'
+        ELSE 'pendiente'
+    END,
+    intentos = intentos + :cuenta,
+    error = :error,
+    enviado_en = CASE WHEN :estado = 'enviado' THEN NOW() ELSE enviado_en END,
+    proximo_intento = CASE
+        WHEN :estado = 'enviado' THEN NULL
+        WHEN :cuenta = 0 THEN NOW() + make_interval(secs => :espera)
+        WHEN intentos + 1 >= :max_intentos THEN NULL
+        ELSE NOW() + make_interval(secs => LEAST(:tope, :base * power(2, intentos)) * (0.8 + random() * 0.4))
+    END,
+    reservado_por = NULL
+WHERE idcorreo = :idcorreo AND reservado_por = :worker
+"""
+
+SQL_EMAIL_LOG = """
+INSERT INTO requisiciones.email_log (idrequisicion, destinatario, asunto, cuerpo, estado, error)
+VALUES (:idrequisicion, :destinatario, :asunto, :cuerpo, :estado, :error)
+"""
+
+def encolar_correo(
+    db: Session,
+    destinatario: str,
+    asunto: str,
+    cuerpo_texto: str,
+    cuerpo_html: Optional[str] = None,
+    adjuntos: Optional[List[Tuple[str, bytes, str]]] = None,
+    incluir_logo: bool = False,
+    idrequisicion=None,
+) -> int:
+    """
+    Inserta un correo en la bandeja de salida dentro de la transacción de `db`
+    (no hace commit). Usa un savepoint para que un fallo aquí no invalide el
+    resto de la transacción del llamador. Devuelve el idcorreo.
+    """
+    adjuntos_json = [
+        {
+            "nombre": nombre,
+            "mime": mime,
+            "contenido": base64.b64encode(contenido).decode("ascii"),
+        }
+        for nombre, contenido, mime in (adjuntos or [])
+        if contenido
+    ]
+    with db.begin_nested():
+        return db.execute(text(SQL_ENCOLAR), {
+            "idrequisicion": str(idrequisicion) if idrequisicion else None,
+            "destinatario": destinatario,
+            "asunto": asunto,
+            "cuerpo_texto": cuerpo_texto,
+            "cuerpo_html": cuerpo_html,
+            "adjuntos": json.dumps(adjuntos_json),
+            "incluir_logo": incluir_logo,
+        }).scalar_one()
+
+
+def despertar_outbox() -> None:
+    """Adelanta la tarea "outbox" de este proceso: hay correos nuevos (llamar tras el commit)."""
+    adelantar("outbox")
+
+
+def _reservar(limite: int) -> List[Any]:
+    db = SessionLocal()
+    try:
+        filas = db.execute(text(SQL_RESERVAR), {
+            "lote": limite,
+            "lease": settings.OUTBOX_LEASE_SEC,
+            "worker": WORKER_ID,
+        }).mappings().all()
+        db.commit()
+        return filas
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def _enviar(fila) -> Tuple[str, Optional[str]]:
+    adjuntos = fila["adjuntos"] or []
+    if isinstance(adjuntos, str):
+        adjuntos = json.loads(adjuntos)
+    try:
+        return send_email(
+            fila["destinatario"],
+            fila["asunto"],
+            fila["cuerpo_texto"],
+            body_html=fila["cuerpo_html"],
+            attachments=[
+                (a["nombre"], base64.b64decode(a["contenido"]), a["mime"]) for a in adjuntos
+            ],
+            inline_images=imagenes_logo() if fila["incluir_logo"] else None,
+        )
+    except Exception as e:
+        return "error", str(e)
+
+
+def _registrar(fila, estado: str, error: Optional[str]) -> None:
+    """
+    Los fallos vuelven a 'pendiente' con backoff hasta agotar OUTBOX_MAX_INTENTOS;
+    con el circuito abierto no hubo intento real y no se cuenta.
+    """
+    db = SessionLocal()
+    try:
+        db.execute(text(SQL_MARCAR_RESULTADO), {
+            "idcorreo": fila["idcorreo"],
+            "worker": WORKER_ID,
+            "estado": estado,
+            "error": error or None,
+            "cuenta": 0 if estado == ESTADO_CIRCUITO_ABIERTO else 1,
+            "max_intentos": settings.OUTBOX_MAX_INTENTOS,
+            "espera": settings.SMTP_CIRCUITO_ESPERA_SEC,
+            "base": settings.OUTBOX_BACKOFF_BASE_SEC,
+            "tope": settings.OUTBOX_BACKOFF_MAX_SEC,
+        })
+        db.execute(text(SQL_EMAIL_LOG), {
+            "idrequisicion": str(fila["idrequisicion"]) if fila["idrequisicion"] else None,
+            "destinatario": fila["destinatario"],
+            "asunto": fila["asunto"],
+            "cuerpo": fila["cuerpo_texto"],
+            "estado": estado,
+            "error": error or None,
+        })
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def procesar_outbox(limite: Optional[int] = None) -> int:
+    """
+    Reserva hasta `limite` correos vencidos (OUTBOX_LOTE por defecto), los envía y
+    registra el resultado de cada uno. Devuelve el número de correos reservados.
+    """
+    limite = limite or settings.OUTBOX_LOTE
+    if circuito_smtp.abierto():
+        return 0
+    try:
+        filas = _reservar(limite)
+        for fila in filas:
+            estado, error = _enviar(fila)
+            _registrar(fila, estado, error)
+            if estado != "enviado":
+                print(f"WARN: Error al enviar correo {fila['idcorreo']} a {fila['destinatario']}: {error}")
+    except Exception as e:
+        # Lo reservado y no registrado se retoma al vencer la reserva
+        print(f"ERROR en bandeja de salida de correos: {e}")
+        return 0
+    return len(filas)
+
+
+def programar_outbox() -> None:
+    """Registra la tarea "outbox" en el scheduler (la API con TAREAS_EN_API o app.worker)."""
+    if not settings.OUTBOX_ENABLED:
+        return
+
+    # Reparte filas con SKIP LOCKED: puede correr en todos los procesos a la vez.
+    # Si el lote se llenó, se repite sin esperar al siguiente intervalo
+    @programar("outbox", settings.OUTBOX_INTERVALO_SEC, exclusivo=False)
+    def _outbox():
+        return procesar_outbox() >= settings.OUTBOX_LOTE
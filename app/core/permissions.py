@@ -6,7 +6,8 @@ from fastapi import Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from app.core.database import get_db
 from app.core.security import get_current_user
-from app.repositories.admin import verificar_es_administrador
+from app.repositories.admin import verificar_es_administrador, verificar_es_administrador_async
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Dict, Any
 
 def requiere_administrador(func):
@@ -47,6 +48,35 @@ def requiere_administrador(func):
         return await func(*args, **kwargs)
     return wrapper
 
+def _email_admin(current_user: Dict[str, Any]) -> str:
+    email = (str(current_user.get("email") or current_user.get("sub") or "")).strip()
+    if not email:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token inválido")
+    return email
+
+def _denegar_no_admin() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_403_FORBIDDEN,
+        detail="Acceso denegado: se requieren permisos de Administrador"
+    )
+
+def verificar_admin(db: Session, current_user: Dict[str, Any]) -> str:
+    """
+    Versión en línea de requiere_administrador para endpoints síncronos:
+    401/403 si el usuario no es Administrador. Devuelve su email.
+    """
+    email = _email_admin(current_user)
+    if not verificar_es_administrador(db, email):
+        raise _denegar_no_admin()
+    return email
+
+async def verificar_admin_async(db: AsyncSession, current_user: Dict[str, Any]) -> str:
+    """verificar_admin() para endpoints async con AsyncSession."""
+    email = _email_admin(current_user)
+    if not await verificar_es_administrador_async(db, email):
+        raise _denegar_no_admin()
+    return email
+
 def verificar_permisos_modulo(modulo: str, accion: str):
     """
     Decorador para verificar permisos específicos de módulo
@@ -0,0 +1,157 @@
+"""
+Avisos de notificaciones en tiempo real (LISTEN/NOTIFY -> Server-Sent Events).
+
+Los triggers de migrations/notificaciones_stream.sql hacen pg_notify('notificaciones')
+al insertar una notificación o cambiar su estado de lectura. Cada proceso de la
+API abre una sola conexión (psycopg 3, asíncrona, fuera del pool) con LISTEN y
+reparte los avisos a los clientes conectados a GET /api/v1/notificaciones/stream:
+
+- Por aviso se hace una sola consulta (la notificación nueva y el conteo de no
+  leídas del usuario) y el resultado se copia a todas las pestañas abiertas de
+  ese usuario. Los avisos de usuarios sin pestañas conectadas se descartan sin
+  tocar la base.
+- La conexión se abre con el primer cliente y se reintenta con espera creciente
+  si se cae. Al reconectar se envía "resincronizar" a los clientes, que recargan
+  la lista porque pudieron perderse avisos mientras no había LISTEN.
+- Cada cliente tiene una cola acotada (NOTIF_STREAM_COLA); si un cliente lento
+  la llena, se vacía y recibe "resincronizar" en lugar de acumular memoria.
+"""
+import asyncio
+import json
+from typing import Any, Dict, Optional, Set
+
+import psycopg
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.repositories.notificaciones import contar_no_leidas, obtener_notificacion
+
+CANAL = "notificaciones"
+
+
+class CanalNotificaciones:
+    """Un LISTEN por proceso repartido entre las colas de los clientes SSE."""
+
+    def __init__(self):
+        self._clientes: Dict[str, Set[asyncio.Queue]] = {}
+        self._tarea: Optional[asyncio.Task] = None
+        self.conectado = False
+        self.avisos_recibidos = 0
+        self.reconexiones = 0
+
+    def suscribir(self, email: str) -> asyncio.Queue:
+        cola: asyncio.Queue = asyncio.Queue(maxsize=settings.NOTIF_STREAM_COLA)
+        self._clientes.setdefault(email.lower(), set()).add(cola)
+        if self._tarea is None or self._tarea.done():
+            self._tarea = asyncio.create_task(self._escuchar(), name="pg-listen-notificaciones")
+        return cola
+
+    def desuscribir(self, email: str, cola: asyncio.Queue) -> None:
+        colas = self._clientes.get(email.lower())
+        if colas is None:
+            return
+        colas.discard(cola)
+        if not colas:
+            del self._clientes[email.lower()]
+
+    def _publicar(self, colas, evento: Dict[str, Any]) -> None:
+        for cola in list(colas):
+            try:
+                cola.put_nowait(evento)
+            except asyncio.QueueFull:
+                # Cliente lento: se descarta lo acumulado y que recargue la lista
+                while not cola.empty():
+                    cola.get_nowait()
+                cola.put_nowait({"evento": "resincronizar"})
+
+    def _publicar_a_todos(self, evento: Dict[str, Any]) -> None:
+        for colas in list(self._clientes.values()):
+            self._publicar(colas, evento)
+
+    async def _despachar(self, payload: str) -> None:
+        try:
+            aviso = json.loads(payload)
+        except ValueError:
+            return
+        email = (aviso.get("email") or "").lower()
+        colas = self._clientes.get(email)
+        if not colas:
+            return
+
+        evento: Dict[str, Any] = {"evento": aviso.get("evento")}
+        async with AsyncSessionLocal() as db:
+            if aviso.get("evento") == "nueva" and aviso.get("id"):
+                notificacion = await obtener_notificacion(db, aviso["id"])
+                if notificacion is not None:
+                    evento["notificacion"] = notificacion
+            evento["noLeidas"] = await contar_no_leidas(db, email)
+        self._publicar(colas, evento)
+
+    async def _escuchar(self) -> None:
+        espera = 1.0
+        recuperada = False
+        while self._clientes:
+            try:
+                conexion = await psycopg.AsyncConnection.connect(
+                    host=settings.DB_HOST,
+                    port=settings.DB_PORT,
+                    user=settings.DB_USER,
+                    password=settings.DB_PASSWORD,
+                    dbname=settings.DB_NAME,
+                    autocommit=True,
+                    application_name="almacen-listen",
+                    keepalives=1,
+                    keepalives_idle=30,
+                )
+            except Exception as e:
+                print(f"WARN: LISTEN {CANAL} no disponible, reintento en {espera:.0f}s: {e}")
+                await asyncio.sleep(espera)
+                espera = min(espera * 2, 60.0)
+                continue
+
+            try:
+                await conexion.execute(f"LISTEN {CANAL}")
+                if recuperada:
+                    # Sin LISTEN pudieron perderse avisos
+                    self._publicar_a_todos({"evento": "resincronizar"})
+                    recuperada = False
+                self.conectado = True
+                espera = 1.0
+                # Con timeout para notar que ya no quedan clientes y cerrar la conexión
+                while self._clientes:
+                    async for aviso in conexion.notifies(timeout=settings.NOTIF_STREAM_KEEPALIVE_SEC):
+                        self.avisos_recibidos += 1
+                        try:
+                            await self._despachar(aviso.payload)
+                        except Exception as e:
+                            print(f"WARN: No se pudo repartir el aviso de notificación: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"WARN: Conexión LISTEN {CANAL} perdida: {e}")
+                recuperada = True
+                self.reconexiones += 1
+                await asyncio.sleep(espera)
+            finally:
+                self.conectado = False
+                await conexion.close()
+
+    async def detener(self) -> None:
+        if self._tarea is not None and not self._tarea.done():
+            self._tarea.cancel()
+            try:
+                await self._tarea
+            except asyncio.CancelledError:
+                pass
+
+    def estado(self) -> Dict[str, Any]:
+        return {
+            "conectado": self.conectado,
+            "usuarios": len(self._clientes),
+            "clientes": sum(len(c) for c in self._clientes.values()),
+            "avisosRecibidos": self.avisos_recibidos,
+            "reconexiones": self.reconexiones,
+        }
+
+
+canal_notificaciones = CanalNotificaciones()
@@ -0,0 +1,175 @@
+"""
+Reenvío de correos con error registrados en requisiciones.email_log.
+
+reconstruir_correo() rearma el mensaje a partir de la fila del log (el HTML se
+deduce del asunto) y lo usan tanto el reenvío individual
+(POST /requisiciones/email-log/{idlog}/reenviar) como el trabajo de cola
+"reenvio_correos", que reenvía en lote los fallidos que cumplen un filtro:
+
+- Toma el último intento fallido de cada mensaje (destinatario, asunto,
+  requisición) y descarta los que ya se reenviaron con éxito después o siguen
+  pendientes en la bandeja de salida, así que relanzar el lote no duplica correos.
+- Envía con send_email() desde REENVIO_CONCURRENCIA hilos (nunca más que
+  SMTP_POOL_SIZE) y registra cada intento como una fila nueva de email_log.
+- Deja el progreso en cola_trabajos.resultado cada REENVIO_PROGRESO_CADA correos
+  y, al terminar, el resumen con los errores más frecuentes.
+- Si el circuito SMTP se abre, deja de enviar: el resto cuenta como omitido.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import text
+
+from app.core import database
+from app.core.config import settings
+from app.core.mail import ESTADO_CIRCUITO_ABIERTO, circuito_smtp, send_email
+from app.core.email_templates import correo_aprobacion_jefe, correo_confirmacion_solicitante, imagenes_logo
+from app.core.outbox import SQL_EMAIL_LOG
+from app.core.trabajos import manejador, reportar_progreso
+
+# Solo el último intento de cada mensaje, y solo si no se resolvió después
+SQL_FALLIDOS = """
+SELECT f.idlog, f.idrequisicion, f.destinatario, f.asunto, f.cuerpo, f.error,
+       r.codrequisicion
+FROM (
+    SELECT DISTINCT ON (el.idrequisicion, el.destinatario, el.asunto)
+           el.idlog, el.idrequisicion, el.destinatario, el.asunto, el.cuerpo,
+           el.error, el.estado
+    FROM requisiciones.email_log el
+    {filtros}
+    ORDER BY el.idrequisicion, el.destinatario, el.asunto, el.idlog DESC
+) f
+LEFT JOIN requisiciones.requisiciones r ON f.idrequisicion = r.idrequisicion
+WHERE f.estado IN ('error', 'circuito_abierto')
+  AND NOT EXISTS (
+      SELECT 1 FROM requisiciones.email_outbox o
+      WHERE o.estado = 'pendiente'
+        AND o.destinatario = f.destinatario
+        AND o.asunto = f.asunto
+        AND o.idrequisicion IS NOT DISTINCT FROM f.idrequisicion
+  )
+ORDER BY f.idlog
+LIMIT :limite
+"""
+
+MAX_ERRORES_RESUMEN = 10
+
+
+def reconstruir_correo(asunto: str, cuerpo: Optional[str], codrequisicion: Optional[str]) -> Dict[str, Any]:
+    """
+    Argumentos de send_email() (salvo destinatario y asunto) para reenviar un
+    correo del log. Los tipos conocidos por el asunto recuperan su HTML con logo
+    (app/core/email_templates.py); el texto es el guardado en el log.
+    """
+    cuerpo_html = None
+    if "Confirmaci??n de creaci??n" in asunto:
+        _, cuerpo_html = correo_confirmacion_solicitante(codrequisicion)
+    elif "pendiente de aprobaci??n" in asunto:
+        _, cuerpo_html = correo_aprobacion_jefe(codrequisicion, None)
+
+    return {
+        "body_text": cuerpo or "",
+        "body_html": cuerpo_html,
+        "attachments": [],
+        "inline_images": imagenes_logo() if cuerpo_html else None,
+    }
+
+
+def _filtros(payload: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    """WHERE sobre email_log con los mismos criterios que el listado."""
+    filtros = []
+    params: Dict[str, Any] = {}
+    if payload.get("desde"):
+        filtros.append("el.fecha_envio::date >= :desde")
+        params["desde"] = payload["desde"]
+    if payload.get("hasta"):
+        filtros.append("el.fecha_envio::date <= :hasta")
+        params["hasta"] = payload["hasta"]
+    if payload.get("destinatario"):
+        filtros.append("el.destinatario = :destinatario")
+        params["destinatario"] = payload["destinatario"]
+    if payload.get("error"):
+        filtros.append("el.error ILIKE :error")
+        params["error"] = f"%{payload['error']}%"
+    return ("WHERE " + " AND ".join(filtros)) if filtros else "", params
+
+
+def _reenviar(fila) -> Tuple[str, Optional[str]]:
+    try:
+        return send_email(
+            fila["destinatario"],
+            fila["asunto"],
+            **reconstruir_correo(fila["asunto"], fila["cuerpo"], fila["codrequisicion"]),
+        )
+    except Exception as e:
+        return "error", str(e)
+
+
+@manejador("reenvio_correos")
+def reenviar_lote(idtrabajo: int, payload: Dict[str, Any]) -> Dict[str, Any]:
+    filtros, params = _filtros(payload)
+    params["limite"] = int(payload.get("limite") or settings.REENVIO_MAX_CORREOS)
+
+    db = database.SessionLocal()
+    try:
+        filas = db.execute(text(SQL_FALLIDOS.format(filtros=filtros)), params).mappings().all()
+
+        progreso: Dict[str, Any] = {
+            "total": len(filas), "procesados": 0, "enviados": 0, "fallidos": 0, "omitidos": 0,
+        }
+        errores: Dict[str, int] = {}
+        reportar_progreso(db, idtrabajo, progreso)
+        db.commit()
+
+        inicio = time.monotonic()
+        hilos = max(1, min(settings.REENVIO_CONCURRENCIA, settings.SMTP_POOL_SIZE))
+        with ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="reenvio") as ejecutor:
+            futuros = {ejecutor.submit(_reenviar, fila): fila for fila in filas}
+            for futuro in as_completed(futuros):
+                fila = futuros[futuro]
+                estado, error = (ESTADO_CIRCUITO_ABIERTO, None) if futuro.cancelled() else futuro.result()
+
+                if estado == ESTADO_CIRCUITO_ABIERTO:
+                    # Sin intento real: no se registra y el correo queda para otro lote
+                    progreso["omitidos"] += 1
+                    if circuito_smtp.abierto():
+                        for pendiente in futuros:
+                            pendiente.cancel()
+                else:
+                    db.execute(text(SQL_EMAIL_LOG), {
+                        "idrequisicion": str(fila["idrequisicion"]) if fila["idrequisicion"] else None,
+                        "destinatario": fila["destinatario"],
+                        "asunto": fila["asunto"],
+                        "cuerpo": fila["cuerpo"],
+                        "estado": estado,
+                        "error": error or None,
+                    })
+                    if estado == "enviado":
+                        progreso["enviados"] += 1
+                    else:
+                        progreso["fallidos"] += 1
+                        clave = (error or "Error desconocido")[:200]
+                        errores[clave] = errores.get(clave, 0) + 1
+                progreso["procesados"] += 1
+
+                if progreso["procesados"] % settings.REENVIO_PROGRESO_CADA == 0:
+                    reportar_progreso(db, idtrabajo, progreso)
+                    db.commit()
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    progreso["duracionSec"] = round(time.monotonic() - inicio, 1)
+    progreso["errores"] = [
+        {"error": e, "cantidad": n}
+        for e, n in sorted(errores.items(), key=lambda x: x[1], reverse=True)[:MAX_ERRORES_RESUMEN]
+    ]
+    print(
+        f"Reenvío en lote {idtrabajo}: {progreso['enviados']} enviados, "
+        f"{progreso['fallidos']} fallidos, {progreso['omitidos']} omitidos de {progreso['total']}"
+    )
+    return progreso
@@ -0,0 +1,224 @@
+"""
+Planificador de tareas periódicas.
+
+    @programar("retencion", 3600)                  # una sola instancia en todo el despliegue
+    def limpiar(): ...
+
+    @programar("outbox", 10, exclusivo=False)      # corre en cada proceso (usa SKIP LOCKED)
+    def drenar(): return hay_mas
+
+- Intervalo con jitter (±SCHEDULER_JITTER) para que los procesos no coincidan.
+  Si la función devuelve True se vuelve a ejecutar en la siguiente vuelta.
+- Las tareas exclusivas solo corren en el líder: el proceso que obtiene
+  pg_try_advisory_lock(hashtext('scheduler:<nombre>')) en una conexión dedicada y
+  la conserva. Si ese proceso muere, PostgreSQL libera el lock y otro toma el
+  relevo en su siguiente intento, sin infraestructura adicional.
+- Métricas por tarea: ejecuciones, fallos, duración última/máxima/media.
+
+El worker (app/worker.py) llama ejecutar_pendientes() en su bucle; con
+TAREAS_EN_API=true la API arranca el mismo bucle en un hilo (iniciar_scheduler).
+"""
+import random
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import text
+
+from app.core import database
+from app.core.config import settings
+
+
+class Tarea:
+    def __init__(self, nombre: str, intervalo_sec: float, funcion: Callable[[], Optional[bool]],
+                 exclusivo: bool, jitter: float):
+        self.nombre = nombre
+        self.intervalo_sec = intervalo_sec
+        self.funcion = funcion
+        self.exclusivo = exclusivo
+        self.jitter = jitter
+        # Primera ejecución desfasada para repartir el arranque entre procesos
+        self.proxima = time.monotonic() + random.uniform(0, intervalo_sec * jitter)
+        self.ejecuciones = 0
+        self.fallos = 0
+        self.omitidas_sin_lider = 0
+        self.duracion_total_ms = 0.0
+        self.duracion_max_ms = 0.0
+        self.ultima_duracion_ms: Optional[float] = None
+        self.ultimo_inicio: Optional[datetime] = None
+        self.ultimo_error: Optional[str] = None
+
+    def programar_siguiente(self, inmediata: bool = False) -> None:
+        if inmediata:
+            self.proxima = time.monotonic()
+            return
+        factor = 1 + random.uniform(-self.jitter, self.jitter)
+        self.proxima = time.monotonic() + self.intervalo_sec * factor
+
+    def resumen(self) -> Dict[str, Any]:
+        return {
+            "intervaloSec": self.intervalo_sec,
+            "exclusivo": self.exclusivo,
+            "ejecuciones": self.ejecuciones,
+            "fallos": self.fallos,
+            "omitidasSinLider": self.omitidas_sin_lider,
+            "ultimaDuracionMs": round(self.ultima_duracion_ms, 1) if self.ultima_duracion_ms is not None else None,
+            "duracionMaxMs": round(self.duracion_max_ms, 1),
+            "duracionMediaMs": round(self.duracion_total_ms / self.ejecuciones, 1) if self.ejecuciones else None,
+            "ultimoInicio": self.ultimo_inicio.isoformat() if self.ultimo_inicio else None,
+            "ultimoError": self.ultimo_error,
+            "proximaEnSec": round(max(0.0, self.proxima - time.monotonic()), 1),
+        }
+
+
+TAREAS: Dict[str, Tarea] = {}
+
+
+def programar(nombre: str, intervalo_sec: float, exclusivo: bool = True, jitter: Optional[float] = None):
+    """Registra una tarea periódica (ver docstring del módulo)."""
+    def decorador(func):
+        TAREAS[nombre] = Tarea(
+            nombre, intervalo_sec, func, exclusivo,
+            settings.SCHEDULER_JITTER if jitter is None else jitter,
+        )
+        return func
+    return decorador
+
+
+def adelantar(nombre: str) -> None:
+    """Hace que la tarea corra en la siguiente vuelta del bucle (si está registrada en este proceso)."""
+    tarea = TAREAS.get(nombre)
+    if tarea is not None:
+        tarea.programar_siguiente(inmediata=True)
+
+
+def registrar_tareas() -> None:
+    """Registra las tareas comunes a la API (TAREAS_EN_API) y a app.worker."""
+    import app.core.mantenimiento  # noqa: F401  (registra sus tareas)
+    import app.core.reenvio_correos  # noqa: F401  (registra su manejador de cola)
+    from app.core.notificaciones_envio import programar_envio_notificaciones
+    from app.core.outbox import programar_outbox
+
+    programar_outbox()
+    programar_envio_notificaciones()
+
+
+# ================================
+# Elección de líder con advisory locks
+# ================================
+
+class _Liderazgo:
+    """Conexión dedicada (autocommit) que conserva los advisory locks obtenidos."""
+
+    def __init__(self):
+        self._conexion = None
+        self._tomados: set = set()
+        self._lock = threading.Lock()
+
+    def es_lider(self, nombre: str) -> bool:
+        with self._lock:
+            try:
+                if self._conexion is None:
+                    engine = database.SessionLocal.kw["bind"]
+                    self._conexion = engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+                    self._tomados.clear()
+                if nombre in self._tomados:
+                    # Si la conexión cayó, el servidor ya liberó el lock
+                    self._conexion.execute(text("SELECT 1"))
+                    return True
+                obtenido = self._conexion.execute(
+                    text("SELECT pg_try_advisory_lock(hashtext(:clave))"),
+                    {"clave": f"scheduler:{nombre}"},
+                ).scalar()
+                if obtenido:
+                    self._tomados.add(nombre)
+                return bool(obtenido)
+            except Exception as e:
+                print(f"WARN: Conexión de liderazgo del scheduler perdida: {e}")
+                self._soltar()
+                return False
+
+    def _soltar(self) -> None:
+        if self._conexion is not None:
+            try:
+                self._conexion.close()
+            except Exception:
+                pass
+        self._conexion = None
+        self._tomados.clear()
+
+    def soltar(self) -> None:
+        """Libera todos los locks (cerrar la sesión los libera en el servidor)."""
+        with self._lock:
+            self._soltar()
+
+    def tomados(self) -> List[str]:
+        return sorted(self._tomados)
+
+
+liderazgo = _Liderazgo()
+
+
+def ejecutar_pendientes(detener: Optional[threading.Event] = None) -> int:
+    """Ejecuta las tareas vencidas. Devuelve cuántas se ejecutaron."""
+    ejecutadas = 0
+    for tarea in list(TAREAS.values()):
+        if detener is not None and detener.is_set():
+            break
+        if time.monotonic() < tarea.proxima:
+            continue
+        if tarea.exclusivo and not liderazgo.es_lider(tarea.nombre):
+            tarea.omitidas_sin_lider += 1
+            tarea.programar_siguiente()
+            continue
+
+        tarea.ultimo_inicio = datetime.now()
+        inicio = time.perf_counter()
+        repetir = False
+        try:
+            repetir = bool(tarea.funcion())
+            tarea.ultimo_error = None
+        except Exception as e:
+            tarea.fallos += 1
+            tarea.ultimo_error = str(e)
+            print(f"ERROR en tarea programada {tarea.nombre}: {e}")
+        duracion = (time.perf_counter() - inicio) * 1000
+        tarea.ejecuciones += 1
+        tarea.ultima_duracion_ms = duracion
+        tarea.duracion_total_ms += duracion
+        tarea.duracion_max_ms = max(tarea.duracion_max_ms, duracion)
+        tarea.programar_siguiente(inmediata=repetir)
+        ejecutadas += 1
+    return ejecutadas
+
+
+def estado_scheduler() -> Dict[str, Any]:
+    return {
+        "lider": liderazgo.tomados(),
+        "tareas": {nombre: t.resumen() for nombre, t in TAREAS.items()},
+    }
+
+
+_hilo: Optional[threading.Thread] = None
+_detener = threading.Event()
+
+
+def _scheduler_loop() -> None:
+    while not _detener.is_set():
+        ejecutar_pendientes(_detener)
+        _detener.wait(settings.SCHEDULER_TICK_SEC)
+    liderazgo.soltar()
+
+
+def iniciar_scheduler() -> None:
+    """Arranca el bucle del scheduler en un hilo (modo TAREAS_EN_API)."""
+    global _hilo
+    if _hilo is None or not _hilo.is_alive():
+        _detener.clear()
+        _hilo = threading.Thread(target=_scheduler_loop, name="scheduler", daemon=True)
+        _hilo.start()
+
+
+def detener_scheduler() -> None:
+    _detener.set()
@@ -13,6 +13,13 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 240  # 4 horas
 # Usado por Swagger y dependencias OAuth2
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_PREFIX}/accesos/login")
 
+def _no_autorizado() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Token inválido o expirado",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
 def create_access_token(
     subject: str,
     expires_delta: Optional[timedelta] = None,
@@ -31,11 +38,29 @@ def decode_access_token(token: str) -> Dict[str, Any]:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[ALGORITHM])
         return payload
     except JWTError:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token inválido o expirado",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+        raise _no_autorizado()
+
+def create_stream_ticket(subject: str) -> str:
+    """
+    Ticket de corta duración (NOTIF_STREAM_TICKET_SEC) que solo sirve para abrir
+    /notificaciones/stream: EventSource no envía cabeceras y el ticket viaja en la
+    URL, donde quedaría el JWT de acceso en los logs de proxies y servidores.
+    """
+    return create_access_token(
+        subject,
+        expires_delta=timedelta(seconds=settings.NOTIF_STREAM_TICKET_SEC),
+        extra_claims={"type": "stream"},
+    )
+
+def decode_stream_ticket(ticket: str) -> Dict[str, Any]:
+    payload = decode_access_token(ticket)
+    if payload.get("type") != "stream":
+        raise _no_autorizado()
+    return payload
 
 def get_current_user(token: str = Depends(oauth2_scheme)) -> Dict[str, Any]:
-    return decode_access_token(token)
\ No newline at end of file
+    payload = decode_access_token(token)
+    # Un ticket de stream no vale como token de acceso
+    if payload.get("type", "access") != "access":
+        raise _no_autorizado()
+    return payload
\ No newline at end of file
@@ -0,0 +1,148 @@
+"""
+Contador de consultas SQL por petición y detector de N+1.
+
+Los hooks before/after_cursor_execute se registran sobre la clase Engine, por lo
+que cubren tanto el motor síncrono como el asíncrono. Por cada petición HTTP se
+acumulan el número de sentencias, el tiempo en base de datos y las repeticiones
+de cada "huella" (la sentencia sin literales). Si una huella se repite más de
+SQL_N1_UMBRAL veces se reporta como posible N+1.
+
+Los totales se devuelven en la cabecera Server-Timing y en logs JSON.
+"""
+import json
+import logging
+import re
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+
+logger = logging.getLogger("app.sql")
+
+_consultas_peticion: ContextVar[Optional[dict]] = ContextVar("sql_monitor_peticion", default=None)
+_detecciones: deque = deque(maxlen=200)
+_instalado = False
+
+_RE_CADENAS = re.compile(r"'(?:[^']|'')*'")
+_RE_NUMEROS = re.compile(r"\b\d+(?:\.\d+)?\b")
+_RE_ESPACIOS = re.compile(r"\s+")
+
+
+def huella_sql(statement: str) -> str:
+    """Normaliza una sentencia para agrupar ejecuciones equivalentes."""
+    huella = _RE_CADENAS.sub("?", statement)
+    huella = _RE_NUMEROS.sub("?", huella)
+    return _RE_ESPACIOS.sub(" ", huella).strip()
+
+
+def _antes(conn, cursor, statement, parameters, context, executemany):
+    if _consultas_peticion.get() is not None:
+        conn.info.setdefault("sql_monitor_inicio", []).append(time.perf_counter())
+
+
+def _despues(conn, cursor, statement, parameters, context, executemany):
+    registro = _consultas_peticion.get()
+    pila = conn.info.get("sql_monitor_inicio")
+    if registro is None or not pila:
+        return
+    ms = (time.perf_counter() - pila.pop()) * 1000
+    registro["consultas"] += 1
+    registro["tiempo_ms"] += ms
+    huella = huella_sql(statement)
+    por_huella = registro["huellas"].get(huella)
+    if por_huella is None:
+        registro["huellas"][huella] = [1, ms]
+    else:
+        por_huella[0] += 1
+        por_huella[1] += ms
+
+
+def instalar_hooks() -> None:
+    """Registra los listeners globales (idempotente)."""
+    global _instalado
+    if _instalado:
+        return
+    event.listen(Engine, "before_cursor_execute", _antes)
+    event.listen(Engine, "after_cursor_execute", _despues)
+    _instalado = True
+
+
+def _nombre_ruta(scope: dict) -> str:
+    ruta = scope.get("route")
+    path = getattr(ruta, "path_format", None) or getattr(ruta, "path", None) or scope.get("path", "")
+    return f"{scope.get('method', '')} {path}"
+
+
+def _reportar(scope: dict, registro: dict, duracion_ms: float) -> None:
+    if registro["consultas"] == 0:
+        return
+    ruta = _nombre_ruta(scope)
+    sospechosas = [
+        {"huella": huella[:300], "repeticiones": n, "tiempo_ms": round(ms, 1)}
+        for huella, (n, ms) in registro["huellas"].items()
+        if n >= settings.SQL_N1_UMBRAL
+    ]
+    logger.info(json.dumps({
+        "evento": "sql_peticion",
+        "ruta": ruta,
+        "consultas": registro["consultas"],
+        "db_ms": round(registro["tiempo_ms"], 1),
+        "duracion_ms": round(duracion_ms, 1),
+    }))
+    if sospechosas:
+        deteccion = {
+            "evento": "posible_n_mas_1",
+            "ruta": ruta,
+            "consultas": registro["consultas"],
+            "db_ms": round(registro["tiempo_ms"], 1),
+            "sentencias": sorted(sospechosas, key=lambda s: s["repeticiones"], reverse=True),
+            "timestamp": time.time(),
+        }
+        _detecciones.append(deteccion)
+        logger.warning(json.dumps(deteccion))
+
+
+class SQLMonitorMiddleware:
+    """Middleware ASGI que cuenta las consultas de cada petición y agrega Server-Timing."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.SQL_MONITOR_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        registro = {"consultas": 0, "tiempo_ms": 0.0, "huellas": {}}
+        inicio = time.perf_counter()
+        token = _consultas_peticion.set(registro)
+
+        async def send_con_server_timing(message):
+            if message["type"] == "http.response.start":
+                total_ms = (time.perf_counter() - inicio) * 1000
+                valor = (
+                    f'db;dur={registro["tiempo_ms"]:.1f};desc="{registro["consultas"]} consultas", '
+                    f"app;dur={total_ms:.1f}"
+                )
+                headers = list(message.get("headers", [])) + [(b"server-timing", valor.encode("latin-1"))]
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_con_server_timing)
+        finally:
+            _consultas_peticion.reset(token)
+            try:
+                _reportar(scope, registro, (time.perf_counter() - inicio) * 1000)
+            except Exception as e:
+                logger.error(f"Error reportando métricas SQL: {e}")
+
+
+def detecciones_recientes(limite: int = 50) -> List[Dict[str, Any]]:
+    """Últimas peticiones marcadas como posible N+1 (más recientes primero)."""
+    return list(_detecciones)[-limite:][::-1]
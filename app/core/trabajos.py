@@ -0,0 +1,202 @@
+"""
+Cola de trabajos en segundo plano requisiciones.cola_trabajos (migrations/worker.sql).
+
+@manejador("tipo") registra la función que procesa el payload; la API crea los
+trabajos con encolar_trabajo() dentro de su transacción y los ejecuta el proceso
+dedicado `python -m app.worker` (o, con TAREAS_EN_API=true, la tarea "cola_trabajos"
+del scheduler de la API). Las tareas periódicas se registran en app/core/scheduler.py.
+"""
+import json
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core import database
+from app.core.config import settings
+
+# tipo -> función(idtrabajo, payload) -> resultado serializable a JSON
+MANEJADORES_COLA: Dict[str, Callable[[int, Dict[str, Any]], Optional[Dict[str, Any]]]] = {}
+
+
+def manejador(tipo: str):
+    def decorador(func):
+        MANEJADORES_COLA[tipo] = func
+        return func
+    return decorador
+
+
+SQL_ENCOLAR_TRABAJO = """
+INSERT INTO requisiciones.cola_trabajos (tipo, payload, creado_por)
+VALUES (:tipo, CAST(:payload AS JSONB), :creado_por)
+RETURNING idtrabajo
+"""
+
+# Un worker que muere a media ejecución deja el intento contado: si ya eran
+# todos, el trabajo pasa a error en lugar de volver a reservarse
+SQL_AGOTAR_TRABAJOS = """
+UPDATE requisiciones.cola_trabajos
+SET estado = 'error',
+    error = COALESCE(error, 'La reserva venció sin terminar el último intento'),
+    terminado_en = NOW(),
+    reservado_hasta = NULL
+WHERE estado = 'procesando'
+  AND reservado_hasta < NOW()
+  AND intentos >= :max_intentos
+"""
+
+# Pendientes listos, o en proceso con la reserva vencida (worker caído) y con
+# intentos restantes
+SQL_RESERVAR_TRABAJO = """
+WITH siguiente AS (
+    SELECT idtrabajo
+    FROM requisiciones.cola_trabajos
+    WHERE (estado = 'pendiente' AND ejecutar_despues <= NOW())
+       OR (estado = 'procesando' AND reservado_hasta < NOW() AND intentos < :max_intentos)
+    ORDER BY ejecutar_despues
+    LIMIT 1
+    FOR UPDATE SKIP LOCKED
+)
+UPDATE requisiciones.cola_trabajos t
+SET estado = 'procesando',
+    intentos = t.intentos + 1,
+    iniciado_en = NOW(),
+    reservado_hasta = NOW() + make_interval(secs => :lease),
+    reservado_por = :worker
+FROM siguiente s
+WHERE t.idtrabajo = s.idtrabajo
+RETURNING t.idtrabajo, t.tipo, t.payload, t.intentos
+"""
+
+SQL_COMPLETAR_TRABAJO = """
+UPDATE requisiciones.cola_trabajos
+SET estado = 'completado', resultado = CAST(:resultado AS JSONB), error = NULL,
+    terminado_en = NOW(), reservado_hasta = NULL
+WHERE idtrabajo = :id AND reservado_por = :worker
+"""
+
+# Avance parcial de un trabajo largo; renueva la reserva para que no la tome otro worker
+SQL_PROGRESO_TRABAJO = """
+UPDATE requisiciones.cola_trabajos
+SET resultado = CAST(:resultado AS JSONB),
+    reservado_hasta = NOW() + make_interval(secs => :lease)
+WHERE idtrabajo = :id AND estado = 'procesando'
+"""
+
+# Reintento con espera creciente hasta WORKER_MAX_INTENTOS
+SQL_FALLAR_TRABAJO = """
+UPDATE requisiciones.cola_trabajos
+SET estado = CASE WHEN intentos < :max_intentos THEN 'pendiente' ELSE 'error' END,
+    ejecutar_despues = NOW() + make_interval(secs => 30 * intentos),
+    error = :error,
+    terminado_en = CASE WHEN intentos < :max_intentos THEN NULL ELSE NOW() END,
+    reservado_hasta = NULL
+WHERE idtrabajo = :id AND reservado_por = :worker
+"""
+
+
+def encolar_trabajo(
+    db: Session, tipo: str, payload: Dict[str, Any], creado_por: Optional[str] = None
+) -> int:
+    """Encola un trabajo en la transacción de `db` (no hace commit). Devuelve el idtrabajo."""
+    return db.execute(text(SQL_ENCOLAR_TRABAJO), {
+        "tipo": tipo,
+        "payload": json.dumps(payload, default=str),
+        "creado_por": creado_por,
+    }).scalar_one()
+
+
+def reportar_progreso(db: Session, idtrabajo: int, progreso: Dict[str, Any]) -> None:
+    """Deja el avance en cola_trabajos.resultado (no hace commit)."""
+    db.execute(text(SQL_PROGRESO_TRABAJO), {
+        "id": idtrabajo,
+        "resultado": json.dumps(progreso, default=str),
+        "lease": settings.WORKER_LEASE_SEC,
+    })
+
+
+def obtener_trabajo(db: Session, idtrabajo: int) -> Optional[Dict[str, Any]]:
+    fila = db.execute(text("""
+        SELECT idtrabajo, tipo, estado, intentos, resultado, error,
+               creado_por, creado_en, iniciado_en, terminado_en
+        FROM requisiciones.cola_trabajos
+        WHERE idtrabajo = :id
+    """), {"id": idtrabajo}).mappings().first()
+    if fila is None:
+        return None
+    return {
+        "idTrabajo": fila["idtrabajo"],
+        "tipo": fila["tipo"],
+        "estado": fila["estado"],
+        "intentos": fila["intentos"],
+        "resultado": fila["resultado"],
+        "error": fila["error"],
+        "creadoPor": fila["creado_por"],
+        "creadoEn": fila["creado_en"].isoformat() if fila["creado_en"] else None,
+        "iniciadoEn": fila["iniciado_en"].isoformat() if fila["iniciado_en"] else None,
+        "terminadoEn": fila["terminado_en"].isoformat() if fila["terminado_en"] else None,
+    }
+
+
+def ejecutar_siguiente_trabajo(db: Session, worker_id: str) -> bool:
+    """
+    Reserva y ejecuta un trabajo de la cola. Devuelve False si no había ninguno.
+    La reserva se confirma antes de ejecutar, así que el manejador puede usar
+    sus propias sesiones.
+    """
+    db.execute(text(SQL_AGOTAR_TRABAJOS), {"max_intentos": settings.WORKER_MAX_INTENTOS})
+    fila = db.execute(text(SQL_RESERVAR_TRABAJO), {
+        "lease": settings.WORKER_LEASE_SEC,
+        "worker": worker_id,
+        "max_intentos": settings.WORKER_MAX_INTENTOS,
+    }).mappings().first()
+    db.commit()
+    if fila is None:
+        return False
+
+    payload = fila["payload"] or {}
+    if isinstance(payload, str):
+        payload = json.loads(payload)
+
+    try:
+        funcion = MANEJADORES_COLA.get(fila["tipo"])
+        if funcion is None:
+            raise LookupError(f"Sin manejador para el tipo de trabajo '{fila['tipo']}'")
+        resultado = funcion(fila["idtrabajo"], payload)
+    except Exception as e:
+        db.rollback()
+        print(f"ERROR en trabajo {fila['idtrabajo']} ({fila['tipo']}): {e}")
+        db.execute(text(SQL_FALLAR_TRABAJO), {
+            "id": fila["idtrabajo"],
+            "worker": worker_id,
+            "error": str(e),
+            "max_intentos": settings.WORKER_MAX_INTENTOS,
+        })
+        db.commit()
+        return True
+
+    db.execute(text(SQL_COMPLETAR_TRABAJO), {
+        "id": fila["idtrabajo"],
+        "worker": worker_id,
+        "resultado": json.dumps(resultado, default=str) if resultado is not None else None,
+    })
+    db.commit()
+    return True
+
+
+def procesar_cola(worker_id: str, limite: int = 10) -> bool:
+    """
+    Ejecuta hasta `limite` trabajos con una sesión propia. Devuelve True si pudo
+    quedar alguno (para que el scheduler vuelva a llamarla en la siguiente vuelta).
+    """
+    db = database.SessionLocal()
+    try:
+        for _ in range(limite):
+            if not ejecutar_siguiente_trabajo(db, worker_id):
+                return False
+        return True
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
@@ -1,5 +1,6 @@
 import sys
 import os
+import socket
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Ruta base de la aplicación
@@ -14,11 +15,15 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
-from threading import Thread
-import time
-from sqlalchemy import text
-from app.core.database import SessionLocal
-from app.core.mail import send_email
+from app.core.config import settings
+from app.core.cache import bus_cache
+from app.core.database import engine, iniciar_verificacion_pool
+from app.core.mail import cerrar_pool_smtp
+from app.core.pg_listen import canal_notificaciones
+from app.core.scheduler import iniciar_scheduler, detener_scheduler, programar, registrar_tareas
+from app.core.trabajos import procesar_cola
+from app.core.monitor import MonitorMiddleware, iniciar_heartbeat, instrumentar_engine
+from app.core.sql_monitor import SQLMonitorMiddleware, instalar_hooks as instalar_hooks_sql
 
 # Intentar importar los routers, si fallan, crear routers vacíos
 try:
@@ -69,6 +74,12 @@ except ImportError:
     from fastapi import APIRouter
     permisos_router = APIRouter()
 
+try:
+    from app.api.monitor.router import router as monitor_router
+except ImportError:
+    from fastapi import APIRouter
+    monitor_router = APIRouter()
+
 app = FastAPI(
     title="Sistema de Almacén SEDH",
     description="API para el sistema de gestión de almacén de la SEDH",
@@ -82,8 +93,17 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "Server-Timing"],
 )
 
+# Monitor de bloqueo del event loop (ver app/core/monitor.py)
+instrumentar_engine(engine)
+app.add_middleware(MonitorMiddleware)
+
+# Conteo de consultas por petición, detector de N+1 y cabecera Server-Timing
+instalar_hooks_sql()
+app.add_middleware(SQLMonitorMiddleware)
+
 # Servir archivos estáticos del frontend
 # Intentar montar desde /opt/almacen-backend/app/frontend
 frontend_path = "/opt/almacen-backend/app/frontend" if os.path.exists("/opt/almacen-backend/app/frontend") else "app/frontend"
@@ -100,6 +120,7 @@ app.include_router(admin_router, prefix="/api/v1/admin-legacy", tags=["administr
 app.include_router(admin_ui_router)  # Ya tiene su propio prefix /api/v1/admin - ROUTER NUEVO
 app.include_router(notificaciones_router, prefix="/api/v1/notificaciones", tags=["notificaciones"])
 app.include_router(permisos_router, prefix="/api/v1/permisos", tags=["permisos"])
+app.include_router(monitor_router, prefix="/api/v1/monitor", tags=["monitor"])
 
 # Función auxiliar para servir archivos frontend
 def get_frontend_file(filename: str):
@@ -232,64 +253,60 @@ if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="127.0.0.1", port=8000, reload=True)
 
-# ================================
-# Background job: envío de notificaciones por correo
-# ================================
+@app.on_event("startup")
+async def _startup_monitor():
+    iniciar_heartbeat()
+    iniciar_verificacion_pool()
 
-def _notificaciones_sender_loop():
-    enabled = os.getenv("NOTIF_SENDER_ENABLED", "false").lower() in ("1", "true", "yes")
-    interval = int(os.getenv("NOTIF_SENDER_INTERVAL_SEC", "120"))
-    if not enabled:
+@app.on_event("startup")
+async def _startup_bandeja():
+    # Sin los triggers la tabla no se mantiene: las listas saldrían desactualizadas
+    if not settings.BANDEJA_APROBACION_ENABLED:
+        return
+    from app.core.database import AsyncSessionLocal
+    from app.repositories.bandeja import bandeja_activa
+
+    try:
+        async with AsyncSessionLocal() as db:
+            activa = await bandeja_activa(db)
+    except Exception as e:
+        print(f"WARN: No se pudo comprobar la bandeja de aprobación: {e}")
         return
-    while True:
-        try:
-            db = SessionLocal()
-            # Seleccionar hasta 100 pendientes globales para evitar duplicaciones masivas
-            q = text("""
-                SELECT n.idnotificacion, n.emailusuario, n.tipo, n.mensaje, r.codrequisicion
-                FROM requisiciones.notificaciones n
-                LEFT JOIN requisiciones.requisiciones r ON r.idrequisicion = n.idrequisicion
-                WHERE (n.estado_envio IS NULL OR n.estado_envio <> 'enviado')
-                ORDER BY n.fechacreacion ASC
-                LIMIT 100
-            """)
-            rows = db.execute(q).fetchall()
-
-            for idnotif, emailusuario, tipo, mensaje, codreq in rows:
-                subject = f"[SEDH Almacén] Notificación: {tipo}"
-                body = mensaje
-                if codreq:
-                    body += f"\n\nCódigo: {codreq}"
-
-                estado, error = send_email(emailusuario, subject, body)
-                if estado == "enviado":
-                    db.execute(text("""
-                        UPDATE requisiciones.notificaciones
-                        SET estado_envio='enviado', medio=COALESCE(medio,'smtp'), enviado_en=NOW(), error_envio=NULL
-                        WHERE idnotificacion=:id
-                    """), {"id": idnotif})
-                else:
-                    db.execute(text("""
-                        UPDATE requisiciones.notificaciones
-                        SET estado_envio='error', medio=COALESCE(medio,'smtp'), enviado_en=NOW(), error_envio=:err
-                        WHERE idnotificacion=:id
-                    """), {"id": idnotif, "err": error or "Error desconocido"})
-            db.commit()
-        except Exception:
-            try:
-                db.rollback()
-            except Exception:
-                pass
-        finally:
-            try:
-                db.close()
-            except Exception:
-                pass
-        time.sleep(interval)
+    if not activa:
+        print("WARN: BANDEJA_APROBACION_ENABLED=true pero la bandeja no está activada; "
+              "ejecutar `python -m app.repositories.bandeja activar`")
 
 @app.on_event("startup")
-async def _startup_notif_sender():
-    # Nota: en producción con múltiples workers, este hilo se iniciará por worker.
-    # Para evitar envíos duplicados, usar un único worker o mover este job a un proceso dedicado.
-    t = Thread(target=_notificaciones_sender_loop, daemon=True)
-    t.start()
\ No newline at end of file
+async def _startup_scheduler():
+    # Las tareas exclusivas corren en un solo proceso (advisory lock en PostgreSQL);
+    # outbox y notificaciones corren en todos y se reparten las filas con SKIP LOCKED.
+    # Con TAREAS_EN_API=false las ejecuta el proceso `python -m app.worker`
+    if settings.TAREAS_EN_API:
+        registrar_tareas()
+
+        # Sin worker dedicado la cola de trabajos se drena desde el scheduler
+        proceso_id = f"api:{socket.gethostname()}:{os.getpid()}"
+
+        @programar("cola_trabajos", settings.WORKER_TICK_SEC, exclusivo=False)
+        def _cola_trabajos():
+            return procesar_cola(proceso_id)
+
+        iniciar_scheduler()
+
+@app.on_event("shutdown")
+async def _shutdown_smtp():
+    detener_scheduler()
+    cerrar_pool_smtp()
+
+@app.on_event("shutdown")
+async def _shutdown_pg_listen():
+    await canal_notificaciones.detener()
+
+@app.on_event("startup")
+async def _startup_cache():
+    # Cada proceso escucha las invalidaciones de las escrituras hechas en los demás
+    bus_cache.iniciar()
+
+@app.on_event("shutdown")
+async def _shutdown_cache():
+    bus_cache.detener()
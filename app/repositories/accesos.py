@@ -2,6 +2,8 @@ from sqlalchemy.orm import Session
 from sqlalchemy import text
 import logging
 
+from app.core.cache import publicar_invalidacion
+
 logger = logging.getLogger(__name__)
 
 def login_empleado(db: Session, email: str, password: str) -> tuple[bool, str | None]:
@@ -120,6 +122,7 @@ def asignar_rol_usuario(db: Session, admin_email: str, usuario_email: str, id_ro
             }
         )
         
+        publicar_invalidacion(db, "permisos", usuario_email.strip().lower())
         db.commit()
         return True, "Rol asignado exitosamente"
         
@@ -144,6 +147,7 @@ def asignar_modulo_rol(db: Session, admin_email: str, id_rol: str, modulo: str)
             }
         )
         
+        publicar_invalidacion(db, "permisos")
         db.commit()
         return True, "Módulo asignado al rol exitosamente"
         
@@ -3,35 +3,77 @@ Funciones administrativas para gestión de accesos, empleados, roles y dependenc
 Solo disponibles para usuarios con rol 'Administrador'
 """
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
 from uuid import UUID, uuid4
 from typing import List, Optional, Dict, Any
 import logging
 
+from app.core.cache import CacheLocal, publicar_invalidacion
+from app.core.config import settings
+
 logger = logging.getLogger(__name__)
 
 logger = logging.getLogger(__name__)
 
+# Consultadas en cada endpoint de administración; se invalidan por email
+# (namespace "permisos") desde las funciones que cambian roles o módulos
+_cache_admin = CacheLocal("es_administrador", "permisos", settings.CACHE_PERMISOS_TTL_SEC)
+_cache_modulos = CacheLocal("modulos_empleado", "permisos", settings.CACHE_PERMISOS_TTL_SEC)
+
+
+def _clave_permisos(email: str) -> str:
+    return (email or "").strip().lower()
+
+
+def _invalidar_permisos(db: Session, email: Optional[str] = None) -> None:
+    """Invalida los permisos cacheados de `email` (o de todos) al confirmar `db`."""
+    publicar_invalidacion(db, "permisos", _clave_permisos(email) if email else None)
+
+
+SQL_ROL_EMPLEADO = """
+SELECT r.nomrol 
+FROM acceso.empleados_roles er
+JOIN acceso.roles r ON r.idrol = er.idrol
+WHERE LOWER(TRIM(er.emailinstitucional)) = LOWER(TRIM(:email))
+AND COALESCE(er.actlaboralmente, FALSE) = TRUE
+"""
+
+
 def verificar_es_administrador(db: Session, email: str) -> bool:
     """
     Verifica si un usuario tiene rol de Administrador
     """
+    clave = _clave_permisos(email)
+    es_admin = _cache_admin.obtener(clave)
+    if es_admin is not None:
+        return es_admin
+    version = _cache_admin.version()
     try:
-        resultado = db.execute(
-            text("""
-                SELECT r.nomrol 
-                FROM acceso.empleados_roles er
-                JOIN acceso.roles r ON r.idrol = er.idrol
-                WHERE LOWER(TRIM(er.emailinstitucional)) = LOWER(TRIM(:email))
-                AND COALESCE(er.actlaboralmente, FALSE) = TRUE
-            """),
-            {"email": email}
-        ).mappings().first()
-        
-        return resultado and resultado["nomrol"] == "Administrador"
+        resultado = db.execute(text(SQL_ROL_EMPLEADO), {"email": email}).mappings().first()
+        es_admin = bool(resultado and resultado["nomrol"] == "Administrador")
+    except Exception as e:
+        logger.error(f"Error verificando administrador: {e}")
+        return False
+    _cache_admin.guardar(clave, es_admin, version)
+    return es_admin
+
+
+async def verificar_es_administrador_async(db: AsyncSession, email: str) -> bool:
+    """verificar_es_administrador() para sesiones asíncronas (misma caché)."""
+    clave = _clave_permisos(email)
+    es_admin = _cache_admin.obtener(clave)
+    if es_admin is not None:
+        return es_admin
+    version = _cache_admin.version()
+    try:
+        resultado = (await db.execute(text(SQL_ROL_EMPLEADO), {"email": email})).mappings().first()
+        es_admin = bool(resultado and resultado["nomrol"] == "Administrador")
     except Exception as e:
         logger.error(f"Error verificando administrador: {e}")
         return False
+    _cache_admin.guardar(clave, es_admin, version)
+    return es_admin
 
 # --- GESTIÓN DE EMPLEADOS ---
 def listar_empleados(db: Session) -> List[Dict[str, Any]]:
@@ -170,6 +212,7 @@ def cambiar_estado_empleado(db: Session, email: str, activo: bool) -> Dict[str,
         if resultado.rowcount == 0:
             raise ValueError("Empleado no encontrado")
         
+        _invalidar_permisos(db, email)
         db.commit()
         estado = "activado" if activo else "desactivado"
         return {"mensaje": f"Empleado {estado} exitosamente", "email": email}
@@ -260,6 +303,7 @@ def asignar_rol_empleado(db: Session, email: str, idrol: UUID) -> Dict[str, Any]
             text("UPDATE acceso.empleados_roles SET idrol = :idrol WHERE LOWER(TRIM(emailinstitucional)) = LOWER(TRIM(:email))"),
             {"email": email, "idrol": str(idrol)}
         )
+        _invalidar_permisos(db, email)
         db.commit()
         
         return {"mensaje": f"Rol '{rol['nomrol']}' asignado exitosamente a {email}", "email": email}
@@ -362,6 +406,7 @@ def cambiar_estado_empleado(db: Session, email: str, activo: bool) -> Dict[str,
         if resultado.rowcount == 0:
             raise ValueError("Empleado no encontrado")
         
+        _invalidar_permisos(db, email)
         db.commit()
         estado = "activado" if activo else "dado de baja"
         return {
@@ -431,6 +476,7 @@ def eliminar_rol_empleado(
         if resultado.rowcount == 0:
             raise ValueError("Rol no encontrado para este empleado")
         
+        _invalidar_permisos(db, email)
         db.commit()
         return {
             "mensaje": "Rol eliminado exitosamente", 
@@ -661,6 +707,8 @@ def actualizar_rol(
         if resultado.rowcount == 0:
             raise ValueError("Rol no encontrado")
         
+        # El nombre del rol decide quién es Administrador
+        _invalidar_permisos(db)
         db.commit()
         return {
             "mensaje": "Rol actualizado exitosamente",
@@ -708,6 +756,11 @@ def eliminar_rol(db: Session, id_rol: int) -> Dict[str, Any]:
 # --- GESTIÓN DE PERMISOS PERSONALIZADOS ---
 def obtener_modulos_personalizados(db: Session, email: str) -> List[str]:
     """Obtiene los módulos asignados al rol del empleado"""
+    clave = _clave_permisos(email)
+    modulos = _cache_modulos.obtener(clave)
+    if modulos is not None:
+        return list(modulos)
+    version = _cache_modulos.version()
     try:
         # Obtener módulos basados en el rol del empleado
         resultados = db.execute(
@@ -720,10 +773,12 @@ def obtener_modulos_personalizados(db: Session, email: str) -> List[str]:
             {"email": email}
         ).fetchall()
         
-        return [row[0] for row in resultados]
+        modulos = [row[0] for row in resultados]
     except Exception as e:
         logger.warning(f"Error obteniendo módulos del empleado: {e}")
         return []
+    _cache_modulos.guardar(clave, tuple(modulos), version)
+    return modulos
 
 def asignar_modulos_personalizados(db: Session, admin_email: str, email: str, modulos: List[str]) -> Dict[str, Any]:
     """Asigna módulos al rol del empleado usando procedimientos almacenados"""
@@ -761,6 +816,8 @@ def asignar_modulos_personalizados(db: Session, admin_email: str, email: str, mo
                 logger.warning(f"Error asignando módulo {modulo}: {mod_error}")
                 mensajes.append(f"Módulo {modulo}: Error - {str(mod_error)}")
         
+        # Los módulos son del rol: cambian para todos sus empleados
+        _invalidar_permisos(db)
         db.commit()
         
         return {
@@ -856,6 +913,7 @@ def eliminar_permisos_personalizados(db: Session, email: str) -> Dict[str, Any]:
             {"idrol": empleado_rol[0]}
         )
         
+        _invalidar_permisos(db)
         db.commit()
         
         return {
@@ -1099,4 +1157,5 @@ def asignar_rol_empleado_con_password(
             "creado_por": creado_por
         })
     
+    _invalidar_permisos(db, email)
     db.commit()
\ No newline at end of file
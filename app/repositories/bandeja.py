@@ -0,0 +1,215 @@
+"""
+Bandeja de aprobación (requisiciones.bandeja_aprobacion).
+
+La tabla la mantienen triggers (migrations/bandeja_aprobacion.sql) en la misma
+transacción que crea o responde una requisición o cambia un rol o un jefe. Los
+triggers solo existen con la bandeja activada; activarla reconstruye la tabla y
+se hace junto con BANDEJA_APROBACION_ENABLED=true. Aquí están las lecturas
+indexadas que usan las bandejas de pendientes y el contador, y los comandos:
+
+    python -m app.repositories.bandeja activar
+    python -m app.repositories.bandeja desactivar
+    python -m app.repositories.bandeja verificar
+    python -m app.repositories.bandeja reconstruir
+"""
+from typing import Any, Dict, List
+
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+
+# Rol de la bandeja -> función requisiciones_pendientes_* equivalente
+FUNCIONES_PENDIENTES = {
+    "JefInmediato": "requisiciones_pendientes_jefe",
+    "GerAdmon": "requisiciones_pendientes_gerente",
+    "JefSerMat": "requisiciones_pendientes_jefe_materiales",
+    "EmpAlmacen": "requisiciones_pendientes_almacen",
+}
+
+# Mismas columnas que devuelven las funciones requisiciones_pendientes_*,
+# para reutilizar _mapear_pendientes sin cambios
+SQL_PENDIENTES_BANDEJA = """
+SELECT
+    r.idrequisicion,
+    r.codrequisicion,
+    r.nomempleado,
+    d.nomdependencia AS dependencia,
+    r.fecsolicitud,
+    CASE WHEN p.codigo ~ '^\\d+$' THEN p.codigo::INTEGER ELSE 0 END AS codprograma,
+    r.prointermedio,
+    r.profinal,
+    r.obsempleado,
+    r.gastotaldelpedido,
+    (
+        SELECT json_agg(json_build_object(
+            'idProducto', dr.idproducto,
+            'nombre', prod.nomproducto,
+            'cantidad', dr.cantsolicitada,
+            'gasUnitario', dr.gasunitario,
+            'gasTotalProducto', dr.gastotalproducto
+        ))
+        FROM requisiciones.detalle_requisicion dr
+        JOIN productos.productos prod ON prod.idproducto = dr.idproducto
+        WHERE dr.idrequisicion = r.idrequisicion
+    ) AS productos
+FROM requisiciones.bandeja_aprobacion b
+JOIN requisiciones.requisiciones r ON r.idrequisicion = b.idrequisicion
+LEFT JOIN usuarios.dependencias d ON d.iddependencia = r.iddependencia
+LEFT JOIN requisiciones.programas p ON p.idprograma = r.codprograma
+WHERE b.emailaprobador = LOWER(:email) AND b.rol = :rol
+ORDER BY r.fecsolicitud DESC, r.codrequisicion DESC
+"""
+
+# Sin bandeja: mismo filtro que _mapear_pendientes(excluir_atendidas=True) aplica
+# a la lista del jefe, para que el contador coincida con la lista
+SQL_CONTEO_PENDIENTES_JEFE = """
+SELECT COUNT(*)
+FROM (
+    SELECT COALESCE(j->>'idrequisicion', j->>'idRequisicion', j->>'id_requisicion')::UUID AS id
+    FROM (SELECT to_jsonb(f) AS j FROM requisiciones.requisiciones_pendientes_jefe(:email) f) x
+) s
+LEFT JOIN requisiciones.requisiciones r ON r.idrequisicion = s.id
+WHERE r.idrequisicion IS NULL
+   OR (
+       r.fecha_hora_aprobacion_almacen IS NULL
+       AND (COALESCE(r.estgeneral, '') = ''
+            OR UPPER(r.estgeneral) IN ('EN ESPERA', 'PENDIENTE', 'PENDIENTE ALMACEN', 'ESPERA ALMACEN'))
+   )
+"""
+
+SQL_CONTEO_BANDEJA = """
+SELECT rol, COUNT(*) AS total
+FROM requisiciones.bandeja_aprobacion
+WHERE emailaprobador = LOWER(:email)
+GROUP BY rol
+"""
+
+
+async def listar_pendientes_bandeja(db: AsyncSession, email: str, rol: str) -> List[Any]:
+    """Pendientes de un aprobador para un rol, leídos de la bandeja."""
+    return (await db.execute(
+        text(SQL_PENDIENTES_BANDEJA), {"email": email, "rol": rol}
+    )).mappings().all()
+
+
+async def contar_bandeja(db: AsyncSession, email: str) -> Dict[str, int]:
+    """Número de pendientes por rol para un aprobador."""
+    rows = (await db.execute(text(SQL_CONTEO_BANDEJA), {"email": email})).mappings().all()
+    return {r["rol"]: int(r["total"]) for r in rows}
+
+
+async def contar_pendientes(db: AsyncSession, email: str) -> Dict[str, int]:
+    """
+    Contador de pendientes por rol. Con BANDEJA_APROBACION_ENABLED es una sola
+    consulta indexada; si no, cuenta sobre las funciones requisiciones_pendientes_*.
+    """
+    if settings.BANDEJA_APROBACION_ENABLED:
+        return await contar_bandeja(db, email)
+
+    conteo: Dict[str, int] = {}
+    for rol, funcion in FUNCIONES_PENDIENTES.items():
+        if rol == "JefInmediato":
+            sql = SQL_CONTEO_PENDIENTES_JEFE
+        else:
+            sql = f"SELECT COUNT(*) FROM requisiciones.{funcion}(:email)"
+        try:
+            total = (await db.execute(text(sql), {"email": email})).scalar_one()
+        except SQLAlchemyError:
+            # La función rechaza a usuarios sin el rol
+            await db.rollback()
+            continue
+        if total:
+            conteo[rol] = int(total)
+    return conteo
+
+
+async def verificar_bandeja(db: AsyncSession) -> List[Dict[str, Any]]:
+    """Diferencias entre la bandeja almacenada y la calculada (faltante/sobrante)."""
+    rows = (await db.execute(
+        text("SELECT * FROM requisiciones.verificar_bandeja_aprobacion()")
+    )).mappings().all()
+    return [
+        {
+            "tipo": r["tipo"],
+            "emailAprobador": r["emailaprobador"],
+            "rol": r["rol"],
+            "idRequisicion": str(r["idrequisicion"]),
+        }
+        for r in rows
+    ]
+
+
+async def bandeja_activa(db: AsyncSession) -> bool:
+    """True si los triggers de la bandeja están instalados."""
+    return bool((await db.execute(
+        text("SELECT requisiciones.bandeja_aprobacion_activa()")
+    )).scalar_one())
+
+
+async def activar_bandeja(db: AsyncSession, activa: bool) -> int:
+    """Instala (y reconstruye) o quita los triggers de la bandeja. Devuelve las filas."""
+    try:
+        filas = (await db.execute(
+            text("SELECT requisiciones.activar_bandeja_aprobacion(:activa)"), {"activa": activa}
+        )).scalar_one()
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    return int(filas or 0)
+
+
+async def reconstruir_bandeja(db: AsyncSession) -> int:
+    """Recalcula la bandeja completa. Devuelve el número de filas insertadas."""
+    try:
+        filas = (await db.execute(
+            text("SELECT requisiciones.reconstruir_bandeja_aprobacion()")
+        )).scalar_one()
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    return int(filas or 0)
+
+
+if __name__ == "__main__":
+    import argparse
+    import asyncio
+
+    from app.core.database import AsyncSessionLocal, async_engine
+
+    parser = argparse.ArgumentParser(description="Verificar o reconstruir la bandeja de aprobación")
+    parser.add_argument("accion", choices=["activar", "desactivar", "verificar", "reconstruir"])
+    args = parser.parse_args()
+
+    async def _main() -> int:
+        try:
+            async with AsyncSessionLocal() as db:
+                if args.accion in ("activar", "desactivar"):
+                    filas = await activar_bandeja(db, args.accion == "activar")
+                    if args.accion == "activar":
+                        print(f"✅ Bandeja activada: {filas} filas")
+                    else:
+                        print("✅ Bandeja desactivada: triggers eliminados")
+                    return 0
+                if not await bandeja_activa(db):
+                    print("❌ La bandeja no está activada (python -m app.repositories.bandeja activar)")
+                    return 1
+                if args.accion == "reconstruir":
+                    filas = await reconstruir_bandeja(db)
+                    print(f"✅ Bandeja reconstruida: {filas} filas")
+                    return 0
+                diferencias = await verificar_bandeja(db)
+                for d in diferencias:
+                    print(f"{d['tipo']:9} {d['rol']:12} {d['emailAprobador']} {d['idRequisicion']}")
+                if diferencias:
+                    print(f"❌ {len(diferencias)} diferencias encontradas")
+                    return 1
+                print("✅ Bandeja consistente")
+                return 0
+        finally:
+            await async_engine.dispose()
+
+    raise SystemExit(asyncio.run(_main()))
@@ -0,0 +1,114 @@
+"""
+Lecturas de requisiciones.notificaciones para el dashboard.
+
+- contar_no_leidas(): conteo del badge con el índice parcial
+  ix_notificaciones_no_leidas (migrations/notificaciones_no_leidas.sql).
+- listar_notificaciones(): páginas por cursor (keyset). El cursor `before` es
+  "<fechacreacion ISO>,<idnotificacion>" de la última fila recibida; la página
+  siguiente empieza justo después, sin OFFSET, con ix_notificaciones_email_orden.
+  Las filas sin fechacreacion se ordenan como '-infinity' (al final) y su cursor
+  es "-infinity,<idnotificacion>".
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+SQL_NO_LEIDAS = """
+SELECT COUNT(*)
+FROM requisiciones.notificaciones
+WHERE LOWER(emailusuario) = LOWER(:email)
+  AND leida IS NOT TRUE
+"""
+
+SQL_COLUMNAS = (
+    "SELECT n.idnotificacion, n.tipo, n.mensaje, n.leida, n.fechacreacion, "
+    "n.emailusuario, n.estado_envio, n.medio, n.enviado_en, n.error_envio, "
+    "n.idrequisicion, COALESCE(r.codrequisicion, '') AS codrequisicion "
+    "FROM requisiciones.notificaciones n "
+    "LEFT JOIN requisiciones.requisiciones r ON r.idrequisicion = n.idrequisicion "
+)
+
+# Clave de orden de las páginas; la misma expresión que ix_notificaciones_email_orden
+ORDEN_FECHA = "COALESCE(n.fechacreacion, '-infinity')"
+SIN_FECHA = "-infinity"
+
+
+async def contar_no_leidas(db: AsyncSession, email: str) -> int:
+    return int((await db.execute(text(SQL_NO_LEIDAS), {"email": email})).scalar() or 0)
+
+
+async def obtener_notificacion(db: AsyncSession, idnotificacion: str) -> Optional[Dict[str, Any]]:
+    fila = (await db.execute(
+        text(SQL_COLUMNAS + "WHERE n.idnotificacion = CAST(:id AS UUID)"), {"id": idnotificacion}
+    )).mappings().first()
+    return dict(fila) if fila is not None else None
+
+
+def decodificar_cursor(before: str) -> Tuple[Optional[datetime], UUID]:
+    """
+    "<fechacreacion ISO>,<idnotificacion>" -> (fecha, id); fecha es None si la fila
+    no tenía fechacreacion. Lanza ValueError si no es válido.
+    """
+    fecha_txt, _, id_txt = before.strip().rpartition(",")
+    if fecha_txt == SIN_FECHA:
+        return None, UUID(id_txt)
+    try:
+        fecha = datetime.fromisoformat(fecha_txt)
+    except ValueError:
+        # Un '+' de la zona horaria sin codificar llega como espacio en la query string
+        fecha = datetime.fromisoformat(fecha_txt.replace(" ", "+"))
+    return fecha, UUID(id_txt)
+
+
+def cursor(fila: Dict[str, Any]) -> str:
+    fecha = fila["fechacreacion"]
+    return f"{fecha.isoformat() if fecha is not None else SIN_FECHA},{fila['idnotificacion']}"
+
+
+async def listar_notificaciones(
+    db: AsyncSession,
+    email: Optional[str],
+    solo_no_leidas: bool = False,
+    codigo: Optional[str] = None,
+    limite: int = 200,
+    before: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Una página de notificaciones, de la más reciente a la más antigua. Sin `email`
+    devuelve las de todos los usuarios (vista de administrador). `siguiente` es el
+    cursor para pedir la página siguiente, o None si no hay más.
+    """
+    filtros: List[str] = []
+    params: Dict[str, Any] = {"limite": limite}
+
+    if email:
+        filtros.append("LOWER(n.emailusuario) = LOWER(:email)")
+        params["email"] = email
+
+    if solo_no_leidas:
+        filtros.append("n.leida IS NOT TRUE")
+
+    if codigo:
+        filtros.append("LOWER(r.codrequisicion) LIKE LOWER(:codigo)")
+        params["codigo"] = f"%{codigo}%"
+
+    if before:
+        fecha, params["antes_id"] = decodificar_cursor(before)
+        # '-infinity' sin tipo: PostgreSQL lo convierte al tipo de fechacreacion
+        params["antes_fecha"] = fecha if fecha is not None else SIN_FECHA
+        filtros.append(f"({ORDEN_FECHA}, n.idnotificacion) < (:antes_fecha, :antes_id)")
+
+    query = (
+        SQL_COLUMNAS
+        + (" WHERE " + " AND ".join(filtros) if filtros else "")
+        + f" ORDER BY {ORDEN_FECHA} DESC, n.idnotificacion DESC LIMIT :limite"
+    )
+    data = [dict(row) for row in (await db.execute(text(query), params)).mappings().all()]
+    return {
+        "notificaciones": data,
+        "total": len(data),
+        "siguiente": cursor(data[-1]) if len(data) == limite else None,
+    }
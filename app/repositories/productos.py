@@ -1,19 +1,40 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from sqlalchemy import text
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
+import hashlib
 import json
 from typing import Mapping
 from uuid import UUID
 
+from pydantic import TypeAdapter
+
+from app.core.cache import CacheLocal, publicar_invalidacion_async
+from app.core.config import settings
+from app.core.imagenes import generar_miniatura, hash_imagen
 from app.schemas.productos.schemas import CategoriaOut, ProductoPorCategoriaOut, ProductoOut, CatalogosProductoOut, CategoriaRefOut, UnidadMedidaOut, ProductoCreateIn
 from app.schemas.productos.schemas import CategoriaCreateIn  # nuevo
 
 SQL_LISTAR_CATEGORIAS = """
-SELECT codobjeto, nomcategoria, descategoria, imagen
+SELECT idcategoria, codobjeto, nomcategoria, descategoria, imagen_hash
 FROM productos.categorias
 ORDER BY codobjeto
 """
 
+SQL_IMAGEN_CATEGORIA = """
+SELECT imagen_hash,
+       CASE WHEN :miniatura AND imagen_miniatura IS NOT NULL THEN imagen_miniatura ELSE imagen END AS contenido,
+       (:miniatura AND imagen_miniatura IS NOT NULL) AS es_miniatura
+FROM productos.categorias
+WHERE idcategoria = CAST(:idcategoria AS UUID) AND imagen IS NOT NULL
+"""
+
+SQL_GUARDAR_MINIATURA = """
+UPDATE productos.categorias
+SET imagen_miniatura = :miniatura
+WHERE idcategoria = CAST(:idcategoria AS UUID)
+"""
+
 SQL_PRODUCTOS_POR_CATEGORIA = """
 SELECT * FROM productos.VerProductosPorCategoria(:p_codobjeto)
 """
@@ -98,43 +119,105 @@ def _normalize_row(row: Dict[str, Any]) -> Dict[str, Any]:
             pass
     return d
 
+
+def _categoria_out(row: Dict[str, Any]) -> CategoriaOut:
+    """CategoriaOut con la URL de la imagen en lugar de sus bytes."""
+    d = _normalize_row(row)
+    imagen = d.pop("imagen", None)
+    if not d.get("imagen_hash") and imagen:
+        d["imagen_hash"] = hash_imagen(imagen)
+    if d.get("imagen_hash") and d.get("idcategoria") is not None:
+        # ?v= cambia con la imagen: el navegador puede guardarla sin revalidar
+        d["imagen_url"] = f"/api/v1/productos/categorias/{d['idcategoria']}/imagen?v={d['imagen_hash'].strip()}"
+    return CategoriaOut(**d)
+
 ##USUARIOS EMPLEADOS
-def listar_categorias(db: Session) -> List[CategoriaOut]:
-    res = db.execute(text(SQL_LISTAR_CATEGORIAS)).mappings().all()
-    return [CategoriaOut(**_normalize_row(r)) for r in res]
+async def listar_categorias(db: AsyncSession) -> List[CategoriaOut]:
+    res = (await db.execute(text(SQL_LISTAR_CATEGORIAS))).mappings().all()
+    return [_categoria_out(r) for r in res]
 
-def ver_productos_por_categoria(db: Session, codobjeto: int) -> List[ProductoPorCategoriaOut]:
-    res = db.execute(text(SQL_PRODUCTOS_POR_CATEGORIA), {"p_codobjeto": codobjeto}).mappings().all()
+
+async def obtener_imagen_categoria(db: AsyncSession, idcategoria: UUID, miniatura: bool) -> Optional[Dict[str, Any]]:
+    """{hash, contenido, es_miniatura} de la imagen de la categoría; None si no tiene."""
+    fila = (await db.execute(
+        text(SQL_IMAGEN_CATEGORIA), {"idcategoria": str(idcategoria), "miniatura": miniatura}
+    )).mappings().first()
+    if fila is None:
+        return None
+    contenido = bytes(fila["contenido"])
+    return {
+        "hash": (fila["imagen_hash"] or hash_imagen(contenido)).strip(),
+        "contenido": contenido,
+        "es_miniatura": bool(fila["es_miniatura"]),
+    }
+
+
+async def _guardar_miniatura(db: AsyncSession, idcategoria: Optional[UUID], imagen: Optional[bytes]) -> None:
+    if not imagen or idcategoria is None:
+        return
+    # Pillow es CPU: fuera del event loop
+    miniatura = await asyncio.to_thread(generar_miniatura, imagen)
+    if miniatura is not None:
+        await db.execute(text(SQL_GUARDAR_MINIATURA), {"idcategoria": str(idcategoria), "miniatura": miniatura})
+
+async def ver_productos_por_categoria(db: AsyncSession, codobjeto: int) -> List[ProductoPorCategoriaOut]:
+    res = (await db.execute(text(SQL_PRODUCTOS_POR_CATEGORIA), {"p_codobjeto": codobjeto})).mappings().all()
     return [ProductoPorCategoriaOut(**dict(r)) for r in res]
 
-def listar_productos(db: Session) -> List[ProductoOut]:
-    res = db.execute(text(SQL_LISTAR_PRODUCTOS)).mappings().all()
+async def listar_productos(db: AsyncSession) -> List[ProductoOut]:
+    res = (await db.execute(text(SQL_LISTAR_PRODUCTOS))).mappings().all()
     return [ProductoOut(**dict(r)) for r in res]
 
-def buscar_productos(db: Session, nomproducto: Optional[str], codobjeto: Optional[int]) -> List[ProductoOut]:
+# Snapshot del listado de productos: el JSON ya serializado y su ETag. Se descarta
+# con cualquier aviso del namespace "catalogo" (crear_producto, categorías y el
+# trigger de migrations/catalogo_invalidacion.sql, que cubre el stock que mueven
+# las aprobaciones de almacén).
+_snapshot_productos = CacheLocal("productos", "catalogo", settings.CACHE_CATALOGO_TTL_SEC, max_entradas=1)
+_lock_snapshot = asyncio.Lock()
+_productos_json = TypeAdapter(List[ProductoOut])
+
+
+async def snapshot_productos(db: AsyncSession) -> Tuple[str, bytes]:
+    """(ETag, cuerpo JSON) del listado de productos; solo consulta la base si cambió el catálogo."""
+    snapshot = _snapshot_productos.obtener("listado")
+    if snapshot is not None:
+        return snapshot
+    # Una sola reconstrucción por proceso aunque lleguen varias peticiones juntas
+    async with _lock_snapshot:
+        snapshot = _snapshot_productos.obtener("listado")
+        if snapshot is not None:
+            return snapshot
+        version = _snapshot_productos.version()
+        cuerpo = _productos_json.dump_json(await listar_productos(db))
+        # Mismo contenido, mismo ETag en todos los workers
+        snapshot = (f'"{hashlib.sha1(cuerpo).hexdigest()}"', cuerpo)
+        _snapshot_productos.guardar("listado", snapshot, version)
+        return snapshot
+
+async def buscar_productos(db: AsyncSession, nomproducto: Optional[str], codobjeto: Optional[int]) -> List[ProductoOut]:
     params = {"p_nomproducto": nomproducto, "p_codobjeto": codobjeto}
-    res = db.execute(text(SQL_BUSCAR_PRODUCTOS), params).mappings().all()
+    res = (await db.execute(text(SQL_BUSCAR_PRODUCTOS), params)).mappings().all()
     return [ProductoOut(**dict(r)) for r in res]
 
-def listar_categorias_y_unidades(db: Session) -> CatalogosProductoOut:
+async def listar_categorias_y_unidades(db: AsyncSession) -> CatalogosProductoOut:
     """
     Obtiene categorías y unidades de medida directamente desde las tablas
     Sin depender de stored procedures que podrían no existir
     """
     try:
         # Obtener categorías directamente
-        categorias_query = db.execute(text("""
+        categorias_query = (await db.execute(text("""
             SELECT "IdCategoria" as idcategoria, "CodObjeto" as codobjeto, "NomCategoria" as nomcategoria
             FROM productos."Categorias"
             ORDER BY "CodObjeto"
-        """)).mappings().all()
+        """))).mappings().all()
         
         # Obtener unidades de medida directamente
-        unidades_query = db.execute(text("""
+        unidades_query = (await db.execute(text("""
             SELECT "IdUnidadMedida" as idunidadmedida, "NomUnidad" as nomunidad
             FROM productos."Unidades_Medida"
             ORDER BY "NomUnidad"
-        """)).mappings().all()
+        """))).mappings().all()
         
         categorias = [CategoriaRefOut(**dict(c)) for c in categorias_query]
         unidades = [UnidadMedidaOut(**dict(u)) for u in unidades_query]
@@ -148,7 +231,7 @@ def listar_categorias_y_unidades(db: Session) -> CatalogosProductoOut:
         return CatalogosProductoOut(categorias=[], unidades=[])
 
 ##USUARIOS EMPLEADOS ALMACEN
-def crear_producto(db: Session, payload: ProductoCreateIn, creado_por: str) -> Optional[UUID]:
+async def crear_producto(db: AsyncSession, payload: ProductoCreateIn, creado_por: str) -> Optional[UUID]:
     params = {
         "p_idcategoria": str(payload.idcategoria),
         "p_fecingreso": payload.fecingreso,
@@ -165,14 +248,15 @@ def crear_producto(db: Session, payload: ProductoCreateIn, creado_por: str) -> O
         "p_facturas": payload.facturas,
         "p_ordenescompra": payload.ordenescompra,
     }
-    res = db.execute(text(SQL_CREAR_PRODUCTO), params).scalar()
-    db.flush()  # Asegurar que la transacción está pending
+    res = (await db.execute(text(SQL_CREAR_PRODUCTO), params)).scalar()
+    await publicar_invalidacion_async(db, "catalogo")
+    await db.flush()  # Asegurar que la transacción está pending
     try:
         return UUID(str(res)) if res is not None else None
     except Exception:
         return None
 
-def crear_categoria(db: Session, payload: CategoriaCreateIn, creado_por: str) -> Optional[UUID]:
+async def crear_categoria(db: AsyncSession, payload: CategoriaCreateIn, creado_por: str) -> Optional[UUID]:
     params = {
         "p_codobjeto": payload.codobjeto,
         "p_nomcategoria": payload.nomcategoria,
@@ -180,14 +264,18 @@ def crear_categoria(db: Session, payload: CategoriaCreateIn, creado_por: str) ->
         "p_creadopor": creado_por,
         "p_imagen": payload.imagen,  # None o bytes
     }
-    res = db.execute(text(SQL_CREAR_CATEGORIA), params).scalar()
-    db.flush()  # Asegurar que la transacción está pending
+    res = (await db.execute(text(SQL_CREAR_CATEGORIA), params)).scalar()
     try:
-        return UUID(str(res)) if res is not None else None
+        idcategoria = UUID(str(res)) if res is not None else None
     except Exception:
-        return None
+        idcategoria = None
+    # Sin un id válido (p. ej. la función devolvió un mensaje) no hay miniatura
+    await _guardar_miniatura(db, idcategoria, payload.imagen)
+    await publicar_invalidacion_async(db, "catalogo")
+    await db.flush()  # Asegurar que la transacción está pending
+    return idcategoria
 
-def editar_categoria(db: Session, idcategoria: UUID, payload, actualizado_por: str) -> bool:
+async def editar_categoria(db: AsyncSession, idcategoria: UUID, payload, actualizado_por: str) -> bool:
     params = {
         "p_idcategoria": str(idcategoria),
         "p_actualizadopor": actualizado_por,
@@ -196,10 +284,12 @@ def editar_categoria(db: Session, idcategoria: UUID, payload, actualizado_por: s
         "p_descategoria": payload.descategoria,
         "p_imagen": payload.imagen,
     }
-    res = db.execute(text(SQL_EDITAR_CATEGORIA), params).scalar()
-    db.flush()  # Asegurar que la transacción está pending
+    res = (await db.execute(text(SQL_EDITAR_CATEGORIA), params)).scalar()
+    await _guardar_miniatura(db, idcategoria, payload.imagen)
+    await publicar_invalidacion_async(db, "catalogo")
+    await db.flush()  # Asegurar que la transacción está pending
     return bool(res) if res is not None else True
 
-def buscar_categoria(db: Session, codobjeto: int) -> List[CategoriaOut]:
-    res = db.execute(text(SQL_BUSCAR_CATEGORIA), {"p_codobjeto": codobjeto}).mappings().all()
-    return [CategoriaOut(**_normalize_row(r)) for r in res]
\ No newline at end of file
+async def buscar_categoria(db: AsyncSession, codobjeto: int) -> List[CategoriaOut]:
+    res = (await db.execute(text(SQL_BUSCAR_CATEGORIA), {"p_codobjeto": codobjeto})).mappings().all()
+    return [_categoria_out(r) for r in res]
\ No newline at end of file
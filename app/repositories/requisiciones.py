@@ -1,14 +1,21 @@
 from typing import Dict, Any, List
 from decimal import Decimal
+from uuid import UUID
 from sqlalchemy import text, bindparam
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.dialects.postgresql import JSON as PGJSON
 from sqlalchemy.dialects.postgresql import UUID as PGUUID
-from sqlalchemy.types import Integer as SAInteger, Numeric as SANumeric, String
+from sqlalchemy.types import Boolean, Integer as SAInteger, Numeric as SANumeric, String
 from app.schemas.requisiciones.schemas import CrearRequisicionIn, CrearRequisicionOut, RequisicionPendienteOut
 from app.schemas.requisiciones.schemas import ResponderRequisicionIn, ResponderRequisicionOut
 from app.schemas.requisiciones.schemas import RequisicionPendienteGerenteOut
 from app.schemas.requisiciones.schemas import ResponderRequisicionGerenteIn
+from app.schemas.requisiciones.schemas import ResponderLoteOut, ResultadoLoteItem
+from app.core.cache import publicar_invalidacion
+from app.core.config import settings
+from app.repositories.bandeja import listar_pendientes_bandeja
 import json
 import logging
 
@@ -32,79 +39,6 @@ def obtener_usuarios_por_rol(db: Session, nombre_rol: str) -> list[tuple[str, st
         return []
 
 
-def enviar_notificacion_aprobacion(
-    db: Session,
-    id_requisicion: str,
-    estado: str,
-    email_aprobador: str,
-    nombre_aprobador: str,
-    rol_aprobador: str,
-    comentario: str = None
-):
-    """Envía notificación al solicitante cuando su requisición es aprobada/rechazada"""
-    try:
-        # Obtener código de requisición y email del solicitante
-        query = text("""
-            SELECT 
-                r.codrequisicion, 
-                r.nomempleado, 
-                COALESCE(r.creadopor, e.emailinstitucional) AS email_solicitante
-            FROM requisiciones.requisiciones r
-            LEFT JOIN usuarios.empleados e ON e.emailinstitucional = r.creadopor
-            WHERE r.idrequisicion = :id
-        """)
-        row = db.execute(query, {"id": id_requisicion}).fetchone()
-        
-        if not row:
-            return
-            
-        cod_req = row.codrequisicion
-        nombre_solicitante = row.nomempleado
-        email_solicitante = row.email_solicitante
-        
-        # Determinar mensaje según estado
-        if estado.lower() in ['aprobada', 'aprobado']:
-            icono = "✅"
-            accion = "aprobó"
-            tipo_notif = "requisicion_aprobada"
-        elif estado.lower() in ['rechazada', 'rechazado']:
-            icono = "❌"
-            accion = "rechazó"
-            tipo_notif = "requisicion_rechazada"
-        else:
-            icono = "📝"
-            accion = "procesó"
-            tipo_notif = "requisicion_actualizada"
-        
-        # Construir mensaje con nombre del aprobador y su rol
-        mensaje = f"{icono} {nombre_aprobador} ({rol_aprobador}) {accion} tu requisición {cod_req}"
-        if comentario:
-            mensaje += f" - Comentario: {comentario}"
-        
-        # Insertar notificación
-        db.execute(
-            text("""
-                INSERT INTO requisiciones.notificaciones 
-                (emailusuario, tipo, mensaje, idrequisicion, leida, fechacreacion)
-                VALUES (:email, :tipo, :mensaje, :idrequisicion, FALSE, CURRENT_TIMESTAMP)
-            """),
-            {
-                "email": email_solicitante,
-                "tipo": tipo_notif,
-                "mensaje": mensaje,
-                "idrequisicion": id_requisicion,
-            }
-        )
-        db.commit()
-        print(f"✅ Notificación enviada a {email_solicitante}: {mensaje}")
-        
-    except Exception as e:
-        print(f"⚠️ Error al enviar notificación de aprobación: {e}")
-        try:
-            db.rollback()
-        except:
-            pass
-
 SQL_CREAR_REQUISICION = """
 SELECT requisiciones.crear_requisicion(
     :p_email,
@@ -131,49 +65,26 @@ SELECT *
 FROM requisiciones.requisiciones_pendientes_gerente(:p_email)
 """
 
-SQL_RESPONDER_REQUISICION_JEFE = """
-SELECT requisiciones.responder_requisicion_jefe(
-    :p_id_requisicion,
-    :p_email_jefe,
-    :p_estado_aprob,
-    :p_comentario,
-    CAST(:p_productos AS jsonb)
-) AS mensaje
-"""
-
-SQL_RESPONDER_REQUISICION_GERENTE = """
-SELECT requisiciones.responder_requisicion_gerente(
-    :p_id_requisicion,
-    :p_email_gerente,
-    :p_estado_aprob,
-    :p_comentario,
-    :p_productos
-) AS mensaje
-"""
-
-SQL_RESPONDER_REQUISICION_JEFE_MATERIALES = """
-SELECT requisiciones.responder_requisicion_jefe_materiales(
-    :p_id_requisicion,
-    :p_email_jefe,
-    :p_estado_aprob,
-    :p_comentario,
-    CAST(:p_productos AS jsonb)
-) AS mensaje
-"""
-
 SQL_REQUISICIONES_PENDIENTES_ALMACEN = """
 SELECT *
 FROM requisiciones.requisiciones_pendientes_almacen(:p_email)
 """
 
-SQL_RESPONDER_REQUISICION_ALMACEN = """
-SELECT requisiciones.responder_requisicion_almacen(
+# Cambio de estado + notificaciones + auditoría + timestamps en un solo viaje
+# (migrations/procesar_aprobacion.sql)
+SQL_PROCESAR_APROBACION = """
+SELECT requisiciones.procesar_aprobacion(
+    :p_rol,
     :p_id_requisicion,
-    :p_email_almacen,
-    :p_estado_aprob,
+    :p_email,
+    :p_estado,
     :p_comentario,
-    CAST(:p_productos AS jsonb)
-) AS mensaje
+    :p_productos,
+    :p_id_usuario,
+    :p_nombre_usuario,
+    :p_cambios_cantidad,
+    :p_diferir
+) AS resultado
 """
 
 def _json_num(v: Decimal | int | float | None) -> float | None:
@@ -236,95 +147,117 @@ def crear_requisicion(db: Session, payload: CrearRequisicionIn) -> CrearRequisic
         emailjefeInmediato="sistema@sedh.gob.hn"
     )
 
-def requisiciones_pendientes_jefe(db: Session, email: str) -> List[RequisicionPendienteOut]:
-    if not email:
-        raise ValueError("Email no proporcionado")
+# ================================
+# Post-procesamiento común de bandejas de pendientes
+# ================================
 
-    stmt = text(SQL_REQUISICIONES_PENDIENTES_JEFE).bindparams(
-        bindparam("p_email"),
-    )
+SQL_ATRIBUTOS_REQUISICIONES = """
+SELECT idrequisicion, nomempleado, estgeneral, fecha_hora_aprobacion_almacen
+FROM requisiciones.requisiciones
+WHERE idrequisicion = ANY(CAST(:ids AS UUID[]))
+"""
 
-    rows = db.execute(stmt, {"p_email": email}).mappings().all()
+_CLAVES_ID_REQUISICION = ("idRequisicion", "idrequisicion", "id_requisicion")
 
-    def _first(d: Dict[str, Any], *keys: str) -> Any:
-        for k in keys:
-            if k in d:
-                return d[k]
-        return None
+# Estados en los que una requisición todavía puede estar en la bandeja del jefe
+_ESTADOS_PENDIENTES_JEFE = {"EN ESPERA", "PENDIENTE", "PENDIENTE ALMACEN", "ESPERA ALMACEN"}
 
-    def _parse_productos(raw: Any) -> List[Dict[str, Any]]:
-        # Si viene como texto, parsear JSON
-        if isinstance(raw, str):
-            try:
-                return json.loads(raw)
-            except Exception:
-                try:
-                    # fallback por casos con comillas duplicadas en dumps intermedios
-                    return json.loads(raw.replace('""', '"'))
-                except Exception:
-                    return []
-        if isinstance(raw, list):
-            return raw
-        return []
 
-    def _map_producto_item(item: Dict[str, Any]) -> Dict[str, Any]:
-        return {
-            "idProducto": _first(item, "idProducto", "id_producto"),
-            "nombre": _first(item, "nombre", "nombre_producto"),
-            "cantidad": _first(item, "cantidad", "cantidad_solicitada"),
-            "gasUnitario": _first(item, "gasUnitario", "gas_unitario"),
-            "gasTotalProducto": _first(item, "gasTotalProducto", "gas_total_producto"),
-        }
+def _first(d: Dict[str, Any], *keys: str) -> Any:
+    for k in keys:
+        if k in d:
+            return d[k]
+    return None
 
-    resultados: List[RequisicionPendienteOut] = []
-    for r in rows:
-        d = dict(r)
 
-        # Excluir requisiciones ya atendidas por Almacén
+def _parse_productos(raw: Any) -> List[Dict[str, Any]]:
+    # Si viene como texto, parsear JSON
+    if isinstance(raw, str):
         try:
-            id_req = _first(d, "idRequisicion", "idrequisicion", "id_requisicion")
-            if id_req:
-                from app.models.requisiciones.requisicion import Requisicion
-                req_obj = db.query(Requisicion).filter(Requisicion.IdRequisicion == id_req).first()
-                if req_obj:
-                    # Si ya tiene timestamp de aprobación en Almacén, no debe aparecer en pendientes
-                    if getattr(req_obj, "FechaHoraAprobacionAlmacen", None):
-                        continue
-                    # Si el estado general indica que no está en espera/pending para Almacén, omitir
-                    if req_obj.EstGeneral and req_obj.EstGeneral.upper() not in [
-                        "EN ESPERA", "PENDIENTE", "PENDIENTE ALMACEN", "ESPERA ALMACEN"
-                    ]:
-                        continue
+            return json.loads(raw)
         except Exception:
-            # Si falla la verificación, continuar sin filtrar para no romper flujo
-            pass
+            try:
+                # fallback por casos con comillas duplicadas en dumps intermedios
+                return json.loads(raw.replace('""', '"'))
+            except Exception:
+                return []
+    if isinstance(raw, list):
+        return raw
+    return []
+
+
+def _map_producto_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "idProducto": _first(item, "idProducto", "id_producto"),
+        "nombre": _first(item, "nombre", "nombre_producto"),
+        "cantidad": _first(item, "cantidad", "cantidad_solicitada"),
+        "gasUnitario": _first(item, "gasUnitario", "gas_unitario"),
+        "gasTotalProducto": _first(item, "gasTotalProducto", "gas_total_producto"),
+    }
 
-        productos_raw = _first(d, "productos", "Porductos", "porductos")
-        productos_list = _parse_productos(productos_raw)
-        productos_out = [_map_producto_item(it) for it in productos_list]
 
-        # Intentar múltiples variaciones para el nombre del subordinado/solicitante
-        nombre_subordinado = _first(d, "nombreSubordinado", "nombresubordinado", "nombre_subordinado", 
-                                    "nomempleado", "NomEmpleado", "nombre_empleado", "solicitante",
-                                    "nombreSolicitante", "nombre_solicitante")
-        
-        # Si no se encontró el nombre, intentar obtenerlo desde la tabla de requisiciones
-        if not nombre_subordinado:
-            id_requisicion = _first(d, "idRequisicion", "idrequisicion", "id_requisicion")
-            if id_requisicion:
-                try:
-                    from app.models.requisiciones.requisicion import Requisicion
-                    req_obj = db.query(Requisicion).filter(Requisicion.IdRequisicion == id_requisicion).first()
-                    if req_obj and req_obj.NomEmpleado:
-                        nombre_subordinado = req_obj.NomEmpleado
-                except Exception as e:
-                    print(f"⚠️  No se pudo obtener el nombre del empleado desde la tabla: {e}")
-                    nombre_subordinado = "No especificado"
+async def _prefetch_atributos_requisiciones(db: AsyncSession, ids: List[Any]) -> Dict[str, Dict[str, Any]]:
+    """Obtiene en una sola consulta los atributos de todas las requisiciones de la bandeja."""
+    if not ids:
+        return {}
+    try:
+        rows = (await db.execute(
+            text(SQL_ATRIBUTOS_REQUISICIONES),
+            {"ids": [str(i) for i in ids]},
+        )).mappings().all()
+    except Exception as e:
+        # Si falla el prefetch, continuar sin filtrar para no romper flujo
+        print(f"⚠️  No se pudieron obtener atributos de requisiciones: {e}")
+        await db.rollback()
+        return {}
+    return {str(r["idrequisicion"]): dict(r) for r in rows}
+
+
+async def _mapear_pendientes(
+    db: AsyncSession,
+    rows: List[Any],
+    modelo,
+    campo_nombre: str,
+    claves_nombre: tuple,
+    excluir_atendidas: bool = False,
+) -> List[Any]:
+    """
+    Convierte las filas de una función requisiciones_pendientes_* al esquema de salida.
+    Los datos que la función SQL no trae (nombre del empleado, estado, timestamp de
+    Almacén) se resuelven con un único prefetch por lista de ids, no por fila.
+    """
+    filas = [dict(r) for r in rows]
+
+    necesita_prefetch = excluir_atendidas or any(not _first(d, *claves_nombre) for d in filas)
+    atributos: Dict[str, Dict[str, Any]] = {}
+    if necesita_prefetch:
+        ids = [i for i in (_first(d, *_CLAVES_ID_REQUISICION) for d in filas) if i]
+        atributos = await _prefetch_atributos_requisiciones(db, ids)
+
+    resultados = []
+    for d in filas:
+        id_req = _first(d, *_CLAVES_ID_REQUISICION)
+        attrs = atributos.get(str(id_req)) if id_req else None
+
+        if excluir_atendidas and attrs:
+            # Si ya tiene timestamp de aprobación en Almacén, no debe aparecer en pendientes
+            if attrs.get("fecha_hora_aprobacion_almacen"):
+                continue
+            # Si el estado general indica que no está en espera, omitir
+            estado = attrs.get("estgeneral")
+            if estado and estado.upper() not in _ESTADOS_PENDIENTES_JEFE:
+                continue
+
+        nombre = _first(d, *claves_nombre) or (attrs or {}).get("nomempleado")
+        productos_out = [
+            _map_producto_item(it)
+            for it in _parse_productos(_first(d, "productos", "Productos", "Porductos", "porductos"))
+        ]
 
         mapeado: Dict[str, Any] = {
-            "idRequisicion": _first(d, "idRequisicion", "idrequisicion", "id_requisicion"),
+            "idRequisicion": id_req,
             "codRequisicion": _first(d, "codRequisicion", "codrequisicion", "cod_requisicion"),
-            "nombreSubordinado": nombre_subordinado or "No especificado",
+            campo_nombre: nombre or "No especificado",
             "dependencia": _first(d, "dependencia"),
             "fecSolicitud": _first(d, "fecSolicitud", "fecsolicitud", "fec_solicitud"),
             "codPrograma": _first(d, "codPrograma", "codprograma", "cod_programa"),
@@ -334,251 +267,234 @@ def requisiciones_pendientes_jefe(db: Session, email: str) -> List[RequisicionPe
             "gasTotalDelPedido": _first(d, "gasTotalDelPedido", "gastotaldelpedido", "gas_total_del_pedido"),
             "productos": productos_out,
         }
-
-        resultados.append(RequisicionPendienteOut(**mapeado))
+        resultados.append(modelo(**mapeado))
 
     return resultados
 
 
-
-def responder_requisicion_jefe(db: Session, payload: ResponderRequisicionIn, email_jefe: str) -> ResponderRequisicionOut:
-    if not email_jefe:
+async def requisiciones_pendientes_jefe(db: AsyncSession, email: str) -> List[RequisicionPendienteOut]:
+    if not email:
         raise ValueError("Email no proporcionado")
 
-    # Convertir productos a JSON si se proporcionan
-    productos_json = None
-    if payload.productos:
-        import json
-        productos_json = json.dumps([{"idProducto": str(p.idProducto), "cantidad": float(p.cantidad)} for p in payload.productos])
+    if settings.BANDEJA_APROBACION_ENABLED:
+        rows = await listar_pendientes_bandeja(db, email, "JefInmediato")
+    else:
+        stmt = text(SQL_REQUISICIONES_PENDIENTES_JEFE).bindparams(
+            bindparam("p_email"),
+        )
+        rows = (await db.execute(stmt, {"p_email": email})).mappings().all()
+
+    # Excluir requisiciones ya atendidas por Almacén y completar el nombre del subordinado
+    return await _mapear_pendientes(
+        db, rows, RequisicionPendienteOut, "nombreSubordinado",
+        ("nombreSubordinado", "nombresubordinado", "nombre_subordinado",
+         "nomempleado", "NomEmpleado", "nombre_empleado", "solicitante",
+         "nombreSolicitante", "nombre_solicitante"),
+        excluir_atendidas=True,
+    )
+
+
+
+def _uuid_o_none(valor: Any):
+    try:
+        return UUID(str(valor)) if valor else None
+    except (ValueError, TypeError):
+        return None
+
+
+# SQLSTATE con que requisiciones.procesar_aprobacion rechaza una decisión -> código HTTP
+ESTADOS_HTTP_APROBACION = {
+    "42501": 403,  # el usuario no es aprobador de la requisición
+    "P0002": 404,  # la requisición no existe
+    "22023": 400,  # la regla del rol rechazó la decisión
+}
+
+
+class AprobacionRechazada(ValueError):
+    """procesar_aprobacion rechazó la decisión; status_code sale de su SQLSTATE."""
+
+    def __init__(self, mensaje: str, status_code: int = 400):
+        super().__init__(mensaje)
+        self.status_code = status_code
+
+
+def _rechazo_procesar_aprobacion(e: DBAPIError) -> AprobacionRechazada | None:
+    orig = getattr(e, "orig", None)
+    status_code = ESTADOS_HTTP_APROBACION.get(getattr(orig, "pgcode", None))
+    if status_code is None:
+        return None
+    diag = getattr(orig, "diag", None)
+    mensaje = getattr(diag, "message_primary", None) or _mensaje_error(e)
+    return AprobacionRechazada(mensaje, status_code)
+
 
+def _ejecutar_aprobacion(
+    db: Session,
+    rol: str,
+    payload,
+    email: str,
+    productos: Any,
+    id_usuario: Any = None,
+    nombre_usuario: str | None = None,
+    cambios_cantidad: str | None = None,
+    diferir_notificaciones: bool = False,
+) -> Dict[str, Any]:
+    """
+    Ejecuta requisiciones.procesar_aprobacion sin confirmar la transacción.
+    Lanza AprobacionRechazada si la función rechaza la decisión.
+    """
     params = {
+        "p_rol": rol,
         "p_id_requisicion": payload.idRequisicion,
-        "p_email_jefe": email_jefe,
-        "p_estado_aprob": payload.estado,
+        "p_email": email,
+        "p_estado": payload.estado,
         "p_comentario": payload.comentario,
-        "p_productos": productos_json,
+        "p_productos": None if productos is None else json.dumps(productos),
+        "p_id_usuario": _uuid_o_none(id_usuario),
+        "p_nombre_usuario": nombre_usuario,
+        "p_cambios_cantidad": cambios_cantidad,
+        "p_diferir": diferir_notificaciones,
     }
 
-    stmt = text(SQL_RESPONDER_REQUISICION_JEFE).bindparams(
+    stmt = text(SQL_PROCESAR_APROBACION).bindparams(
+        bindparam("p_rol"),
         bindparam("p_id_requisicion", type_=PGUUID),
-        bindparam("p_email_jefe"),
-        bindparam("p_estado_aprob"),
+        bindparam("p_email"),
+        bindparam("p_estado"),
         bindparam("p_comentario"),
         bindparam("p_productos"),
+        bindparam("p_id_usuario", type_=PGUUID),
+        bindparam("p_nombre_usuario"),
+        bindparam("p_cambios_cantidad"),
+        bindparam("p_diferir", type_=Boolean),
     )
 
     try:
-        row = db.execute(stmt, params).mappings().one()
-        
-        # Obtener nombre del jefe y código de requisición ANTES del commit
-        query_jefe = text("""
-            SELECT nombre FROM usuarios.empleados WHERE emailinstitucional = :email
-        """)
-        row_jefe = db.execute(query_jefe, {"email": email_jefe}).fetchone()
-        nombre_jefe = row_jefe.nombre if row_jefe else email_jefe
-        
-        # Obtener código de requisición
-        query_req = text("SELECT codrequisicion FROM requisiciones.requisiciones WHERE idrequisicion = CAST(:id AS UUID)")
-        cod_req_result = db.execute(query_req, {"id": str(payload.idRequisicion)}).fetchone()
-        cod_req = cod_req_result[0] if cod_req_result else None
-        
-        # Enviar notificación al solicitante
-        enviar_notificacion_aprobacion(
-            db=db,
-            id_requisicion=str(payload.idRequisicion),
-            estado=payload.estado,
-            email_aprobador=email_jefe,
-            nombre_aprobador=nombre_jefe,
-            rol_aprobador="Jefe Inmediato",
-            comentario=payload.comentario
-        )
-        
-        # Si aprobó, notificar al siguiente rol (Gerente Administrativo)
-        if payload.estado.lower() in ['aprobada', 'aprobado']:
-            gerentes = obtener_usuarios_por_rol(db, "GerAdmon")
-            for email_ger, nombre_ger in gerentes:
-                msg_ger = f"📋 Requisición {cod_req or ''} aprobada por Jefe Inmediato, pendiente tu revisión"
-                db.execute(
-                    text("""
-                        INSERT INTO requisiciones.notificaciones 
-                        (emailusuario, tipo, mensaje, idrequisicion, leida, fechacreacion)
-                        VALUES (:email, :tipo, :mensaje, :idrequisicion, FALSE, CURRENT_TIMESTAMP)
-                    """),
-                    {
-                        "email": email_ger,
-                        "tipo": "requisicion_pendiente",
-                        "mensaje": msg_ger,
-                        "idrequisicion": str(payload.idRequisicion),
-                    }
-                )
-        
-        # Commit al final de todo
+        resultado = db.execute(stmt, params).scalar_one()
+    except DBAPIError as e:
+        rechazo = _rechazo_procesar_aprobacion(e)
+        if rechazo is None:
+            raise
+        raise rechazo from e
+    if isinstance(resultado, str):
+        resultado = json.loads(resultado)
+    if rol == "EmpAlmacen":
+        # La entrega de almacén descuenta stock: snapshot de productos viejo
+        publicar_invalidacion(db, "catalogo")
+    return resultado
+
+
+def _salida_aprobacion(resultado: Dict[str, Any]) -> ResponderRequisicionOut:
+    return ResponderRequisicionOut(**{
+        k: v for k, v in resultado.items() if k not in ("error", "rol", "notificaciones")
+    })
+
+
+def _procesar_aprobacion(db: Session, rol: str, payload, email: str, productos: Any, **kwargs) -> ResponderRequisicionOut:
+    """
+    Cambio de estado, notificaciones, auditoría y timestamps en un solo viaje y
+    un solo commit (requisiciones.procesar_aprobacion).
+    """
+    try:
+        resultado = _ejecutar_aprobacion(db, rol, payload, email, productos, **kwargs)
         db.commit()
-        
     except Exception as e:
         db.rollback()
-        print(f"❌ Error en responder_requisicion_jefe: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.error(f"Error en procesar_aprobacion ({rol}) para {payload.idRequisicion}: {e}")
         raise
+    return _salida_aprobacion(resultado)
 
-    return ResponderRequisicionOut(mensaje=row["mensaje"])
-
-# GERENTE ADMINISTRATIVO
-
-def requisiciones_pendientes_gerente(db: Session, email: str) -> List[RequisicionPendienteGerenteOut]:
-    if not email:
-        raise ValueError("Email no proporcionado")
-
-    stmt = text(SQL_REQUISICIONES_PENDIENTES_GERENTE).bindparams(
-        bindparam("p_email"),
-    )
-    rows = db.execute(stmt, {"p_email": email}).mappings().all()
 
-    def _first(d: Dict[str, Any], *keys: str) -> Any:
-        for k in keys:
-            if k in d:
-                return d[k]
+def _productos_jefe(payload: ResponderRequisicionIn) -> List[Dict[str, Any]] | None:
+    if not payload.productos:
         return None
+    return [{"idProducto": str(p.idProducto), "cantidad": float(p.cantidad)} for p in payload.productos]
 
-    def _parse_productos(raw: Any) -> List[Dict[str, Any]]:
-        if isinstance(raw, str):
-            import json
-            try:
-                return json.loads(raw)
-            except Exception:
-                try:
-                    return json.loads(raw.replace('""', '"'))
-                except Exception:
-                    return []
-        if isinstance(raw, list):
-            return raw
-        return []
 
-    def _map_producto_item(item: Dict[str, Any]) -> Dict[str, Any]:
-        return {
-            "idProducto": _first(item, "idProducto", "id_producto"),
-            "nombre": _first(item, "nombre", "nombre_producto"),
-            "cantidad": _first(item, "cantidad", "cantidad_solicitada"),
-            "gasUnitario": _first(item, "gasUnitario", "gas_unitario"),
-            "gasTotalProducto": _first(item, "gasTotalProducto", "gas_total_producto"),
+def _productos_ajuste(payload: ResponderRequisicionGerenteIn) -> List[Dict[str, Any]]:
+    """Formato de responder_requisicion_gerente / responder_requisicion_jefe_materiales."""
+    return [
+        {
+            "id_producto": str(p.idProducto),
+            "nueva_cantidad": _json_num(p.nuevaCantidad if hasattr(p, "nuevaCantidad") else None) or _json_num(getattr(p, "cantidad", None)),
         }
+        for p in payload.productos
+    ]
 
-    resultados: List[RequisicionPendienteGerenteOut] = []
-    for r in rows:
-        d = dict(r)
-        productos_list = _parse_productos(_first(d, "productos", "Productos"))
-        productos_out = [_map_producto_item(it) for it in productos_list]
 
-        mapeado = {
-            "idRequisicion": _first(d, "idRequisicion", "idrequisicion"),
-            "codRequisicion": _first(d, "codRequisicion", "codrequisicion"),
-            "nombreEmpleado": _first(d, "nombreEmpleado", "nombreempleado", "nomempleado", "nom_empleado"),
-            "dependencia": _first(d, "dependencia"),
-            "fecSolicitud": _first(d, "fecSolicitud", "fecsolicitud"),
-            "codPrograma": _first(d, "codPrograma", "codprograma"),
-            "proIntermedio": _first(d, "proIntermedio", "prointermedio"),
-            "proFinal": _first(d, "proFinal", "profinal"),
-            "obsEmpleado": _first(d, "obsEmpleado", "obsempleado"),
-            "gasTotalDelPedido": _first(d, "gasTotalDelPedido", "gastotaldelpedido"),
-            "productos": productos_out,
+def _productos_almacen(payload: ResponderRequisicionGerenteIn) -> List[Dict[str, Any]]:
+    return [
+        {
+            "idProducto": str(p.idProducto),
+            "nuevaCantidad": float(p.nuevaCantidad if hasattr(p, "nuevaCantidad") and p.nuevaCantidad is not None else getattr(p, "cantidad", 0)),
         }
-        resultados.append(RequisicionPendienteGerenteOut(**mapeado))
+        for p in payload.productos
+    ]
 
-    return resultados
 
-def responder_requisicion_gerente(
+def _cambios_cantidad(payload: ResponderRequisicionGerenteIn) -> str | None:
+    """Observaciones de auditoría con los cambios de cantidad del Jefe de Materiales."""
+    cambios = []
+    for p in payload.productos:
+        cant_original = _json_num(p.cantidadSolicitada if hasattr(p, "cantidadSolicitada") else getattr(p, "cantidad", None))
+        cant_nueva = _json_num(p.nuevaCantidad if hasattr(p, "nuevaCantidad") else getattr(p, "cantidad", None))
+        if cant_original != cant_nueva:
+            cambios.append(f"Producto {p.idProducto}: {cant_original} → {cant_nueva}")
+    return ("Cambios de cantidad: " + "; ".join(cambios)) if cambios else None
+
+
+def responder_requisicion_jefe(
     db: Session,
-    payload: ResponderRequisicionGerenteIn,
-    email_gerente: str
+    payload: ResponderRequisicionIn,
+    email_jefe: str,
+    id_usuario: Any = None,
+    nombre_usuario: str | None = None,
 ) -> ResponderRequisicionOut:
-    if not email_gerente:
+    if not email_jefe:
         raise ValueError("Email no proporcionado")
 
-    productos_json: List[Dict[str, Any]] = [
-        {
-            "id_producto": str(p.idProducto),
-            "nueva_cantidad": _json_num(p.nuevaCantidad if hasattr(p, "nuevaCantidad") else None) or _json_num(getattr(p, "cantidad", None)),
-        }
-        for p in payload.productos
-    ]
+    return _procesar_aprobacion(
+        db, "JefInmediato", payload, email_jefe, _productos_jefe(payload),
+        id_usuario=id_usuario, nombre_usuario=nombre_usuario,
+    )
 
-    params = {
-        "p_id_requisicion": payload.idRequisicion,
-        "p_email_gerente": email_gerente,
-        "p_estado_aprob": payload.estado,     # normalizado a MAYÚSCULA
-        "p_comentario": payload.comentario,
-        "p_productos": productos_json,        # JSON array
-    }
+# GERENTE ADMINISTRATIVO
 
-    stmt = text(SQL_RESPONDER_REQUISICION_GERENTE).bindparams(
-        bindparam("p_id_requisicion", type_=PGUUID),
-        bindparam("p_email_gerente"),
-        bindparam("p_estado_aprob"),
-        bindparam("p_comentario"),
-        bindparam("p_productos", type_=PGJSON),
-    )
+async def requisiciones_pendientes_gerente(db: AsyncSession, email: str) -> List[RequisicionPendienteGerenteOut]:
+    if not email:
+        raise ValueError("Email no proporcionado")
 
-    try:
-        row = db.execute(stmt, params).mappings().one()
-        
-        # Obtener nombre del gerente y código de requisición ANTES del commit
-        query_gerente = text("""
-            SELECT nombre FROM usuarios.empleados WHERE emailinstitucional = :email
-        """)
-        row_gerente = db.execute(query_gerente, {"email": email_gerente}).fetchone()
-        nombre_gerente = row_gerente.nombre if row_gerente else email_gerente
-        
-        # Obtener código de requisición
-        query_req = text("SELECT codrequisicion FROM requisiciones.requisiciones WHERE idrequisicion = CAST(:id AS UUID)")
-        cod_req_result = db.execute(query_req, {"id": str(payload.idRequisicion)}).fetchone()
-        cod_req = cod_req_result[0] if cod_req_result else None
-        
-        # Enviar notificación al solicitante
-        enviar_notificacion_aprobacion(
-            db=db,
-            id_requisicion=str(payload.idRequisicion),
-            estado=payload.estado,
-            email_aprobador=email_gerente,
-            nombre_aprobador=nombre_gerente,
-            rol_aprobador="Gerente Administrativo",
-            comentario=payload.comentario
+    if settings.BANDEJA_APROBACION_ENABLED:
+        rows = await listar_pendientes_bandeja(db, email, "GerAdmon")
+    else:
+        stmt = text(SQL_REQUISICIONES_PENDIENTES_GERENTE).bindparams(
+            bindparam("p_email"),
         )
-        
-        # Si aprobó, notificar al siguiente rol (Jefe de Materiales)
-        if payload.estado.lower() in ['aprobada', 'aprobado']:
-            jefes_mat = obtener_usuarios_por_rol(db, "JefSerMat")
-            for email_jm, nombre_jm in jefes_mat:
-                msg_jm = f"📋 Requisición {cod_req or ''} aprobada por Gerente Administrativo, pendiente tu revisión"
-                db.execute(
-                    text("""
-                        INSERT INTO requisiciones.notificaciones 
-                        (emailusuario, tipo, mensaje, idrequisicion, leida, fechacreacion)
-                        VALUES (:email, :tipo, :mensaje, :idrequisicion, FALSE, CURRENT_TIMESTAMP)
-                    """),
-                    {
-                        "email": email_jm,
-                        "tipo": "requisicion_pendiente",
-                        "mensaje": msg_jm,
-                        "idrequisicion": str(payload.idRequisicion),
-                    }
-                )
-        
-        # Commit al final de todo
-        db.commit()
-        
-    except Exception as e:
-        db.rollback()
-        print(f"❌ Error en responder_requisicion_gerente: {e}")
-        import traceback
-        traceback.print_exc()
-        raise
+        rows = (await db.execute(stmt, {"p_email": email})).mappings().all()
+
+    return await _mapear_pendientes(
+        db, rows, RequisicionPendienteGerenteOut, "nombreEmpleado",
+        ("nombreEmpleado", "nombreempleado", "nomempleado", "nom_empleado"),
+    )
+
+def responder_requisicion_gerente(
+    db: Session,
+    payload: ResponderRequisicionGerenteIn,
+    email_gerente: str,
+    id_usuario: Any = None,
+    nombre_usuario: str | None = None,
+) -> ResponderRequisicionOut:
+    if not email_gerente:
+        raise ValueError("Email no proporcionado")
 
-    return ResponderRequisicionOut(mensaje=row["mensaje"])
+    return _procesar_aprobacion(
+        db, "GerAdmon", payload, email_gerente, _productos_ajuste(payload),
+        id_usuario=id_usuario, nombre_usuario=nombre_usuario,
+    )
 
 # JEFE MATERIALES
 
-def requisiciones_pendientes_jefe_materiales(db: Session, email: str) -> List[RequisicionPendienteGerenteOut]:
+async def requisiciones_pendientes_jefe_materiales(db: AsyncSession, email: str) -> List[RequisicionPendienteGerenteOut]:
     if not email:
         raise ValueError("Email no proporcionado")
 
@@ -588,387 +504,164 @@ def requisiciones_pendientes_jefe_materiales(db: Session, email: str) -> List[Re
     
     # Ejecutar en una transacción limpia
     try:
-        rows = db.execute(stmt, {"p_email": email}).mappings().all()
-        db.commit()  # Confirmar transacción de lectura
+        if settings.BANDEJA_APROBACION_ENABLED:
+            rows = await listar_pendientes_bandeja(db, email, "JefSerMat")
+        else:
+            rows = (await db.execute(stmt, {"p_email": email})).mappings().all()
+        await db.commit()  # Confirmar transacción de lectura
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise
 
-    def _first(d: Dict[str, Any], *keys: str) -> Any:
-        for k in keys:
-            if k in d:
-                return d[k]
-        return None
-
-    def _parse_productos(raw: Any) -> List[Dict[str, Any]]:
-        if isinstance(raw, str):
-            try:
-                return json.loads(raw)
-            except Exception:
-                try:
-                    return json.loads(raw.replace('""', '"'))
-                except Exception:
-                    return []
-        if isinstance(raw, list):
-            return raw
-        return []
-
-    def _map_producto_item(item: Dict[str, Any]) -> Dict[str, Any]:
-        return {
-            "idProducto": _first(item, "idProducto", "id_producto"),
-            "nombre": _first(item, "nombre", "nombre_producto"),
-            "cantidad": _first(item, "cantidad", "cantidad_solicitada"),
-            "gasUnitario": _first(item, "gasUnitario", "gas_unitario"),
-            "gasTotalProducto": _first(item, "gasTotalProducto", "gas_total_producto"),
-        }
-
-    resultados: List[RequisicionPendienteGerenteOut] = []
-    for r in rows:
-        d = dict(r)
-        
-        productos_list = _parse_productos(_first(d, "productos", "Productos"))
-        productos_out = [_map_producto_item(it) for it in productos_list]
-
-        # Intentar múltiples variaciones para el nombre del empleado/solicitante
-        nombre_empleado = _first(d, "nombreEmpleado", "nombreempleado", "nomempleado", "nom_empleado",
-                                 "NomEmpleado", "nombre_empleado", "solicitante", 
-                                 "nombreSolicitante", "nombre_solicitante", "nombreSubordinado")
-        
-        # Si no se encontró el nombre, intentar obtenerlo desde la tabla de requisiciones
-        if not nombre_empleado:
-            id_requisicion = _first(d, "idRequisicion", "idrequisicion", "id_requisicion")
-            if id_requisicion:
-                try:
-                    from app.models.requisiciones.requisicion import Requisicion
-                    req_obj = db.query(Requisicion).filter(Requisicion.IdRequisicion == id_requisicion).first()
-                    if req_obj and req_obj.NomEmpleado:
-                        nombre_empleado = req_obj.NomEmpleado
-                except Exception as e:
-                    print(f"⚠️  No se pudo obtener el nombre del empleado desde la tabla: {e}")
-                    nombre_empleado = "No especificado"
-
-        mapeado = {
-            "idRequisicion": _first(d, "idRequisicion", "idrequisicion"),
-            "codRequisicion": _first(d, "codRequisicion", "codrequisicion"),
-            "nombreEmpleado": nombre_empleado or "No especificado",
-            "dependencia": _first(d, "dependencia"),
-            "fecSolicitud": _first(d, "fecSolicitud", "fecsolicitud"),
-            "codPrograma": _first(d, "codPrograma", "codprograma"),
-            "proIntermedio": _first(d, "proIntermedio", "prointermedio"),
-            "proFinal": _first(d, "proFinal", "profinal"),
-            "obsEmpleado": _first(d, "obsEmpleado", "obsempleado"),
-            "gasTotalDelPedido": _first(d, "gasTotalDelPedido", "gastotaldelpedido"),
-            "productos": productos_out,
-        }
-        resultados.append(RequisicionPendienteGerenteOut(**mapeado))
-
-    return resultados
+    return await _mapear_pendientes(
+        db, rows, RequisicionPendienteGerenteOut, "nombreEmpleado",
+        ("nombreEmpleado", "nombreempleado", "nomempleado", "nom_empleado",
+         "NomEmpleado", "nombre_empleado", "solicitante",
+         "nombreSolicitante", "nombre_solicitante", "nombreSubordinado"),
+    )
 
 def responder_requisicion_jefe_materiales(
     db: Session,
     payload: ResponderRequisicionGerenteIn,
-    email_jefe: str
+    email_jefe: str,
+    id_usuario: Any = None,
+    nombre_usuario: str | None = None,
 ) -> ResponderRequisicionOut:
     if not email_jefe:
         raise ValueError("Email no proporcionado")
 
-    productos_json: List[Dict[str, Any]] = [
-        {
-            "id_producto": str(p.idProducto),
-            "nueva_cantidad": _json_num(p.nuevaCantidad if hasattr(p, "nuevaCantidad") else None) or _json_num(getattr(p, "cantidad", None)),
-        }
-        for p in payload.productos
-    ]
-    
-    # DEBUG: Log productos JSON
-    logger.warning(f"[JefSerMat] productos_json: {json.dumps(productos_json, default=str)}")
-
-    # Guardar historial de cambios de cantidad ANTES de actualizar
-    cambios_cantidad = []
-    for p in payload.productos:
-        cant_original = _json_num(p.cantidadSolicitada if hasattr(p, "cantidadSolicitada") else getattr(p, "cantidad", None))
-        cant_nueva = _json_num(p.nuevaCantidad if hasattr(p, "nuevaCantidad") else getattr(p, "cantidad", None))
-        
-        if cant_original != cant_nueva:
-            cambios_cantidad.append({
-                "idProducto": str(p.idProducto),
-                "cantidadOriginal": cant_original,
-                "cantidadNueva": cant_nueva
-            })
-
-    params = {
-        "p_id_requisicion": payload.idRequisicion,
-        "p_email_jefe": email_jefe,
-        "p_estado_aprob": payload.estado,     
-        "p_comentario": payload.comentario,
-        "p_productos": productos_json,        
-    }
-
-    stmt = text(SQL_RESPONDER_REQUISICION_JEFE_MATERIALES).bindparams(
-        bindparam("p_id_requisicion", type_=PGUUID),
-        bindparam("p_email_jefe"),
-        bindparam("p_estado_aprob"),
-        bindparam("p_comentario"),
-        bindparam("p_productos", type_=PGJSON),  # Será convertido a JSONB por PostgreSQL
+    return _procesar_aprobacion(
+        db, "JefSerMat", payload, email_jefe, _productos_ajuste(payload),
+        id_usuario=id_usuario, nombre_usuario=nombre_usuario,
+        cambios_cantidad=_cambios_cantidad(payload),
     )
-    
-    logger.warning(f"[JefSerMat] *** ANTES de ejecutar SQL ***")
-    logger.warning(f"[JefSerMat] SQL_TEXT: {SQL_RESPONDER_REQUISICION_JEFE_MATERIALES}")
-    logger.warning(f"[JefSerMat] PARAMS: {params}")
 
-    try:
-        logger.warning(f"[JefSerMat] *** EJECUTANDO SQL ***")
-        row = db.execute(stmt, params).mappings().one()
-        logger.warning(f"[JefSerMat] *** DESPUÉS de ejecutar SQL - ROW recibido ***")
-        logger.warning(f"[JefSerMat] ROW content: {dict(row) if row else 'NULL'}")
-        
-        resultado = row.mensaje if row and hasattr(row, 'mensaje') else str(row)
-        logger.warning(f"[JefSerMat] Resultado SQL: {resultado}")
-        
-        # Verificar si la función devolvió un error
-        if resultado.startswith('ERROR:'):
-            logger.error(f"[JefSerMat] Error de función SQL: {resultado}")
-            raise ValueError(resultado)
+# EMPLEADOS ALMACEN
 
-        # *** COMMIT INMEDIATO para asegurar que el INSERT de aprobación se persista ***
-        logger.warning(f"[JefSerMat] *** COMMIT INMEDIATO POST-FUNCIÓN SQL ***")
-        db.commit()
-        logger.warning(f"[JefSerMat] *** COMMIT EXITOSO - Aprobación JefSerMat persistida ***")
+async def requisiciones_pendientes_almacen(db: AsyncSession, email: str) -> List[RequisicionPendienteGerenteOut]:
+    if not email:
+        raise ValueError("Email no proporcionado")
 
-        # Obtener nombre del jefe de materiales y código ANTES del commit
-        query_jefe = text("""
-            SELECT nombre FROM usuarios.empleados WHERE emailinstitucional = :email
-        """)
-        row_jefe = db.execute(query_jefe, {"email": email_jefe}).fetchone()
-        nombre_jefe = row_jefe.nombre if row_jefe else email_jefe
-        # Obtener código de requisición
-        query_req = text("SELECT codrequisicion FROM requisiciones.requisiciones WHERE idrequisicion = CAST(:id AS UUID)")
-        cod_req_result = db.execute(query_req, {"id": str(payload.idRequisicion)}).fetchone()
-        cod_req = cod_req_result[0] if cod_req_result else None
-        
-        # Registrar cambios de cantidad en auditoría
-        if cambios_cantidad and payload.estado.upper() in ['APROBADO', 'APROBADA']:
-            observaciones_cambios = "Cambios de cantidad: " + "; ".join([
-                f"Producto {c['idProducto']}: {c['cantidadOriginal']} → {c['cantidadNueva']}"
-                for c in cambios_cantidad
-            ])
-            registrar_auditoria_requisicion(
-                db=db,
-                id_requisicion=str(payload.idRequisicion),
-                tipo_accion="CAMBIO_CANTIDAD_JEFE_MATERIALES",
-                id_usuario_accion="",  # Se obtiene del token en el router
-                nombre_usuario_accion=nombre_jefe,
-                descripcion_accion="Cambio de cantidades por Jefe de Materiales",
-                observaciones=observaciones_cambios
-            )
-        
-        # Enviar notificación al solicitante
-        enviar_notificacion_aprobacion(
-            db=db,
-            id_requisicion=str(payload.idRequisicion),
-            estado=payload.estado,
-            email_aprobador=email_jefe,
-            nombre_aprobador=nombre_jefe,
-            rol_aprobador="Jefe de Materiales",
-            comentario=payload.comentario
+    if settings.BANDEJA_APROBACION_ENABLED:
+        rows = await listar_pendientes_bandeja(db, email, "EmpAlmacen")
+    else:
+        stmt = text(SQL_REQUISICIONES_PENDIENTES_ALMACEN).bindparams(
+            bindparam("p_email"),
         )
-        
-        # Si aprobó, notificar al siguiente rol (Empleado de Almacén)
-        if payload.estado.lower() in ['aprobada', 'aprobado']:
-            empleados_alm = obtener_usuarios_por_rol(db, "EmpAlmacen")
-            for email_alm, nombre_alm in empleados_alm:
-                msg_alm = f"📦 Requisición {cod_req or ''} aprobada por Jefe de Materiales, lista para despacho"
-                db.execute(
-                    text("""
-                        INSERT INTO requisiciones.notificaciones 
-                        (emailusuario, tipo, mensaje, idrequisicion, leida, fechacreacion)
-                        VALUES (:email, :tipo, :mensaje, :idrequisicion, FALSE, CURRENT_TIMESTAMP)
-                    """),
-                    {
-                        "email": email_alm,
-                        "tipo": "requisicion_pendiente",
-                        "mensaje": msg_alm,
-                        "idrequisicion": str(payload.idRequisicion),
-                    }
-                )
-
-            # Registrar estado PENDIENTE para el rol EmpAlmacen en la tabla de Aprobaciones
-            try:
-                estado_actual_alm = db.execute(
-                    text(
-                        """
-                        SELECT estadoaprobacion 
-                        FROM requisiciones.aprobaciones 
-                        WHERE idrequisicion = CAST(:id AS UUID) AND rol = 'EmpAlmacen' 
-                        ORDER BY fecaprobacion DESC NULLS LAST 
-                        LIMIT 1
-                        """
-                    ),
-                    {"id": str(payload.idRequisicion)}
-                ).fetchone()
-
-                if not estado_actual_alm or (str(estado_actual_alm[0] or '').upper() != 'PENDIENTE'):
-                    db.execute(
-                        text(
-                            """
-                            INSERT INTO requisiciones.aprobaciones 
-                            (idrequisicion, emailinstitucional, rol, estadoaprobacion, comentario, fecaprobacion)
-                            VALUES (CAST(:id AS UUID), NULL, 'EmpAlmacen', 'Pendiente', NULL, NULL)
-                            """
-                        ),
-                        {"id": str(payload.idRequisicion)}
-                    )
-            except Exception as ap_e:
-                print(f"⚠️  No se pudo registrar estado pendiente para EmpAlmacen: {ap_e}")
-
-        # Commit de auditoría y notificaciones
-        try:
-            db.commit()
-            logger.warning(f"[JefSerMat] *** COMMIT final (auditoría/notificaciones) exitoso ***")
-        except Exception as commit_e:
-            logger.error(f"[JefSerMat] Error en commit final: {commit_e}")
-            # No hacer rollback aquí porque la aprobación ya está commiteada
+        rows = (await db.execute(stmt, {"p_email": email})).mappings().all()
 
-    except Exception as e:
-        logger.error(f"[JefSerMat] *** EXCEPCIÓN en función: {e} ***")
-        db.rollback()
-        print(f"❌ Error en responder_requisicion_jefe_materiales: {e}")
-        import traceback
-        traceback.print_exc()
-        raise
+    return await _mapear_pendientes(
+        db, rows, RequisicionPendienteGerenteOut, "nombreEmpleado",
+        ("nombreEmpleado", "nombreempleado", "nomempleado", "nom_empleado"),
+    )
 
-    logger.warning(f"[JefSerMat] *** RETORNANDO RESULTADO: {row['mensaje']} ***")
-    return ResponderRequisicionOut(mensaje=row["mensaje"])
 
-# EMPLEADOS ALMACEN
 
-def requisiciones_pendientes_almacen(db: Session, email: str) -> List[RequisicionPendienteGerenteOut]:
-    if not email:
+def responder_requisicion_almacen(
+    db: Session,
+    payload: ResponderRequisicionGerenteIn,
+    email_almacen: str,
+    id_usuario: Any = None,
+    nombre_usuario: str | None = None,
+) -> ResponderRequisicionOut:
+    if not email_almacen:
         raise ValueError("Email no proporcionado")
 
-    stmt = text(SQL_REQUISICIONES_PENDIENTES_ALMACEN).bindparams(
-        bindparam("p_email"),
+    return _procesar_aprobacion(
+        db, "EmpAlmacen", payload, email_almacen, _productos_almacen(payload),
+        id_usuario=id_usuario, nombre_usuario=nombre_usuario,
     )
-    rows = db.execute(stmt, {"p_email": email}).mappings().all()
 
-    def _first(d: Dict[str, Any], *keys: str) -> Any:
-        for k in keys:
-            if k in d:
-                return d[k]
-        return None
 
-    def _parse_productos(raw: Any) -> List[Dict[str, Any]]:
-        if isinstance(raw, str):
-            try:
-                return json.loads(raw)
-            except Exception:
-                try:
-                    return json.loads(raw.replace('""', '"'))
-                except Exception:
-                    return []
-        if isinstance(raw, list):
-            return raw
-        return []
+# APROBACIÓN POR LOTE
 
-    def _map_producto_item(item: Dict[str, Any]) -> Dict[str, Any]:
-        return {
-            "idProducto": _first(item, "idProducto", "id_producto"),
-            "nombre": _first(item, "nombre", "nombre_producto"),
-            "cantidad": _first(item, "cantidad", "cantidad_solicitada"),
-            "gasUnitario": _first(item, "gasUnitario", "gas_unitario"),
-            "gasTotalProducto": _first(item, "gasTotalProducto", "gas_total_producto"),
-        }
+SQL_INSERTAR_NOTIFICACIONES_LOTE = """
+INSERT INTO requisiciones.notificaciones
+    (emailusuario, tipo, mensaje, idrequisicion, leida, fechacreacion)
+SELECT n.emailusuario, n.tipo, n.mensaje, n.idrequisicion, FALSE, CURRENT_TIMESTAMP
+FROM json_to_recordset(CAST(:notificaciones AS json))
+     AS n(emailusuario TEXT, tipo TEXT, mensaje TEXT, idrequisicion UUID)
+"""
 
-    resultados: List[RequisicionPendienteGerenteOut] = []
-    for r in rows:
-        d = dict(r)
-        productos_list = _parse_productos(_first(d, "productos", "Productos"))
-        productos_out = [_map_producto_item(it) for it in productos_list]
 
-        mapeado = {
-            "idRequisicion": _first(d, "idRequisicion", "idrequisicion"),
-            "codRequisicion": _first(d, "codRequisicion", "codrequisicion"),
-            "nombreEmpleado": _first(d, "nombreEmpleado", "nombreempleado", "nomempleado", "nom_empleado"),
-            "dependencia": _first(d, "dependencia"),
-            "fecSolicitud": _first(d, "fecSolicitud", "fecsolicitud"),
-            "codPrograma": _first(d, "codPrograma", "codprograma"),
-            "proIntermedio": _first(d, "proIntermedio", "prointermedio"),
-            "proFinal": _first(d, "proFinal", "profinal"),
-            "obsEmpleado": _first(d, "obsEmpleado", "obsempleado"),
-            "gasTotalDelPedido": _first(d, "gasTotalDelPedido", "gastotaldelpedido"),
-            "productos": productos_out,
-        }
-        resultados.append(RequisicionPendienteGerenteOut(**mapeado))
+def _productos_lote(rol: str, decision: ResponderRequisicionGerenteIn) -> tuple[Any, str | None]:
+    """Productos (y cambios de cantidad) en el formato de cada responder_requisicion_*."""
+    if rol == "JefInmediato":
+        productos = [
+            {"idProducto": str(p.idProducto), "cantidad": float(p.nuevaCantidad)} for p in decision.productos
+        ]
+        return productos or None, None
+    if rol == "JefSerMat":
+        return _productos_ajuste(decision), _cambios_cantidad(decision)
+    return _productos_ajuste(decision), None
 
-    return resultados
 
+def _mensaje_error(e: Exception) -> str:
+    if isinstance(e, DBAPIError) and getattr(e, "orig", None) is not None:
+        return str(e.orig).strip().split("\n")[0]
+    return str(e)
 
 
-def responder_requisicion_almacen(
+def responder_requisiciones_lote(
     db: Session,
-    payload: ResponderRequisicionGerenteIn,
-    email_almacen: str
-) -> ResponderRequisicionOut:
-    if not email_almacen:
-        raise ValueError("Email no proporcionado")
-
-    # Convertir productos al formato esperado por la función SQL
-    productos_json: List[Dict[str, Any]] = [
-        {
-            "idProducto": str(p.idProducto),
-            "nuevaCantidad": float(p.nuevaCantidad if hasattr(p, "nuevaCantidad") and p.nuevaCantidad is not None else getattr(p, "cantidad", 0)),
-        }
-        for p in payload.productos
-    ]
+    rol: str,
+    decisiones: List[ResponderRequisicionGerenteIn],
+    email: str,
+    id_usuario: Any = None,
+    nombre_usuario: str | None = None,
+) -> ResponderLoteOut:
+    """
+    Aplica varias decisiones del mismo aprobador en una sola transacción.
 
-    params = {
-        "p_id_requisicion": payload.idRequisicion,
-        "p_email_almacen": email_almacen,
-        "p_estado_aprob": payload.estado,
-        "p_comentario": payload.comentario or "",
-        "p_productos": json.dumps(productos_json),
-    }
+    Cada decisión corre en su propio SAVEPOINT con la misma lógica que
+    responder_requisicion_* (requisiciones.procesar_aprobacion), así que una
+    decisión inválida no invalida a las demás. Las notificaciones de todo el
+    lote se insertan al final con una sola sentencia.
+    """
+    if not email:
+        raise ValueError("Email no proporcionado")
 
-    stmt = text(SQL_RESPONDER_REQUISICION_ALMACEN).bindparams(
-        bindparam("p_id_requisicion", type_=PGUUID),
-        bindparam("p_email_almacen"),
-        bindparam("p_estado_aprob"),
-        bindparam("p_comentario"),
-        bindparam("p_productos"),
-    )
+    resultados: List[ResultadoLoteItem] = []
+    notificaciones: List[Dict[str, Any]] = []
 
     try:
-        row = db.execute(stmt, params).mappings().one()
-        
-        # Obtener nombre del encargado de almacén ANTES del commit
-        query_almacen = text("""
-            SELECT nombre FROM usuarios.empleados WHERE emailinstitucional = :email
-        """)
-        row_almacen = db.execute(query_almacen, {"email": email_almacen}).fetchone()
-        nombre_almacen = row_almacen.nombre if row_almacen else email_almacen
-        
-        # Enviar notificación al solicitante
-        enviar_notificacion_aprobacion(
-            db=db,
-            id_requisicion=str(payload.idRequisicion),
-            estado=payload.estado,
-            email_aprobador=email_almacen,
-            nombre_aprobador=nombre_almacen,
-            rol_aprobador="Encargado de Almacén",
-            comentario=payload.comentario
-        )
-        
-        # Commit al final
+        for decision in decisiones:
+            productos, cambios = _productos_lote(rol, decision)
+            try:
+                with db.begin_nested():
+                    resultado = _ejecutar_aprobacion(
+                        db, rol, decision, email, productos,
+                        id_usuario=id_usuario, nombre_usuario=nombre_usuario,
+                        cambios_cantidad=cambios, diferir_notificaciones=True,
+                    )
+            except Exception as e:
+                logger.warning(f"Aprobación por lote ({rol}): {decision.idRequisicion} falló: {e}")
+                resultados.append(ResultadoLoteItem(
+                    idRequisicion=decision.idRequisicion, ok=False, error=_mensaje_error(e),
+                ))
+                continue
+
+            for n in resultado.get("notificaciones") or []:
+                notificaciones.append({**n, "idrequisicion": str(decision.idRequisicion)})
+            resultados.append(ResultadoLoteItem(
+                idRequisicion=decision.idRequisicion, ok=True, resultado=_salida_aprobacion(resultado),
+            ))
+
+        if notificaciones:
+            db.execute(text(SQL_INSERTAR_NOTIFICACIONES_LOTE), {"notificaciones": json.dumps(notificaciones)})
         db.commit()
-        
-    except Exception as e:
+    except Exception:
         db.rollback()
-        print(f"❌ Error en responder_requisicion_almacen: {e}")
-        import traceback
-        traceback.print_exc()
         raise
 
-    return ResponderRequisicionOut(mensaje=row["mensaje"])
+    exitosas = sum(1 for r in resultados if r.ok)
+    return ResponderLoteOut(
+        total=len(resultados),
+        exitosas=exitosas,
+        fallidas=len(resultados) - exitosas,
+        notificados=len(notificaciones),
+        resultados=resultados,
+    )
 
 
 # ===== FUNCIONES DE AUDITORÍA Y TIMESTAMPS =====
@@ -1026,7 +719,7 @@ def registrar_auditoria_requisicion(
         return False
 
 
-def obtener_timeline_requisicion(db: Session, id_requisicion: str) -> list[Dict[str, Any]]:
+async def obtener_timeline_requisicion(db: AsyncSession, id_requisicion: str) -> list[Dict[str, Any]]:
     """
     Obtiene el timeline completo de una requisición con todos los eventos
     
@@ -1047,7 +740,7 @@ def obtener_timeline_requisicion(db: Session, id_requisicion: str) -> list[Dict[
             ORDER BY fecha_hora_accion ASC
         """)
         
-        rows = db.execute(query, {"id_req": id_requisicion}).mappings().fetchall()
+        rows = (await db.execute(query, {"id_req": id_requisicion})).mappings().fetchall()
         
         return [dict(row) for row in rows]
     except Exception as e:
@@ -1055,7 +748,7 @@ def obtener_timeline_requisicion(db: Session, id_requisicion: str) -> list[Dict[
         return []
 
 
-def obtener_tiempos_requisicion(db: Session, id_requisicion: str) -> Dict[str, Any]:
+async def obtener_tiempos_requisicion(db: AsyncSession, id_requisicion: str) -> Dict[str, Any]:
     """
     Calcula los tiempos transcurridos entre cada etapa
     
@@ -1082,7 +775,7 @@ def obtener_tiempos_requisicion(db: Session, id_requisicion: str) -> Dict[str, A
             WHERE idrequisicion = :id_req
         """)
         
-        row = db.execute(query, {"id_req": id_requisicion}).mappings().first()
+        row = (await db.execute(query, {"id_req": id_requisicion})).mappings().first()
         
         return dict(row) if row else {}
     except Exception as e:
@@ -0,0 +1,12 @@
+from pydantic import BaseModel, Field
+
+
+class PreferenciasNotificacionIn(BaseModel):
+    resumen: bool
+    ventanaMin: int = Field(30, ge=5, le=1440)
+
+
+class PreferenciasNotificacionOut(BaseModel):
+    email: str
+    resumen: bool
+    ventanaMin: int
@@ -7,10 +7,13 @@ from datetime import date
 
 ##usuarios EMPLEADOS
 class CategoriaOut(BaseModel):
+    idcategoria: Optional[UUID] = None
     codobjeto: Optional[int] = None
     nomcategoria: Optional[str] = None
     descategoria: Optional[str] = None
-    imagen: Optional[bytes] = None
+    # La imagen se descarga aparte (GET /categorias/{idcategoria}/imagen)
+    imagen_hash: Optional[str] = None
+    imagen_url: Optional[str] = None
 
 class ProductoPorCategoriaOut(BaseModel):
     idproducto: UUID
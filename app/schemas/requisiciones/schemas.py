@@ -1,7 +1,7 @@
-from typing import List, Optional
+from typing import List, Literal, Optional
 from uuid import UUID
 from decimal import Decimal
-from pydantic import BaseModel, model_validator
+from pydantic import BaseModel, Field, model_validator
 from datetime import date
 
 class ProductoItemIn(BaseModel):
@@ -69,6 +69,13 @@ class ResponderRequisicionIn(BaseModel):
 
 class ResponderRequisicionOut(BaseModel):
     mensaje: str
+    # Estado resultante, para que la interfaz actualice la fila sin volver a consultar
+    idRequisicion: Optional[UUID] = None
+    codRequisicion: Optional[str] = None
+    estadoAprobacion: Optional[str] = None
+    estadoGeneral: Optional[str] = None
+    aprobador: Optional[str] = None
+    notificados: int = 0
 
 # --- GERENTE ADMINISTRATIVO ---
 class RequisicionPendienteGerenteOut(BaseModel):
@@ -116,6 +123,25 @@ class ResponderRequisicionGerenteIn(BaseModel):
         return self
 
 
+# --- APROBACIÓN POR LOTE ---
+class ResponderLoteIn(BaseModel):
+    rol: Literal["JefInmediato", "GerAdmon", "JefSerMat"]
+    decisiones: List[ResponderRequisicionGerenteIn] = Field(min_length=1, max_length=200)
+
+class ResultadoLoteItem(BaseModel):
+    idRequisicion: UUID
+    ok: bool
+    resultado: Optional[ResponderRequisicionOut] = None
+    error: Optional[str] = None
+
+class ResponderLoteOut(BaseModel):
+    total: int
+    exitosas: int
+    fallidas: int
+    notificados: int
+    resultados: List[ResultadoLoteItem]
+
+
 # --- JEFE DE MATERIALES ---
 class RequisicionPendienteJefeMaterialesOut(BaseModel):
     idRequisicion: UUID
@@ -182,3 +208,16 @@ class ResponderRequisicionAlmacenIn(BaseModel):
     idRequisicion: UUID
     emailRecibido: str  # Nombre de quien recibe
     productos: List[ProductoEntregaAlmacenIn]
+
+class ReenvioCorreosIn(BaseModel):
+    desde: Optional[date] = None
+    hasta: Optional[date] = None
+    destinatario: Optional[str] = None
+    error: Optional[str] = None  # texto contenido en el error
+    limite: int = Field(500, ge=1, le=2000)
+
+    @model_validator(mode="after")
+    def _validar_rango(self):
+        if self.desde and self.hasta and self.desde > self.hasta:
+            raise ValueError("desde no puede ser posterior a hasta")
+        return self
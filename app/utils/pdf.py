@@ -12,6 +12,8 @@ from io import BytesIO
 from typing import Optional, List, Dict, Any
 import logging
 
+from app.core.monitor import medir_bloqueo
+
 logger = logging.getLogger(__name__)
 
 
@@ -247,7 +249,8 @@ def generar_pdf_requisicion(
         ))
         
         # Construir PDF
-        doc.build(elements)
+        with medir_bloqueo("pdf"):
+            doc.build(elements)
         
         buffer.seek(0)
         return buffer.getvalue()
@@ -0,0 +1,127 @@
+"""
+Proceso dedicado para trabajos en segundo plano.
+
+    python -m app.worker
+
+Ejecuta las tareas del scheduler (bandeja de salida de correos, envío de
+notificaciones, mantenimiento) y los trabajos de requisiciones.cola_trabajos, con
+su propio engine y pool de conexiones. Mientras corre actualiza su fila en
+requisiciones.worker_latidos, con las métricas de cada tarea (visible en
+GET /api/v1/monitor/workers).
+
+Con el worker desplegado, configurar TAREAS_EN_API=false para que los procesos de
+la API dejen de ejecutar el scheduler y solo atiendan HTTP. Se pueden correr varios
+workers: las colas usan FOR UPDATE SKIP LOCKED y las tareas exclusivas corren solo
+en el worker que tiene su advisory lock.
+
+SIGTERM/SIGINT terminan el trabajo en curso y salen marcando el latido como detenido.
+"""
+import json
+import os
+import signal
+import socket
+import threading
+import time
+
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.core import database
+from app.core.mail import cerrar_pool_smtp, estado_smtp
+from app.core.scheduler import TAREAS, ejecutar_pendientes, estado_scheduler, liderazgo, registrar_tareas
+from app.core.trabajos import ejecutar_siguiente_trabajo
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+_detener = threading.Event()
+
+
+def _configurar_engine():
+    """
+    Engine propio del worker, con la configuración de pool de la API salvo el
+    tamaño; SessionLocal (y los módulos que lo usan) pasan a usarlo.
+    """
+    database.engine.dispose()
+    engine = database.crear_engine(pool_size=settings.WORKER_DB_POOL_SIZE, max_overflow=0)
+    # El hilo de liveness y estadisticas_pool() leen database.engine
+    database.engine = engine
+    database.SessionLocal.configure(bind=engine)
+    database.iniciar_verificacion_pool()
+    return engine
+
+
+def _latido(estado: str, ejecutados: int, ultimo_error=None) -> None:
+    db = database.SessionLocal()
+    try:
+        db.execute(text("""
+            INSERT INTO requisiciones.worker_latidos
+                (worker_id, host, pid, estado, trabajos_ejecutados, ultimo_error, metricas)
+            VALUES (:id, :host, :pid, :estado, :ejecutados, :error, CAST(:metricas AS JSONB))
+            ON CONFLICT (worker_id) DO UPDATE
+            SET estado = EXCLUDED.estado,
+                ultimo_latido = NOW(),
+                trabajos_ejecutados = EXCLUDED.trabajos_ejecutados,
+                ultimo_error = COALESCE(EXCLUDED.ultimo_error, requisiciones.worker_latidos.ultimo_error),
+                metricas = EXCLUDED.metricas
+        """), {
+            "id": WORKER_ID,
+            "host": socket.gethostname(),
+            "pid": os.getpid(),
+            "estado": estado,
+            "ejecutados": ejecutados,
+            "error": ultimo_error,
+            "metricas": json.dumps({**estado_scheduler(), "smtp": estado_smtp()}),
+        })
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"WARN: No se pudo registrar el latido del worker: {e}")
+    finally:
+        db.close()
+
+
+def ejecutar() -> None:
+    engine = _configurar_engine()
+    registrar_tareas()
+    print(f"Worker {WORKER_ID} iniciado; tareas: {', '.join(TAREAS) or 'ninguna'}")
+
+    ejecutados = 0
+    ultimo_error = None
+    proximo_latido = 0.0
+
+    while not _detener.is_set():
+        ejecutados += ejecutar_pendientes(_detener)
+
+        db = database.SessionLocal()
+        try:
+            while not _detener.is_set() and ejecutar_siguiente_trabajo(db, WORKER_ID):
+                ejecutados += 1
+        except Exception as e:
+            ultimo_error = f"cola: {e}"
+            print(f"ERROR al procesar la cola de trabajos: {e}")
+            db.rollback()
+        finally:
+            db.close()
+
+        if time.monotonic() >= proximo_latido:
+            _latido("activo", ejecutados, ultimo_error)
+            ultimo_error = None
+            proximo_latido = time.monotonic() + settings.WORKER_HEARTBEAT_SEC
+
+        _detener.wait(settings.WORKER_TICK_SEC)
+
+    print(f"Worker {WORKER_ID} deteniéndose")
+    _latido("detenido", ejecutados)
+    liderazgo.soltar()
+    cerrar_pool_smtp()
+    engine.dispose()
+
+
+def _manejar_senal(signum, frame) -> None:
+    _detener.set()
+
+
+if __name__ == "__main__":
+    signal.signal(signal.SIGTERM, _manejar_senal)
+    signal.signal(signal.SIGINT, _manejar_senal)
+    ejecutar()
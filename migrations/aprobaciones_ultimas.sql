@@ -0,0 +1,127 @@
+-- Proyección: última aprobación por rol y requisición
+--
+-- /mis-requisiciones y /todas necesitaban, por cada requisición, la aprobación más
+-- reciente de cada rol (JefInmediato, GerAdmon, JefSerMat, EmpAlmacen). Antes se
+-- resolvía con ~16 subconsultas correlacionadas "ORDER BY FecAprobacion DESC LIMIT 1".
+-- Esta tabla guarda ese resultado y la mantiene un trigger sobre requisiciones.aprobaciones.
+--
+-- Orden: el mismo que "ORDER BY fecaprobacion DESC" (NULLs primero). Como fecaprobacion
+-- es DATE, en empates gana la aprobación insertada más recientemente, según
+-- aprobaciones.orden_insercion (secuencia). El recálculo, el camino rápido del
+-- INSERT y el backfill usan la misma regla.
+
+BEGIN;
+
+-- Orden de inserción real (ctid cambia con UPDATE y VACUUM). Las filas que ya
+-- existían se numeran en el orden en que se leen al agregar la columna.
+ALTER TABLE requisiciones.aprobaciones
+    ADD COLUMN IF NOT EXISTS orden_insercion BIGSERIAL;
+
+CREATE TABLE IF NOT EXISTS requisiciones.aprobaciones_ultimas (
+    idrequisicion      UUID         NOT NULL,
+    rol                VARCHAR(50)  NOT NULL,
+    idaprobacion       UUID,
+    emailinstitucional VARCHAR(100),
+    estadoaprobacion   VARCHAR(50),
+    comentario         TEXT,
+    fecaprobacion      DATE,
+    orden_insercion    BIGINT,
+    actualizado_en     TIMESTAMPTZ  NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (idrequisicion, rol)
+);
+
+ALTER TABLE requisiciones.aprobaciones_ultimas
+    ADD COLUMN IF NOT EXISTS orden_insercion BIGINT;
+
+-- Índice para recalcular una pareja (requisición, rol) sin recorrer la tabla
+DROP INDEX IF EXISTS requisiciones.ix_aprobaciones_requisicion_rol_fecha;
+CREATE INDEX IF NOT EXISTS ix_aprobaciones_requisicion_rol_orden
+    ON requisiciones.aprobaciones (idrequisicion, rol, fecaprobacion DESC, orden_insercion DESC);
+
+-- Recalcula la proyección de una requisición/rol desde la tabla base
+CREATE OR REPLACE FUNCTION requisiciones.refrescar_aprobacion_ultima(p_idrequisicion UUID, p_rol VARCHAR)
+RETURNS VOID AS $$
+BEGIN
+    DELETE FROM requisiciones.aprobaciones_ultimas
+    WHERE idrequisicion = p_idrequisicion AND rol = p_rol;
+
+    INSERT INTO requisiciones.aprobaciones_ultimas (
+        idrequisicion, rol, idaprobacion, emailinstitucional,
+        estadoaprobacion, comentario, fecaprobacion, orden_insercion, actualizado_en
+    )
+    SELECT a.idrequisicion, a.rol, a.idaprobacion, a.emailinstitucional,
+           a.estadoaprobacion, a.comentario, a.fecaprobacion, a.orden_insercion, NOW()
+    FROM requisiciones.aprobaciones a
+    WHERE a.idrequisicion = p_idrequisicion AND a.rol = p_rol
+    ORDER BY a.fecaprobacion DESC NULLS FIRST, a.orden_insercion DESC
+    LIMIT 1;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION requisiciones.trg_aprobaciones_ultimas()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        -- Camino rápido: la nueva fila reemplaza a la actual si va antes en
+        -- (fecaprobacion DESC NULLS FIRST, orden_insercion DESC), igual que el recálculo
+        INSERT INTO requisiciones.aprobaciones_ultimas AS au (
+            idrequisicion, rol, idaprobacion, emailinstitucional,
+            estadoaprobacion, comentario, fecaprobacion, orden_insercion, actualizado_en
+        )
+        VALUES (
+            NEW.idrequisicion, NEW.rol, NEW.idaprobacion, NEW.emailinstitucional,
+            NEW.estadoaprobacion, NEW.comentario, NEW.fecaprobacion, NEW.orden_insercion, NOW()
+        )
+        ON CONFLICT (idrequisicion, rol) DO UPDATE
+        SET idaprobacion       = EXCLUDED.idaprobacion,
+            emailinstitucional = EXCLUDED.emailinstitucional,
+            estadoaprobacion   = EXCLUDED.estadoaprobacion,
+            comentario         = EXCLUDED.comentario,
+            fecaprobacion      = EXCLUDED.fecaprobacion,
+            orden_insercion    = EXCLUDED.orden_insercion,
+            actualizado_en     = EXCLUDED.actualizado_en
+        WHERE CASE
+            WHEN EXCLUDED.fecaprobacion IS NULL AND au.fecaprobacion IS NOT NULL THEN TRUE
+            WHEN EXCLUDED.fecaprobacion IS NOT NULL AND au.fecaprobacion IS NULL THEN FALSE
+            WHEN EXCLUDED.fecaprobacion IS DISTINCT FROM au.fecaprobacion
+                THEN EXCLUDED.fecaprobacion > au.fecaprobacion
+            ELSE COALESCE(EXCLUDED.orden_insercion > au.orden_insercion, TRUE)
+        END;
+        RETURN NEW;
+    END IF;
+
+    -- UPDATE / DELETE: recalcular desde la tabla base
+    PERFORM requisiciones.refrescar_aprobacion_ultima(OLD.idrequisicion, OLD.rol);
+
+    IF TG_OP = 'UPDATE'
+       AND (NEW.idrequisicion, NEW.rol) IS DISTINCT FROM (OLD.idrequisicion, OLD.rol) THEN
+        PERFORM requisiciones.refrescar_aprobacion_ultima(NEW.idrequisicion, NEW.rol);
+    END IF;
+
+    RETURN COALESCE(NEW, OLD);
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_aprobaciones_ultimas ON requisiciones.aprobaciones;
+
+CREATE TRIGGER trg_aprobaciones_ultimas
+AFTER INSERT OR UPDATE OR DELETE ON requisiciones.aprobaciones
+FOR EACH ROW EXECUTE FUNCTION requisiciones.trg_aprobaciones_ultimas();
+
+-- Backfill (bloquea escrituras en aprobaciones mientras se reconstruye)
+LOCK TABLE requisiciones.aprobaciones IN SHARE ROW EXCLUSIVE MODE;
+
+TRUNCATE requisiciones.aprobaciones_ultimas;
+
+INSERT INTO requisiciones.aprobaciones_ultimas (
+    idrequisicion, rol, idaprobacion, emailinstitucional,
+    estadoaprobacion, comentario, fecaprobacion, orden_insercion, actualizado_en
+)
+SELECT DISTINCT ON (a.idrequisicion, a.rol)
+       a.idrequisicion, a.rol, a.idaprobacion, a.emailinstitucional,
+       a.estadoaprobacion, a.comentario, a.fecaprobacion, a.orden_insercion, NOW()
+FROM requisiciones.aprobaciones a
+WHERE a.idrequisicion IS NOT NULL AND a.rol IS NOT NULL
+ORDER BY a.idrequisicion, a.rol, a.fecaprobacion DESC NULLS FIRST, a.orden_insercion DESC;
+
+COMMIT;
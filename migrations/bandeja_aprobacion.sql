@@ -0,0 +1,336 @@
+-- Bandeja de aprobación incremental
+--
+-- requisiciones.bandeja_aprobacion guarda, por aprobador (email) y rol, las
+-- requisiciones que tiene pendientes. Las listas de pendientes y los contadores
+-- pasan a ser búsquedas indexadas en lugar de evaluar requisiciones_pendientes_*
+-- en cada petición.
+--
+-- La pertenencia se calcula por requisición a partir de su estado, sus
+-- aprobaciones y sus aprobadores (calcular_bandeja_aprobacion), con las mismas
+-- reglas que requisiciones_pendientes_*; no se llama a esas funciones por
+-- usuario. Se mantiene con triggers:
+--   - requisiciones, aprobaciones, detalle_requisicion: constraint trigger
+--     diferido que recalcula la requisición al final de la transacción (una vez
+--     por requisición y transacción);
+--   - acceso.empleados_roles: recalcula las filas del aprobador cuyo rol o
+--     actlaboralmente cambió;
+--   - usuarios.empleados: recalcula las requisiciones afectadas cuando cambia el
+--     jefe inmediato (dnijefeinmediato), el dni o el email de un empleado.
+--
+-- Los triggers solo se instalan al activar la bandeja (junto con
+-- BANDEJA_APROBACION_ENABLED=true):
+--     python -m app.repositories.bandeja activar
+--     python -m app.repositories.bandeja desactivar
+-- Esta migración crea la tabla y las funciones y deja los triggers sin instalar,
+-- así que con la bandeja desactivada las escrituras no pagan nada. Los errores
+-- del cálculo no se ocultan: abortan la transacción que los provocó.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS requisiciones.bandeja_aprobacion (
+    emailaprobador VARCHAR(100) NOT NULL,   -- siempre en minúsculas
+    rol            VARCHAR(50)  NOT NULL,
+    idrequisicion  UUID         NOT NULL,
+    agregado_en    TIMESTAMPTZ  NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (emailaprobador, rol, idrequisicion)
+);
+
+CREATE INDEX IF NOT EXISTS ix_bandeja_aprobacion_requisicion
+    ON requisiciones.bandeja_aprobacion (idrequisicion);
+
+-- Versión anterior (evaluaba requisiciones_pendientes_* por cada aprobador)
+DROP FUNCTION IF EXISTS requisiciones.calcular_bandeja_aprobacion(UUID);
+
+-- Pertenencia calculada. Filtros opcionales: una requisición o un aprobador.
+-- Sin filtros, la bandeja completa.
+CREATE OR REPLACE FUNCTION requisiciones.calcular_bandeja_aprobacion(
+    p_idrequisicion UUID DEFAULT NULL,
+    p_email         TEXT DEFAULT NULL
+)
+RETURNS TABLE(emailaprobador VARCHAR, rol VARCHAR, idrequisicion UUID)
+LANGUAGE sql
+STABLE
+AS $$
+    WITH req AS (
+        SELECT r.idrequisicion,
+               r.creadopor,
+               r.fecha_hora_aprobacion_almacen,
+               UPPER(COALESCE(r.estgeneral, '')) AS est,
+               EXISTS (
+                   SELECT 1 FROM requisiciones.aprobaciones a
+                   WHERE a.idrequisicion = r.idrequisicion AND a.rol = 'JefInmediato'
+                     AND UPPER(a.estadoaprobacion) IN ('APROBADO', 'RECHAZADO')
+               ) AS jefe_respondio,
+               EXISTS (
+                   SELECT 1 FROM requisiciones.aprobaciones a
+                   WHERE a.idrequisicion = r.idrequisicion AND a.rol = 'JefInmediato'
+                     AND UPPER(a.estadoaprobacion) = 'APROBADO'
+               ) AS jefe_aprobo,
+               EXISTS (
+                   SELECT 1 FROM requisiciones.aprobaciones a
+                   WHERE a.idrequisicion = r.idrequisicion AND a.rol = 'GerAdmon'
+                     AND UPPER(a.estadoaprobacion) IN ('APROBADO', 'RECHAZADO')
+               ) AS gerente_respondio,
+               EXISTS (
+                   SELECT 1 FROM requisiciones.aprobaciones a
+                   WHERE a.idrequisicion = r.idrequisicion AND a.rol = 'JefSerMat'
+                     AND UPPER(a.estadoaprobacion) IN ('APROBADO', 'RECHAZADO')
+               ) AS materiales_respondio,
+               EXISTS (
+                   SELECT 1 FROM requisiciones.aprobaciones a
+                   WHERE a.idrequisicion = r.idrequisicion AND a.rol = 'JefSerMat'
+                     AND UPPER(a.estadoaprobacion) = 'APROBADO'
+               ) AS materiales_aprobo,
+               EXISTS (
+                   SELECT 1 FROM requisiciones.aprobaciones a
+                   WHERE a.idrequisicion = r.idrequisicion AND a.rol = 'EmpAlmacen'
+                     AND UPPER(a.estadoaprobacion) IN ('APROBADO', 'RECHAZADO')
+               ) AS almacen_respondio
+        FROM requisiciones.requisiciones r
+        WHERE (p_idrequisicion IS NULL OR r.idrequisicion = p_idrequisicion)
+          -- Solo estados en los que algún rol todavía puede tenerla pendiente
+          AND UPPER(COALESCE(r.estgeneral, '')) IN (
+              '', 'EN ESPERA', 'PENDIENTE', 'PENDIENTE ALMACEN', 'ESPERA ALMACEN',
+              'PENDIENTE JEFE MATERIALES', 'ESPERA JEFE MATERIALES'
+          )
+    ),
+    aprobadores AS (
+        SELECT DISTINCT LOWER(er.emailinstitucional) AS email, ro.nomrol AS rol
+        FROM acceso.empleados_roles er
+        JOIN acceso.roles ro ON ro.idrol = er.idrol
+        WHERE ro.nomrol IN ('GerAdmon', 'JefSerMat', 'EmpAlmacen')
+          AND COALESCE(er.actlaboralmente, TRUE) = TRUE
+          AND er.emailinstitucional IS NOT NULL
+          AND (p_email IS NULL OR LOWER(er.emailinstitucional) = LOWER(p_email))
+    )
+    -- Jefe inmediato del solicitante; fuera las ya atendidas por Almacén
+    -- (mismo filtro que _mapear_pendientes con excluir_atendidas)
+    SELECT DISTINCT LOWER(jefe.emailinstitucional)::VARCHAR, 'JefInmediato'::VARCHAR, req.idrequisicion
+    FROM req
+    JOIN usuarios.empleados e ON LOWER(e.emailinstitucional) = LOWER(req.creadopor)
+    JOIN usuarios.empleados jefe ON jefe.dni = e.dnijefeinmediato
+    WHERE jefe.emailinstitucional IS NOT NULL
+      AND (p_email IS NULL OR LOWER(jefe.emailinstitucional) = LOWER(p_email))
+      AND NOT req.jefe_respondio
+      AND req.fecha_hora_aprobacion_almacen IS NULL
+      AND req.est IN ('', 'EN ESPERA', 'PENDIENTE', 'PENDIENTE ALMACEN', 'ESPERA ALMACEN')
+    UNION
+    SELECT ap.email::VARCHAR, ap.rol::VARCHAR, req.idrequisicion
+    FROM req
+    JOIN aprobadores ap ON
+        -- Gerente: después del jefe inmediato
+        (ap.rol = 'GerAdmon'
+         AND req.jefe_aprobo AND NOT req.gerente_respondio
+         AND req.est IN ('EN ESPERA', 'PENDIENTE'))
+        -- Jefe de Materiales: requisiciones_pendientes_jefe_materiales
+        OR (ap.rol = 'JefSerMat'
+            AND NOT req.materiales_respondio
+            AND req.est IN ('PENDIENTE', 'PENDIENTE JEFE MATERIALES', 'ESPERA JEFE MATERIALES', 'EN ESPERA'))
+        -- Almacén: requisiciones_pendientes_almacen
+        OR (ap.rol = 'EmpAlmacen'
+            AND req.est = 'EN ESPERA' AND req.materiales_aprobo AND NOT req.almacen_respondio)
+$$;
+
+-- Recalcula la bandeja de una requisición
+CREATE OR REPLACE FUNCTION requisiciones.refrescar_bandeja_requisicion(p_idrequisicion UUID)
+RETURNS INTEGER AS $$
+DECLARE
+    v_filas INTEGER;
+BEGIN
+    DELETE FROM requisiciones.bandeja_aprobacion b WHERE b.idrequisicion = p_idrequisicion;
+
+    INSERT INTO requisiciones.bandeja_aprobacion (emailaprobador, rol, idrequisicion)
+    SELECT c.emailaprobador, c.rol, c.idrequisicion
+    FROM requisiciones.calcular_bandeja_aprobacion(p_idrequisicion) c;
+
+    GET DIAGNOSTICS v_filas = ROW_COUNT;
+    RETURN v_filas;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Recalcula las filas de un aprobador (cambio de rol o de estado laboral)
+CREATE OR REPLACE FUNCTION requisiciones.refrescar_bandeja_aprobador(p_email TEXT)
+RETURNS INTEGER AS $$
+DECLARE
+    v_filas INTEGER;
+BEGIN
+    IF p_email IS NULL THEN
+        RETURN 0;
+    END IF;
+
+    DELETE FROM requisiciones.bandeja_aprobacion b WHERE b.emailaprobador = LOWER(p_email);
+
+    INSERT INTO requisiciones.bandeja_aprobacion (emailaprobador, rol, idrequisicion)
+    SELECT c.emailaprobador, c.rol, c.idrequisicion
+    FROM requisiciones.calcular_bandeja_aprobacion(NULL, p_email) c;
+
+    GET DIAGNOSTICS v_filas = ROW_COUNT;
+    RETURN v_filas;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Reconstrucción completa (activación y recuperación)
+CREATE OR REPLACE FUNCTION requisiciones.reconstruir_bandeja_aprobacion()
+RETURNS INTEGER AS $$
+DECLARE
+    v_filas INTEGER;
+BEGIN
+    LOCK TABLE requisiciones.bandeja_aprobacion IN EXCLUSIVE MODE;
+    DELETE FROM requisiciones.bandeja_aprobacion;
+
+    INSERT INTO requisiciones.bandeja_aprobacion (emailaprobador, rol, idrequisicion)
+    SELECT c.emailaprobador, c.rol, c.idrequisicion
+    FROM requisiciones.calcular_bandeja_aprobacion() c;
+
+    GET DIAGNOSTICS v_filas = ROW_COUNT;
+    RETURN v_filas;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Diferencias entre la bandeja almacenada y la calculada
+CREATE OR REPLACE FUNCTION requisiciones.verificar_bandeja_aprobacion()
+RETURNS TABLE(tipo TEXT, emailaprobador VARCHAR, rol VARCHAR, idrequisicion UUID) AS $$
+BEGIN
+    RETURN QUERY
+    WITH calculada AS (
+        SELECT c.emailaprobador, c.rol, c.idrequisicion
+        FROM requisiciones.calcular_bandeja_aprobacion() c
+    ),
+    almacenada AS (
+        SELECT b.emailaprobador, b.rol, b.idrequisicion FROM requisiciones.bandeja_aprobacion b
+    )
+    SELECT 'faltante'::TEXT, x.emailaprobador, x.rol, x.idrequisicion
+    FROM (SELECT * FROM calculada EXCEPT SELECT * FROM almacenada) x
+    UNION ALL
+    SELECT 'sobrante'::TEXT, y.emailaprobador, y.rol, y.idrequisicion
+    FROM (SELECT * FROM almacenada EXCEPT SELECT * FROM calculada) y;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Trigger diferido: se ejecuta al COMMIT, una vez por requisición y transacción
+CREATE OR REPLACE FUNCTION requisiciones.trg_bandeja_aprobacion()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_id UUID;
+    v_refrescadas TEXT;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        v_id := OLD.idrequisicion;
+    ELSE
+        v_id := NEW.idrequisicion;
+    END IF;
+
+    IF v_id IS NULL THEN
+        RETURN NULL;
+    END IF;
+
+    v_refrescadas := COALESCE(current_setting('requisiciones.bandeja_refrescadas', TRUE), '');
+    IF position(v_id::TEXT IN v_refrescadas) > 0 THEN
+        RETURN NULL;
+    END IF;
+    PERFORM set_config('requisiciones.bandeja_refrescadas', v_refrescadas || ',' || v_id::TEXT, TRUE);
+
+    PERFORM requisiciones.refrescar_bandeja_requisicion(v_id);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Cambio de rol o de actlaboralmente: filas del aprobador anterior y del nuevo
+CREATE OR REPLACE FUNCTION requisiciones.trg_bandeja_empleados_roles()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM requisiciones.refrescar_bandeja_aprobador(NEW.emailinstitucional);
+        RETURN NULL;
+    END IF;
+
+    PERFORM requisiciones.refrescar_bandeja_aprobador(OLD.emailinstitucional);
+    IF TG_OP = 'UPDATE'
+       AND LOWER(NEW.emailinstitucional) IS DISTINCT FROM LOWER(OLD.emailinstitucional) THEN
+        PERFORM requisiciones.refrescar_bandeja_aprobador(NEW.emailinstitucional);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Cambio de jefe, dni o email: requisiciones del empleado y de sus subordinados
+CREATE OR REPLACE FUNCTION requisiciones.trg_bandeja_empleados()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_id UUID;
+BEGIN
+    FOR v_id IN
+        SELECT DISTINCT r.idrequisicion
+        FROM requisiciones.requisiciones r
+        JOIN usuarios.empleados e ON LOWER(e.emailinstitucional) = LOWER(r.creadopor)
+        WHERE LOWER(e.emailinstitucional) IN (LOWER(OLD.emailinstitucional), LOWER(NEW.emailinstitucional))
+           OR e.dnijefeinmediato IN (OLD.dni, NEW.dni)
+    LOOP
+        PERFORM requisiciones.refrescar_bandeja_requisicion(v_id);
+    END LOOP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Instala (TRUE) o quita (FALSE) los triggers; al instalarlos reconstruye la bandeja
+CREATE OR REPLACE FUNCTION requisiciones.activar_bandeja_aprobacion(p_activa BOOLEAN)
+RETURNS INTEGER AS $$
+BEGIN
+    DROP TRIGGER IF EXISTS trg_bandeja_requisiciones ON requisiciones.requisiciones;
+    DROP TRIGGER IF EXISTS trg_bandeja_aprobaciones ON requisiciones.aprobaciones;
+    DROP TRIGGER IF EXISTS trg_bandeja_detalle ON requisiciones.detalle_requisicion;
+    DROP TRIGGER IF EXISTS trg_bandeja_empleados_roles ON acceso.empleados_roles;
+    DROP TRIGGER IF EXISTS trg_bandeja_empleados ON usuarios.empleados;
+
+    IF NOT p_activa THEN
+        DELETE FROM requisiciones.bandeja_aprobacion;
+        RETURN 0;
+    END IF;
+
+    CREATE CONSTRAINT TRIGGER trg_bandeja_requisiciones
+    AFTER INSERT OR UPDATE OR DELETE ON requisiciones.requisiciones
+    DEFERRABLE INITIALLY DEFERRED
+    FOR EACH ROW EXECUTE FUNCTION requisiciones.trg_bandeja_aprobacion();
+
+    CREATE CONSTRAINT TRIGGER trg_bandeja_aprobaciones
+    AFTER INSERT OR UPDATE OR DELETE ON requisiciones.aprobaciones
+    DEFERRABLE INITIALLY DEFERRED
+    FOR EACH ROW EXECUTE FUNCTION requisiciones.trg_bandeja_aprobacion();
+
+    CREATE CONSTRAINT TRIGGER trg_bandeja_detalle
+    AFTER INSERT OR DELETE ON requisiciones.detalle_requisicion
+    DEFERRABLE INITIALLY DEFERRED
+    FOR EACH ROW EXECUTE FUNCTION requisiciones.trg_bandeja_aprobacion();
+
+    CREATE TRIGGER trg_bandeja_empleados_roles
+    AFTER INSERT OR DELETE OR UPDATE OF emailinstitucional, idrol, actlaboralmente ON acceso.empleados_roles
+    FOR EACH ROW EXECUTE FUNCTION requisiciones.trg_bandeja_empleados_roles();
+
+    CREATE TRIGGER trg_bandeja_empleados
+    AFTER UPDATE OF emailinstitucional, dni, dnijefeinmediato ON usuarios.empleados
+    FOR EACH ROW
+    WHEN ((OLD.emailinstitucional, OLD.dni, OLD.dnijefeinmediato)
+          IS DISTINCT FROM (NEW.emailinstitucional, NEW.dni, NEW.dnijefeinmediato))
+    EXECUTE FUNCTION requisiciones.trg_bandeja_empleados();
+
+    RETURN requisiciones.reconstruir_bandeja_aprobacion();
+END;
+$$ LANGUAGE plpgsql;
+
+-- Estado de la bandeja: triggers instalados o no
+CREATE OR REPLACE FUNCTION requisiciones.bandeja_aprobacion_activa()
+RETURNS BOOLEAN
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT EXISTS (
+        SELECT 1 FROM pg_trigger
+        WHERE tgname = 'trg_bandeja_requisiciones'
+          AND tgrelid = 'requisiciones.requisiciones'::regclass
+    )
+$$;
+
+-- Sin la bandeja activada no queda ningún trigger (también quita los de la versión anterior)
+SELECT requisiciones.activar_bandeja_aprobacion(FALSE);
+
+COMMIT;
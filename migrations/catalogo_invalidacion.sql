@@ -0,0 +1,31 @@
+-- Invalidación del catálogo en memoria de la API (app/core/cache.py)
+--
+-- Cualquier cambio en productos o categorías (incluido el stock que descuenta
+-- requisiciones.responder_requisicion_almacen o una edición manual) avisa por
+-- el canal 'cache_invalidacion' al confirmar la transacción. Cada proceso de la
+-- API descarta su snapshot de GET /api/v1/productos/ y lo reconstruye en la
+-- siguiente petición. Es a nivel de sentencia y con el mismo texto que publica
+-- publicar_invalidacion(), así que PostgreSQL junta los avisos repetidos de una
+-- transacción en uno solo.
+
+CREATE OR REPLACE FUNCTION productos.notificar_cambio_catalogo()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    PERFORM pg_notify('cache_invalidacion', '{"ns": "catalogo", "clave": null}');
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_productos_cache ON productos.productos;
+CREATE TRIGGER trg_productos_cache
+    AFTER INSERT OR UPDATE OR DELETE ON productos.productos
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION productos.notificar_cambio_catalogo();
+
+DROP TRIGGER IF EXISTS trg_categorias_cache ON productos.categorias;
+CREATE TRIGGER trg_categorias_cache
+    AFTER INSERT OR UPDATE OR DELETE ON productos.categorias
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION productos.notificar_cambio_catalogo();
@@ -0,0 +1,39 @@
+-- Imágenes de categorías servidas aparte del listado
+--
+-- GET /api/v1/productos/categorias ya no incluye los bytes de la imagen: devuelve
+-- imagen_hash e imagen_url, y la imagen (o su miniatura) se descarga de
+-- GET /api/v1/productos/categorias/{idcategoria}/imagen con ETag = imagen_hash.
+--
+-- El trigger mantiene imagen_hash con cualquier escritura (incluidas
+-- productos.CrearCategoria/EditarCategoria) y borra la miniatura si cambia la
+-- imagen en otra sentencia; la API la vuelve a generar después de crear o
+-- editar (app/core/imagenes.py).
+
+ALTER TABLE productos.categorias
+    ADD COLUMN IF NOT EXISTS imagen_hash      CHAR(64),
+    ADD COLUMN IF NOT EXISTS imagen_miniatura BYTEA;
+
+UPDATE productos.categorias
+SET imagen_hash = encode(sha256(imagen), 'hex')
+WHERE imagen IS NOT NULL AND imagen_hash IS NULL;
+
+CREATE OR REPLACE FUNCTION productos.actualizar_hash_imagen_categoria()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF TG_OP = 'INSERT' OR NEW.imagen IS DISTINCT FROM OLD.imagen THEN
+        NEW.imagen_hash := CASE WHEN NEW.imagen IS NULL THEN NULL ELSE encode(sha256(NEW.imagen), 'hex') END;
+        IF TG_OP = 'UPDATE' AND NEW.imagen_miniatura IS NOT DISTINCT FROM OLD.imagen_miniatura THEN
+            NEW.imagen_miniatura := NULL;
+        END IF;
+    END IF;
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_categorias_imagen_hash ON productos.categorias;
+CREATE TRIGGER trg_categorias_imagen_hash
+    BEFORE INSERT OR UPDATE OF imagen ON productos.categorias
+    FOR EACH ROW
+    EXECUTE FUNCTION productos.actualizar_hash_imagen_categoria();
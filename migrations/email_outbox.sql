@@ -0,0 +1,43 @@
+-- Bandeja de salida de correos (outbox transaccional)
+--
+-- Los handlers insertan el correo en requisiciones.email_outbox dentro de su propia
+-- transacción y responden en cuanto hacen COMMIT. Un hilo de fondo
+-- (app/core/outbox.py) toma los pendientes con FOR UPDATE SKIP LOCKED, los envía
+-- por SMTP y registra el resultado en requisiciones.email_log como antes.
+
+CREATE TABLE IF NOT EXISTS requisiciones.email_outbox (
+    idcorreo        BIGSERIAL PRIMARY KEY,
+    idrequisicion   UUID,
+    destinatario    VARCHAR(150) NOT NULL,
+    asunto          TEXT         NOT NULL,
+    cuerpo_texto    TEXT         NOT NULL,
+    cuerpo_html     TEXT,
+    adjuntos        JSONB        NOT NULL DEFAULT '[]'::JSONB,  -- [{nombre, mime, contenido (base64)}]
+    incluir_logo    BOOLEAN      NOT NULL DEFAULT FALSE,        -- imagen inline cid:logo_sedh
+    estado          VARCHAR(20)  NOT NULL DEFAULT 'pendiente',  -- pendiente | enviado | error
+    intentos        INTEGER      NOT NULL DEFAULT 0,
+    error           TEXT,
+    creado_en       TIMESTAMPTZ  NOT NULL DEFAULT NOW(),
+    enviado_en      TIMESTAMPTZ
+);
+
+-- El drenado solo recorre los pendientes
+CREATE INDEX IF NOT EXISTS ix_email_outbox_pendientes
+    ON requisiciones.email_outbox (creado_en)
+    WHERE estado = 'pendiente';
+
+-- Reserva y reintentos con backoff (app/core/outbox.py)
+--
+-- proximo_intento es la próxima vez que un pendiente puede tomarse; al reservarlo
+-- se adelanta al fin de la reserva, así que también hace de lease y la reserva se
+-- confirma antes del envío SMTP. reservado_por identifica al worker que lo tiene.
+-- Los pendientes que ya existían quedan vencidos al añadir la columna.
+ALTER TABLE requisiciones.email_outbox
+    ADD COLUMN IF NOT EXISTS proximo_intento TIMESTAMPTZ DEFAULT NOW(),
+    ADD COLUMN IF NOT EXISTS reservado_por   VARCHAR(100);
+
+DROP INDEX IF EXISTS requisiciones.ix_email_outbox_pendientes;
+
+CREATE INDEX IF NOT EXISTS ix_email_outbox_vencidos
+    ON requisiciones.email_outbox (proximo_intento)
+    WHERE estado = 'pendiente';
@@ -0,0 +1,17 @@
+-- Índices para GET /requisiciones/todas
+-- 1) Paginación keyset: misma expresión de orden que usa el endpoint
+--    (fecha sin valor primero, luego código e id como desempate)
+-- 2) Productos en lote: detalle_requisicion filtrado por idrequisicion = ANY(:ids)
+
+CREATE INDEX IF NOT EXISTS ix_requisiciones_orden_reporte
+    ON requisiciones.requisiciones (
+        (COALESCE(fecsolicitud, DATE '9999-12-31')) DESC,
+        (COALESCE(codrequisicion, '')) DESC,
+        idrequisicion DESC
+    );
+
+CREATE INDEX IF NOT EXISTS ix_detalle_requisicion_idrequisicion
+    ON requisiciones.detalle_requisicion (idrequisicion);
+
+CREATE INDEX IF NOT EXISTS ix_requisiciones_codrequisicion_lower
+    ON requisiciones.requisiciones (LOWER(codrequisicion));
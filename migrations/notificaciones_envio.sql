@@ -0,0 +1,14 @@
+-- Envío de notificaciones por correo con reservas (app/core/notificaciones_envio.py)
+--
+-- Cada worker reserva un lote con FOR UPDATE SKIP LOCKED y marca reservado_hasta;
+-- otro worker no lo toma hasta que la reserva vence, así que un proceso que muere
+-- a mitad de lote solo retrasa esos correos, no los pierde ni los duplica.
+
+ALTER TABLE requisiciones.notificaciones
+    ADD COLUMN IF NOT EXISTS reservado_hasta TIMESTAMPTZ,
+    ADD COLUMN IF NOT EXISTS reservado_por   VARCHAR(100);
+
+-- Solo se recorren las que faltan por enviar
+CREATE INDEX IF NOT EXISTS ix_notificaciones_por_enviar
+    ON requisiciones.notificaciones (fechacreacion)
+    WHERE estado_envio IS DISTINCT FROM 'enviado';
@@ -0,0 +1,20 @@
+-- Conteo de no leídas y paginación por cursor de notificaciones
+-- (app/repositories/notificaciones.py)
+--
+-- Las consultas usan `leida IS NOT TRUE` (equivale a COALESCE(leida, FALSE) = FALSE)
+-- para coincidir con el predicado del índice parcial: el conteo del badge solo
+-- recorre las no leídas del usuario.
+
+CREATE INDEX IF NOT EXISTS ix_notificaciones_no_leidas
+    ON requisiciones.notificaciones (LOWER(emailusuario))
+    WHERE leida IS NOT TRUE;
+
+-- Páginas: WHERE LOWER(emailusuario) = :email
+--            AND (COALESCE(fechacreacion, '-infinity'), idnotificacion) < (:fecha, :id)
+--          ORDER BY COALESCE(fechacreacion, '-infinity') DESC, idnotificacion DESC LIMIT :limite
+-- Las filas sin fechacreacion van al final como las más antiguas en lugar de
+-- quedar fuera de la lista; el cursor de una de ellas lleva '-infinity'.
+DROP INDEX IF EXISTS requisiciones.ix_notificaciones_email_fecha;
+CREATE INDEX IF NOT EXISTS ix_notificaciones_email_orden
+    ON requisiciones.notificaciones
+       (LOWER(emailusuario), COALESCE(fechacreacion, '-infinity') DESC, idnotificacion DESC);
@@ -0,0 +1,35 @@
+-- Reintentos con backoff exponencial para el envío de notificaciones
+-- (app/core/notificaciones_envio.py)
+--
+-- proximo_intento NOT NULL  <=>  la notificación espera envío; el sender solo lee
+-- las vencidas (proximo_intento <= NOW()) por el índice parcial. Al reservar un
+-- lote se adelanta proximo_intento al fin de la reserva, así que también hace de
+-- lease (reemplaza a reservado_hasta). Tras NOTIF_MAX_INTENTOS fallos queda en
+-- estado_envio = 'fallido' con proximo_intento NULL (cola de muertos); se
+-- reencolan desde POST /api/v1/monitor/notificaciones/reintentar-fallidas.
+
+ALTER TABLE requisiciones.notificaciones
+    ADD COLUMN IF NOT EXISTS intentos        INTEGER NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS proximo_intento TIMESTAMPTZ;
+
+-- El endpoint proxy de requisiciones escribía los estados en mayúsculas
+UPDATE requisiciones.notificaciones
+SET estado_envio = LOWER(estado_envio)
+WHERE estado_envio <> LOWER(estado_envio);
+
+-- Lo que no se ha enviado vence ya
+UPDATE requisiciones.notificaciones
+SET proximo_intento = COALESCE(fechacreacion, NOW())
+WHERE estado_envio IS DISTINCT FROM 'enviado'
+  AND proximo_intento IS NULL;
+
+-- Las notificaciones nuevas quedan pendientes de envío sin tocar los INSERT existentes
+ALTER TABLE requisiciones.notificaciones
+    ALTER COLUMN proximo_intento SET DEFAULT NOW();
+
+DROP INDEX IF EXISTS requisiciones.ix_notificaciones_por_enviar;
+ALTER TABLE requisiciones.notificaciones DROP COLUMN IF EXISTS reservado_hasta;
+
+CREATE INDEX IF NOT EXISTS ix_notificaciones_vencidas
+    ON requisiciones.notificaciones (proximo_intento)
+    WHERE proximo_intento IS NOT NULL;
@@ -0,0 +1,58 @@
+-- Resumen (digest) de notificaciones por destinatario, opcional por usuario
+--
+-- Con resumen activado, cada notificación nueva del usuario toma el mismo
+-- proximo_intento que la primera pendiente de su ventana (o NOW() + ventana si no
+-- hay ninguna). Así todas vencen juntas, el sender las reserva en el mismo lote y
+-- envía un solo correo con la tabla de códigos y acciones
+-- (app/core/notificaciones_envio.py). Cada notificación se marca enviada igual.
+
+CREATE TABLE IF NOT EXISTS requisiciones.preferencias_notificacion (
+    emailusuario    VARCHAR(150) PRIMARY KEY,          -- en minúsculas
+    resumen         BOOLEAN      NOT NULL DEFAULT FALSE,
+    ventana_min     INTEGER      NOT NULL DEFAULT 30 CHECK (ventana_min BETWEEN 5 AND 1440),
+    actualizado_en  TIMESTAMPTZ  NOT NULL DEFAULT NOW()
+);
+
+-- Búsqueda de la ventana abierta del destinatario
+CREATE INDEX IF NOT EXISTS ix_notificaciones_email_por_enviar
+    ON requisiciones.notificaciones (LOWER(emailusuario), proximo_intento)
+    WHERE proximo_intento IS NOT NULL;
+
+CREATE OR REPLACE FUNCTION requisiciones.programar_resumen_notificacion()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_ventana INTEGER;
+    v_slot    TIMESTAMPTZ;
+BEGIN
+    IF NEW.proximo_intento IS NULL THEN
+        RETURN NEW;
+    END IF;
+
+    SELECT p.ventana_min INTO v_ventana
+    FROM requisiciones.preferencias_notificacion p
+    WHERE p.emailusuario = LOWER(NEW.emailusuario) AND p.resumen;
+
+    IF NOT FOUND THEN
+        RETURN NEW;
+    END IF;
+
+    -- Ventana ya abierta: pendientes sin reservar ni intentar, que vencen en el futuro
+    SELECT MIN(n.proximo_intento) INTO v_slot
+    FROM requisiciones.notificaciones n
+    WHERE LOWER(n.emailusuario) = LOWER(NEW.emailusuario)
+      AND n.proximo_intento > NOW()
+      AND n.reservado_por IS NULL
+      AND n.intentos = 0;
+
+    NEW.proximo_intento := COALESCE(v_slot, NOW() + make_interval(mins => v_ventana));
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_notificaciones_resumen ON requisiciones.notificaciones;
+CREATE TRIGGER trg_notificaciones_resumen
+    BEFORE INSERT ON requisiciones.notificaciones
+    FOR EACH ROW
+    EXECUTE FUNCTION requisiciones.programar_resumen_notificacion();
@@ -0,0 +1,56 @@
+-- Avisos en tiempo real de notificaciones (LISTEN/NOTIFY)
+--
+-- Cada proceso de la API mantiene una conexión con LISTEN notificaciones
+-- (app/core/pg_listen.py) y reparte los avisos a los navegadores conectados por
+-- Server-Sent Events (GET /api/v1/notificaciones/stream). pg_notify se entrega
+-- al hacer COMMIT, así que solo se avisa de filas confirmadas.
+--
+-- Carga útil (JSON, muy por debajo del límite de 8000 bytes):
+--   {"evento": "nueva", "email": "<minúsculas>", "id": "<idnotificacion>"}
+--   {"evento": "leidas", "email": "<minúsculas>"}   -- cambió el estado de lectura
+
+CREATE OR REPLACE FUNCTION requisiciones.avisar_notificacion_nueva()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    PERFORM pg_notify('notificaciones', json_build_object(
+        'evento', 'nueva',
+        'email', LOWER(NEW.emailusuario),
+        'id', NEW.idnotificacion
+    )::text);
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_notificaciones_aviso_nueva ON requisiciones.notificaciones;
+CREATE TRIGGER trg_notificaciones_aviso_nueva
+    AFTER INSERT ON requisiciones.notificaciones
+    FOR EACH ROW
+    EXECUTE FUNCTION requisiciones.avisar_notificacion_nueva();
+
+-- Solo cambios de `leida`: el envío por correo y sus reservas (estado_envio,
+-- proximo_intento, reservado_por...) actualizan la tabla sin cambiar la lectura y
+-- no deben ejecutar nada. UPDATE OF no se puede combinar con tablas de transición,
+-- así que el trigger es por fila con WHEN; PostgreSQL descarta los pg_notify con el
+-- mismo canal y carga útil dentro de una transacción, de modo que "marcar todas
+-- como leídas" sigue dando un solo aviso por usuario.
+CREATE OR REPLACE FUNCTION requisiciones.avisar_notificaciones_leidas()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    PERFORM pg_notify('notificaciones', json_build_object(
+        'evento', 'leidas',
+        'email', LOWER(NEW.emailusuario)
+    )::text);
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_notificaciones_aviso_leidas ON requisiciones.notificaciones;
+CREATE TRIGGER trg_notificaciones_aviso_leidas
+    AFTER UPDATE OF leida ON requisiciones.notificaciones
+    FOR EACH ROW
+    WHEN (OLD.leida IS DISTINCT FROM NEW.leida)
+    EXECUTE FUNCTION requisiciones.avisar_notificaciones_leidas();
@@ -0,0 +1,286 @@
+-- Aprobación en un solo viaje a la base de datos
+--
+-- requisiciones.procesar_aprobacion ejecuta en una sola llamada (y una sola
+-- transacción) todo lo que antes hacían responder_requisicion_* en Python con
+-- 6+ sentencias y 2-3 commits por clic:
+--   1. la función responder_requisicion_<rol> existente (cambio de estado + fila de aprobación)
+--   2. notificación al solicitante y al siguiente rol del flujo
+--   3. fila 'Pendiente' de EmpAlmacen cuando aprueba JefSerMat
+--   4. timestamps del flujo y auditoría (incluido el cambio de cantidades de JefSerMat)
+-- y devuelve en JSON lo que la interfaz necesita para refrescarse.
+--
+-- Las reglas de negocio de cada rol siguen en responder_requisicion_*; esta
+-- función solo las orquesta.
+--
+-- Con p_diferir_notificaciones = TRUE no inserta las notificaciones: las devuelve
+-- en la clave "notificaciones" para que el llamador (aprobación por lote) las
+-- inserte todas en una sola sentencia.
+--
+-- Los rechazos se lanzan como excepción con un SQLSTATE fijo, que la API traduce
+-- a un código HTTP sin mirar el texto del mensaje:
+--   42501 (insufficient_privilege)   el usuario no es aprobador de la requisición -> 403
+--   P0002 (no_data_found)            la requisición no existe                     -> 404
+--   22023 (invalid_parameter_value)  la regla del rol rechazó la decisión         -> 400
+
+DROP FUNCTION IF EXISTS requisiciones.procesar_aprobacion(TEXT, UUID, TEXT, TEXT, TEXT, TEXT, UUID, TEXT, TEXT);
+
+CREATE OR REPLACE FUNCTION requisiciones.procesar_aprobacion(
+    p_rol               TEXT,
+    p_id_requisicion    UUID,
+    p_email             TEXT,
+    p_estado            TEXT,
+    p_comentario        TEXT,
+    p_productos         TEXT,               -- JSON con el formato que espera responder_requisicion_<rol>
+    p_id_usuario        UUID DEFAULT NULL,
+    p_nombre_usuario    TEXT DEFAULT NULL,
+    p_cambios_cantidad  TEXT DEFAULT NULL,  -- observaciones de auditoría (solo JefSerMat)
+    p_diferir_notificaciones BOOLEAN DEFAULT FALSE
+)
+RETURNS JSONB AS $$
+DECLARE
+    v_funcion            TEXT;
+    v_etiqueta_rol       TEXT;
+    v_siguiente_rol      TEXT;
+    v_msg_siguiente      TEXT;
+    v_tipo_auditoria     TEXT;
+    v_mensaje            TEXT;
+    v_nombre_aprobador   TEXT;
+    v_cod                TEXT;
+    v_estgeneral         TEXT;
+    v_email_solicitante  TEXT;
+    v_aprobado           BOOLEAN := LOWER(COALESCE(p_estado, '')) IN ('aprobada', 'aprobado');
+    v_rechazado          BOOLEAN := LOWER(COALESCE(p_estado, '')) IN ('rechazada', 'rechazado');
+    v_texto              TEXT;
+    v_tipo_notif         TEXT;
+    v_notificaciones     JSONB := '[]'::JSONB;
+    v_ultimo_almacen     TEXT;
+    v_autorizado         BOOLEAN;
+    v_paso               TEXT;
+    v_contexto           TEXT;
+BEGIN
+    CASE p_rol
+        WHEN 'JefInmediato' THEN
+            v_funcion := 'responder_requisicion_jefe';
+            v_etiqueta_rol := 'Jefe Inmediato';
+            v_siguiente_rol := 'GerAdmon';
+            v_msg_siguiente := '📋 Requisición %s aprobada por Jefe Inmediato, pendiente tu revisión';
+            v_tipo_auditoria := 'APROBADA_JEFE';
+        WHEN 'GerAdmon' THEN
+            v_funcion := 'responder_requisicion_gerente';
+            v_etiqueta_rol := 'Gerente Administrativo';
+            v_siguiente_rol := 'JefSerMat';
+            v_msg_siguiente := '📋 Requisición %s aprobada por Gerente Administrativo, pendiente tu revisión';
+            v_tipo_auditoria := 'APROBADA_GERENTE';
+        WHEN 'JefSerMat' THEN
+            v_funcion := 'responder_requisicion_jefe_materiales';
+            v_etiqueta_rol := 'Jefe de Materiales';
+            v_siguiente_rol := 'EmpAlmacen';
+            v_msg_siguiente := '📦 Requisición %s aprobada por Jefe de Materiales, lista para despacho';
+            v_tipo_auditoria := 'APROBADA_JEFE_MATERIALES';
+        WHEN 'EmpAlmacen' THEN
+            v_funcion := 'responder_requisicion_almacen';
+            v_etiqueta_rol := 'Encargado de Almacén';
+            v_siguiente_rol := NULL;
+            v_tipo_auditoria := 'APROBADA_ALMACEN';
+        ELSE
+            RAISE EXCEPTION 'Rol de aprobación inválido: %', p_rol USING ERRCODE = '22023';
+    END CASE;
+
+    IF NOT EXISTS (SELECT 1 FROM requisiciones.requisiciones WHERE idrequisicion = p_id_requisicion) THEN
+        RAISE EXCEPTION 'Requisición no encontrada' USING ERRCODE = 'P0002';
+    END IF;
+
+    -- 0. Autorización: el jefe inmediato del solicitante, o un usuario activo con el rol
+    --    (mismas reglas que calcular_bandeja_aprobacion)
+    IF p_rol = 'JefInmediato' THEN
+        SELECT EXISTS (
+            SELECT 1
+            FROM requisiciones.requisiciones r
+            JOIN usuarios.empleados e ON LOWER(e.emailinstitucional) = LOWER(r.creadopor)
+            JOIN usuarios.empleados jefe ON jefe.dni = e.dnijefeinmediato
+            WHERE r.idrequisicion = p_id_requisicion
+              AND LOWER(jefe.emailinstitucional) = LOWER(p_email)
+        ) INTO v_autorizado;
+    ELSE
+        SELECT EXISTS (
+            SELECT 1
+            FROM acceso.empleados_roles er
+            JOIN acceso.roles ro ON ro.idrol = er.idrol
+            WHERE LOWER(er.emailinstitucional) = LOWER(p_email)
+              AND ro.nomrol = p_rol
+              AND er.actlaboralmente = TRUE
+        ) INTO v_autorizado;
+    END IF;
+    IF NOT v_autorizado THEN
+        RAISE EXCEPTION 'Usuario no autorizado: no es % de esta requisición', v_etiqueta_rol
+            USING ERRCODE = '42501';
+    END IF;
+
+    -- 1. Reglas del rol. Los productos van como literal sin tipo para que se
+    --    resuelvan al tipo (json/jsonb) que declara cada función. Sus rechazos
+    --    (RAISE EXCEPTION o un texto 'ERROR: ...') salen como 22023; el llamador
+    --    hace rollback y no quedan notificaciones ni auditoría.
+    BEGIN
+        EXECUTE format('SELECT requisiciones.%I($1, $2, $3, $4, %L)', v_funcion, p_productos)
+        INTO v_mensaje
+        USING p_id_requisicion, p_email, p_estado, p_comentario;
+    EXCEPTION WHEN raise_exception THEN
+        RAISE EXCEPTION '%', SQLERRM USING ERRCODE = '22023';
+    END;
+
+    IF v_mensaje LIKE 'ERROR:%' THEN
+        RAISE EXCEPTION '%', btrim(substr(v_mensaje, 7)) USING ERRCODE = '22023';
+    END IF;
+
+    SELECT e.nombre INTO v_nombre_aprobador
+    FROM usuarios.empleados e
+    WHERE e.emailinstitucional = p_email
+    LIMIT 1;
+    v_nombre_aprobador := COALESCE(v_nombre_aprobador, p_email);
+
+    SELECT r.codrequisicion, r.estgeneral, COALESCE(r.creadopor, e.emailinstitucional)
+    INTO v_cod, v_estgeneral, v_email_solicitante
+    FROM requisiciones.requisiciones r
+    LEFT JOIN usuarios.empleados e ON e.emailinstitucional = r.creadopor
+    WHERE r.idrequisicion = p_id_requisicion;
+
+    -- 2a. Notificación al solicitante
+    IF v_email_solicitante IS NOT NULL THEN
+        IF v_aprobado THEN
+            v_texto := '✅ %s (%s) aprobó tu requisición %s';
+            v_tipo_notif := 'requisicion_aprobada';
+        ELSIF v_rechazado THEN
+            v_texto := '❌ %s (%s) rechazó tu requisición %s';
+            v_tipo_notif := 'requisicion_rechazada';
+        ELSE
+            v_texto := '📝 %s (%s) procesó tu requisición %s';
+            v_tipo_notif := 'requisicion_actualizada';
+        END IF;
+        v_texto := format(v_texto, v_nombre_aprobador, v_etiqueta_rol, v_cod);
+        IF COALESCE(p_comentario, '') <> '' THEN
+            v_texto := v_texto || ' - Comentario: ' || p_comentario;
+        END IF;
+
+        v_notificaciones := v_notificaciones || jsonb_build_array(jsonb_build_object(
+            'emailusuario', v_email_solicitante, 'tipo', v_tipo_notif, 'mensaje', v_texto
+        ));
+    END IF;
+
+    -- 2b. Notificación al siguiente rol del flujo
+    IF v_aprobado AND v_siguiente_rol IS NOT NULL THEN
+        v_notificaciones := v_notificaciones || COALESCE((
+            SELECT jsonb_agg(jsonb_build_object(
+                'emailusuario', x.emailinstitucional,
+                'tipo', 'requisicion_pendiente',
+                'mensaje', format(v_msg_siguiente, COALESCE(v_cod, ''))
+            ))
+            FROM (
+                SELECT DISTINCT e.emailinstitucional
+                FROM usuarios.empleados e
+                JOIN acceso.empleados_roles er ON er.emailinstitucional = e.emailinstitucional
+                JOIN acceso.roles ro ON ro.idrol = er.idrol
+                WHERE ro.nomrol = v_siguiente_rol AND er.actlaboralmente = TRUE
+            ) x
+        ), '[]'::JSONB);
+    END IF;
+
+    IF NOT p_diferir_notificaciones THEN
+        INSERT INTO requisiciones.notificaciones
+            (emailusuario, tipo, mensaje, idrequisicion, leida, fechacreacion)
+        SELECT n.emailusuario, n.tipo, n.mensaje, p_id_requisicion, FALSE, CURRENT_TIMESTAMP
+        FROM jsonb_to_recordset(v_notificaciones) AS n(emailusuario TEXT, tipo TEXT, mensaje TEXT);
+    END IF;
+
+    -- 3. Estado 'Pendiente' para EmpAlmacen
+    IF v_aprobado AND p_rol = 'JefSerMat' THEN
+        SELECT a.estadoaprobacion INTO v_ultimo_almacen
+        FROM requisiciones.aprobaciones a
+        WHERE a.idrequisicion = p_id_requisicion AND a.rol = 'EmpAlmacen'
+        ORDER BY a.fecaprobacion DESC NULLS LAST
+        LIMIT 1;
+
+        IF UPPER(COALESCE(v_ultimo_almacen, '')) <> 'PENDIENTE' THEN
+            INSERT INTO requisiciones.aprobaciones
+                (idrequisicion, emailinstitucional, rol, estadoaprobacion, comentario, fecaprobacion)
+            VALUES (p_id_requisicion, NULL, 'EmpAlmacen', 'Pendiente', NULL, NULL);
+        END IF;
+    END IF;
+
+    -- 4. Timestamps y auditoría: igual que antes, un fallo aquí no invalida la
+    --    aprobación; el WARNING indica qué sentencia falló y dónde
+    BEGIN
+        IF v_aprobado THEN
+            v_paso := 'timestamps de aprobación';
+            IF p_rol IN ('JefInmediato', 'GerAdmon') THEN
+                UPDATE requisiciones.requisiciones
+                SET fecha_hora_aprobacion_jefe = CURRENT_TIMESTAMP
+                WHERE idrequisicion = p_id_requisicion;
+                IF p_id_usuario IS NOT NULL THEN
+                    UPDATE requisiciones.requisiciones
+                    SET id_jefe_aprobador = p_id_usuario
+                    WHERE idrequisicion = p_id_requisicion;
+                END IF;
+            ELSIF p_id_usuario IS NOT NULL THEN
+                UPDATE requisiciones.requisiciones
+                SET fecha_hora_aprobacion_almacen = CURRENT_TIMESTAMP,
+                    id_almacen_aprobador = p_id_usuario
+                WHERE idrequisicion = p_id_requisicion;
+            END IF;
+
+            IF p_rol = 'JefSerMat' AND p_cambios_cantidad IS NOT NULL THEN
+                v_paso := 'auditoría CAMBIO_CANTIDAD_JEFE_MATERIALES';
+                INSERT INTO requisiciones.auditoria_requisiciones
+                    (id_requisicion, tipo_accion, id_usuario_accion, nombre_usuario_accion,
+                     descripcion_accion, fecha_hora_accion, observaciones)
+                VALUES (p_id_requisicion, 'CAMBIO_CANTIDAD_JEFE_MATERIALES', p_id_usuario, v_nombre_aprobador,
+                        'Cambio de cantidades por Jefe de Materiales', CURRENT_TIMESTAMP, p_cambios_cantidad);
+            END IF;
+
+            v_paso := 'auditoría ' || v_tipo_auditoria;
+            INSERT INTO requisiciones.auditoria_requisiciones
+                (id_requisicion, tipo_accion, id_usuario_accion, nombre_usuario_accion,
+                 descripcion_accion, fecha_hora_accion, observaciones)
+            VALUES (p_id_requisicion, v_tipo_auditoria, p_id_usuario, COALESCE(p_nombre_usuario, p_email),
+                    CASE p_rol
+                        WHEN 'JefInmediato' THEN 'Aprobada por jefe de departamento'
+                        ELSE 'Aprobada por ' || v_etiqueta_rol
+                    END,
+                    CURRENT_TIMESTAMP, p_comentario);
+        ELSIF v_rechazado THEN
+            v_paso := 'timestamp de rechazo';
+            UPDATE requisiciones.requisiciones
+            SET fecha_hora_rechazo = CURRENT_TIMESTAMP
+            WHERE idrequisicion = p_id_requisicion;
+
+            v_paso := 'auditoría RECHAZADA';
+            INSERT INTO requisiciones.auditoria_requisiciones
+                (id_requisicion, tipo_accion, id_usuario_accion, nombre_usuario_accion,
+                 descripcion_accion, fecha_hora_accion, observaciones)
+            VALUES (p_id_requisicion, 'RECHAZADA', p_id_usuario, COALESCE(p_nombre_usuario, p_email),
+                    CASE p_rol
+                        WHEN 'JefInmediato' THEN 'Rechazada por jefe de departamento'
+                        ELSE 'Rechazada por ' || v_etiqueta_rol
+                    END,
+                    CURRENT_TIMESTAMP, 'Motivo: ' || COALESCE(p_comentario, ''));
+        END IF;
+    EXCEPTION WHEN OTHERS THEN
+        GET STACKED DIAGNOSTICS v_contexto = PG_EXCEPTION_CONTEXT;
+        RAISE WARNING 'procesar_aprobacion (%): % de % falló [%] %', p_rol, v_paso, p_id_requisicion, SQLSTATE, SQLERRM
+            USING DETAIL = v_contexto;
+    END;
+
+    RETURN jsonb_build_object(
+        'mensaje', v_mensaje,
+        'idRequisicion', p_id_requisicion,
+        'codRequisicion', v_cod,
+        'estadoAprobacion', UPPER(p_estado),
+        'estadoGeneral', v_estgeneral,
+        'rol', p_rol,
+        'aprobador', v_nombre_aprobador,
+        'notificados', jsonb_array_length(v_notificaciones)
+    ) || CASE WHEN p_diferir_notificaciones
+              THEN jsonb_build_object('notificaciones', v_notificaciones)
+              ELSE '{}'::JSONB
+         END;
+END;
+$$ LANGUAGE plpgsql;
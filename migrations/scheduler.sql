@@ -0,0 +1,3 @@
+-- Métricas del scheduler (app/core/scheduler.py) en el latido de cada worker
+ALTER TABLE requisiciones.worker_latidos
+    ADD COLUMN IF NOT EXISTS metricas JSONB;
@@ -0,0 +1,37 @@
+-- Proceso de trabajos en segundo plano (python -m app.worker)
+--
+-- cola_trabajos: trabajos encolados por la API (encolar_trabajo en app/core/trabajos.py)
+-- y tomados por el worker con FOR UPDATE SKIP LOCKED y reserva con vencimiento.
+-- worker_latidos: una fila por proceso worker, actualizada cada WORKER_HEARTBEAT_SEC.
+
+CREATE TABLE IF NOT EXISTS requisiciones.cola_trabajos (
+    idtrabajo         BIGSERIAL PRIMARY KEY,
+    tipo              VARCHAR(60)  NOT NULL,
+    payload           JSONB        NOT NULL DEFAULT '{}'::JSONB,
+    estado            VARCHAR(20)  NOT NULL DEFAULT 'pendiente',  -- pendiente | procesando | completado | error
+    intentos          INTEGER      NOT NULL DEFAULT 0,
+    resultado         JSONB,
+    error             TEXT,
+    creado_por        VARCHAR(150),
+    creado_en         TIMESTAMPTZ  NOT NULL DEFAULT NOW(),
+    ejecutar_despues  TIMESTAMPTZ  NOT NULL DEFAULT NOW(),
+    iniciado_en       TIMESTAMPTZ,
+    terminado_en      TIMESTAMPTZ,
+    reservado_hasta   TIMESTAMPTZ,
+    reservado_por     VARCHAR(100)
+);
+
+CREATE INDEX IF NOT EXISTS ix_cola_trabajos_pendientes
+    ON requisiciones.cola_trabajos (ejecutar_despues)
+    WHERE estado IN ('pendiente', 'procesando');
+
+CREATE TABLE IF NOT EXISTS requisiciones.worker_latidos (
+    worker_id            VARCHAR(100) PRIMARY KEY,
+    host                 VARCHAR(100) NOT NULL,
+    pid                  INTEGER      NOT NULL,
+    estado               VARCHAR(20)  NOT NULL,  -- activo | detenido
+    iniciado_en          TIMESTAMPTZ  NOT NULL DEFAULT NOW(),
+    ultimo_latido        TIMESTAMPTZ  NOT NULL DEFAULT NOW(),
+    trabajos_ejecutados  INTEGER      NOT NULL DEFAULT 0,
+    ultimo_error         TEXT
+);
@@ -0,0 +1,162 @@
+"""
+Pruebas sin base de datos ni SMTP: lógica pura, y endpoints y tareas con
+sesiones falsas (SesionFalsa / SesionAsyncFalsa) que registran el SQL ejecutado.
+
+app.core.config exige las variables de conexión; se dan valores de relleno para
+poder importar los módulos. Ninguna prueba abre conexiones.
+"""
+import os
+
+import pytest
+
+for variable, valor in {
+    "SECRET_KEY": "pruebas",
+    "DB_HOST": "localhost",
+    "DB_USER": "pruebas",
+    "DB_PASSWORD": "pruebas",
+    "DB_NAME": "pruebas",
+}.items():
+    os.environ.setdefault(variable, valor)
+
+
+
+class ResultadoFalso:
+    """Lo mínimo de un Result de SQLAlchemy que usan los repositorios y routers."""
+
+    def __init__(self, filas=None, rowcount: int = 0):
+        self.filas = list(filas or [])
+        self.rowcount = rowcount
+
+    def fetchall(self):
+        return list(self.filas)
+
+    def all(self):
+        return list(self.filas)
+
+    def first(self):
+        return self.filas[0] if self.filas else None
+
+    def one(self):
+        assert len(self.filas) == 1, self.filas
+        return self.filas[0]
+
+    def mappings(self):
+        return self
+
+    def scalar(self):
+        fila = self.first()
+        return fila[0] if isinstance(fila, (tuple, list)) else fila
+
+    def scalar_one(self):
+        return self.one()[0] if isinstance(self.one(), (tuple, list)) else self.one()
+
+
+class _Savepoint:
+    def __init__(self, sesion):
+        self.sesion = sesion
+
+    def __enter__(self):
+        self.sesion.savepoints += 1
+        return self
+
+    def __exit__(self, tipo, valor, tb):
+        if tipo is not None:
+            self.sesion.savepoints_revertidos += 1
+        return False
+
+
+class SesionFalsa:
+    """
+    Session sin base de datos: cada execute() se registra en `ejecutadas` y lo
+    responde `responder(sql, params)` (un ResultadoFalso, o una excepción que se lanza).
+    """
+
+    def __init__(self):
+        self.responder = lambda sql, params: ResultadoFalso()
+        self.ejecutadas = []
+        self.commits = 0
+        self.rollbacks = 0
+        self.savepoints = 0
+        self.savepoints_revertidos = 0
+
+    def execute(self, sentencia, params=None):
+        sql = str(sentencia)
+        self.ejecutadas.append((sql, params))
+        resultado = self.responder(sql, params)
+        if isinstance(resultado, Exception):
+            raise resultado
+        return resultado
+
+    def begin_nested(self):
+        return _Savepoint(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        pass
+
+    def sql_con(self, fragmento: str):
+        return [(sql, params) for sql, params in self.ejecutadas if fragmento in sql]
+
+
+class SesionAsyncFalsa(SesionFalsa):
+    async def execute(self, sentencia, params=None):
+        return SesionFalsa.execute(self, sentencia, params)
+
+    async def commit(self):
+        SesionFalsa.commit(self)
+
+    async def rollback(self):
+        SesionFalsa.rollback(self)
+
+    async def close(self):
+        pass
+
+
+@pytest.fixture
+def usuario():
+    return {"email": "aprobador@sedh.gob.hn", "id": None, "nombre": "Aprobador"}
+
+
+@pytest.fixture
+def app_pruebas(usuario):
+    from app.core.security import get_current_user
+    from app.main import app
+
+    app.dependency_overrides[get_current_user] = lambda: usuario
+    yield app
+    app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def cliente(app_pruebas):
+    from fastapi.testclient import TestClient
+
+    # Sin `with`: no se ejecutan los eventos startup (hilos, LISTEN, heartbeat)
+    return TestClient(app_pruebas)
+
+
+@pytest.fixture
+def sesion(app_pruebas):
+    from app.core.database import get_db
+
+    falsa = SesionFalsa()
+    app_pruebas.dependency_overrides[get_db] = lambda: falsa
+    return falsa
+
+
+@pytest.fixture
+def sesion_async(app_pruebas):
+    from app.core.database import get_async_db
+
+    falsa = SesionAsyncFalsa()
+
+    async def _get_async_db():
+        yield falsa
+
+    app_pruebas.dependency_overrides[get_async_db] = _get_async_db
+    return falsa
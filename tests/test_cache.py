@@ -0,0 +1,106 @@
+import json
+from itertools import count
+
+import pytest
+
+from app.core.cache import BusCache, CacheLocal, bus_cache, invalidar_local
+
+_secuencia = count()
+
+
+@pytest.fixture(autouse=True)
+def bus_conectado(monkeypatch):
+    monkeypatch.setattr(bus_cache, "conectado", True)
+
+
+def _cache(**kwargs) -> CacheLocal:
+    # Namespace propio por prueba: las cachés quedan registradas en el módulo
+    return CacheLocal("prueba", f"pruebas-{next(_secuencia)}", kwargs.pop("ttl_sec", 60), **kwargs)
+
+
+def test_guarda_y_obtiene():
+    cache = _cache()
+    cache.guardar("a", 1, cache.version())
+    assert cache.obtener("a") == 1
+    assert cache.obtener("b") is None
+    assert (cache.aciertos, cache.fallos) == (1, 1)
+
+
+def test_invalidacion_durante_la_carga_no_se_guarda():
+    cache = _cache()
+    version = cache.version()
+    # Otro worker escribe mientras se cargaba el valor
+    cache.invalidar("a")
+    cache.guardar("a", "viejo", version)
+    assert cache.obtener("a") is None
+    cache.guardar("a", "nuevo", cache.version())
+    assert cache.obtener("a") == "nuevo"
+
+
+def test_obtener_o_cargar_descarta_la_carga_invalidada():
+    cache = _cache()
+
+    def cargar():
+        cache.invalidar()
+        return "viejo"
+
+    assert cache.obtener_o_cargar("a", cargar) == "viejo"
+    assert cache.obtener("a") is None
+    assert cache.obtener_o_cargar("a", lambda: "nuevo") == "nuevo"
+    assert cache.obtener_o_cargar("a", lambda: pytest.fail("no debería cargar")) == "nuevo"
+
+
+def test_invalidar_clave_o_todo():
+    cache = _cache()
+    cache.guardar("a", 1, cache.version())
+    cache.guardar("b", 2, cache.version())
+    cache.invalidar("a")
+    assert cache.obtener("a") is None and cache.obtener("b") == 2
+    cache.invalidar()
+    assert cache.obtener("b") is None
+    assert cache.invalidaciones == 2
+
+
+def test_ttl_vencido():
+    cache = _cache(ttl_sec=0)
+    cache.guardar("a", 1, cache.version())
+    assert cache.obtener("a") is None
+
+
+def test_descarta_la_entrada_mas_antigua():
+    cache = _cache(max_entradas=2)
+    for clave in ("a", "b", "c"):
+        cache.guardar(clave, clave, cache.version())
+    assert cache.obtener("a") is None
+    assert cache.obtener("b") == "b" and cache.obtener("c") == "c"
+
+
+def test_sin_bus_no_guarda_ni_responde(monkeypatch):
+    cache = _cache()
+    cache.guardar("a", 1, cache.version())
+    monkeypatch.setattr(bus_cache, "conectado", False)
+    assert cache.obtener("a") is None
+    cache.guardar("b", 2, cache.version())
+    monkeypatch.setattr(bus_cache, "conectado", True)
+    assert cache.obtener("b") is None
+
+
+def test_aviso_del_bus_invalida_el_namespace():
+    cache = _cache()
+    otra = _cache()
+    for c in (cache, otra):
+        c.guardar("a", 1, c.version())
+        c.guardar("b", 2, c.version())
+    BusCache()._aplicar(json.dumps({"ns": cache.namespace, "clave": "a"}))
+    assert cache.obtener("a") is None and cache.obtener("b") == 2
+    assert otra.obtener("a") == 1
+    invalidar_local(otra.namespace)
+    assert otra.obtener("b") is None
+
+
+def test_aviso_mal_formado_se_ignora():
+    cache = _cache()
+    cache.guardar("a", 1, cache.version())
+    BusCache()._aplicar("no es json")
+    BusCache()._aplicar(json.dumps({"clave": "a"}))
+    assert cache.obtener("a") == 1
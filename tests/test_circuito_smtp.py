@@ -0,0 +1,73 @@
+import pytest
+
+from app.core.config import settings
+from app.core.mail import ESTADO_CIRCUITO_ABIERTO, CircuitoSMTP
+
+
+@pytest.fixture
+def circuito(monkeypatch):
+    monkeypatch.setattr(settings, "SMTP_CIRCUITO_UMBRAL", 3)
+    monkeypatch.setattr(settings, "SMTP_CIRCUITO_ESPERA_SEC", 60)
+    return CircuitoSMTP()
+
+
+def test_abre_al_llegar_al_umbral(circuito):
+    for _ in range(2):
+        circuito.registrar_fallo("timeout")
+        assert circuito.estado == CircuitoSMTP.CERRADO
+        assert circuito.permitir()
+    circuito.registrar_fallo("timeout")
+    assert circuito.estado == CircuitoSMTP.ABIERTO
+    assert circuito.abierto()
+    assert not circuito.permitir()
+    assert circuito.aperturas == 1
+    assert circuito.rechazados == 1
+
+
+def test_exito_reinicia_los_fallos(circuito):
+    circuito.registrar_fallo("timeout")
+    circuito.registrar_fallo("timeout")
+    circuito.registrar_exito()
+    circuito.registrar_fallo("timeout")
+    assert circuito.estado == CircuitoSMTP.CERRADO
+    assert circuito.fallos_consecutivos == 1
+
+
+def test_semiabierto_deja_pasar_una_sola_sonda(circuito, monkeypatch):
+    for _ in range(3):
+        circuito.registrar_fallo("timeout")
+    monkeypatch.setattr(settings, "SMTP_CIRCUITO_ESPERA_SEC", 0)
+    assert not circuito.abierto()
+    assert circuito.permitir()
+    assert circuito.estado == CircuitoSMTP.SEMIABIERTO
+    assert not circuito.permitir()
+
+
+def test_sonda_exitosa_cierra(circuito, monkeypatch):
+    for _ in range(3):
+        circuito.registrar_fallo("timeout")
+    monkeypatch.setattr(settings, "SMTP_CIRCUITO_ESPERA_SEC", 0)
+    assert circuito.permitir()
+    circuito.registrar_exito()
+    assert circuito.estado == CircuitoSMTP.CERRADO
+    assert circuito.permitir()
+    assert circuito.permitir()
+
+
+def test_sonda_fallida_reabre_sin_contar_otra_apertura(circuito, monkeypatch):
+    for _ in range(3):
+        circuito.registrar_fallo("timeout")
+    monkeypatch.setattr(settings, "SMTP_CIRCUITO_ESPERA_SEC", 0)
+    assert circuito.permitir()
+    circuito.registrar_fallo("sigue caído")
+    assert circuito.estado == CircuitoSMTP.ABIERTO
+    assert circuito.aperturas == 2
+    assert circuito.ultimo_error == "sigue caído"
+
+
+def test_resultado_rechazo(circuito):
+    for _ in range(3):
+        circuito.registrar_fallo("conexión rechazada")
+    estado, error = circuito.resultado_rechazo()
+    assert estado == ESTADO_CIRCUITO_ABIERTO
+    assert "conexión rechazada" in error
@@ -0,0 +1,84 @@
+from io import BytesIO
+from uuid import uuid4
+
+import pytest
+
+from app.core import imagenes
+from app.core.config import settings
+from app.core.imagenes import generar_miniatura, hash_imagen, tipo_imagen
+from conftest import ResultadoFalso
+
+PIL = pytest.importorskip("PIL.Image")
+
+
+def _imagen(formato: str, lado: int, modo: str = "RGB") -> bytes:
+    salida = BytesIO()
+    PIL.effect_noise((lado, lado), 64).convert(modo).save(salida, format=formato)
+    return salida.getvalue()
+
+
+@pytest.mark.parametrize("formato, tipo", [
+    ("PNG", "image/png"),
+    ("JPEG", "image/jpeg"),
+    ("GIF", "image/gif"),
+    ("WEBP", "image/webp"),
+])
+def test_tipo_imagen(formato, tipo):
+    assert tipo_imagen(_imagen(formato, 8)) == tipo
+
+
+def test_tipo_imagen_desconocido():
+    assert tipo_imagen(b"") == "application/octet-stream"
+    assert tipo_imagen(b"%PDF-1.7") == "application/octet-stream"
+
+
+def test_hash_imagen():
+    assert hash_imagen(b"abc") == "ba7816bf8f01cfea414140de5dae2223b00361a396177a9cb410ff61f20015ad"
+
+
+def test_miniatura_jpeg_dentro_del_lado_maximo(monkeypatch):
+    monkeypatch.setattr(settings, "CATEGORIA_MINIATURA_PX", 64)
+    miniatura = generar_miniatura(_imagen("JPEG", 512))
+    assert tipo_imagen(miniatura) == "image/jpeg"
+    with PIL.open(BytesIO(miniatura)) as img:
+        assert max(img.size) == 64
+
+
+def test_miniatura_con_transparencia_es_png(monkeypatch):
+    monkeypatch.setattr(settings, "CATEGORIA_MINIATURA_PX", 64)
+    miniatura = generar_miniatura(_imagen("PNG", 512, "RGBA"))
+    assert tipo_imagen(miniatura) == "image/png"
+
+
+def test_sin_miniatura_si_ya_es_pequena(monkeypatch):
+    monkeypatch.setattr(settings, "CATEGORIA_MINIATURA_PX", 64)
+    assert generar_miniatura(_imagen("PNG", 32)) is None
+
+
+def test_sin_miniatura_si_no_es_imagen():
+    assert generar_miniatura(b"") is None
+    assert generar_miniatura(b"no es una imagen") is None
+
+
+def test_sin_pillow(monkeypatch):
+    monkeypatch.setattr(imagenes, "Image", None)
+    assert generar_miniatura(_imagen("JPEG", 512)) is None
+
+
+def test_immutable_solo_con_el_hash_vigente(cliente, sesion_async):
+    contenido = _imagen("PNG", 8)
+    vigente = hash_imagen(contenido)
+    sesion_async.responder = lambda sql, params: ResultadoFalso([
+        {"imagen_hash": vigente.ljust(64), "contenido": contenido, "es_miniatura": False},
+    ])
+    url = f"/api/v1/productos/categorias/{uuid4()}/imagen"
+
+    respuesta = cliente.get(url, params={"v": vigente})
+    assert respuesta.status_code == 200
+    assert "immutable" in respuesta.headers["cache-control"]
+    assert respuesta.headers["etag"] == f'"{vigente}"'
+
+    # Un prefijo (o una versión vieja) no fija en caché los bytes actuales
+    for v in (vigente[:16], "0" * 64, None):
+        cabecera = cliente.get(url, params={"v": v} if v else None).headers["cache-control"]
+        assert cabecera == "public, max-age=300"
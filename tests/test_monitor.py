@@ -0,0 +1,56 @@
+import time
+
+import pytest
+
+from app.core import monitor
+
+
+def _peticion(ruta: str, streaming: bool = False, db_ms: float = 0.0) -> dict:
+    return {
+        "scope": {"method": "GET"},
+        "ruta": ruta,
+        "inicio": time.perf_counter(),
+        "fin": None,
+        "status": 200,
+        "streaming": streaming,
+        "bloqueo": {**dict.fromkeys(monitor.CATEGORIAS, 0.0), "db": db_ms},
+    }
+
+
+@pytest.fixture(autouse=True)
+def estado_limpio(monkeypatch):
+    monkeypatch.setattr(monitor, "_en_curso", {})
+    monkeypatch.setattr(monitor, "_finalizadas", monitor.deque(maxlen=256))
+    monitor.reiniciar_estadisticas()
+    yield
+    monitor.reiniciar_estadisticas()
+
+
+def _stalls_por_ruta() -> dict:
+    return {r["ruta"]: r["stalls"] for r in monitor.obtener_resumen()["rutas"]}
+
+
+def _en_curso(*peticiones) -> None:
+    for p in peticiones:
+        monitor._en_curso[id(p)] = p
+
+
+def test_stall_sin_bloqueo_medido_excluye_streams_sse():
+    _en_curso(_peticion("GET /notificaciones/stream", streaming=True), _peticion("GET /reporte"))
+    monitor._atribuir_stall(250.0, time.perf_counter(), {})
+    assert _stalls_por_ruta() == {"GET /reporte": 1}
+
+
+def test_stall_se_atribuye_a_quien_mas_bloqueo():
+    lenta = _peticion("GET /lenta", db_ms=200.0)
+    _en_curso(lenta, _peticion("GET /rapida", db_ms=1.0))
+    monitor._atribuir_stall(250.0, time.perf_counter(), {})
+    assert _stalls_por_ruta() == {"GET /lenta": 1}
+
+
+def test_bloqueo_previo_a_la_ventana_no_cuenta():
+    antigua = _peticion("GET /antigua", db_ms=500.0)
+    nueva = _peticion("GET /nueva", db_ms=50.0)
+    _en_curso(antigua, nueva)
+    monitor._atribuir_stall(250.0, time.perf_counter(), {id(antigua): 500.0})
+    assert _stalls_por_ruta() == {"GET /nueva": 1}
@@ -0,0 +1,65 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+import pytest
+
+from app.repositories.notificaciones import cursor, decodificar_cursor, listar_notificaciones
+from conftest import ResultadoFalso, SesionAsyncFalsa
+
+
+def test_ida_y_vuelta():
+    fila = {
+        "fechacreacion": datetime(2026, 3, 1, 14, 5, 9, 123456, tzinfo=timezone(timedelta(hours=-6))),
+        "idnotificacion": uuid4(),
+    }
+    assert decodificar_cursor(cursor(fila)) == (fila["fechacreacion"], fila["idnotificacion"])
+
+
+def test_ida_y_vuelta_sin_zona_horaria():
+    fila = {"fechacreacion": datetime(2026, 3, 1, 14, 5, 9), "idnotificacion": uuid4()}
+    assert decodificar_cursor(cursor(fila)) == (fila["fechacreacion"], fila["idnotificacion"])
+
+
+def test_mas_de_la_zona_llega_como_espacio():
+    fila = {
+        "fechacreacion": datetime(2026, 3, 1, 14, 5, 9, tzinfo=timezone(timedelta(hours=2))),
+        "idnotificacion": uuid4(),
+    }
+    # Sin codificar, '+02:00' llega en la query string como ' 02:00'
+    assert decodificar_cursor(cursor(fila).replace("+", " ")) == (fila["fechacreacion"], fila["idnotificacion"])
+
+
+@pytest.mark.parametrize("before", ["", "basura", "2026-03-01T14:05:09", f"no-es-fecha,{uuid4()}", "2026-03-01T14:05:09,no-es-uuid"])
+def test_cursor_invalido(before):
+    with pytest.raises(ValueError):
+        decodificar_cursor(before)
+
+
+def test_ida_y_vuelta_sin_fechacreacion():
+    fila = {"fechacreacion": None, "idnotificacion": uuid4()}
+    assert cursor(fila) == f"-infinity,{fila['idnotificacion']}"
+    assert decodificar_cursor(cursor(fila)) == (None, fila["idnotificacion"])
+
+
+async def _pagina(before, filas):
+    sesion = SesionAsyncFalsa()
+    sesion.responder = lambda sql, params: ResultadoFalso(filas)
+    pagina = await listar_notificaciones(sesion, "usuario@sedh.gob.hn", limite=len(filas) or 1, before=before)
+    (sql, params), = sesion.ejecutadas
+    return pagina, sql, params
+
+
+def test_las_filas_sin_fecha_no_se_descartan():
+    fila = {"fechacreacion": None, "idnotificacion": uuid4()}
+    pagina, sql, params = asyncio.run(_pagina(None, [fila]))
+    assert "IS NOT NULL" not in sql
+    assert "ORDER BY COALESCE(n.fechacreacion, '-infinity') DESC, n.idnotificacion DESC" in sql
+    assert pagina["siguiente"] == f"-infinity,{fila['idnotificacion']}"
+
+
+def test_cursor_sin_fecha_sigue_entre_las_filas_sin_fecha():
+    id_cursor = uuid4()
+    _, sql, params = asyncio.run(_pagina(f"-infinity,{id_cursor}", []))
+    assert "(COALESCE(n.fechacreacion, '-infinity'), n.idnotificacion) < (:antes_fecha, :antes_id)" in sql
+    assert (params["antes_fecha"], params["antes_id"]) == ("-infinity", id_cursor)
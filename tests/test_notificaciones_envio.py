@@ -0,0 +1,119 @@
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from app.core import notificaciones_envio as envio
+from app.core.config import settings
+from app.core.mail import ESTADO_CIRCUITO_ABIERTO
+from app.core.notificaciones_envio import _agrupar
+from conftest import ResultadoFalso, SesionFalsa
+
+
+def _fila(idnotificacion, email, resumen, tipo="aprobada", codigo="REQ-001"):
+    return SimpleNamespace(
+        idnotificacion=idnotificacion,
+        emailusuario=email,
+        tipo=tipo,
+        mensaje=f"Mensaje {idnotificacion}",
+        fechacreacion=datetime(2026, 3, 1, 9, 30),
+        codrequisicion=codigo,
+        resumen=resumen,
+    )
+
+
+def test_sin_resumen_un_correo_por_notificacion():
+    envios = _agrupar([_fila(1, "ana@x.hn", False), _fila(2, "ana@x.hn", False)])
+    assert [ids for ids, _ in envios] == [[1], [2]]
+    assert envios[0][1]["to_email"] == "ana@x.hn"
+    assert "REQ-001" in envios[0][1]["body_text"]
+
+
+def test_resumen_agrupa_por_destinatario_sin_distinguir_mayusculas():
+    envios = _agrupar([
+        _fila(1, "Luis@x.hn", True),
+        _fila(2, "ana@x.hn", False),
+        _fila(3, "luis@X.hn", True, codigo="REQ-002"),
+    ])
+    assert [ids for ids, _ in envios] == [[2], [1, 3]]
+    resumen = envios[1][1]
+    assert "2 notificaciones" in resumen["subject"]
+    assert "REQ-001" in resumen["body_html"] and "REQ-002" in resumen["body_html"]
+
+
+def test_resumen_de_una_sola_notificacion_es_un_correo_normal():
+    envios = _agrupar([_fila(1, "luis@x.hn", True)])
+    assert envios == [([1], _agrupar([_fila(1, "luis@x.hn", False)])[0][1])]
+
+
+def test_lote_vacio():
+    assert _agrupar([]) == []
+
+
+@pytest.fixture
+def sesiones(monkeypatch):
+    creadas = []
+    reservadas = [_fila(1, "ana@x.hn", False), _fila(2, "luis@x.hn", False), _fila(3, "eva@x.hn", False)]
+
+    def nueva_sesion():
+        sesion = SesionFalsa()
+        sesion.responder = lambda sql, params: ResultadoFalso(reservadas if "FOR UPDATE SKIP LOCKED" in sql else [])
+        creadas.append(sesion)
+        return sesion
+
+    monkeypatch.setattr(envio, "SessionLocal", nueva_sesion)
+    monkeypatch.setattr(envio, "circuito_smtp", SimpleNamespace(abierto=lambda: False))
+    monkeypatch.setattr(envio, "_executor", None)
+    return creadas
+
+
+def test_reserva_con_skip_locked_confirmada_antes_de_enviar(sesiones, monkeypatch):
+    commits_al_enviar = []
+
+    def send_emails(mensajes):
+        commits_al_enviar.append(sesiones[0].commits)
+        return [("enviado", None)] * len(mensajes)
+
+    monkeypatch.setattr(envio, "send_emails", send_emails)
+    assert envio.procesar_notificaciones() == 3
+
+    (sql, params), = sesiones[0].ejecutadas
+    assert "FOR UPDATE SKIP LOCKED" in sql
+    assert params == {
+        "lote": settings.NOTIF_SENDER_LOTE, "lease": settings.NOTIF_SENDER_LEASE_SEC, "worker": envio.WORKER_ID,
+    }
+    assert commits_al_enviar and all(c == 1 for c in commits_al_enviar)
+
+
+def test_resultados_por_estado_y_solo_con_nuestra_reserva(sesiones, monkeypatch):
+    resultados = {
+        "ana@x.hn": ("enviado", None),
+        "luis@x.hn": (ESTADO_CIRCUITO_ABIERTO, "circuito abierto"),
+        "eva@x.hn": ("error", "timeout"),
+    }
+    monkeypatch.setattr(envio, "send_emails", lambda mensajes: [resultados[m["to_email"]] for m in mensajes])
+    envio.procesar_notificaciones()
+
+    registro = sesiones[1]
+    por_sentencia = {sql: params for sql, params in registro.ejecutadas}
+    assert por_sentencia[envio.SQL_MARCAR_ENVIADA] == [{"id": 1, "worker": envio.WORKER_ID}]
+    assert [p["id"] for p in por_sentencia[envio.SQL_LIBERAR]] == [2]
+    (fallida,) = por_sentencia[envio.SQL_MARCAR_ERROR]
+    assert (fallida["id"], fallida["err"], fallida["worker"]) == (3, "timeout", envio.WORKER_ID)
+    for sql in (envio.SQL_MARCAR_ENVIADA, envio.SQL_LIBERAR, envio.SQL_MARCAR_ERROR):
+        assert "reservado_por = :worker" in sql
+    assert registro.commits == 1
+
+
+def test_sin_filas_reservadas_no_se_envia(sesiones, monkeypatch):
+    monkeypatch.setattr(envio, "send_emails", lambda mensajes: pytest.fail("no debía enviar"))
+    sesiones_vacias = []
+
+    def sesion_vacia():
+        sesion = SesionFalsa()
+        sesiones_vacias.append(sesion)
+        return sesion
+
+    monkeypatch.setattr(envio, "SessionLocal", sesion_vacia)
+    assert envio.procesar_notificaciones() == 0
+    assert len(sesiones_vacias) == 1 and sesiones_vacias[0].commits == 1
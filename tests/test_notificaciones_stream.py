@@ -0,0 +1,36 @@
+from datetime import timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from app.core.security import create_access_token, create_stream_ticket, decode_stream_ticket, get_current_user
+
+
+def test_ticket_del_stream(cliente, usuario):
+    usuario["sub"] = usuario["email"]
+    respuesta = cliente.post("/api/v1/notificaciones/stream/ticket")
+    assert respuesta.status_code == 200
+    datos = decode_stream_ticket(respuesta.json()["ticket"])
+    assert datos["sub"] == usuario["email"]
+    assert "rol" not in datos
+
+
+def test_stream_rechaza_el_jwt_de_acceso(cliente):
+    token = create_access_token("aprobador@sedh.gob.hn", extra_claims={"rol": "admin"})
+    assert cliente.get("/api/v1/notificaciones/stream", params={"ticket": token}).status_code == 401
+    # El parámetro anterior ya no se acepta
+    assert cliente.get("/api/v1/notificaciones/stream", params={"token": token}).status_code == 422
+
+
+def test_ticket_no_vale_como_token_de_acceso():
+    with pytest.raises(HTTPException) as error:
+        get_current_user(create_stream_ticket("aprobador@sedh.gob.hn"))
+    assert error.value.status_code == 401
+
+
+def test_ticket_vencido():
+    ticket = create_access_token("aprobador@sedh.gob.hn", expires_delta=timedelta(seconds=-1),
+                                 extra_claims={"type": "stream"})
+    with pytest.raises(HTTPException) as error:
+        decode_stream_ticket(ticket)
+    assert error.value.status_code == 401
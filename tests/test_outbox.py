@@ -0,0 +1,91 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.core import outbox
+from app.core.config import settings
+from app.core.mail import ESTADO_CIRCUITO_ABIERTO
+from conftest import ResultadoFalso, SesionFalsa
+
+
+def _correo(idcorreo):
+    return {
+        "idcorreo": idcorreo, "idrequisicion": None, "destinatario": f"d{idcorreo}@sedh.gob.hn",
+        "asunto": "Asunto", "cuerpo_texto": "Cuerpo", "cuerpo_html": None,
+        "adjuntos": [], "incluir_logo": False, "intentos": 0,
+    }
+
+
+@pytest.fixture
+def entorno(monkeypatch):
+    """Una sesión falsa por SessionLocal() y un send_email que anota en qué momento se llamó."""
+    sesiones = []
+    envios = []
+    reservados = [_correo(1), _correo(2)]
+
+    def nueva_sesion():
+        sesion = SesionFalsa()
+        sesion.responder = lambda sql, params: ResultadoFalso(reservados if "FOR UPDATE SKIP LOCKED" in sql else [])
+        sesiones.append(sesion)
+        return sesion
+
+    def send_email(destinatario, *args, **kwargs):
+        # Estado de la reserva cuando se habla con SMTP
+        envios.append((destinatario, sesiones[0].commits))
+        return entorno.resultados.get(destinatario, ("enviado", None))
+
+    entorno = SimpleNamespace(sesiones=sesiones, envios=envios, resultados={})
+    monkeypatch.setattr(outbox, "SessionLocal", nueva_sesion)
+    monkeypatch.setattr(outbox, "send_email", send_email)
+    monkeypatch.setattr(outbox, "circuito_smtp", SimpleNamespace(abierto=lambda: False))
+    return entorno
+
+
+def _resultados(entorno):
+    return {
+        params["idcorreo"]: params
+        for sesion in entorno.sesiones[1:]
+        for _, params in sesion.sql_con("UPDATE requisiciones.email_outbox")
+    }
+
+
+def test_reserva_confirmada_antes_de_enviar(entorno):
+    assert outbox.procesar_outbox(10) == 2
+    reserva = entorno.sesiones[0]
+    (sql, params), = reserva.ejecutadas
+    assert "FOR UPDATE SKIP LOCKED" in sql
+    assert params == {"lote": 10, "lease": settings.OUTBOX_LEASE_SEC, "worker": outbox.WORKER_ID}
+    # Ningún correo se envía con la transacción de la reserva abierta
+    assert [commits for _, commits in entorno.envios] == [1, 1]
+
+
+def test_resultado_solo_si_la_reserva_sigue_siendo_nuestra(entorno):
+    entorno.resultados["d2@sedh.gob.hn"] = ("error", "550 buzón inexistente")
+    outbox.procesar_outbox(10)
+    assert "reservado_por = :worker" in outbox.SQL_MARCAR_RESULTADO
+    resultados = _resultados(entorno)
+    assert resultados[1]["estado"] == "enviado" and resultados[1]["worker"] == outbox.WORKER_ID
+    assert (resultados[2]["estado"], resultados[2]["cuenta"], resultados[2]["error"]) == ("error", 1, "550 buzón inexistente")
+    # Cada resultado queda también en email_log, en la misma transacción
+    assert all(len(s.sql_con("email_log")) == 1 and s.commits == 1 for s in entorno.sesiones[1:])
+
+
+def test_circuito_abierto_no_cuenta_el_intento(entorno):
+    entorno.resultados["d1@sedh.gob.hn"] = (ESTADO_CIRCUITO_ABIERTO, "circuito abierto")
+    outbox.procesar_outbox(10)
+    assert _resultados(entorno)[1]["cuenta"] == 0
+
+
+def test_circuito_abierto_no_reserva(entorno, monkeypatch):
+    monkeypatch.setattr(outbox, "circuito_smtp", SimpleNamespace(abierto=lambda: True))
+    assert outbox.procesar_outbox(10) == 0
+    assert entorno.sesiones == []
+
+
+def test_error_al_registrar_deja_la_fila_para_cuando_venza_la_reserva(entorno, monkeypatch):
+    def registrar(fila, estado, error):
+        raise RuntimeError("conexión perdida")
+
+    monkeypatch.setattr(outbox, "_registrar", registrar)
+    assert outbox.procesar_outbox(10) == 0
+    assert len(entorno.envios) == 1
@@ -0,0 +1,21 @@
+import pytest
+
+from app.api.productos.router import _etag_coincide
+
+ETAG = '"abc123"'
+
+
+@pytest.mark.parametrize("if_none_match", [
+    '"abc123"',
+    'W/"abc123"',
+    '"otro", "abc123"',
+    '"otro",W/"abc123"',
+    "*",
+])
+def test_coincide(if_none_match):
+    assert _etag_coincide(if_none_match, ETAG)
+
+
+@pytest.mark.parametrize("if_none_match", [None, "", '"otro"', "abc123", '"abc123-mini"'])
+def test_no_coincide(if_none_match):
+    assert not _etag_coincide(if_none_match, ETAG)
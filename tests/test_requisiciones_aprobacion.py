@@ -0,0 +1,89 @@
+from types import SimpleNamespace
+from uuid import uuid4
+
+import pytest
+from sqlalchemy.exc import InternalError, ProgrammingError
+
+from conftest import ResultadoFalso
+
+
+class ErrorPG(Exception):
+    """Lo que psycopg2 adjunta a DBAPIError.orig: pgcode y diag.message_primary."""
+
+    def __init__(self, pgcode: str, mensaje: str):
+        super().__init__(f"ERROR:  {mensaje}\nCONTEXT:  PL/pgSQL function requisiciones.procesar_aprobacion")
+        self.pgcode = pgcode
+        self.diag = SimpleNamespace(message_primary=mensaje)
+
+
+def _falla(clase, pgcode: str, mensaje: str):
+    return clase("SELECT requisiciones.procesar_aprobacion(...)", {}, ErrorPG(pgcode, mensaje))
+
+
+def _aprobada(params):
+    return ResultadoFalso([({
+        "mensaje": "Requisición aprobada",
+        "idRequisicion": str(params["p_id_requisicion"]),
+        "codRequisicion": "UIT-001-2026",
+        "estadoAprobacion": "APROBADO",
+        "estadoGeneral": "EN ESPERA",
+        "rol": params["p_rol"],
+        "aprobador": "Aprobador",
+        "notificados": 2,
+    },)])
+
+
+RESPONDERS = {
+    "/api/v1/requisiciones/responder/jefe": "JefInmediato",
+    "/api/v1/requisiciones/responder/gerente": "GerAdmon",
+    "/api/v1/requisiciones/responder/jefe-materiales": "JefSerMat",
+    "/api/v1/requisiciones/responder/almacen": "EmpAlmacen",
+}
+
+
+def _cuerpo():
+    return {"idRequisicion": str(uuid4()), "estado": "APROBADO", "productos": []}
+
+
+@pytest.mark.parametrize("url, rol", RESPONDERS.items())
+def test_aprobacion_exitosa(cliente, sesion, url, rol):
+    sesion.responder = lambda sql, params: _aprobada(params) if "procesar_aprobacion" in sql else ResultadoFalso()
+    respuesta = cliente.post(url, json=_cuerpo())
+    assert respuesta.status_code == 200, respuesta.text
+    assert respuesta.json()["notificados"] == 2
+    (_, params), = sesion.sql_con("procesar_aprobacion")
+    assert params["p_rol"] == rol
+    assert (sesion.commits, sesion.rollbacks) == (1, 0)
+
+
+@pytest.mark.parametrize("url", RESPONDERS)
+@pytest.mark.parametrize("clase, pgcode, mensaje, status", [
+    (ProgrammingError, "42501", "Usuario no autorizado: no es Gerente Administrativo de esta requisición", 403),
+    (InternalError, "P0002", "Requisición no encontrada", 404),
+    (InternalError, "22023", "Esta requisición ya fue respondida", 400),
+])
+def test_rechazos_por_sqlstate(cliente, sesion, url, clase, pgcode, mensaje, status):
+    sesion.responder = lambda sql, params: _falla(clase, pgcode, mensaje)
+    respuesta = cliente.post(url, json=_cuerpo())
+    assert respuesta.status_code == status
+    assert respuesta.json() == {"detail": mensaje}
+    assert sesion.commits == 0 and sesion.rollbacks >= 1
+
+
+def test_el_codigo_no_depende_del_texto(cliente, sesion):
+    # Mismo texto que antes daba 403 por coincidencia de subcadenas; manda el SQLSTATE
+    sesion.responder = lambda sql, params: _falla(InternalError, "22023", "Usuario no autorizado: no es nada")
+    assert cliente.post("/api/v1/requisiciones/responder/jefe", json=_cuerpo()).status_code == 400
+
+
+def test_otro_error_de_base_de_datos_es_500(cliente, sesion):
+    sesion.responder = lambda sql, params: _falla(InternalError, "40001", "could not serialize access")
+    respuesta = cliente.post("/api/v1/requisiciones/responder/gerente", json=_cuerpo())
+    assert respuesta.status_code == 500
+    assert sesion.commits == 0
+
+
+def test_estado_invalido_se_rechaza_antes_de_la_base(cliente, sesion):
+    respuesta = cliente.post("/api/v1/requisiciones/responder/jefe", json={**_cuerpo(), "estado": "QUIZAS"})
+    assert respuesta.status_code == 422
+    assert sesion.ejecutadas == []
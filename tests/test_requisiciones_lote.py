@@ -0,0 +1,67 @@
+import json
+from types import SimpleNamespace
+from uuid import uuid4
+
+from sqlalchemy.exc import InternalError
+
+from conftest import ResultadoFalso
+
+
+def _rechazo(mensaje: str):
+    orig = Exception(mensaje)
+    orig.pgcode = "42501"
+    orig.diag = SimpleNamespace(message_primary=mensaje)
+    return InternalError("SELECT requisiciones.procesar_aprobacion(...)", {}, orig)
+
+
+def test_lote_una_decision_falla_y_las_demas_se_confirman(cliente, sesion):
+    ids = [uuid4(), uuid4(), uuid4()]
+    fallida = str(ids[1])
+
+    def responder(sql, params):
+        if "procesar_aprobacion" not in sql:
+            return ResultadoFalso()
+        assert params["p_diferir"] is True
+        id_req = str(params["p_id_requisicion"])
+        if id_req == fallida:
+            return _rechazo("Usuario no autorizado: no es Gerente Administrativo de esta requisición")
+        return ResultadoFalso([({
+            "mensaje": "Requisición aprobada",
+            "idRequisicion": id_req,
+            "codRequisicion": "UIT-001-2026",
+            "estadoAprobacion": "APROBADO",
+            "estadoGeneral": "EN ESPERA",
+            "aprobador": "Aprobador",
+            "notificaciones": [{"emailusuario": "solicitante@sedh.gob.hn", "tipo": "APROBACION", "mensaje": "ok"}],
+        },)])
+
+    sesion.responder = responder
+    respuesta = cliente.post("/api/v1/requisiciones/responder/lote", json={
+        "rol": "GerAdmon",
+        "decisiones": [{"idRequisicion": str(i), "estado": "APROBADO", "productos": []} for i in ids],
+    })
+
+    assert respuesta.status_code == 200, respuesta.text
+    cuerpo = respuesta.json()
+    assert (cuerpo["total"], cuerpo["exitosas"], cuerpo["fallidas"], cuerpo["notificados"]) == (3, 2, 1, 2)
+    error = next(r for r in cuerpo["resultados"] if not r["ok"])
+    assert error["idRequisicion"] == fallida
+    assert error["error"].startswith("Usuario no autorizado")
+
+    assert (sesion.savepoints, sesion.savepoints_revertidos) == (3, 1)
+    (_, params), = sesion.sql_con("json_to_recordset")
+    notificadas = {n["idrequisicion"] for n in json.loads(params["notificaciones"])}
+    assert notificadas == {str(ids[0]), str(ids[2])}
+    assert (sesion.commits, sesion.rollbacks) == (1, 0)
+
+
+def test_lote_sin_exitosas_no_inserta_notificaciones(cliente, sesion):
+    sesion.responder = lambda sql, params: _rechazo("Requisición no encontrada")
+    respuesta = cliente.post("/api/v1/requisiciones/responder/lote", json={
+        "rol": "JefInmediato",
+        "decisiones": [{"idRequisicion": str(uuid4()), "estado": "APROBADO", "productos": []}],
+    })
+    assert respuesta.status_code == 200
+    assert respuesta.json()["fallidas"] == 1
+    assert sesion.sql_con("json_to_recordset") == []
+    assert sesion.commits == 1
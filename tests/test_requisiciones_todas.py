@@ -0,0 +1,82 @@
+from datetime import date, datetime
+from uuid import UUID, uuid4
+
+from conftest import ResultadoFalso
+
+URL = "/api/v1/requisiciones/todas"
+
+
+def _requisicion(cod: str, fecha: date):
+    return (
+        uuid4(), cod, "Ana López", uuid4(), fecha, "EN ESPERA", "", 100.0,
+        datetime(2026, 1, 1), "ana@sedh.gob.hn", "Unidad de Informática", "UIT",
+        "APROBADO", None, None, None,
+    )
+
+
+def _responder_con(requisiciones, total=None):
+    def responder(sql, params):
+        if "COUNT(*)" in sql:
+            return ResultadoFalso([(total,)])
+        if "detalle_requisicion" in sql:
+            return ResultadoFalso([
+                (params["ids"][0], uuid4(), "Papel", 2, 5.0, 10.0, "", ""),
+            ])
+        return ResultadoFalso(requisiciones)
+    return responder
+
+
+def test_cursor_invalido_es_400_sin_consultar(cliente, sesion_async):
+    respuesta = cliente.get(URL, params={"cursor": "basura", "limit": 10})
+    assert respuesta.status_code == 400
+    assert respuesta.json() == {"detail": "Cursor inválido"}
+    assert sesion_async.ejecutadas == []
+
+
+def test_pagina_con_cursor_siguiente(cliente, sesion_async):
+    filas = [_requisicion("UIT-002-2026", date(2026, 2, 1)), _requisicion("UIT-001-2026", date(2026, 1, 15))]
+    sesion_async.responder = _responder_con(filas, total=7)
+
+    respuesta = cliente.get(URL, params={"limit": 2, "incluir_total": True})
+
+    assert respuesta.status_code == 200
+    assert respuesta.headers["X-Total-Count"] == "7"
+    cuerpo = respuesta.json()
+    assert [r["CodRequisicion"] for r in cuerpo] == ["UIT-002-2026", "UIT-001-2026"]
+    assert cuerpo[0]["TotalProductos"] == 1 and cuerpo[1]["TotalProductos"] == 0
+    # Conteo, página y productos de toda la página: sin una consulta por requisición
+    assert len(sesion_async.ejecutadas) == 3
+    (_, params_productos), = sesion_async.sql_con("detalle_requisicion")
+    assert params_productos["ids"] == [filas[0][0], filas[1][0]]
+
+    siguiente = respuesta.headers["X-Next-Cursor"]
+    sesion_async.ejecutadas.clear()
+    sesion_async.responder = _responder_con([])
+    respuesta = cliente.get(URL, params={"limit": 2, "cursor": siguiente})
+
+    assert respuesta.status_code == 200
+    assert respuesta.json() == []
+    assert "X-Next-Cursor" not in respuesta.headers
+    (sql, params), = sesion_async.ejecutadas
+    assert "< (:c_fec, :c_cod, :c_id)" in sql
+    assert (params["c_fec"], params["c_cod"], params["c_id"]) == (date(2026, 1, 15), "UIT-001-2026", filas[1][0])
+
+
+def test_pagina_incompleta_no_tiene_cursor(cliente, sesion_async):
+    sesion_async.responder = _responder_con([_requisicion("UIT-001-2026", date(2026, 1, 15))])
+    respuesta = cliente.get(URL, params={"limit": 2})
+    assert respuesta.status_code == 200
+    assert "X-Next-Cursor" not in respuesta.headers
+
+
+def test_requisicion_sin_fecha_conserva_el_orden_en_el_cursor(cliente, sesion_async):
+    fila = _requisicion("UIT-003-2026", None)
+    sesion_async.responder = _responder_con([fila])
+    siguiente = cliente.get(URL, params={"limit": 1}).headers["X-Next-Cursor"]
+
+    sesion_async.ejecutadas.clear()
+    sesion_async.responder = _responder_con([])
+    cliente.get(URL, params={"limit": 1, "cursor": siguiente})
+    (_, params), = sesion_async.ejecutadas
+    assert params["c_fec"] == date(9999, 12, 31)
+    assert isinstance(params["c_id"], UUID)
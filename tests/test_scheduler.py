@@ -0,0 +1,49 @@
+import time
+
+import pytest
+
+from app.core import scheduler
+from app.core.config import settings
+from app.core.outbox import despertar_outbox
+
+
+@pytest.fixture
+def tareas(monkeypatch):
+    monkeypatch.setattr(scheduler, "TAREAS", {})
+    monkeypatch.setattr(settings, "OUTBOX_ENABLED", True)
+    monkeypatch.setattr(settings, "NOTIF_SENDER_ENABLED", True)
+    return scheduler.TAREAS
+
+
+def test_envios_se_registran_como_tareas_no_exclusivas(tareas):
+    scheduler.registrar_tareas()
+    assert not tareas["outbox"].exclusivo
+    assert not tareas["notificaciones"].exclusivo
+    assert tareas["outbox"].intervalo_sec == settings.OUTBOX_INTERVALO_SEC
+    assert tareas["notificaciones"].intervalo_sec == settings.NOTIF_SENDER_INTERVAL_SEC
+
+
+def test_envios_deshabilitados_no_se_registran(tareas, monkeypatch):
+    monkeypatch.setattr(settings, "OUTBOX_ENABLED", False)
+    monkeypatch.setattr(settings, "NOTIF_SENDER_ENABLED", False)
+    scheduler.registrar_tareas()
+    assert "outbox" not in tareas and "notificaciones" not in tareas
+
+
+def test_lote_lleno_repite_en_la_siguiente_vuelta(tareas, monkeypatch):
+    import app.core.outbox as outbox
+
+    monkeypatch.setattr(outbox, "procesar_outbox", lambda: settings.OUTBOX_LOTE)
+    outbox.programar_outbox()
+    tarea = tareas["outbox"]
+    tarea.proxima = 0
+    assert scheduler.ejecutar_pendientes() == 1
+    assert tarea.proxima <= time.monotonic()
+
+
+def test_despertar_outbox_adelanta_la_tarea(tareas):
+    scheduler.registrar_tareas()
+    tarea = tareas["outbox"]
+    tarea.proxima = time.monotonic() + 3600
+    despertar_outbox()
+    assert tarea.proxima <= time.monotonic()
@@ -0,0 +1,25 @@
+from app.core.sql_monitor import huella_sql
+
+
+def test_literales_y_numeros_se_reemplazan():
+    assert (
+        huella_sql("SELECT * FROM t WHERE id = 42 AND nombre = 'Ana' AND monto > 3.5")
+        == "SELECT * FROM t WHERE id = ? AND nombre = ? AND monto > ?"
+    )
+
+
+def test_comillas_escapadas_dentro_de_cadenas():
+    assert huella_sql("SELECT 'O''Brien', 'x'") == "SELECT ?, ?"
+
+
+def test_espacios_se_normalizan():
+    assert huella_sql("  SELECT a\n\tFROM   t\n") == "SELECT a FROM t"
+
+
+def test_identificadores_con_digitos_se_conservan():
+    assert huella_sql("SELECT col1 FROM t2 WHERE x = 7") == "SELECT col1 FROM t2 WHERE x = ?"
+
+
+def test_misma_huella_para_ejecuciones_equivalentes():
+    assert huella_sql("SELECT * FROM t WHERE id = 1") == huella_sql("SELECT *  FROM t WHERE id = 99")
+    assert huella_sql("SELECT * FROM t WHERE id = %(id)s") != huella_sql("SELECT * FROM u WHERE id = %(id)s")